@@ -1,5 +1,19 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Callable, Dict, List, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+def parse_key_value_list(value: str, cast: Callable[[str], T]) -> Dict[str, T]:
+    """Parse 'key=value,key=value' settings into a dict"""
+    result: Dict[str, T] = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        key, raw = item.split("=", 1)
+        result[key.strip()] = cast(raw.strip())
+    return result
 
 
 class Settings(BaseSettings):
@@ -13,6 +27,126 @@ class Settings(BaseSettings):
     GROQ_API_KEY: str
     GROQ_MODEL: str = "llama-3.3-70b-versatile"
     GROQ_MAX_TOKENS: int = 2000
+    GROQ_BASE_URL: Optional[str] = None
+    
+    # Groq HTTP connection pool
+    GROQ_MAX_CONNECTIONS: int = 100
+    GROQ_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    GROQ_KEEPALIVE_EXPIRY: float = 30.0
+    GROQ_CONNECT_TIMEOUT: float = 5.0
+    GROQ_READ_TIMEOUT: float = 60.0
+    GROQ_WRITE_TIMEOUT: float = 10.0
+    GROQ_POOL_TIMEOUT: float = 10.0
+    
+    # Model routing: endpoints in ROUTING_TABLE start on a smaller model tier
+    # (ROUTING_TIERS, smallest first; GROQ_MODEL is the largest) and escalate
+    # when their JSON answer fails validation. Policy: single, tiered or latency
+    ROUTING_POLICY: str = "single"
+    ROUTING_TIERS: str = "small=llama-3.1-8b-instant"
+    ROUTING_TABLE: str = "generate_name=small,analyze_mood=small,enrich_songs=small"
+    ROUTING_EXPLORE_RATIO: float = 0.05
+    ROUTING_MIN_SAMPLES: int = 5
+    
+    # Client-side Groq rate limits (0 disables a limit)
+    GROQ_RPM_LIMIT: int = 0
+    GROQ_TPM_LIMIT: int = 0
+    RATE_LIMIT_MAX_WAIT: float = 10.0
+    
+    # Retries for transient upstream errors
+    RETRY_MAX_ATTEMPTS: int = 3
+    RETRY_BASE_DELAY: float = 0.5
+    RETRY_MAX_DELAY: float = 8.0
+    RETRY_MAX_TOTAL_TIME: float = 20.0
+    RETRY_BUDGET_RATIO: float = 0.1
+    RETRY_BUDGET_MIN_PER_SECOND: float = 1.0
+    
+    # Circuit breaker
+    BREAKER_ENABLED: bool = True
+    BREAKER_FAILURE_RATE: float = 0.5
+    BREAKER_SLOW_CALL_SECONDS: float = 30.0
+    BREAKER_SLOW_CALL_RATE: float = 0.8
+    BREAKER_WINDOW_SIZE: int = 20
+    BREAKER_MIN_CALLS: int = 10
+    BREAKER_OPEN_SECONDS: float = 30.0
+    BREAKER_HALF_OPEN_CALLS: int = 2
+    
+    # Hedged requests (opt-in)
+    HEDGING_ENABLED: bool = False
+    HEDGING_ENDPOINTS: str = "semantic_search,recommend_songs"
+    HEDGING_PERCENTILE: float = 95.0
+    HEDGING_BUDGET_RATIO: float = 0.05
+    HEDGING_MIN_SAMPLES: int = 20
+    HEDGING_MIN_DELAY_MS: float = 50.0
+    
+    # Response cache
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 1000
+    CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    CACHE_DEFAULT_TTL: float = 3600.0
+    CACHE_STALE_TTL: float = 86400.0
+    CACHE_TTLS: str = "describe_playlist=3600,analyze_mood=3600,generate_name=600,recommend_songs=1800,semantic_search=900"
+    CACHE_DISK_PATH: str = ""
+    CACHE_DISK_MAX_ENTRIES: int = 100000
+    CACHE_DISK_MAX_BYTES: int = 256 * 1024 * 1024
+    
+    # Batch endpoint
+    BATCH_MAX_CONCURRENCY: int = 8
+    BATCH_MAX_ITEMS: int = 500
+    
+    # Micro-batching of generate-name and analyze-mood calls (opt-in)
+    MICRO_BATCH_ENABLED: bool = False
+    MICRO_BATCH_WINDOW_MS: float = 10.0
+    MICRO_BATCH_MAX_SIZE: int = 8
+    
+    # Song catalog and local semantic search
+    CATALOG_STORE_PATH: Optional[str] = None
+    CATALOG_PATH: Optional[str] = None
+    SEARCH_EMBEDDING_DIM: int = 256
+    SEARCH_IVF_LISTS: int = 0
+    SEARCH_IVF_PROBES: int = 32
+    SEARCH_QUANTIZE: bool = False
+    SEARCH_LLM_EXPLANATION: bool = True
+    SEARCH_MODE: str = "hybrid"
+    SEARCH_HYBRID_ALPHA: float = 0.5
+    
+    # Query planning for catalog search
+    SEARCH_QUERY_PLANNER: bool = True
+    SEARCH_PLANNER_LLM: bool = True
+    SEARCH_PLAN_CACHE_SIZE: int = 10000
+    CATALOG_MAX_INGEST: int = 10000
+    
+    # Incremental re-analysis of edited playlists
+    PLAYLIST_HISTORY_SIZE: int = 10000
+    PLAYLIST_REUSE_MAX_CHANGE: float = 0.1
+    PLAYLIST_UPDATE_MAX_CHANGE: float = 0.5
+    
+    # Per-song mood features for analyze-mood
+    FEATURE_STORE_ENABLED: bool = False
+    FEATURE_STORE_PATH: str = ""
+    FEATURE_ENRICH_BATCH_SIZE: int = 25
+    FEATURE_ENRICH_WINDOW_MS: float = 2000.0
+    FEATURE_MIN_COVERAGE: float = 0.8
+    FEATURE_LLM_DESCRIPTION: bool = True
+    
+    # Matching recommendations to catalog songs
+    RECOMMEND_RESOLVE_ENABLED: bool = True
+    RECOMMEND_MIN_CONFIDENCE: float = 0.7
+    
+    # Local item-to-item recommendations from playlist co-occurrence
+    RECOMMEND_MODEL_PATH: str = ""
+    RECOMMEND_MODE: str = "local"
+    RECOMMEND_MIN_COVERAGE: float = 0.5
+    RECOMMEND_FACTOR_WEIGHT: float = 0.1
+    
+    # Prompt token budgets per endpoint; longer playlists are sampled to fit
+    # (0 lists every song)
+    PROMPT_TOKEN_BUDGETS: str = "describe_playlist=2000,analyze_mood=2000,recommend_songs=1000"
+    
+    # Semantic cache: search responses reused for similar queries
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.8
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2000
+    SEMANTIC_CACHE_TTL: int = 1800
     
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:3001,http://localhost:3000"
@@ -28,6 +162,31 @@ class Settings(BaseSettings):
     def allowed_origins_list(self) -> List[str]:
         """Convert comma-separated origins to list"""
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
+    
+    @property
+    def hedging_endpoints_list(self) -> List[str]:
+        """Convert comma-separated hedged endpoints to list"""
+        return [endpoint.strip() for endpoint in self.HEDGING_ENDPOINTS.split(",") if endpoint.strip()]
+    
+    @property
+    def cache_ttls_map(self) -> Dict[str, float]:
+        """Convert comma-separated endpoint=seconds pairs to a dict"""
+        return parse_key_value_list(self.CACHE_TTLS, float)
+    
+    @property
+    def routing_tiers_map(self) -> Dict[str, str]:
+        """Convert comma-separated tier=model pairs to a dict, smallest first"""
+        return parse_key_value_list(self.ROUTING_TIERS, str)
+    
+    @property
+    def routing_table_map(self) -> Dict[str, str]:
+        """Convert comma-separated endpoint=tier pairs to a dict"""
+        return parse_key_value_list(self.ROUTING_TABLE, str)
+    
+    @property
+    def prompt_budgets_map(self) -> Dict[str, int]:
+        """Convert comma-separated endpoint=tokens pairs to a dict"""
+        return parse_key_value_list(self.PROMPT_TOKEN_BUDGETS, int)
 
 
 settings = Settings()
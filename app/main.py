@@ -1,17 +1,25 @@
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from datetime import datetime
 from app.config import settings
-from app.routers import ai_routes
+from app.routers import ai_routes, catalog_routes
 from app.utils.logger import setup_logger
 from app.utils.exceptions import AIServiceException
+from app.utils.metrics import metrics
+from app.utils.request_metrics import RequestMetricsMiddleware, count_error
 
 
 logger = setup_logger(__name__)
 
 
+# Response cache figures, copied from the cache when /metrics is scraped
+cache_entries = metrics.gauge("response_cache_entries", "Completions in the in-memory response cache")
+cache_bytes = metrics.gauge("response_cache_bytes", "Size of the completions in the in-memory response cache")
+
+
 # Create FastAPI app
 app = FastAPI(
     title="MusicLibrary AI API",
@@ -30,29 +38,50 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 
 # Include routers
 app.include_router(ai_routes.router, tags=["AI Features"])
+app.include_router(catalog_routes.router, tags=["Catalog"])
 
 
 # Health check endpoint
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check endpoint"""
+    breaker = ai_routes.ai_service.groq.breaker
+    breaker_status = breaker.snapshot() if breaker is not None else {"state": "disabled"}
+    
     return {
-        "status": "healthy",
+        "status": "healthy" if breaker_status["state"] in ("closed", "disabled") else "degraded",
         "service": "musiclibrary-ai",
         "timestamp": datetime.utcnow().isoformat(),
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "circuit_breaker": breaker_status,
+        "cache": await ai_routes.ai_service.cache_stats(),
+        "model_routing": ai_routes.ai_service.groq.router.snapshot(),
+        "metrics": metrics.snapshot()
     }
 
 
+# Prometheus metrics endpoint
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Metrics in the Prometheus text exposition format"""
+    stats = await ai_routes.ai_service.cache_stats()
+    cache_entries.set(stats["entries"])
+    cache_bytes.set(stats["bytes"])
+    
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # Exception handlers
 @app.exception_handler(AIServiceException)
 async def ai_service_exception_handler(request: Request, exc: AIServiceException):
     """Handle custom AI service exceptions"""
     logger.error(f"AI Service Exception: {exc.detail}")
+    count_error(exc)
     return JSONResponse(
         status_code=exc.status_code,
         content={
@@ -66,10 +95,11 @@ async def ai_service_exception_handler(request: Request, exc: AIServiceException
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle request validation errors"""
     logger.error(f"Validation Error: {exc.errors()}")
+    count_error(exc)
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
-            "detail": exc.errors(),
+            "detail": jsonable_encoder(exc.errors()),
             "error_type": "validation_error"
         }
     )
@@ -79,6 +109,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle all other exceptions"""
     logger.error(f"Unexpected error: {str(exc)}", exc_info=True)
+    count_error(exc)
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
@@ -96,6 +127,7 @@ async def startup_event():
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"Groq Model: {settings.GROQ_MODEL}")
     logger.info(f"Allowed Origins: {settings.allowed_origins_list}")
+    await ai_routes.ai_service.startup()
 
 
 # Shutdown event
@@ -103,6 +135,7 @@ async def startup_event():
 async def shutdown_event():
     """Run on application shutdown"""
     logger.info("🎵 MusicLibrary AI API shutting down...")
+    await ai_routes.ai_service.shutdown()
 
 
 if __name__ == "__main__":
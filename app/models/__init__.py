@@ -4,7 +4,9 @@ from .requests import (
     RecommendSongsRequest,
     GeneratePlaylistNameRequest,
     AnalyzeMoodRequest,
-    SemanticSearchRequest
+    SemanticSearchRequest,
+    BatchRequest,
+    CatalogIngestRequest
 )
 from .responses import (
     DescribePlaylistResponse,
@@ -12,7 +14,13 @@ from .responses import (
     GeneratePlaylistNameResponse,
     AnalyzeMoodResponse,
     SemanticSearchResponse,
-    SongRecommendation
+    SearchPlan,
+    SongRecommendation,
+    BatchResponse,
+    BatchItemResult,
+    CatalogIngestResponse,
+    CatalogRemoveResponse,
+    CatalogStatsResponse
 )
 
 __all__ = [
@@ -22,10 +30,18 @@ __all__ = [
     'GeneratePlaylistNameRequest',
     'AnalyzeMoodRequest',
     'SemanticSearchRequest',
+    'BatchRequest',
+    'CatalogIngestRequest',
     'DescribePlaylistResponse',
     'RecommendSongsResponse',
     'GeneratePlaylistNameResponse',
     'AnalyzeMoodResponse',
     'SemanticSearchResponse',
-    'SongRecommendation'
+    'SearchPlan',
+    'SongRecommendation',
+    'BatchResponse',
+    'BatchItemResult',
+    'CatalogIngestResponse',
+    'CatalogRemoveResponse',
+    'CatalogStatsResponse'
 ]
\ No newline at end of file
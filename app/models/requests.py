@@ -1,11 +1,18 @@
-from pydantic import BaseModel, Field
-from typing import List, Literal
+from pydantic import BaseModel, Field, TypeAdapter, model_validator
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
 from app.models.song import Song
 
 
+def _require_songs_or_ids(songs: Optional[List[Song]], song_ids: Optional[List[str]], songs_field: str, ids_field: str) -> None:
+    """Songs are given either in full or as catalog ids, not both"""
+    if (songs is None) == (song_ids is None):
+        raise ValueError(f"Provide exactly one of '{songs_field}' or '{ids_field}'")
+
+
 class DescribePlaylistRequest(BaseModel):
     """Request to generate a playlist description"""
-    songs: List[Song] = Field(..., min_length=1, description="List of songs in the playlist")
+    songs: Optional[List[Song]] = Field(None, min_length=1, description="List of songs in the playlist")
+    song_ids: Optional[List[str]] = Field(None, min_length=1, description="Catalog ids of the songs, instead of full song objects")
     
     class Config:
         json_schema_extra = {
@@ -22,12 +29,25 @@ class DescribePlaylistRequest(BaseModel):
                 ]
             }
         }
+    
+    @model_validator(mode="after")
+    def check_songs(self):
+        _require_songs_or_ids(self.songs, self.song_ids, "songs", "song_ids")
+        return self
 
 
 class RecommendSongsRequest(BaseModel):
     """Request to get song recommendations"""
-    current_songs: List[Song] = Field(..., min_length=1, description="Songs currently in the playlist")
+    current_songs: Optional[List[Song]] = Field(None, min_length=1, description="Songs currently in the playlist")
+    current_song_ids: Optional[List[str]] = Field(None, min_length=1, description="Catalog ids of the songs, instead of full song objects")
     number_of_recommendations: int = Field(5, ge=1, le=20, description="Number of recommendations to generate")
+    mode: Optional[Literal['llm', 'local', 'fast']] = Field(
+        None,
+        description=(
+            "Who picks the songs: the LLM, or the local playlist co-occurrence model with reasons "
+            "written by the LLM ('local') or built locally ('fast'); defaults to RECOMMEND_MODE"
+        )
+    )
     
     class Config:
         json_schema_extra = {
@@ -45,11 +65,17 @@ class RecommendSongsRequest(BaseModel):
                 "number_of_recommendations": 5
             }
         }
+    
+    @model_validator(mode="after")
+    def check_songs(self):
+        _require_songs_or_ids(self.current_songs, self.current_song_ids, "current_songs", "current_song_ids")
+        return self
 
 
 class GeneratePlaylistNameRequest(BaseModel):
     """Request to generate creative playlist names"""
-    songs: List[Song] = Field(..., min_length=1, description="Songs in the playlist")
+    songs: Optional[List[Song]] = Field(None, min_length=1, description="Songs in the playlist")
+    song_ids: Optional[List[str]] = Field(None, min_length=1, description="Catalog ids of the songs, instead of full song objects")
     style: Literal['creative', 'descriptive', 'fun'] = Field('creative', description="Style of name generation")
     
     class Config:
@@ -68,11 +94,17 @@ class GeneratePlaylistNameRequest(BaseModel):
                 "style": "creative"
             }
         }
+    
+    @model_validator(mode="after")
+    def check_songs(self):
+        _require_songs_or_ids(self.songs, self.song_ids, "songs", "song_ids")
+        return self
 
 
 class AnalyzeMoodRequest(BaseModel):
     """Request to analyze mood of songs"""
-    songs: List[Song] = Field(..., min_length=1, description="Songs to analyze")
+    songs: Optional[List[Song]] = Field(None, min_length=1, description="Songs to analyze")
+    song_ids: Optional[List[str]] = Field(None, min_length=1, description="Catalog ids of the songs, instead of full song objects")
     
     class Config:
         json_schema_extra = {
@@ -89,18 +121,144 @@ class AnalyzeMoodRequest(BaseModel):
                 ]
             }
         }
+    
+    @model_validator(mode="after")
+    def check_songs(self):
+        _require_songs_or_ids(self.songs, self.song_ids, "songs", "song_ids")
+        return self
 
 
 class SemanticSearchRequest(BaseModel):
     """Request for semantic search of songs"""
     query: str = Field(..., min_length=3, max_length=500, description="Natural language search query")
     limit: int = Field(10, ge=1, le=50, description="Maximum number of results")
+    mode: Optional[Literal['hybrid', 'semantic', 'keyword']] = Field(
+        None,
+        description="Catalog search mode: BM25 keywords, vector similarity or both (defaults to SEARCH_MODE)"
+    )
+    year_from: Optional[int] = Field(None, ge=1900, le=2100, description="Only catalog songs released in or after this year")
+    year_to: Optional[int] = Field(None, ge=1900, le=2100, description="Only catalog songs released in or before this year")
+    genres: Optional[List[str]] = Field(None, min_length=1, description="Only catalog songs in one of these genres")
+    
+    @model_validator(mode="after")
+    def check_years(self):
+        if self.year_from is not None and self.year_to is not None and self.year_from > self.year_to:
+            raise ValueError("'year_from' must not be after 'year_to'")
+        return self
     
     class Config:
         json_schema_extra = {
             "example": {
                 "query": "upbeat songs for running in the morning",
-                "limit": 10
+                "limit": 10,
+                "mode": "hybrid",
+                "year_from": 1980,
+                "genres": ["Rock"]
+            }
+        }
+
+
+
+class DescribeBatchItem(DescribePlaylistRequest):
+    """Batch item: describe a playlist"""
+    op: Literal['describe']
+    id: Optional[str] = Field(None, description="Client-provided identifier echoed in the result")
+
+
+class RecommendBatchItem(RecommendSongsRequest):
+    """Batch item: recommend songs"""
+    op: Literal['recommend']
+    id: Optional[str] = Field(None, description="Client-provided identifier echoed in the result")
+
+
+class NameBatchItem(GeneratePlaylistNameRequest):
+    """Batch item: generate playlist names"""
+    op: Literal['name']
+    id: Optional[str] = Field(None, description="Client-provided identifier echoed in the result")
+
+
+class MoodBatchItem(AnalyzeMoodRequest):
+    """Batch item: analyze mood"""
+    op: Literal['mood']
+    id: Optional[str] = Field(None, description="Client-provided identifier echoed in the result")
+
+
+class SearchBatchItem(SemanticSearchRequest):
+    """Batch item: semantic search"""
+    op: Literal['search']
+    id: Optional[str] = Field(None, description="Client-provided identifier echoed in the result")
+
+
+BatchItem = Annotated[
+    Union[DescribeBatchItem, RecommendBatchItem, NameBatchItem, MoodBatchItem, SearchBatchItem],
+    Field(discriminator='op')
+]
+
+# Items that don't validate as a batch item are kept as plain dicts and
+# validated again when the batch runs, so an invalid item fails on its own
+# instead of failing the whole request. The batch item models come first,
+# so they are what the OpenAPI schema documents for each operation.
+batch_item_adapter = TypeAdapter(BatchItem)
+BatchOperation = Annotated[Union[BatchItem, Dict[str, Any]], Field(union_mode='left_to_right')]
+
+
+class BatchRequest(BaseModel):
+    """Request to run many AI operations at once"""
+    operations: List[BatchOperation] = Field(
+        ...,
+        min_length=1,
+        description=(
+            "Operations to run: each has an `op` (describe, recommend, name, mood or search) "
+            "and the body of the matching endpoint"
+        )
+    )
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "operations": [
+                    {
+                        "op": "describe",
+                        "id": "playlist-1",
+                        "songs": [
+                            {
+                                "id": "1",
+                                "title": "Bohemian Rhapsody",
+                                "artist": "Queen",
+                                "genre": "Rock",
+                                "year": 1975,
+                                "duration": 354
+                            }
+                        ]
+                    },
+                    {
+                        "op": "search",
+                        "id": "search-1",
+                        "query": "upbeat songs for running in the morning",
+                        "limit": 5
+                    }
+                ]
             }
         }
 
+
+class CatalogIngestRequest(BaseModel):
+    """Request to add songs to the searchable catalog"""
+    songs: List[Song] = Field(..., min_length=1, description="Songs to add or replace, keyed by id")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "songs": [
+                    {
+                        "id": "1",
+                        "title": "Bohemian Rhapsody",
+                        "artist": "Queen",
+                        "album": "A Night at the Opera",
+                        "genre": "Rock",
+                        "year": 1975,
+                        "duration": 354
+                    }
+                ]
+            }
+        }
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Literal, Optional, Union
 from app.models.song import Song
 
 
@@ -13,6 +13,8 @@ class SongRecommendation(BaseModel):
     title: str
     artist: str
     reason: str = Field(..., description="Why this song was recommended")
+    song_id: Optional[str] = Field(None, description="Id of the matching catalog song, if any")
+    confidence: Optional[float] = Field(None, description="How closely the catalog song matches, from 0 to 1")
 
 
 class RecommendSongsResponse(BaseModel):
@@ -29,12 +31,27 @@ class AnalyzeMoodResponse(BaseModel):
     """Response with mood analysis"""
     moods: List[str] = Field(..., description="Identified moods/emotions")
     description: str = Field(..., description="Detailed mood description")
+    energy: Optional[float] = Field(None, description="Average song energy, from 0 (calm) to 1 (intense)")
+    valence: Optional[float] = Field(None, description="Average song valence, from 0 (dark) to 1 (bright)")
+
+
+class SearchPlan(BaseModel):
+    """Structured form of a search query, used to search the catalog"""
+    keywords: List[str]
+    genres: List[str]
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    min_duration: Optional[int] = Field(None, description="Minimum duration in seconds")
+    max_duration: Optional[int] = Field(None, description="Maximum duration in seconds")
+    moods: List[str]
+    source: str = Field(..., description="Where the plan came from: rules or llm")
 
 
 class SemanticSearchResponse(BaseModel):
     """Response with semantic search results"""
     songs: List[Song] = Field(..., description="Songs matching the semantic query")
     explanation: str = Field(..., description="Why these songs match the query")
+    plan: Optional[SearchPlan] = Field(None, description="How the query was interpreted, for catalog searches")
 
 
 class ErrorResponse(BaseModel):
@@ -42,3 +59,54 @@ class ErrorResponse(BaseModel):
     detail: str
     error_type: str = "error"
 
+
+
+class BatchItemError(BaseModel):
+    """Error for a single failed batch item"""
+    detail: str
+    error_type: str
+    status_code: int
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of a single batch item"""
+    index: int = Field(..., description="Position of the operation in the request")
+    id: Optional[str] = Field(None, description="Client-provided identifier")
+    op: str
+    status: Literal['ok', 'error']
+    result: Optional[Union[
+        DescribePlaylistResponse,
+        RecommendSongsResponse,
+        GeneratePlaylistNameResponse,
+        AnalyzeMoodResponse,
+        SemanticSearchResponse
+    ]] = None
+    error: Optional[BatchItemError] = None
+
+
+class BatchResponse(BaseModel):
+    """Response with per-item batch results"""
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+
+
+class CatalogIngestResponse(BaseModel):
+    """Response after adding songs to the catalog"""
+    ingested: int = Field(..., description="Songs added or replaced")
+    total: int = Field(..., description="Songs in the catalog")
+
+
+class CatalogRemoveResponse(BaseModel):
+    """Response after removing songs from the catalog"""
+    removed: int = Field(..., description="Songs removed")
+    total: int = Field(..., description="Songs in the catalog")
+
+
+class CatalogStatsResponse(BaseModel):
+    """Size and index settings of the song catalog"""
+    songs: int
+    stored_songs: int = Field(..., description="Songs loaded from the memory-mapped catalog store")
+    dimensions: int
+    ivf_lists: int
+    quantized: bool
@@ -1,25 +1,13 @@
 from typing import List
 from app.models import Song
-from app.utils.helpers import format_songs_for_prompt, get_dominant_genre
+from app.utils.helpers import extract_decades, extract_genres, get_dominant_genre, short_song_lines
+from app.utils.prompt_budget import fit_prompt, songs_within_budget
+from app.utils.prompt_compiler import PromptTemplate, static_prompt
 
 
-def create_analyze_mood_prompt(songs: List[Song]) -> str:
-    """Create prompt for analyzing mood"""
-    
-    songs_list = format_songs_for_prompt(songs)
-    dominant_genre = get_dominant_genre(songs)
-    
-    prompt = f"""Analyze the mood and emotional character of this playlist:
-
-
-
-{songs_list}
-
-
-
-Main genre: {dominant_genre}
-
-Number of songs: {len(songs)}
+# Instructions come before the playlist, so prompts for different playlists
+# share a cacheable prefix
+ANALYZE_MOOD_TEMPLATE = PromptTemplate("""Analyze the mood and emotional character of the playlist below.
 
 
 
@@ -55,14 +43,190 @@ Return your response as JSON with this exact structure:
 
 
 
-Return ONLY the JSON object, no additional text, no markdown formatting, no code blocks."""
+Return ONLY the JSON object, no additional text, no markdown formatting, no code blocks.
+
+
+
+The playlist:
+
+
+
+{songs_list}
+
+
+
+Main genre: {dominant_genre}
+
+Number of songs: {total_songs}""")
+
+UPDATE_MOOD_TEMPLATE = PromptTemplate("""Update the mood analysis of a playlist to fit the playlist as it is now: 3-5 mood tags and a 2-3 sentence description of the overall emotional atmosphere, changing only what the added and removed songs call for.
+
+Return your response as JSON with this exact structure:
+{{
+  "moods": ["mood1", "mood2", "mood3"],
+  "description": "Overall emotional atmosphere description"
+}}
+
+Return ONLY the JSON object, no additional text, no markdown formatting, no code blocks.
+
+This is the mood analysis:
+
+Moods: {previous_moods}
+Description: {previous_description}
+
+The playlist has since changed:
+
+{changes_text}
+
+It now has {total_songs} songs, main genre {dominant_genre}.""")
 
-    return prompt
+SYSTEM_PROMPT = static_prompt("""You are a music psychologist and mood analysis expert.
+You understand how music affects emotions and can accurately identify the emotional character of songs and playlists.
+You provide insightful, nuanced mood analyses that go beyond surface-level descriptions.""")
+
+BATCH_ANALYZE_MOOD_TEMPLATE = PromptTemplate("""Analyze the mood and emotional character of each of the playlists below independently.
+
+For each playlist provide a list of 3-5 mood tags/keywords and a 2-3 sentence description of the overall emotional atmosphere, considering the musical characteristics, era and typical emotional associations of its songs.
+
+Return your response as a JSON object keyed by playlist id, with this exact structure for each:
+{{
+  "p0": {{"moods": ["mood1", "mood2", "mood3"], "description": "Overall emotional atmosphere description"}}
+}}
+
+Return ONLY the JSON object, no additional text, no markdown formatting, no code blocks.
+
+The {count} playlists ({keys}):
+
+{playlists_text}""")
+
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + "\nYou analyze each playlist on its own merits and never mix songs between playlists."
+
+SONG_FEATURES_TEMPLATE = PromptTemplate("""Rate each of these songs on its own.
+
+For each song give:
+- "moods": 1-5 mood tags, strongest first, chosen only from: {mood_tags}
+- "energy": from 0.0 (very calm) to 1.0 (very intense)
+- "valence": from 0.0 (sad, dark) to 1.0 (happy, bright)
+
+Return your response as a JSON object keyed by song id (s0, s1, ...), with this exact structure for each:
+{{
+  "s0": {{"moods": ["mood1", "mood2"], "energy": 0.5, "valence": 0.5}}
+}}
+
+Return ONLY the JSON object, no additional text, no markdown formatting, no code blocks.
+
+The {count} songs:
+
+{songs_text}""")
+
+SONG_FEATURES_SYSTEM_PROMPT = static_prompt("""You are a music psychologist who knows the recordings of every era and genre.
+You rate how individual songs feel to listeners, consistently and on a fixed scale.""")
+
+MOOD_DESCRIPTION_TEMPLATE = PromptTemplate("""Write a 2-3 sentence description of a playlist's overall emotional atmosphere from its mood features.
+
+Write ONLY the description, no preamble or explanation.
+
+The playlist has {total_songs} songs, mainly {dominant_genre} (genres: {genres}; decades: {decades}), and these mood features:
+
+Moods: {moods}
+Energy: {energy} (0 = very calm, 1 = very intense)
+Valence: {valence} (0 = sad and dark, 1 = happy and bright)""")
+
+
+def create_analyze_mood_prompt(songs: List[Song], budget: int = 0) -> str:
+    """Create prompt for analyzing mood, sampling the songs to stay within `budget` tokens"""
+    
+    dominant_genre = get_dominant_genre(songs)
+    
+    def render(songs_list: str) -> str:
+        return ANALYZE_MOOD_TEMPLATE.render(
+            songs_list=songs_list,
+            dominant_genre=dominant_genre,
+            total_songs=len(songs)
+        )
+    
+    return fit_prompt(render, songs, budget)
+
+
+def create_update_mood_prompt(
+    previous_moods: List[str],
+    previous_description: str,
+    added: List[Song],
+    removed: List[Song],
+    songs: List[Song],
+    budget: int = 0
+) -> str:
+    """Create prompt for revising a mood analysis after a few songs changed"""
+    
+    changes = []
+    if added:
+        changes.append(f"Added:\n{songs_within_budget(added, budget // 2)}")
+    if removed:
+        changes.append(f"Removed:\n{songs_within_budget(removed, budget // 2)}")
+    
+    return UPDATE_MOOD_TEMPLATE.render(
+        previous_moods=', '.join(previous_moods),
+        previous_description=previous_description,
+        changes_text="\n\n".join(changes),
+        total_songs=len(songs),
+        dominant_genre=get_dominant_genre(songs)
+    )
 
 
 def create_system_prompt() -> str:
     """System prompt for mood analysis"""
-    return """You are a music psychologist and mood analysis expert.
-You understand how music affects emotions and can accurately identify the emotional character of songs and playlists.
-You provide insightful, nuanced mood analyses that go beyond surface-level descriptions."""
+    return SYSTEM_PROMPT
+
+
+def create_batch_analyze_mood_prompt(playlists: List[List[Song]], budget: int = 0) -> str:
+    """Create one prompt that analyzes the mood of several playlists, each sampled to about `budget` tokens"""
+    
+    sections = []
+    for i, songs in enumerate(playlists):
+        sections.append(
+            f"Playlist p{i} (main genre: {get_dominant_genre(songs)}, {len(songs)} songs):\n"
+            f"{songs_within_budget(songs, budget)}"
+        )
+    
+    return BATCH_ANALYZE_MOOD_TEMPLATE.render(
+        count=len(playlists),
+        playlists_text="\n\n".join(sections),
+        keys=", ".join(f'"p{i}"' for i in range(len(playlists)))
+    )
 
+
+def create_batch_system_prompt() -> str:
+    """System prompt for analyzing several playlists in one call"""
+    return BATCH_SYSTEM_PROMPT
+
+
+def create_song_features_prompt(songs: List[Song], mood_tags: List[str]) -> str:
+    """Create one prompt that tags the mood, energy and valence of each song"""
+    
+    return SONG_FEATURES_TEMPLATE.render(
+        count=len(songs),
+        songs_text=short_song_lines.numbered(songs, "s", 0),
+        mood_tags=', '.join(mood_tags)
+    )
+
+
+def create_song_features_system_prompt() -> str:
+    """System prompt for tagging songs"""
+    return SONG_FEATURES_SYSTEM_PROMPT
+
+
+def create_mood_description_prompt(moods: List[str], energy: float, valence: float, songs: List[Song]) -> str:
+    """Create prompt for describing a playlist's mood from its aggregated song features"""
+    
+    genres = extract_genres(songs)[:3]
+    decades = extract_decades(songs)
+    
+    return MOOD_DESCRIPTION_TEMPLATE.render(
+        total_songs=len(songs),
+        dominant_genre=get_dominant_genre(songs),
+        genres=', '.join(genres) if genres else 'Various',
+        decades=', '.join(decades) if decades else 'Various',
+        moods=', '.join(moods),
+        energy=f"{energy:.1f}",
+        valence=f"{valence:.1f}"
+    )
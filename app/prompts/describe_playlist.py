@@ -1,25 +1,37 @@
 from typing import List
 from app.models import Song
 from app.utils.helpers import (
-    format_songs_for_prompt,
     extract_decades,
     extract_genres,
     get_dominant_genre,
     calculate_total_duration,
     format_duration
 )
+from app.utils.prompt_budget import fit_prompt, songs_within_budget
+from app.utils.prompt_compiler import PromptTemplate, static_prompt
 
 
-def create_describe_playlist_prompt(songs: List[Song]) -> str:
-    """Create prompt for describing a playlist"""
-    
-    songs_list = format_songs_for_prompt(songs)
-    decades = extract_decades(songs)
-    genres = extract_genres(songs)
-    dominant_genre = get_dominant_genre(songs)
-    total_duration = calculate_total_duration(songs)
-    
-    prompt = f"""You are a music curator and expert. I have a playlist with the following songs:
+# Instructions come before the playlist, so prompts for different playlists
+# share a cacheable prefix
+DESCRIBE_TEMPLATE = PromptTemplate("""You are a music curator and expert. Generate a creative, engaging, and atmospheric description for the playlist below. The description should:
+
+1. Capture the overall mood and vibe of the collection
+
+2. Highlight the musical era(s) and style(s)
+
+3. Be 2-4 sentences long
+
+4. Be written in an evocative, descriptive style (like you'd see on Spotify or Apple Music)
+
+5. Make someone excited to listen to it
+
+
+
+Write ONLY the description, no preamble or explanation.
+
+
+
+The playlist has the following songs:
 
 
 
@@ -29,40 +41,79 @@ def create_describe_playlist_prompt(songs: List[Song]) -> str:
 
 Playlist Details:
 
-- Total songs: {len(songs)}
+- Total songs: {total_songs}
 
-- Total duration: {format_duration(total_duration)}
+- Total duration: {total_duration}
 
 - Main genre: {dominant_genre}
 
-- Genres present: {', '.join(genres) if genres else 'Various'}
+- Genres present: {genres}
 
-- Decades represented: {', '.join(decades) if decades else 'Various'}
+- Decades represented: {decades}""")
 
+UPDATE_DESCRIPTION_TEMPLATE = PromptTemplate("""Update the description of a playlist to fit the playlist as it is now, keeping its style and length (2-4 sentences) and changing only what the added and removed songs call for.
 
+Write ONLY the description, no preamble or explanation.
 
-Generate a creative, engaging, and atmospheric description for this playlist. The description should:
+This is the description:
 
-1. Capture the overall mood and vibe of the collection
+{previous}
 
-2. Highlight the musical era(s) and style(s)
+The playlist has since changed:
 
-3. Be 2-4 sentences long
+{changes_text}
 
-4. Be written in an evocative, descriptive style (like you'd see on Spotify or Apple Music)
+It now has {total_songs} songs ({total_duration}), main genre {dominant_genre}, genres: {genres}, decades: {decades}.""")
 
-5. Make someone excited to listen to it
+SYSTEM_PROMPT = static_prompt("""You are an expert music curator with deep knowledge of music history, genres, and cultural context.
+You write compelling, evocative playlist descriptions that capture the essence and mood of music collections.
+Your descriptions are concise yet vivid, making listeners eager to press play.""")
 
 
+def create_describe_playlist_prompt(songs: List[Song], budget: int = 0) -> str:
+    """Create prompt for describing a playlist, sampling its songs to stay within `budget` tokens"""
+    
+    genres = extract_genres(songs)
+    decades = extract_decades(songs)
+    values = {
+        "total_songs": len(songs),
+        "total_duration": format_duration(calculate_total_duration(songs)),
+        "dominant_genre": get_dominant_genre(songs),
+        "genres": ', '.join(genres) if genres else 'Various',
+        "decades": ', '.join(decades) if decades else 'Various',
+    }
+    
+    return fit_prompt(lambda songs_list: DESCRIBE_TEMPLATE.render(songs_list=songs_list, **values), songs, budget)
 
-Write ONLY the description, no preamble or explanation."""
 
-    return prompt
+def create_update_description_prompt(
+    previous: str,
+    added: List[Song],
+    removed: List[Song],
+    songs: List[Song],
+    budget: int = 0
+) -> str:
+    """Create prompt for revising a description after a few songs changed"""
+    
+    genres = extract_genres(songs)
+    decades = extract_decades(songs)
+    changes = []
+    if added:
+        changes.append(f"Added:\n{songs_within_budget(added, budget // 2)}")
+    if removed:
+        changes.append(f"Removed:\n{songs_within_budget(removed, budget // 2)}")
+    
+    return UPDATE_DESCRIPTION_TEMPLATE.render(
+        previous=previous,
+        changes_text="\n\n".join(changes),
+        total_songs=len(songs),
+        total_duration=format_duration(calculate_total_duration(songs)),
+        dominant_genre=get_dominant_genre(songs),
+        genres=', '.join(genres) if genres else 'Various',
+        decades=', '.join(decades) if decades else 'Various'
+    )
 
 
 def create_system_prompt() -> str:
     """System prompt for playlist description"""
-    return """You are an expert music curator with deep knowledge of music history, genres, and cultural context. 
-You write compelling, evocative playlist descriptions that capture the essence and mood of music collections. 
-Your descriptions are concise yet vivid, making listeners eager to press play."""
-
+    return SYSTEM_PROMPT
@@ -1,13 +1,14 @@
 """
 Prompts for playlist name generation feature
 """
-from typing import List
+from collections import Counter
+from typing import List, Tuple
 from app.models import Song
+from app.utils.prompt_budget import representative_songs
+from app.utils.prompt_compiler import PromptTemplate, static_prompt
 
 
-def create_system_prompt() -> str:
-    """Create the system prompt for playlist name generation"""
-    return """You are a creative playlist naming expert. Your task is to generate catchy, memorable playlist names.
+SYSTEM_PROMPT = static_prompt("""You are a creative playlist naming expert. Your task is to generate catchy, memorable playlist names.
 
 CRITICAL: You must respond with ONLY valid JSON in this exact format:
 ["Name 1", "Name 2", "Name 3"]
@@ -16,21 +17,65 @@ Rules:
 - Return ONLY a JSON array with exactly 3 strings
 - No markdown, no code blocks, no explanations
 - Names should be creative and reflect the playlist's mood/theme
-- Keep names concise (2-5 words typically)"""
+- Keep names concise (2-5 words typically)""")
+
+# The response format comes before the playlist, so prompts for different
+# playlists share a cacheable prefix
+GENERATE_NAME_TEMPLATE = PromptTemplate("""Your response must be ONLY this JSON array (no markdown, no code blocks, no explanations):
+["First Name Here", "Second Name Here", "Third Name Here"]
 
+Generate exactly 3 playlist names for this collection:
 
-def create_generate_name_prompt(songs: List[Song], style: str) -> str:
-    """Create the user prompt for playlist name generation"""
+{context}
+
+Sample songs:
+{songs_text}
+
+Style: {style}
+
+Generate exactly 3 names now:""")
+
+BATCH_GENERATE_NAME_TEMPLATE = PromptTemplate("""Your response must be ONLY a JSON object keyed by playlist id, each value an array of exactly 3 names (no markdown, no code blocks, no explanations):
+{{"p0": ["First Name Here", "Second Name Here", "Third Name Here"]}}
+
+Generate exactly 3 playlist names for each of these {count} collections ({keys}):
+
+{playlists_text}
+
+Style: {style}
+
+Generate the names now:""")
+
+BATCH_SYSTEM_PROMPT = static_prompt("""You are a creative playlist naming expert. Your task is to generate catchy, memorable playlist names for several playlists at once.
+
+CRITICAL: You must respond with ONLY valid JSON in this exact format:
+{"p0": ["Name 1", "Name 2", "Name 3"], "p1": ["Name 1", "Name 2", "Name 3"]}
+
+Rules:
+- Return ONLY a JSON object with one key per playlist, each holding exactly 3 strings
+- No markdown, no code blocks, no explanations
+- Names should be creative and reflect each playlist's own mood/theme
+- Keep names concise (2-5 words typically)""")
+
+
+def create_system_prompt() -> str:
+    """Create the system prompt for playlist name generation"""
+    return SYSTEM_PROMPT
+
+
+def _playlist_context(songs: List[Song]) -> Tuple[str, str]:
+    """Summarize a playlist's theme and sample songs for naming prompts"""
     
-    # Analyze songs to understand the theme
-    genres = list(set([song.genre for song in songs if song.genre]))[:5]
-    artists = list(set([song.artist for song in songs]))[:5]
+    # Analyze songs to understand the theme; most common first, ties in
+    # first-seen order so identical playlists build identical prompts
+    genres = [genre for genre, _ in Counter(song.genre for song in songs if song.genre).most_common(5)]
+    artists = [artist for artist, _ in Counter(song.artist for song in songs).most_common(5)]
     years = [song.year for song in songs if song.year]
     avg_year = sum(years) // len(years) if years else None
     
     # Format songs for context
     songs_list = []
-    for i, song in enumerate(songs[:5], 1):  # Show first 5 songs
+    for i, song in enumerate(representative_songs(songs, 5), 1):  # Show 5 songs across genres, eras and artists
         songs_list.append(f"{i}. '{song.title}' by {song.artist}")
     
     songs_text = "\n".join(songs_list)
@@ -51,26 +96,46 @@ Featured artists: {', '.join(artists[:3]) if artists else 'Various'}"""
             era = "Modern/Recent"
         context += f"\nEra: {era} (avg. {avg_year})"
     
-    style_descriptions = {
-        "creative": "Creative and imaginative names with wordplay",
-        "descriptive": "Clear, descriptive names that explain the content",
-        "fun": "Fun, playful, and energetic names",
-        "elegant": "Sophisticated and elegant names",
-        "edgy": "Bold, edgy names with attitude"
-    }
+    return context, songs_text
+
+
+STYLE_DESCRIPTIONS = {
+    "creative": "Creative and imaginative names with wordplay",
+    "descriptive": "Clear, descriptive names that explain the content",
+    "fun": "Fun, playful, and energetic names",
+    "elegant": "Sophisticated and elegant names",
+    "edgy": "Bold, edgy names with attitude"
+}
+
+
+def create_generate_name_prompt(songs: List[Song], style: str) -> str:
+    """Create the user prompt for playlist name generation"""
     
-    style_desc = style_descriptions.get(style, "Creative and memorable names")
+    context, songs_text = _playlist_context(songs)
     
-    return f"""Generate exactly 3 playlist names for this collection:
-
-{context}
+    return GENERATE_NAME_TEMPLATE.render(
+        context=context,
+        songs_text=songs_text,
+        style=STYLE_DESCRIPTIONS.get(style, "Creative and memorable names")
+    )
 
-Sample songs:
-{songs_text}
 
-Style: {style_desc}
+def create_batch_generate_name_prompt(playlists: List[List[Song]], style: str) -> str:
+    """Create one prompt that names several playlists"""
+    
+    sections = []
+    for i, songs in enumerate(playlists):
+        context, songs_text = _playlist_context(songs)
+        sections.append(f"Playlist p{i}:\n{context}\nSample songs:\n{songs_text}")
+    
+    return BATCH_GENERATE_NAME_TEMPLATE.render(
+        count=len(playlists),
+        keys=", ".join(f'"p{i}"' for i in range(len(playlists))),
+        playlists_text="\n\n".join(sections),
+        style=STYLE_DESCRIPTIONS.get(style, "Creative and memorable names")
+    )
 
-Your response must be ONLY this JSON array (no markdown, no code blocks, no explanations):
-["First Name Here", "Second Name Here", "Third Name Here"]
 
-Generate exactly 3 names now:"""
\ No newline at end of file
+def create_batch_system_prompt() -> str:
+    """Create the system prompt for naming several playlists in one call"""
+    return BATCH_SYSTEM_PROMPT
@@ -1,13 +1,14 @@
 """
 Prompts for song recommendation feature
 """
-from typing import List
+from typing import List, Tuple
 from app.models import Song
+from app.utils.helpers import extract_decades, extract_genres, get_dominant_genre, short_song_lines
+from app.utils.prompt_budget import fit_prompt
+from app.utils.prompt_compiler import PromptTemplate, static_prompt
 
 
-def create_system_prompt() -> str:
-    """Create the system prompt for song recommendations"""
-    return """You are a music recommendation expert. Your task is to recommend songs that complement a given playlist.
+SYSTEM_PROMPT = static_prompt("""You are a music recommendation expert. Your task is to recommend songs that complement a given playlist.
 
 CRITICAL: You must respond with ONLY valid JSON in this exact format:
 {
@@ -27,31 +28,11 @@ Rules:
 - Return ONLY the JSON object, no markdown, no code blocks, no explanations
 - Each recommendation must have: title, artist, album, genre, year (number), reason (string)
 - Make recommendations that match the style, mood, and era of the input songs
-- Provide diverse but coherent recommendations"""
-
-
-def create_recommend_songs_prompt(songs: List[Song], number: int) -> str:
-    """Create the user prompt for song recommendations"""
-    
-    # Format songs for the prompt
-    songs_list = []
-    for i, song in enumerate(songs[:10], 1):  # Limit to 10 songs to save tokens
-        song_info = f"{i}. '{song.title}' by {song.artist}"
-        if song.genre:
-            song_info += f" ({song.genre})"
-        if song.year:
-            song_info += f" [{song.year}]"
-        songs_list.append(song_info)
-    
-    songs_text = "\n".join(songs_list)
-    
-    return f"""Based on this playlist:
-
-{songs_text}
-
-Recommend exactly {number} songs that would fit well with this collection.
+- Provide diverse but coherent recommendations""")
 
-Your response must be ONLY this JSON format (no markdown, no code blocks):
+# The response format comes before the playlist, so prompts for different
+# playlists share a cacheable prefix
+RECOMMEND_SONGS_TEMPLATE = PromptTemplate("""Your response must be ONLY this JSON format (no markdown, no code blocks):
 {{
   "recommendations": [
     {{
@@ -65,4 +46,68 @@ Your response must be ONLY this JSON format (no markdown, no code blocks):
   ]
 }}
 
-Generate exactly {number} recommendations now:"""
\ No newline at end of file
+Based on this playlist:
+
+{songs_text}
+
+Recommend exactly {number} songs that would fit well with this collection.
+
+Generate exactly {number} recommendations now:""")
+
+REASONS_SYSTEM_PROMPT = static_prompt("""You are a music recommendation expert. The songs have already been chosen from what listeners play together; you explain, in one friendly sentence each, why they suit the playlist.""")
+
+REASONS_TEMPLATE = PromptTemplate("""For each recommendation below, write one sentence on why it fits the playlist.
+
+Return your response as a JSON object keyed by recommendation id (r0, r1, ...):
+{{
+  "r0": "Why it fits"
+}}
+
+Return ONLY the JSON object, no additional text, no markdown formatting, no code blocks.
+
+A playlist of {total_songs} songs, mainly {dominant_genre} (genres: {genres}; decades: {decades}), gets these recommendations:
+
+{picks_text}""")
+
+
+def create_system_prompt() -> str:
+    """Create the system prompt for song recommendations"""
+    return SYSTEM_PROMPT
+
+
+def _format_songs(songs: List[Song]) -> str:
+    """Format songs for the prompt"""
+    return short_song_lines.numbered(songs)
+
+
+def create_recommend_songs_prompt(songs: List[Song], number: int, budget: int = 0) -> str:
+    """Create the user prompt for song recommendations, sampling the playlist to stay within `budget` tokens"""
+    
+    def render(songs_text: str) -> str:
+        return RECOMMEND_SONGS_TEMPLATE.render(songs_text=songs_text, number=number)
+    
+    return fit_prompt(render, songs, budget, _format_songs)
+
+
+def create_reasons_system_prompt() -> str:
+    """System prompt for explaining recommendations picked from listening data"""
+    return REASONS_SYSTEM_PROMPT
+
+
+def create_recommendation_reasons_prompt(songs: List[Song], picks: List[Tuple[Song, Song]]) -> str:
+    """Create one prompt that writes the reason for each recommended song"""
+    
+    genres = extract_genres(songs)[:3]
+    decades = extract_decades(songs)
+    picks_text = "\n".join(
+        f"r{i}. {short_song_lines.get(song)} - often played with '{anchor.title}' by {anchor.artist}"
+        for i, (song, anchor) in enumerate(picks)
+    )
+    
+    return REASONS_TEMPLATE.render(
+        total_songs=len(songs),
+        dominant_genre=get_dominant_genre(songs),
+        genres=', '.join(genres) if genres else 'Various',
+        decades=', '.join(decades) if decades else 'Various',
+        picks_text=picks_text
+    )
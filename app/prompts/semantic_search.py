@@ -1,13 +1,12 @@
-def create_semantic_search_prompt(query: str) -> str:
-    """Create prompt for semantic search"""
-    
-    prompt = f"""A user is searching for music with this description:
-
-"{query}"
-
+from typing import List
+from app.models import Song
+from app.utils.helpers import format_songs_for_prompt
+from app.utils.prompt_compiler import PromptTemplate, static_prompt
 
 
-Based on this search query, generate a list of 10 songs that match what the user is looking for.
+# Instructions come before the query, so prompts for different searches
+# share a cacheable prefix
+SEMANTIC_SEARCH_TEMPLATE = PromptTemplate("""Based on the search query below, generate a list of 10 songs that match what the user is looking for.
 
 
 
@@ -61,14 +60,78 @@ Return your response as JSON with this exact structure:
 
 
 
-Return ONLY the JSON object, no additional text, no markdown formatting, no code blocks."""
+Always put "explanation" after the "songs" array.
 
-    return prompt
+Return ONLY the JSON object, no additional text, no markdown formatting, no code blocks.
 
 
-def create_system_prompt() -> str:
-    """System prompt for semantic search"""
-    return """You are a music search and discovery expert with comprehensive knowledge of songs across all genres and eras.
+
+A user is searching for music with this description:
+
+"{query}"
+""")
+
+SEARCH_EXPLANATION_TEMPLATE = PromptTemplate("""In 2-3 sentences, explain how the songs found for a user's search of our music catalog match what the user is looking for. Refer to their moods, genres or eras rather than listing every title.
+
+Return ONLY the explanation text, no JSON, no markdown formatting.
+
+The user searched for:
+
+"{query}"
+
+These songs were found, best match first:
+
+{songs_list}""")
+
+QUERY_PLAN_TEMPLATE = PromptTemplate("""Turn the music search below into filters for our song catalog.
+
+Return JSON with this exact structure, using null or [] for anything the search doesn't imply:
+
+{{
+  "genres": ["genre names, only if the search asks for specific genres"],
+  "year_from": earliest_release_year_or_null,
+  "year_to": latest_release_year_or_null,
+  "min_duration": minimum_seconds_or_null,
+  "max_duration": maximum_seconds_or_null,
+  "moods": ["up to 4 mood words, e.g. energetic, melancholic, calm"],
+  "keywords": ["artist, title or topic words to look for"]
+}}
+
+Return ONLY the JSON object, no additional text, no markdown formatting, no code blocks.
+
+The search:
+
+"{query}"
+""")
+
+QUERY_PLAN_SYSTEM_PROMPT = static_prompt("""You translate natural language music searches into structured catalog filters.
+You infer eras, genres, song lengths and moods from context, and only set a filter when the search clearly implies it.""")
+
+SYSTEM_PROMPT = static_prompt("""You are a music search and discovery expert with comprehensive knowledge of songs across all genres and eras.
 You excel at understanding natural language queries and translating them into relevant song recommendations.
-You consider both explicit and implicit criteria, mood, context, and cultural associations."""
+You consider both explicit and implicit criteria, mood, context, and cultural associations.""")
+
+
+def create_semantic_search_prompt(query: str) -> str:
+    """Create prompt for semantic search"""
+    return SEMANTIC_SEARCH_TEMPLATE.render(query=query)
+
+
+def create_search_explanation_prompt(query: str, songs: List[Song]) -> str:
+    """Create prompt explaining catalog search results"""
+    return SEARCH_EXPLANATION_TEMPLATE.render(query=query, songs_list=format_songs_for_prompt(songs))
+
+
+def create_query_plan_prompt(query: str) -> str:
+    """Create prompt turning a search query into a structured plan"""
+    return QUERY_PLAN_TEMPLATE.render(query=query)
 
+
+def create_query_plan_system_prompt() -> str:
+    """System prompt for query planning"""
+    return QUERY_PLAN_SYSTEM_PROMPT
+
+
+def create_system_prompt() -> str:
+    """System prompt for semantic search"""
+    return SYSTEM_PROMPT
@@ -1,19 +1,27 @@
+from typing import Any, AsyncIterator, Dict, List
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
 from app.models.requests import (
     DescribePlaylistRequest,
     RecommendSongsRequest,
     GeneratePlaylistNameRequest,
     AnalyzeMoodRequest,
-    SemanticSearchRequest
+    SemanticSearchRequest,
+    BatchRequest
 )
 from app.models.responses import (
     DescribePlaylistResponse,
     RecommendSongsResponse,
     GeneratePlaylistNameResponse,
     AnalyzeMoodResponse,
-    SemanticSearchResponse
+    SemanticSearchResponse,
+    BatchResponse
 )
 from app.services.ai_service import AIService
+from app.services.bm25_index import SearchFilters
+from app.utils.exceptions import AIServiceException
+from app.utils.request_metrics import count_error
+from app.utils.helpers import format_ndjson, format_sse
 from app.utils.logger import setup_logger
 
 
@@ -22,6 +30,36 @@ logger = setup_logger(__name__)
 ai_service = AIService()
 
 
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+
+async def ndjson_events(events: AsyncIterator[Dict[str, Any]], operation: str) -> AsyncIterator[str]:
+    """Serialize service events as NDJSON, reporting failures in-band"""
+    try:
+        async for event in events:
+            yield format_ndjson(event)
+    except AIServiceException as e:
+        logger.error(f"Error {operation}: {e.detail}")
+        count_error(e)
+        yield format_ndjson({"type": "error", "detail": e.detail, "error_type": "ai_service_error"})
+        return
+    except Exception as e:
+        logger.error(f"Error {operation}: {str(e)}", exc_info=True)
+        count_error(e)
+        yield format_ndjson({"type": "error", "detail": "Internal server error", "error_type": "internal_error"})
+        return
+    
+    yield format_ndjson({"type": "done"})
+
+
+def search_filters(request: SemanticSearchRequest) -> SearchFilters:
+    """Catalog filters from a search request"""
+    return SearchFilters(request.year_from, request.year_to, request.genres)
+
+
 @router.post(
     "/describe-playlist",
     response_model=DescribePlaylistResponse,
@@ -31,12 +69,53 @@ ai_service = AIService()
 async def describe_playlist(request: DescribePlaylistRequest):
     """Generate a playlist description using AI"""
     try:
-        return await ai_service.describe_playlist(request.songs)
+        return await ai_service.describe_playlist(
+            ai_service.resolve_songs(request.songs, request.song_ids)
+        )
     except Exception as e:
         logger.error(f"Error describing playlist: {str(e)}")
         raise
 
 
+@router.post(
+    "/describe-playlist/stream",
+    summary="Stream playlist description",
+    description=(
+        "Stream a playlist description as Server-Sent Events. Emits `token` events "
+        "with text deltas, then a final `done` event with the full description, or an "
+        "`error` event if generation fails mid-stream."
+    ),
+    response_class=StreamingResponse
+)
+async def describe_playlist_stream(request: DescribePlaylistRequest):
+    """Stream a playlist description using AI"""
+    songs = ai_service.resolve_songs(request.songs, request.song_ids)
+    
+    async def events() -> AsyncIterator[str]:
+        # Flush headers right away so clients see the first byte immediately
+        yield ": stream opened\n\n"
+        
+        parts: List[str] = []
+        try:
+            async for delta in ai_service.stream_describe_playlist(songs):
+                parts.append(delta)
+                yield format_sse("token", {"text": delta})
+        except AIServiceException as e:
+            logger.error(f"Error streaming playlist description: {e.detail}")
+            count_error(e)
+            yield format_sse("error", {"detail": e.detail, "error_type": "ai_service_error"})
+            return
+        except Exception as e:
+            logger.error(f"Error streaming playlist description: {str(e)}", exc_info=True)
+            count_error(e)
+            yield format_sse("error", {"detail": "Internal server error", "error_type": "internal_error"})
+            return
+        
+        yield format_sse("done", {"description": "".join(parts).strip()})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=STREAM_HEADERS)
+
+
 @router.post(
     "/recommend-songs",
     response_model=RecommendSongsResponse,
@@ -47,14 +126,39 @@ async def recommend_songs(request: RecommendSongsRequest):
     """Get song recommendations using AI"""
     try:
         return await ai_service.recommend_songs(
-            request.current_songs,
-            request.number_of_recommendations
+            ai_service.resolve_songs(request.current_songs, request.current_song_ids),
+            request.number_of_recommendations,
+            request.mode
         )
     except Exception as e:
         logger.error(f"Error recommending songs: {str(e)}")
         raise
 
 
+@router.post(
+    "/recommend-songs/stream",
+    summary="Stream song recommendations",
+    description=(
+        "Stream recommendations as newline-delimited JSON. Each `recommendation` record "
+        "is sent as soon as the model finishes it, followed by a `done` record, or an "
+        "`error` record if generation fails."
+    ),
+    response_class=StreamingResponse
+)
+async def recommend_songs_stream(request: RecommendSongsRequest):
+    """Stream song recommendations using AI"""
+    events = ai_service.stream_recommend_songs(
+        ai_service.resolve_songs(request.current_songs, request.current_song_ids),
+        request.number_of_recommendations,
+        request.mode
+    )
+    return StreamingResponse(
+        ndjson_events(events, "streaming recommendations"),
+        media_type="application/x-ndjson",
+        headers=STREAM_HEADERS
+    )
+
+
 @router.post(
     "/generate-name",
     response_model=GeneratePlaylistNameResponse,
@@ -65,7 +169,7 @@ async def generate_playlist_name(request: GeneratePlaylistNameRequest):
     """Generate playlist names using AI"""
     try:
         return await ai_service.generate_playlist_name(
-            request.songs,
+            ai_service.resolve_songs(request.songs, request.song_ids),
             request.style
         )
     except Exception as e:
@@ -82,7 +186,9 @@ async def generate_playlist_name(request: GeneratePlaylistNameRequest):
 async def analyze_mood(request: AnalyzeMoodRequest):
     """Analyze playlist mood using AI"""
     try:
-        return await ai_service.analyze_mood(request.songs)
+        return await ai_service.analyze_mood(
+            ai_service.resolve_songs(request.songs, request.song_ids)
+        )
     except Exception as e:
         logger.error(f"Error analyzing mood: {str(e)}")
         raise
@@ -97,8 +203,56 @@ async def analyze_mood(request: AnalyzeMoodRequest):
 async def semantic_search(request: SemanticSearchRequest):
     """Perform semantic search using AI"""
     try:
-        return await ai_service.semantic_search(request.query, request.limit)
+        return await ai_service.semantic_search(
+            request.query,
+            request.limit,
+            request.mode,
+            search_filters(request)
+        )
     except Exception as e:
         logger.error(f"Error in semantic search: {str(e)}")
         raise
 
+
+@router.post(
+    "/semantic-search/stream",
+    summary="Stream semantic music search",
+    description=(
+        "Stream search results as newline-delimited JSON. Each `song` record is sent as "
+        "soon as the model finishes it, then an `explanation` record and a `done` record, "
+        "or an `error` record if the search fails."
+    ),
+    response_class=StreamingResponse
+)
+async def semantic_search_stream(request: SemanticSearchRequest):
+    """Stream semantic search results using AI"""
+    events = ai_service.stream_semantic_search(
+        request.query,
+        request.limit,
+        request.mode,
+        search_filters(request)
+    )
+    return StreamingResponse(
+        ndjson_events(events, "streaming semantic search"),
+        media_type="application/x-ndjson",
+        headers=STREAM_HEADERS
+    )
+
+
+@router.post(
+    "/batch",
+    response_model=BatchResponse,
+    summary="Run AI operations in batch",
+    description=(
+        "Run many describe, recommend, name, mood and search operations in one request. "
+        "Operations run concurrently up to a configured cap, and each item reports its own "
+        "result or error without failing the batch."
+    )
+)
+async def run_batch(request: BatchRequest):
+    """Run a batch of AI operations"""
+    try:
+        return await ai_service.run_batch(request.operations)
+    except Exception as e:
+        logger.error(f"Error running batch: {str(e)}")
+        raise
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, HTTPException, status
+from app.models.requests import CatalogIngestRequest
+from app.models.responses import CatalogIngestResponse, CatalogRemoveResponse, CatalogStatsResponse
+from app.routers.ai_routes import ai_service
+from app.utils.logger import setup_logger
+
+
+router = APIRouter(prefix="/catalog")
+logger = setup_logger(__name__)
+
+
+@router.post(
+    "/songs",
+    response_model=CatalogIngestResponse,
+    summary="Add songs to the catalog",
+    description=(
+        "Embed songs and add them to the local catalog used by semantic search. "
+        "Songs whose id is already in the catalog are replaced."
+    )
+)
+async def ingest_songs(request: CatalogIngestRequest):
+    """Add songs to the searchable catalog"""
+    try:
+        return await ai_service.ingest_songs(request.songs)
+    except Exception as e:
+        logger.error(f"Error ingesting songs: {str(e)}")
+        raise
+
+
+@router.delete(
+    "/songs/{song_id}",
+    response_model=CatalogRemoveResponse,
+    summary="Remove a song from the catalog",
+    description="Remove a song from the local catalog and its search indexes"
+)
+async def remove_song(song_id: str):
+    """Remove a song from the searchable catalog"""
+    result = await ai_service.remove_songs([song_id])
+    if not result.removed:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown song id: {song_id}")
+    return result
+
+
+@router.get(
+    "",
+    response_model=CatalogStatsResponse,
+    summary="Catalog statistics",
+    description="Number of songs in the catalog and how its search index is configured"
+)
+async def catalog_stats():
+    """Get catalog statistics"""
+    return ai_service.catalog.stats()
@@ -1,7 +1,19 @@
-from typing import List
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple, Union
+import asyncio
+import json
 import uuid
+from dataclasses import dataclass
+from functools import partial
+from pydantic import ValidationError
+from app.config import settings
 from app.models.song import Song
+from app.models.requests import BatchItem, batch_item_adapter
 from app.models.responses import (
+    BatchItemError,
+    BatchItemResult,
+    BatchResponse,
+    CatalogIngestResponse,
+    CatalogRemoveResponse,
     DescribePlaylistResponse,
     RecommendSongsResponse,
     SongRecommendation,
@@ -10,38 +22,387 @@ from app.models.responses import (
     SemanticSearchResponse
 )
 from app.services.groq_service import GroqService
+from app.services.response_cache import ResponseCache
+from app.services.disk_cache import TieredCache, open_disk_cache
+from app.services.single_flight import SingleFlight
+from app.services.micro_batcher import MicroBatcher
+from app.services import fallbacks
+from app.services.bm25_index import SearchFilters
+from app.services.catalog import SongCatalog
+from app.services.catalog_store import CatalogStore
+from app.services.embeddings import HashingEmbedder
+from app.services.query_planner import QueryPlan, QueryPlanner, plan_from_llm
+from app.services.semantic_cache import SemanticCache, query_signature
+from app.services.playlist_history import PlaylistChange, PlaylistHistory
+from app.services.feature_store import MOOD_TAGS, FeatureStore, parse_features
+from app.services.item_recommender import RECOMMEND_MODES, ItemRecommender
+from app.services.song_resolver import match_key
+from app.services.vector_index import VectorIndex
 from app.prompts.describe_playlist import (
     create_describe_playlist_prompt,
+    create_update_description_prompt,
     create_system_prompt as describe_system_prompt
 )
 from app.prompts.recommend_songs import (
     create_recommend_songs_prompt,
+    create_recommendation_reasons_prompt,
+    create_reasons_system_prompt as recommend_reasons_system_prompt,
     create_system_prompt as recommend_system_prompt
 )
 from app.prompts.generate_name import (
     create_generate_name_prompt,
-    create_system_prompt as generate_name_system_prompt
+    create_batch_generate_name_prompt,
+    create_system_prompt as generate_name_system_prompt,
+    create_batch_system_prompt as generate_name_batch_system_prompt
 )
 from app.prompts.analyze_mood import (
     create_analyze_mood_prompt,
-    create_system_prompt as analyze_mood_system_prompt
+    create_batch_analyze_mood_prompt,
+    create_update_mood_prompt,
+    create_mood_description_prompt,
+    create_song_features_prompt,
+    create_song_features_system_prompt as song_features_system_prompt,
+    create_system_prompt as analyze_mood_system_prompt,
+    create_batch_system_prompt as analyze_mood_batch_system_prompt
 )
 from app.prompts.semantic_search import (
     create_semantic_search_prompt,
+    create_search_explanation_prompt,
+    create_query_plan_prompt,
+    create_query_plan_system_prompt as query_plan_system_prompt,
     create_system_prompt as semantic_search_system_prompt
 )
+from app.utils.helpers import sort_songs_canonically
+from app.utils.json_stream import IncrementalJSONParser
 from app.utils.logger import setup_logger
-from app.utils.exceptions import InvalidRequestException
+from app.utils.exceptions import AIServiceException, CircuitOpenException, InvalidRequestException
+from app.utils.metrics import metrics
+from app.utils.request_metrics import count_error
 
 
 logger = setup_logger(__name__)
 
 
+degraded_responses = metrics.counter(
+    "degraded_responses_total",
+    "Responses served without the AI provider while the circuit breaker was open",
+    ("endpoint", "source")
+)
+
+playlist_reanalysis = metrics.counter(
+    "playlist_reanalysis_total",
+    "Playlist analyses by strategy: reuse of a prior result, an incremental update, or a full run",
+    ("endpoint", "strategy")
+)
+
+recommendation_matches = metrics.counter(
+    "recommendation_matches_total",
+    "Recommendations by catalog match: matched, unmatched, or dropped as already in the playlist",
+    ("result",)
+)
+
+recommendation_sources = metrics.counter(
+    "recommendation_requests_total",
+    "Recommendation requests by who picked the songs: the local co-occurrence model or the LLM",
+    ("source",)
+)
+
+
+@dataclass
+class BatchedCall:
+    """A single completion waiting in the micro-batcher"""
+    endpoint: str
+    songs: List[Song]
+    prompt: str
+    system_prompt: Optional[str]
+    temperature: float
+
+
 class AIService:
     """Business logic for AI features"""
     
     def __init__(self):
         self.groq = GroqService()
+        self.cache = ResponseCache(
+            max_entries=settings.CACHE_MAX_ENTRIES,
+            max_bytes=settings.CACHE_MAX_BYTES,
+            default_ttl=settings.CACHE_DEFAULT_TTL,
+            ttls=settings.cache_ttls_map,
+            stale_ttl=settings.CACHE_STALE_TTL
+        )
+        if settings.CACHE_DISK_PATH:
+            # Shared with the other workers on this host and kept across restarts
+            self.cache = TieredCache(self.cache, open_disk_cache(settings.CACHE_DISK_PATH))
+        self.single_flight = SingleFlight()
+        self.micro_batcher: Optional[MicroBatcher] = None
+        if settings.MICRO_BATCH_ENABLED:
+            self.micro_batcher = MicroBatcher(
+                self._run_micro_batch,
+                window=settings.MICRO_BATCH_WINDOW_MS / 1000,
+                max_size=settings.MICRO_BATCH_MAX_SIZE
+            )
+        self.catalog = SongCatalog(
+            HashingEmbedder(dim=settings.SEARCH_EMBEDDING_DIM),
+            VectorIndex(
+                dim=settings.SEARCH_EMBEDDING_DIM,
+                ivf_lists=settings.SEARCH_IVF_LISTS,
+                nprobe=settings.SEARCH_IVF_PROBES,
+                quantize=settings.SEARCH_QUANTIZE
+            )
+        )
+        self.planner = QueryPlanner(max_entries=settings.SEARCH_PLAN_CACHE_SIZE)
+        self.semantic_cache = SemanticCache(
+            HashingEmbedder(dim=settings.SEARCH_EMBEDDING_DIM),
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl=settings.SEMANTIC_CACHE_TTL
+        )
+        self.history = PlaylistHistory(max_entries=settings.PLAYLIST_HISTORY_SIZE)
+        self.features = FeatureStore(settings.FEATURE_STORE_PATH)
+        self.enrichment_batcher = MicroBatcher(
+            self._run_enrichment,
+            window=settings.FEATURE_ENRICH_WINDOW_MS / 1000,
+            max_size=settings.FEATURE_ENRICH_BATCH_SIZE
+        )
+        self._enriching: Dict[str, asyncio.Future] = {}
+        self.recommender: Optional[ItemRecommender] = None
+    
+    async def startup(self) -> None:
+        """Open upstream connections and load the song catalog and features"""
+        await self.groq.open()
+        if settings.CATALOG_STORE_PATH and CatalogStore.exists(settings.CATALOG_STORE_PATH):
+            self.catalog = await asyncio.to_thread(
+                SongCatalog.open,
+                settings.CATALOG_STORE_PATH,
+                nprobe=settings.SEARCH_IVF_PROBES
+            )
+        if settings.CATALOG_PATH:
+            await asyncio.to_thread(self.catalog.load_file, settings.CATALOG_PATH)
+        if settings.RECOMMEND_MODEL_PATH:
+            if ItemRecommender.exists(settings.RECOMMEND_MODEL_PATH):
+                self.recommender = await asyncio.to_thread(ItemRecommender.load, settings.RECOMMEND_MODEL_PATH)
+            else:
+                logger.warning(f"No current recommender in {settings.RECOMMEND_MODEL_PATH}, the LLM picks recommendations")
+        if settings.FEATURE_STORE_ENABLED:
+            # Loads every stored song's features, so not on a request's event loop
+            songs = await asyncio.to_thread(self.features.open)
+            logger.info(f"Loaded features of {songs} songs")
+        self.semantic_cache.clear()
+    
+    async def shutdown(self) -> None:
+        """Close upstream connections and the disk cache"""
+        await self.groq.close()
+        if isinstance(self.cache, TieredCache):
+            self.cache.disk.close()
+        self.features.close()
+    
+    def resolve_songs(self, songs: Optional[List[Song]], song_ids: Optional[List[str]]) -> List[Song]:
+        """Songs sent in full, or looked up in the catalog by id"""
+        if songs is not None:
+            return songs
+        found, missing = self.catalog.get_many(song_ids or [])
+        if missing:
+            shown = ", ".join(missing[:10]) + (", ..." if len(missing) > 10 else "")
+            raise InvalidRequestException(f"Unknown song ids: {shown}")
+        return found
+    
+    async def cache_stats(self) -> Dict[str, object]:
+        """Response cache statistics, reading the disk tier's off the event loop"""
+        if isinstance(self.cache, TieredCache):
+            return await self.cache.stats_async()
+        return self.cache.stats()
+    
+    async def _cache_get(self, key: str, endpoint: str) -> Optional[str]:
+        """Fresh cached response, or None on a miss or with caching disabled"""
+        if not settings.CACHE_ENABLED:
+            return None
+        if isinstance(self.cache, TieredCache):
+            return await self.cache.get_async(key, endpoint)
+        return self.cache.get(key, endpoint)
+    
+    async def _cache_get_stale(self, key: str) -> Optional[str]:
+        """Cached response even if expired, while it is still retained"""
+        if isinstance(self.cache, TieredCache):
+            return await self.cache.get_stale_async(key)
+        return self.cache.get_stale(key)
+    
+    async def _cache_set(self, key: str, value: str, endpoint: str) -> None:
+        """Cache a response, unless caching is disabled"""
+        if not settings.CACHE_ENABLED:
+            return
+        if isinstance(self.cache, TieredCache):
+            await self.cache.set_async(key, value, endpoint)
+        else:
+            self.cache.set(key, value, endpoint)
+    
+    async def _complete(
+        self,
+        endpoint: str,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 1.0,
+        json_mode: bool = False,
+        batch_group: Optional[str] = None,
+        batch_songs: Optional[List[Song]] = None,
+        fallback: Optional[Callable[[], Any]] = None,
+        validate: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Run a completion through the response cache and single-flight layer
+        
+        Returns the completion text, or the parsed JSON when json_mode is set.
+        Only responses that parse successfully are cached. When micro-batching
+        is enabled, calls with a batch_group may share one upstream request
+        with other compatible calls. While the circuit breaker is open, a stale
+        cache entry or the `fallback` answer is returned instead. A JSON
+        answer that `validate` rejects is asked again of a larger model when
+        the endpoint is routed to a smaller one.
+        """
+        key = self.groq.fingerprint(prompt, system_prompt, temperature, json_mode, endpoint)
+        
+        cached = await self._cache_get(key, endpoint)
+        if cached is not None:
+            logger.info(f"Cache hit for {endpoint}")
+            return self.groq.parse_json_response(cached) if json_mode else cached
+        
+        async def fetch() -> str:
+            if batch_group is not None and batch_songs is not None and self.micro_batcher is not None:
+                response = await self.micro_batcher.submit(
+                    batch_group,
+                    BatchedCall(
+                        endpoint=endpoint,
+                        songs=batch_songs,
+                        prompt=prompt,
+                        system_prompt=system_prompt,
+                        temperature=temperature
+                    )
+                )
+            else:
+                response = await self.groq.generate_completion(
+                    prompt=prompt,
+                    system_prompt=system_prompt,
+                    temperature=temperature,
+                    json_mode=json_mode,
+                    endpoint=endpoint,
+                    validate=validate
+                )
+            if json_mode:
+                self.groq.parse_json_response(response)
+            await self._cache_set(key, response, endpoint)
+            return response
+        
+        try:
+            response = await self.single_flight.do(key, fetch, endpoint=endpoint)
+        except CircuitOpenException:
+            response = await self._cache_get_stale(key)
+            if response is not None:
+                logger.warning(f"Serving stale cached response for {endpoint}")
+                degraded_responses.inc(endpoint=endpoint, source="stale")
+            elif fallback is not None:
+                logger.warning(f"Serving local fallback for {endpoint}")
+                degraded_responses.inc(endpoint=endpoint, source="local")
+                return fallback()
+            else:
+                raise
+        
+        # Each caller parses its own copy so callers never share mutable results
+        return self.groq.parse_json_response(response) if json_mode else response
+    
+    async def _run_micro_batch(self, group: str, calls: List[BatchedCall]) -> List[Any]:
+        """
+        Answer several compatible calls with one multi-playlist completion
+        
+        The batched answer is keyed by playlist ("p0", "p1", ...). Entries that
+        are missing or malformed, or a whole answer that isn't valid JSON, fall
+        back to individual calls. Upstream errors are shared by every call.
+        """
+        if len(calls) == 1:
+            return [await self._run_single_call(calls[0])]
+        
+        endpoint = calls[0].endpoint
+        playlists = [call.songs for call in calls]
+        
+        if endpoint == "analyze_mood":
+            prompt = create_batch_analyze_mood_prompt(playlists, self._prompt_budget(endpoint))
+            system_prompt = analyze_mood_batch_system_prompt()
+            is_valid = self._is_valid_mood
+        else:
+            style = group.split(":", 1)[1]
+            prompt = create_batch_generate_name_prompt(playlists, style)
+            system_prompt = generate_name_batch_system_prompt()
+            is_valid = self._is_valid_names
+        
+        logger.info(f"Running micro-batch of {len(calls)} calls for {group}")
+        
+        response = await self.groq.generate_completion(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=calls[0].temperature,
+            json_mode=True,
+            endpoint=endpoint
+        )
+        
+        try:
+            data = self.groq.parse_json_response(response)
+        except AIServiceException:
+            data = None
+        if not isinstance(data, dict):
+            logger.warning(f"Malformed micro-batch answer for {group}, falling back to individual calls")
+            data = {}
+        
+        results: List[Any] = [None] * len(calls)
+        fallback: List[int] = []
+        for i in range(len(calls)):
+            value = data.get(f"p{i}")
+            if is_valid(value):
+                results[i] = json.dumps(value, ensure_ascii=False)
+            else:
+                fallback.append(i)
+        
+        if fallback:
+            logger.warning(f"{len(fallback)} of {len(calls)} micro-batch entries unusable for {group}")
+            answers = await asyncio.gather(
+                *(self._run_single_call(calls[i]) for i in fallback),
+                return_exceptions=True
+            )
+            for i, answer in zip(fallback, answers):
+                results[i] = answer
+        
+        return results
+    
+    async def _run_single_call(self, call: BatchedCall) -> str:
+        """Run a batched call on its own"""
+        return await self.groq.generate_completion(
+            prompt=call.prompt,
+            system_prompt=call.system_prompt,
+            temperature=call.temperature,
+            json_mode=True,
+            endpoint=call.endpoint
+        )
+    
+    @staticmethod
+    def _is_valid_mood(value: Any) -> bool:
+        return (
+            isinstance(value, dict)
+            and isinstance(value.get('moods'), list)
+            and len(value['moods']) > 0
+            and isinstance(value.get('description'), str)
+        )
+    
+    @staticmethod
+    def _is_valid_names(value: Any) -> bool:
+        return (
+            isinstance(value, list)
+            and len(value) >= 3
+            and all(isinstance(name, str) and name.strip() for name in value)
+        )
+    
+    @classmethod
+    def _is_names_answer(cls, value: Any) -> bool:
+        """Whether a generate-name answer holds names in any of the accepted shapes"""
+        if isinstance(value, dict):
+            value = value.get('names', value.get('playlist_names', value.get('suggestions')))
+        return cls._is_valid_names(value)
     
     async def describe_playlist(self, songs: List[Song]) -> DescribePlaylistResponse:
         """Generate a creative description for a playlist"""
@@ -50,35 +411,217 @@ class AIService:
         if not songs:
             raise InvalidRequestException("Cannot describe an empty playlist")
         
-        prompt = create_describe_playlist_prompt(songs)
+        change = self._playlist_change("describe_playlist", songs)
+        if change is not None and change.ratio <= settings.PLAYLIST_REUSE_MAX_CHANGE:
+            return DescribePlaylistResponse(description=change.snapshot.result)
+        
+        served_fallback = False
+        
+        def fallback() -> str:
+            nonlocal served_fallback
+            served_fallback = True
+            return change.snapshot.result if change is not None else fallbacks.describe_playlist(songs)
+        
+        description = await self._complete(
+            "describe_playlist",
+            prompt=self._describe_prompt(songs, change),
+            system_prompt=describe_system_prompt(),
+            temperature=0.8,
+            fallback=fallback
+        )
+        description = description.strip()
+        
+        if not served_fallback:
+            self.history.remember("describe_playlist", songs, description)
+        return DescribePlaylistResponse(description=description)
+    
+    def _playlist_change(self, endpoint: str, songs: List[Song]) -> Optional[PlaylistChange]:
+        """
+        The closest earlier analysis of this playlist, if it changed little enough to build on
+        
+        Up to PLAYLIST_REUSE_MAX_CHANGE the earlier result is served as is; up
+        to PLAYLIST_UPDATE_MAX_CHANGE the LLM only revises it for the songs
+        added and removed. Results older than the endpoint's response cache
+        TTL aren't built on. Returns None when a full analysis is needed.
+        """
+        change = None
+        if settings.PLAYLIST_HISTORY_SIZE > 0:
+            max_age = settings.cache_ttls_map.get(endpoint, settings.CACHE_DEFAULT_TTL)
+            change = self.history.find(endpoint, songs, max_age)
+        if change is None or change.ratio > settings.PLAYLIST_UPDATE_MAX_CHANGE:
+            playlist_reanalysis.inc(endpoint=endpoint, strategy="full")
+            return None
+        
+        strategy = "reuse" if change.ratio <= settings.PLAYLIST_REUSE_MAX_CHANGE else "update"
+        logger.info(
+            f"{endpoint}: {len(change.added)} songs added, {len(change.removed)} removed "
+            f"since a prior analysis ({strategy})"
+        )
+        playlist_reanalysis.inc(endpoint=endpoint, strategy=strategy)
+        return change
+    
+    @staticmethod
+    def _prompt_budget(endpoint: str) -> int:
+        """Token budget for an endpoint's prompt; 0 if unlimited"""
+        return settings.prompt_budgets_map.get(endpoint, 0)
+    
+    @classmethod
+    def _describe_prompt(cls, songs: List[Song], change: Optional[PlaylistChange]) -> str:
+        """Prompt for a full description, or for updating the prior one"""
+        budget = cls._prompt_budget("describe_playlist")
+        if change is not None:
+            return create_update_description_prompt(
+                change.snapshot.result,
+                sort_songs_canonically(change.added),
+                sort_songs_canonically(change.removed),
+                songs,
+                budget
+            )
+        # The description doesn't depend on song order, so canonicalize it
+        # to let reordered copies of a playlist share a cache entry
+        return create_describe_playlist_prompt(sort_songs_canonically(songs), budget)
+    
+    async def stream_describe_playlist(self, songs: List[Song]) -> AsyncIterator[str]:
+        """
+        Stream a playlist description as it is generated
+        
+        Cached descriptions are yielded in one piece. Fresh ones are streamed
+        token by token and cached once the stream completes.
+        """
+        logger.info(f"Streaming description for playlist with {len(songs)} songs")
+        
+        if not songs:
+            raise InvalidRequestException("Cannot describe an empty playlist")
+        
+        change = self._playlist_change("describe_playlist", songs)
+        if change is not None and change.ratio <= settings.PLAYLIST_REUSE_MAX_CHANGE:
+            yield change.snapshot.result
+            return
+        
+        prompt = self._describe_prompt(songs, change)
         system_prompt = describe_system_prompt()
+        temperature = 0.8
+        
+        key = self.groq.fingerprint(prompt, system_prompt, temperature, endpoint="describe_playlist")
+        
+        cached = await self._cache_get(key, "describe_playlist")
+        if cached is not None:
+            logger.info("Cache hit for describe_playlist")
+            self.history.remember("describe_playlist", songs, cached.strip())
+            yield cached.strip()
+            return
+        
+        parts: List[str] = []
+        try:
+            async for delta in self.groq.stream_completion(
+                prompt=prompt,
+                system_prompt=system_prompt,
+                temperature=temperature,
+                endpoint="describe_playlist"
+            ):
+                # Leading whitespace is dropped to match the non-streaming endpoint
+                if not parts:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                parts.append(delta)
+                yield delta
+        except CircuitOpenException:
+            stale = await self._cache_get_stale(key)
+            if stale is not None:
+                degraded_responses.inc(endpoint="describe_playlist", source="stale")
+                yield stale.strip()
+            elif change is not None:
+                degraded_responses.inc(endpoint="describe_playlist", source="previous")
+                yield change.snapshot.result
+            else:
+                degraded_responses.inc(endpoint="describe_playlist", source="local")
+                yield fallbacks.describe_playlist(songs)
+            return
+        
+        if parts:
+            description = "".join(parts)
+            self.history.remember("describe_playlist", songs, description.strip())
+            await self._cache_set(key, description, "describe_playlist")
+    
+    async def _stream_json_items(
+        self,
+        endpoint: str,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: float,
+        array_key: str,
+        accept_root_array: bool = False
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream a JSON completion, yielding array items as they close
         
-        description = await self.groq.generate_completion(
+        Yields ("item", dict) for each element of `array_key` as soon as it is
+        complete, then ("document", parsed) once the whole response arrived.
+        Streamed responses share cache entries with the non-streaming calls.
+        """
+        key = self.groq.fingerprint(prompt, system_prompt, temperature, json_mode=True, endpoint=endpoint)
+        
+        cached = await self._cache_get(key, endpoint)
+        if cached is not None:
+            logger.info(f"Cache hit for {endpoint}")
+            document = self.groq.parse_json_response(cached)
+            items = document if isinstance(document, list) else document.get(array_key, [])
+            for item in items:
+                yield "item", item
+            yield "document", document
+            return
+        
+        parser = IncrementalJSONParser(array_key, accept_root_array=accept_root_array)
+        async for delta in self.groq.stream_completion(
             prompt=prompt,
             system_prompt=system_prompt,
-            temperature=0.8
-        )
+            temperature=temperature,
+            json_mode=True,
+            endpoint=endpoint
+        ):
+            for item in parser.feed(delta):
+                yield "item", item
+        
+        document = self.groq.parse_json_response(parser.buffer)
+        await self._cache_set(key, parser.buffer, endpoint)
         
-        return DescribePlaylistResponse(description=description.strip())
+        yield "document", document
     
     async def recommend_songs(
         self,
         current_songs: List[Song],
-        number_of_recommendations: int
+        number_of_recommendations: int,
+        mode: Optional[str] = None
     ) -> RecommendSongsResponse:
-        """Generate song recommendations based on current playlist"""
+        """
+        Generate song recommendations based on current playlist
+        
+        Unless `mode` (default RECOMMEND_MODE) is "llm", songs are picked by
+        the local co-occurrence model when it covers the playlist; see
+        `_recommend_locally`.
+        """
         logger.info(f"Generating {number_of_recommendations} recommendations")
         
         if not current_songs:
             raise InvalidRequestException("Cannot generate recommendations for an empty playlist")
         
-        prompt = create_recommend_songs_prompt(current_songs, number_of_recommendations)
+        recommendations = await self._recommend_locally(current_songs, number_of_recommendations, mode)
+        if recommendations is not None:
+            return RecommendSongsResponse(recommendations=recommendations)
+        recommendation_sources.inc(source="llm")
+        
+        prompt = create_recommend_songs_prompt(
+            current_songs, number_of_recommendations, self._prompt_budget("recommend_songs")
+        )
         system_prompt = recommend_system_prompt()
         
-        response_data = await self.groq.generate_json_completion(
+        response_data = await self._complete(
+            "recommend_songs",
             prompt=prompt,
             system_prompt=system_prompt,
-            temperature=0.7
+            temperature=0.7,
+            json_mode=True
         )
         
         # FIX: Handle different response formats
@@ -102,29 +645,221 @@ class AIService:
         # Parse recommendations with error handling
         recommendations = []
         for i, rec in enumerate(recommendations_list):
-            try:
-                # Ensure it's a dict
-                if isinstance(rec, str):
-                    logger.error(f"Recommendation {i} is a string: {rec}")
-                    continue
-                
-                # Validate required fields
-                if not isinstance(rec, dict):
-                    logger.error(f"Recommendation {i} is not a dict: {type(rec)}")
-                    continue
-                
-                # Create SongRecommendation object
-                recommendations.append(SongRecommendation(**rec))
-            except Exception as e:
-                logger.error(f"Failed to parse recommendation {i}: {e}")
-                logger.error(f"Recommendation data: {rec}")
-                continue
+            recommendation = self._parse_recommendation(i, rec)
+            if recommendation is not None:
+                recommendations.append(recommendation)
+        recommendations = await self._resolve_recommendations(
+            recommendations,
+            self._playlist_identities(current_songs)
+        )
         
         if not recommendations:
             raise InvalidRequestException("No valid recommendations generated")
         
         return RecommendSongsResponse(recommendations=recommendations)
     
+    async def stream_recommend_songs(
+        self,
+        current_songs: List[Song],
+        number_of_recommendations: int,
+        mode: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream song recommendations as they are generated
+        
+        Yields a `recommendation` event for each recommendation as soon as its
+        JSON object is complete and valid. Recommendations picked locally are
+        all yielded at once.
+        """
+        logger.info(f"Streaming {number_of_recommendations} recommendations")
+        
+        if not current_songs:
+            raise InvalidRequestException("Cannot generate recommendations for an empty playlist")
+        
+        recommendations = await self._recommend_locally(current_songs, number_of_recommendations, mode)
+        if recommendations is not None:
+            for recommendation in recommendations:
+                yield {"type": "recommendation", "data": recommendation.model_dump()}
+            return
+        recommendation_sources.inc(source="llm")
+        
+        prompt = create_recommend_songs_prompt(
+            current_songs, number_of_recommendations, self._prompt_budget("recommend_songs")
+        )
+        system_prompt = recommend_system_prompt()
+        
+        count = 0
+        seen = self._playlist_identities(current_songs)
+        async for kind, payload in self._stream_json_items(
+            "recommend_songs",
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=0.7,
+            array_key="recommendations",
+            accept_root_array=True
+        ):
+            if kind != "item":
+                continue
+            recommendation = self._parse_recommendation(count, payload)
+            if recommendation is None:
+                continue
+            for resolved in await self._resolve_recommendations([recommendation], seen):
+                count += 1
+                yield {"type": "recommendation", "data": resolved.model_dump()}
+        
+        if count == 0:
+            raise InvalidRequestException("No valid recommendations generated")
+    
+    async def _recommend_locally(
+        self,
+        songs: List[Song],
+        number: int,
+        mode: Optional[str]
+    ) -> Optional[List[SongRecommendation]]:
+        """
+        Recommendations picked by the playlist co-occurrence model
+        
+        Every song of the playlist is scored against the model, and only
+        catalog songs not already in the playlist are recommended. In "local"
+        mode the LLM writes all the reasons in one call; in "fast" mode they
+        are built locally. Returns None, for the LLM to pick the songs, in
+        "llm" mode, when no model is loaded, when the model knows fewer than
+        RECOMMEND_MIN_COVERAGE of the playlist's songs, or when it can't find
+        `number` songs.
+        """
+        mode = mode or settings.RECOMMEND_MODE
+        if mode not in RECOMMEND_MODES:
+            raise InvalidRequestException(f"Unknown recommendation mode: {mode}")
+        if mode == "llm" or self.recommender is None or not len(self.catalog):
+            return None
+        items = self.recommender.lookup([song.id for song in songs])
+        if not len(items) or len(items) < settings.RECOMMEND_MIN_COVERAGE * len(songs):
+            return None
+        
+        seen_ids, seen_keys = self._playlist_identities(songs)
+        picked: Dict[str, Song] = {}
+        
+        def accept(song_id: str) -> bool:
+            song = self.catalog.get(song_id) if song_id not in seen_ids else None
+            if song is None:
+                return False
+            key = match_key(song.title, song.artist)
+            if key in seen_keys:
+                return False
+            seen_keys.add(key)
+            picked[song_id] = song
+            return True
+        
+        scored = self.recommender.recommend(items, number, settings.RECOMMEND_FACTOR_WEIGHT, accept)
+        if len(scored) < number:
+            return None
+        recommendation_sources.inc(source="local")
+        
+        playlist = {song.id: song for song in songs}
+        pairs = [(picked[item.song_id], playlist[item.because]) for item in scored]
+        reasons = [fallbacks.recommendation_reason(song, anchor) for song, anchor in pairs]
+        if mode == "local":
+            reasons = await self._write_reasons(songs, pairs, reasons)
+        return [
+            SongRecommendation(title=song.title, artist=song.artist, reason=reason, song_id=song.id, confidence=1.0)
+            for (song, _), reason in zip(pairs, reasons)
+        ]
+    
+    async def _write_reasons(
+        self,
+        songs: List[Song],
+        pairs: List[Tuple[Song, Song]],
+        local_reasons: List[str]
+    ) -> List[str]:
+        """
+        Reasons for locally picked recommendations, written by the LLM in one
+        call; each reason the LLM leaves out or fails to write keeps its
+        local version
+        """
+        try:
+            data = await self._complete(
+                "recommend_songs",
+                prompt=create_recommendation_reasons_prompt(songs, pairs),
+                system_prompt=recommend_reasons_system_prompt(),
+                temperature=0.7,
+                json_mode=True,
+                fallback=dict
+            )
+        except AIServiceException as e:
+            # The songs come from the model, so they don't depend on the LLM
+            logger.warning(f"Falling back to local recommendation reasons: {e.detail}")
+            return local_reasons
+        
+        reasons = []
+        for i, local_reason in enumerate(local_reasons):
+            reason = data.get(f"r{i}") if isinstance(data, dict) else None
+            reasons.append(reason.strip() if isinstance(reason, str) and reason.strip() else local_reason)
+        return reasons
+    
+    def _parse_recommendation(self, index: int, rec: Any) -> Optional[SongRecommendation]:
+        """Validate a single recommendation, returning None if it is unusable"""
+        try:
+            # Ensure it's a dict
+            if isinstance(rec, str):
+                logger.error(f"Recommendation {index} is a string: {rec}")
+                return None
+            
+            # Validate required fields
+            if not isinstance(rec, dict):
+                logger.error(f"Recommendation {index} is not a dict: {type(rec)}")
+                return None
+            
+            # Create SongRecommendation object; catalog matches are ours to fill in
+            return SongRecommendation(**{
+                key: value for key, value in rec.items() if key not in ("song_id", "confidence")
+            })
+        except Exception as e:
+            logger.error(f"Failed to parse recommendation {index}: {e}")
+            logger.error(f"Recommendation data: {rec}")
+            return None
+    
+    def _playlist_identities(self, songs: List[Song]) -> Tuple[Set[str], Set[int]]:
+        """Ids and normalized title/artist keys of the songs in a playlist"""
+        return {song.id for song in songs}, {match_key(song.title, song.artist) for song in songs}
+    
+    async def _resolve_recommendations(
+        self,
+        recommendations: List[SongRecommendation],
+        seen: Tuple[Set[str], Set[int]]
+    ) -> List[SongRecommendation]:
+        """
+        Attach the catalog song each recommendation names, dropping those
+        already in the playlist or recommended before
+        
+        `seen` holds the ids and keys from `_playlist_identities`, and is
+        extended with each recommendation kept. Matching runs in a worker
+        thread, as it can take milliseconds on a large catalog.
+        """
+        seen_ids, seen_keys = seen
+        matches: List[Optional[Tuple[Song, float]]] = [None] * len(recommendations)
+        if settings.RECOMMEND_RESOLVE_ENABLED and len(self.catalog):
+            matches = await asyncio.to_thread(
+                self.catalog.resolve,
+                [(recommendation.title, recommendation.artist) for recommendation in recommendations],
+                settings.RECOMMEND_MIN_CONFIDENCE
+            )
+        
+        kept = []
+        for recommendation, match in zip(recommendations, matches):
+            key = match_key(recommendation.title, recommendation.artist)
+            if key in seen_keys or (match is not None and match[0].id in seen_ids):
+                recommendation_matches.inc(result="duplicate")
+                continue
+            seen_keys.add(key)
+            if match is not None:
+                song, confidence = match
+                seen_ids.add(song.id)
+                recommendation.song_id = song.id
+                recommendation.confidence = confidence
+            recommendation_matches.inc(result="matched" if match is not None else "unmatched")
+            kept.append(recommendation)
+        return kept
+    
     async def generate_playlist_name(
         self,
         songs: List[Song],
@@ -139,10 +874,16 @@ class AIService:
         prompt = create_generate_name_prompt(songs, style)
         system_prompt = generate_name_system_prompt()
         
-        response_data = await self.groq.generate_json_completion(
+        response_data = await self._complete(
+            "generate_name",
             prompt=prompt,
             system_prompt=system_prompt,
-            temperature=0.9
+            temperature=0.9,
+            json_mode=True,
+            batch_group=f"generate_name:{style}",
+            batch_songs=songs,
+            fallback=lambda: fallbacks.generate_playlist_names(songs, style),
+            validate=self._is_names_answer
         )
         
         # FIX: Handle different response formats
@@ -191,50 +932,593 @@ class AIService:
         if not songs:
             raise InvalidRequestException("Cannot analyze mood of empty playlist")
         
-        prompt = create_analyze_mood_prompt(songs)
-        system_prompt = analyze_mood_system_prompt()
+        songs = sort_songs_canonically(songs)
+        if settings.FEATURE_STORE_ENABLED:
+            response = await self._analyze_mood_from_features(songs)
+            if response is not None:
+                return response
         
-        response_data = await self.groq.generate_json_completion(
-            prompt=prompt,
-            system_prompt=system_prompt,
-            temperature=0.6
-        )
+        change = self._playlist_change("analyze_mood", songs)
+        if change is not None and change.ratio <= settings.PLAYLIST_REUSE_MAX_CHANGE:
+            return AnalyzeMoodResponse(**change.snapshot.result)
         
-        return AnalyzeMoodResponse(
+        served_fallback = False
+        
+        def fallback() -> Dict[str, Any]:
+            nonlocal served_fallback
+            served_fallback = True
+            return change.snapshot.result if change is not None else fallbacks.analyze_mood(songs)
+        
+        if change is not None:
+            # Updates are small prompts of their own, so they skip micro-batching
+            response_data = await self._complete(
+                "analyze_mood",
+                prompt=create_update_mood_prompt(
+                    change.snapshot.result['moods'],
+                    change.snapshot.result['description'],
+                    sort_songs_canonically(change.added),
+                    sort_songs_canonically(change.removed),
+                    songs,
+                    self._prompt_budget("analyze_mood")
+                ),
+                system_prompt=analyze_mood_system_prompt(),
+                temperature=0.6,
+                json_mode=True,
+                fallback=fallback,
+                validate=self._is_valid_mood
+            )
+        else:
+            response_data = await self._complete(
+                "analyze_mood",
+                prompt=create_analyze_mood_prompt(songs, self._prompt_budget("analyze_mood")),
+                system_prompt=analyze_mood_system_prompt(),
+                temperature=0.6,
+                json_mode=True,
+                batch_group="analyze_mood",
+                batch_songs=songs,
+                fallback=fallback,
+                validate=self._is_valid_mood
+            )
+        
+        result = AnalyzeMoodResponse(
             moods=response_data['moods'],
             description=response_data['description']
         )
+        if not served_fallback:
+            self.history.remember("analyze_mood", songs, result.model_dump())
+        return result
+    
+    async def _analyze_mood_from_features(self, songs: List[Song]) -> Optional[AnalyzeMoodResponse]:
+        """
+        Playlist mood aggregated from stored song features
+        
+        Songs without features are enriched first when fewer than
+        FEATURE_MIN_COVERAGE of the playlist has them, and queued for the
+        next enrichment batch otherwise. Returns None if no song could be
+        enriched.
+        """
+        rows, missing = await self.features.lookup_async(songs)
+        if missing and len(rows) < settings.FEATURE_MIN_COVERAGE * len(songs):
+            await self.enrich_songs(missing)
+            rows, missing = await self.features.lookup_async(songs)
+        if missing:
+            await self.enrich_songs(missing, wait=False)
+        if not len(rows):
+            return None
+        
+        features = self.features.aggregate(rows, len(songs))
+        
+        def local_description() -> str:
+            return fallbacks.describe_mood(songs, features.moods, features.energy, features.valence)
+        
+        if settings.FEATURE_LLM_DESCRIPTION:
+            # The prompt holds only aggregates, so similar playlists share a cache entry
+            description = await self._complete(
+                "analyze_mood",
+                prompt=create_mood_description_prompt(
+                    features.moods,
+                    features.energy,
+                    features.valence,
+                    songs
+                ),
+                system_prompt=analyze_mood_system_prompt(),
+                temperature=0.6,
+                fallback=local_description
+            )
+        else:
+            description = local_description()
+        
+        return AnalyzeMoodResponse(
+            moods=features.moods,
+            description=description.strip(),
+            energy=round(features.energy, 3),
+            valence=round(features.valence, 3)
+        )
     
-    async def semantic_search(self, query: str, limit: int) -> SemanticSearchResponse:
-        """Search for songs using natural language"""
+    async def enrich_songs(self, songs: List[Song], wait: bool = True) -> None:
+        """
+        Store mood features for the songs that don't have any yet
+        
+        Songs are queued on the enrichment micro-batcher, which rates up to
+        FEATURE_ENRICH_BATCH_SIZE songs per LLM call, so songs missing from
+        concurrent requests share calls. With `wait`, the queue is flushed and
+        this returns once the songs are rated; otherwise they are rated when
+        the batch fills or FEATURE_ENRICH_WINDOW_MS elapses. Songs already
+        queued are not queued again, and songs the LLM doesn't rate stay
+        unenriched and are retried next time.
+        """
+        _, missing = await self.features.lookup_async(songs)
+        futures = []
+        for song in missing:
+            future = self._enriching.get(song.id)
+            if future is None:
+                future = asyncio.ensure_future(self.enrichment_batcher.submit("enrich_songs", song))
+                self._enriching[song.id] = future
+                future.add_done_callback(partial(self._finish_enrichment, song.id))
+            futures.append(future)
+        
+        if wait and futures:
+            # Let the submissions reach the batcher before flushing it
+            await asyncio.sleep(0)
+            self.enrichment_batcher.flush("enrich_songs")
+            await asyncio.gather(*futures, return_exceptions=True)
+    
+    def _finish_enrichment(self, song_id: str, future: asyncio.Future) -> None:
+        if self._enriching.get(song_id) is future:
+            del self._enriching[song_id]
+    
+    async def _run_enrichment(self, group: str, songs: List[Song]) -> List[Any]:
+        """Rate one batch of songs with the LLM and store what validates"""
+        logger.info(f"Enriching {len(songs)} songs")
+        
+        def rates_most(data: Any) -> bool:
+            # Songs left unrated are enriched again on a later lookup; an
+            # answer missing most of them calls for a larger model
+            if not isinstance(data, dict):
+                return False
+            rated = sum(parse_features(data.get(f"s{i}")) is not None for i in range(len(songs)))
+            return rated * 2 > len(songs)
+        
+        try:
+            data = await self._complete(
+                "enrich_songs",
+                prompt=create_song_features_prompt(songs, list(MOOD_TAGS)),
+                system_prompt=song_features_system_prompt(),
+                temperature=0.2,
+                json_mode=True,
+                validate=rates_most
+            )
+        except AIServiceException as e:
+            logger.warning(f"Song enrichment failed for {len(songs)} songs: {e.detail}")
+            return [None] * len(songs)
+        
+        rated = [
+            parse_features(data.get(f"s{i}")) if isinstance(data, dict) else None
+            for i in range(len(songs))
+        ]
+        features = {song.id: song_features for song, song_features in zip(songs, rated) if song_features is not None}
+        if len(features) < len(songs):
+            logger.warning(f"Song enrichment rated {len(features)} of {len(songs)} songs")
+        await self.features.add_async(features)
+        return rated
+    
+    async def semantic_search(
+        self,
+        query: str,
+        limit: int,
+        mode: Optional[str] = None,
+        filters: Optional[SearchFilters] = None
+    ) -> SemanticSearchResponse:
+        """
+        Search for songs using natural language
+        
+        With a catalog loaded, songs come from the local index in the given
+        `mode` and `filters` apply; otherwise the LLM suggests songs.
+        """
         logger.info(f"Performing semantic search: '{query}'")
         
         if len(query.strip()) < 3:
             raise InvalidRequestException("Search query too short")
         
+        cache_key = self._semantic_cache_key(query, limit, mode, filters)
+        if cache_key is not None:
+            cached = self.semantic_cache.get(*cache_key)
+            if cached is not None:
+                logger.info("Serving semantic search from the semantic cache")
+                return cached
+        
+        if len(self.catalog):
+            mode = mode or settings.SEARCH_MODE
+            plan = await self._plan_search(query, mode)
+            # Scanning the vector and keyword indexes is CPU-bound, so it runs
+            # in a worker thread while other requests are served
+            songs = await asyncio.to_thread(self._search_catalog, query, limit, mode, filters, plan)
+            explanation = await self._explain_search(query, songs, mode)
+            response = SemanticSearchResponse(
+                songs=songs,
+                explanation=explanation,
+                plan=plan.to_dict() if plan is not None else None
+            )
+        else:
+            # Without a catalog, the LLM suggests songs itself
+            prompt = create_semantic_search_prompt(query)
+            system_prompt = semantic_search_system_prompt()
+            
+            response_data = await self._complete(
+                "semantic_search",
+                prompt=prompt,
+                system_prompt=system_prompt,
+                temperature=0.7,
+                json_mode=True
+            )
+            
+            # Parse songs and limit results
+            songs = [self._parse_search_song(song_data) for song_data in response_data['songs'][:limit]]
+            
+            explanation = response_data.get('explanation', '')
+            
+            response = SemanticSearchResponse(songs=songs, explanation=explanation)
+        
+        if cache_key is not None:
+            self.semantic_cache.put(*cache_key, response)
+        return response
+    
+    async def stream_semantic_search(
+        self,
+        query: str,
+        limit: int,
+        mode: Optional[str] = None,
+        filters: Optional[SearchFilters] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream semantic search results as they are generated
+        
+        Yields a `song` event per matching song as soon as its JSON object is
+        complete, followed by an `explanation` event. Results share semantic
+        cache entries with `semantic_search`.
+        """
+        logger.info(f"Streaming semantic search: '{query}'")
+        
+        if len(query.strip()) < 3:
+            raise InvalidRequestException("Search query too short")
+        
+        cache_key = self._semantic_cache_key(query, limit, mode, filters)
+        cached = self.semantic_cache.get(*cache_key) if cache_key is not None else None
+        if cached is not None:
+            logger.info("Serving semantic search from the semantic cache")
+            if cached.plan is not None:
+                yield {"type": "plan", "plan": cached.plan.model_dump()}
+            for song in cached.songs:
+                yield {"type": "song", "data": song.model_dump()}
+            yield {"type": "explanation", "explanation": cached.explanation}
+            return
+        
+        plan = None
+        songs = []
+        async for event in self._stream_search_events(query, limit, mode, filters):
+            if event["type"] == "plan":
+                plan = event["plan"]
+            elif event["type"] == "song":
+                songs.append(Song(**event["data"]))
+            elif cache_key is not None:
+                self.semantic_cache.put(
+                    *cache_key,
+                    SemanticSearchResponse(songs=songs, explanation=event["explanation"], plan=plan)
+                )
+            yield event
+    
+    async def _stream_search_events(
+        self,
+        query: str,
+        limit: int,
+        mode: Optional[str],
+        filters: Optional[SearchFilters]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Search events for `stream_semantic_search`, without the semantic cache"""
+        if len(self.catalog):
+            mode = mode or settings.SEARCH_MODE
+            plan = await self._plan_search(query, mode)
+            if plan is not None:
+                yield {"type": "plan", "plan": plan.to_dict()}
+            songs = await asyncio.to_thread(self._search_catalog, query, limit, mode, filters, plan)
+            for song in songs:
+                yield {"type": "song", "data": song.model_dump()}
+            yield {"type": "explanation", "explanation": await self._explain_search(query, songs, mode)}
+            return
+        
         prompt = create_semantic_search_prompt(query)
         system_prompt = semantic_search_system_prompt()
         
-        response_data = await self.groq.generate_json_completion(
+        count = 0
+        async for kind, payload in self._stream_json_items(
+            "semantic_search",
             prompt=prompt,
             system_prompt=system_prompt,
-            temperature=0.7
+            temperature=0.7,
+            array_key="songs"
+        ):
+            if kind == "item":
+                if count >= limit:
+                    continue
+                count += 1
+                yield {"type": "song", "data": self._parse_search_song(payload).model_dump()}
+            else:
+                explanation = payload.get('explanation', '') if isinstance(payload, dict) else ''
+                yield {"type": "explanation", "explanation": explanation}
+    
+    def _semantic_cache_key(
+        self,
+        query: str,
+        limit: int,
+        mode: Optional[str],
+        filters: Optional[SearchFilters]
+    ) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+        """
+        Text and scope a search is cached under in the semantic cache
+        
+        Queries are reduced to keywords and moods by the planner's rules (no
+        LLM call), so phrasings of the same intent embed close together;
+        request parameters and the filters the rules found must match exactly.
+        """
+        if not settings.SEMANTIC_CACHE_ENABLED:
+            return None
+        plan, _ = self.planner.plan_with_rules(query, self.catalog.genres())
+        text, plan_scope = query_signature(plan)
+        explicit = (
+            (filters.year_from, filters.year_to, tuple(sorted(filters.genres or ())),
+             filters.min_duration, filters.max_duration)
+            if filters is not None and filters.active else None
         )
+        catalog_mode = (mode or settings.SEARCH_MODE) if len(self.catalog) else None
+        return text, (limit, catalog_mode, explicit, plan_scope)
+    
+    async def _plan_search(self, query: str, mode: str) -> Optional[QueryPlan]:
+        """
+        Structured plan for a catalog search
         
-        # Parse songs and limit results
-        # Ensure all required fields are present
-        songs = []
-        for song_data in response_data['songs'][:limit]:
-            # Generate ID if not provided
-            if 'id' not in song_data or not song_data['id']:
-                song_data['id'] = str(uuid.uuid4())
-            # Ensure duration is present (default to 180 seconds if not provided)
-            if 'duration' not in song_data or not song_data['duration']:
-                song_data['duration'] = 180
-            # Remove 'reason' field as it's not part of Song model
-            song_data.pop('reason', None)
-            songs.append(Song(**song_data))
-        
-        explanation = response_data.get('explanation', '')
-        
-        return SemanticSearchResponse(songs=songs, explanation=explanation)
\ No newline at end of file
+        Plans are cached by normalized query text, so repeat and near-repeat
+        queries are planned without the LLM. New queries go through the
+        rules first; the LLM is only asked when the rules don't understand
+        the query, and never for keyword searches.
+        """
+        if not settings.SEARCH_QUERY_PLANNER:
+            return None
+        
+        plan = self.planner.cached(query)
+        if plan is not None:
+            return plan
+        
+        plan, understood = self.planner.plan_with_rules(query, self.catalog.genres())
+        if not understood:
+            if mode == "keyword" or not settings.SEARCH_PLANNER_LLM:
+                return plan
+            try:
+                response_data = await self._complete(
+                    "semantic_search",
+                    prompt=create_query_plan_prompt(query),
+                    system_prompt=query_plan_system_prompt(),
+                    temperature=0.0,
+                    json_mode=True
+                )
+                plan = plan_from_llm(response_data)
+            except (AIServiceException, ValueError) as e:
+                # Not cached, so the LLM is asked again next time
+                detail = e.detail if isinstance(e, AIServiceException) else str(e)
+                logger.warning(f"Falling back to a rule-based query plan: {detail}")
+                return plan
+        
+        self.planner.remember(query, plan)
+        return plan
+    
+    def _search_catalog(
+        self,
+        query: str,
+        limit: int,
+        mode: str,
+        filters: Optional[SearchFilters],
+        plan: Optional[QueryPlan] = None
+    ) -> List[Song]:
+        """
+        Songs from the local catalog for a search query
+        
+        With a plan, the catalog is searched with the plan's text and
+        filters; filters given explicitly take precedence. If the plan's
+        filters leave nothing, the query is searched as written.
+        """
+        alpha = settings.SEARCH_HYBRID_ALPHA
+        if plan is not None:
+            planned = plan.filters()
+            if filters is not None:
+                planned = SearchFilters(
+                    year_from=filters.year_from if filters.year_from is not None else planned.year_from,
+                    year_to=filters.year_to if filters.year_to is not None else planned.year_to,
+                    genres=filters.genres or planned.genres,
+                    min_duration=filters.min_duration if filters.min_duration is not None else planned.min_duration,
+                    max_duration=filters.max_duration if filters.max_duration is not None else planned.max_duration
+                )
+            results = self.catalog.search(plan.search_text(), limit, mode, planned, alpha)
+            if results or not plan.structured:
+                return [song for song, _ in results]
+        
+        results = self.catalog.search(query, limit, mode, filters, alpha)
+        return [song for song, _ in results]
+    
+    async def _explain_search(self, query: str, songs: List[Song], mode: str) -> str:
+        """
+        Explanation for catalog search results
+        
+        Written by the LLM if enabled, except for keyword searches, which are
+        answered entirely locally.
+        """
+        if not songs:
+            return f'No songs in the catalog match "{query}".'
+        
+        def local_explanation() -> str:
+            return fallbacks.explain_search(query, songs)
+        
+        if not settings.SEARCH_LLM_EXPLANATION or mode == "keyword":
+            return local_explanation()
+        
+        try:
+            explanation = await self._complete(
+                "semantic_search",
+                prompt=create_search_explanation_prompt(query, songs),
+                system_prompt=semantic_search_system_prompt(),
+                temperature=0.5,
+                fallback=local_explanation
+            )
+        except AIServiceException as e:
+            # The results come from the catalog, so they don't depend on the LLM
+            logger.warning(f"Falling back to a local search explanation: {e.detail}")
+            return local_explanation()
+        return explanation.strip()
+    
+    def _parse_search_song(self, song_data: Dict[str, Any]) -> Song:
+        """Build a Song from a search result, filling in required fields"""
+        # Generate ID if not provided
+        if 'id' not in song_data or not song_data['id']:
+            song_data['id'] = str(uuid.uuid4())
+        # Ensure duration is present (default to 180 seconds if not provided)
+        if 'duration' not in song_data or not song_data['duration']:
+            song_data['duration'] = 180
+        # Remove 'reason' field as it's not part of Song model
+        song_data.pop('reason', None)
+        return Song(**song_data)
+    
+    async def ingest_songs(self, songs: List[Song]) -> CatalogIngestResponse:
+        """Add songs to the searchable catalog"""
+        if len(songs) > settings.CATALOG_MAX_INGEST:
+            raise InvalidRequestException(
+                f"Too many songs: {len(songs)} (max {settings.CATALOG_MAX_INGEST} per request)"
+            )
+        # Embedding and indexing thousands of songs takes a while, so it runs
+        # in a worker thread while other requests are served
+        ingested = await asyncio.to_thread(self.catalog.add_songs, songs)
+        self.semantic_cache.clear()
+        logger.info(f"Ingested {ingested} songs, catalog size {len(self.catalog)}")
+        return CatalogIngestResponse(ingested=ingested, total=len(self.catalog))
+    
+    async def remove_songs(self, song_ids: List[str]) -> CatalogRemoveResponse:
+        """Remove songs from the searchable catalog"""
+        removed = await asyncio.to_thread(self.catalog.remove_songs, song_ids)
+        self.semantic_cache.clear()
+        logger.info(f"Removed {removed} songs, catalog size {len(self.catalog)}")
+        return CatalogRemoveResponse(removed=removed, total=len(self.catalog))
+    
+    async def run_batch(self, operations: List[Union[BatchItem, Dict[str, Any]]]) -> BatchResponse:
+        """
+        Run many operations concurrently under a concurrency cap
+        
+        Each operation succeeds or fails on its own; failures, including
+        operations given as dicts that don't validate as a batch item, are
+        reported per item instead of failing the whole batch.
+        """
+        logger.info(f"Running batch of {len(operations)} operations")
+        
+        if len(operations) > settings.BATCH_MAX_ITEMS:
+            raise InvalidRequestException(
+                f"Batch too large: {len(operations)} operations (max {settings.BATCH_MAX_ITEMS})"
+            )
+        
+        semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+        
+        async def run_one(index: int, item: Union[BatchItem, Dict[str, Any]]) -> BatchItemResult:
+            if isinstance(item, dict):
+                try:
+                    operation = batch_item_adapter.validate_python(item)
+                except ValidationError as e:
+                    logger.error(f"Batch item {index} is invalid: {e.errors()}")
+                    count_error(e)
+                    return BatchItemResult(
+                        index=index,
+                        id=str(item["id"]) if item.get("id") is not None else None,
+                        op=str(item.get("op", "")),
+                        status="error",
+                        error=BatchItemError(
+                            detail=self._validation_detail(e),
+                            error_type="validation_error",
+                            status_code=422
+                        )
+                    )
+            else:
+                operation = item
+            
+            async with semaphore:
+                try:
+                    result = await self._run_batch_item(operation)
+                    return BatchItemResult(
+                        index=index,
+                        id=operation.id,
+                        op=operation.op,
+                        status="ok",
+                        result=result
+                    )
+                except AIServiceException as e:
+                    logger.error(f"Batch item {index} ({operation.op}) failed: {e.detail}")
+                    count_error(e)
+                    error = BatchItemError(
+                        detail=str(e.detail),
+                        error_type="ai_service_error",
+                        status_code=e.status_code
+                    )
+                except Exception as e:
+                    logger.error(f"Batch item {index} ({operation.op}) failed: {str(e)}", exc_info=True)
+                    count_error(e)
+                    error = BatchItemError(
+                        detail="Internal server error",
+                        error_type="internal_error",
+                        status_code=500
+                    )
+                
+                return BatchItemResult(
+                    index=index,
+                    id=operation.id,
+                    op=operation.op,
+                    status="error",
+                    error=error
+                )
+        
+        results = await asyncio.gather(
+            *(run_one(index, operation) for index, operation in enumerate(operations))
+        )
+        succeeded = sum(1 for result in results if result.status == "ok")
+        
+        return BatchResponse(
+            results=list(results),
+            succeeded=succeeded,
+            failed=len(results) - succeeded
+        )
+    
+    @staticmethod
+    def _validation_detail(error: ValidationError) -> str:
+        """One line per validation error, such as 'songs: List should have at least 1 item'"""
+        return "; ".join(
+            f"{'.'.join(str(part) for part in detail['loc'][1:]) or 'operation'}: {detail['msg']}"
+            for detail in error.errors()
+        )
+    
+    async def _run_batch_item(self, operation: BatchItem) -> Any:
+        """Dispatch a single batch operation"""
+        if operation.op == "describe":
+            return await self.describe_playlist(self.resolve_songs(operation.songs, operation.song_ids))
+        if operation.op == "recommend":
+            return await self.recommend_songs(
+                self.resolve_songs(operation.current_songs, operation.current_song_ids),
+                operation.number_of_recommendations,
+                operation.mode
+            )
+        if operation.op == "name":
+            return await self.generate_playlist_name(
+                self.resolve_songs(operation.songs, operation.song_ids),
+                operation.style
+            )
+        if operation.op == "mood":
+            return await self.analyze_mood(self.resolve_songs(operation.songs, operation.song_ids))
+        if operation.op == "search":
+            return await self.semantic_search(
+                operation.query,
+                operation.limit,
+                operation.mode,
+                SearchFilters(operation.year_from, operation.year_to, operation.genres)
+            )
+        raise InvalidRequestException(f"Unknown batch operation: {operation.op}")
@@ -0,0 +1,479 @@
+"""
+BM25 inverted index over song fields
+"""
+import json
+import math
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+from app.models.song import Song
+from app.services.catalog_store import StringHeap, id_hash, load_array
+from app.services.embeddings import era_tokens, tokenize
+from app.utils.helpers import save_array
+
+
+# Weight of a term occurrence in each field
+FIELD_BOOSTS: Dict[str, float] = {
+    "title": 2.0,
+    "artist": 2.5,
+    "album": 1.0,
+    "genre": 1.5,
+    "era": 1.0,
+    "lyrics": 0.3
+}
+
+K1 = 1.2
+B = 0.75
+
+# Buffered postings are frozen into a sorted segment at this size
+FLUSH_POSTINGS = 1 << 18
+
+# Matched postings are summed into a dense per-row array, instead of being
+# sorted and grouped, once there are more than 1/DENSE_ACCUMULATE of the rows
+DENSE_ACCUMULATE = 16
+
+# Per-document arrays written by `save`
+DOC_ARRAYS = ("_lengths", "_years", "_durations", "_genres", "_live")
+
+FORMAT_VERSION = 2
+
+
+@dataclass
+class SearchFilters:
+    """Year range, duration and genre restrictions for a catalog search"""
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    genres: Optional[List[str]] = None
+    min_duration: Optional[int] = None
+    max_duration: Optional[int] = None
+
+    @property
+    def active(self) -> bool:
+        return (
+            self.year_from is not None
+            or self.year_to is not None
+            or bool(self.genres)
+            or self.min_duration is not None
+            or self.max_duration is not None
+        )
+
+
+def song_term_weights(song: Song) -> Dict[str, float]:
+    """Boosted term frequencies of a song across its fields"""
+    weights: Dict[str, float] = {}
+
+    def add(tokens: Iterable[str], boost: float) -> None:
+        for token in tokens:
+            weights[token] = weights.get(token, 0.0) + boost
+
+    add(tokenize(song.title), FIELD_BOOSTS["title"])
+    add(tokenize(song.artist), FIELD_BOOSTS["artist"])
+    if song.album:
+        add(tokenize(song.album), FIELD_BOOSTS["album"])
+    if song.genre:
+        add(tokenize(song.genre), FIELD_BOOSTS["genre"])
+    if song.year:
+        add(era_tokens(song.year), FIELD_BOOSTS["era"])
+    if song.lyrics:
+        add(tokenize(song.lyrics), FIELD_BOOSTS["lyrics"])
+    return weights
+
+
+class _Postings:
+    """Posting lists in CSR form: term t owns rows[offsets[t]:offsets[t + 1]]"""
+
+    def __init__(self, offsets: np.ndarray, rows: np.ndarray, tfs: np.ndarray):
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        if term_id + 1 >= len(self.offsets):
+            return self.rows[:0], self.tfs[:0]
+        start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.rows[start:stop], self.tfs[start:stop]
+
+    def expand(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(term_ids, rows, tfs) triples for every posting"""
+        terms = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets))
+        return terms, self.rows, self.tfs
+
+    @staticmethod
+    def build(terms: np.ndarray, rows: np.ndarray, tfs: np.ndarray, vocab_size: int) -> "_Postings":
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=vocab_size), out=offsets[1:])
+        return _Postings(offsets, rows[order], tfs[order])
+
+    @staticmethod
+    def merge(parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]], vocab_size: int) -> "_Postings":
+        """Build one segment from (term_ids, rows, tfs) parts, oldest first"""
+        terms, rows, tfs = (np.concatenate(column) for column in zip(*parts))
+        return _Postings.build(terms, rows, tfs, vocab_size)
+
+
+class BM25Index:
+    """
+    Inverted index with BM25 scoring and field boosts
+
+    Term frequencies are summed across fields with per-field boosts, and
+    document length is the boosted length, so a word in the title or artist
+    counts for more than one in the lyrics.
+
+    Postings live in a read-only segment loaded from disk, sorted in-memory
+    segments, and an append buffer for recent adds. A full buffer becomes a
+    new segment, merged with the newest segments while they are no larger,
+    so there are only logarithmically many segments to read per term.
+    Deletes are tombstones; document frequencies keep counting deleted songs
+    until the index is rebuilt, as in most inverted indexes. Year and genre
+    filters are applied to each posting list before scoring, so filtered-out
+    songs are never scored.
+    """
+
+    def __init__(self):
+        self._size = 0
+        self.doc_count = 0
+        self.total_length = 0.0
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._years = np.zeros(0, dtype=np.int32)
+        self._durations = np.zeros(0, dtype=np.int32)
+        self._genres = np.zeros(0, dtype=np.int32)
+        self._live = np.zeros(0, dtype=bool)
+        self._genre_names: List[str] = []
+        self._genre_ids: Dict[str, int] = {}
+        # Segment loaded from disk, with its own term lookup
+        self._base: Optional[_Postings] = None
+        self._base_terms: Optional[StringHeap] = None
+        self._base_hashes: Optional[np.ndarray] = None
+        self._base_order: Optional[np.ndarray] = None
+        # In-memory terms, sorted segments (oldest and largest first) and
+        # append buffer
+        self._vocab: Dict[str, int] = {}
+        self._segments: List[_Postings] = []
+        self._buffer_terms = array("i")
+        self._buffer_rows = array("i")
+        self._buffer_tfs = array("f")
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    @property
+    def size(self) -> int:
+        """Number of rows, including deleted ones"""
+        return self._size
+
+    def is_live(self, row: int) -> bool:
+        return 0 <= row < self._size and bool(self._live[row])
+
+    def genres(self) -> List[str]:
+        """Lowercased genre names seen by the index"""
+        return list(self._genre_names)
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = len(self._lengths)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name in DOC_ARRAYS:
+            current = getattr(self, name)
+            grown = np.zeros(capacity, dtype=current.dtype)
+            grown[:self._size] = current[:self._size]
+            setattr(self, name, grown)
+
+    def _genre_id(self, genre: Optional[str]) -> int:
+        if not genre:
+            return -1
+        key = genre.strip().lower()
+        genre_id = self._genre_ids.get(key)
+        if genre_id is None:
+            genre_id = len(self._genre_names)
+            self._genre_names.append(key)
+            self._genre_ids[key] = genre_id
+        return genre_id
+
+    def add(self, songs: List[Song]) -> np.ndarray:
+        """Index songs and return their row numbers"""
+        self._reserve(len(songs))
+        start = self._size
+        vocab = self._vocab
+
+        for offset, song in enumerate(songs):
+            row = start + offset
+            weights = song_term_weights(song)
+            for term, tf in weights.items():
+                term_id = vocab.get(term)
+                if term_id is None:
+                    term_id = len(vocab)
+                    vocab[term] = term_id
+                self._buffer_terms.append(term_id)
+                self._buffer_rows.append(row)
+                self._buffer_tfs.append(tf)
+
+            length = sum(weights.values())
+            self._lengths[row] = length
+            self._years[row] = song.year or 0
+            self._durations[row] = song.duration
+            self._genres[row] = self._genre_id(song.genre)
+            self._live[row] = True
+            self.total_length += length
+
+        self._size += len(songs)
+        self.doc_count += len(songs)
+
+        if len(self._buffer_terms) >= FLUSH_POSTINGS:
+            self._flush()
+        return np.arange(start, self._size)
+
+    def remove(self, rows: Iterable[int]) -> None:
+        """Delete rows from the index"""
+        if not self._live.flags.writeable:
+            self._live = np.array(self._live)
+        for row in rows:
+            if self.is_live(row):
+                self._live[row] = False
+                self.doc_count -= 1
+                self.total_length -= float(self._lengths[row])
+
+    def _flush(self) -> None:
+        """Freeze the append buffer into a sorted segment"""
+        buffer = (
+            np.frombuffer(self._buffer_terms, dtype=np.int32),
+            np.frombuffer(self._buffer_rows, dtype=np.int32),
+            np.frombuffer(self._buffer_tfs, dtype=np.float32)
+        )
+        segment = _Postings.build(*buffer, len(self._vocab))
+        while self._segments and len(self._segments[-1]) <= len(segment):
+            segment = _Postings.merge([self._segments.pop().expand(), segment.expand()], len(self._vocab))
+        self._segments.append(segment)
+        self._buffer_terms = array("i")
+        self._buffer_rows = array("i")
+        self._buffer_tfs = array("f")
+
+    def _base_term_id(self, term: str) -> Optional[int]:
+        if self._base is None:
+            return None
+        target = id_hash(term)
+        start = int(np.searchsorted(self._base_hashes, target, side="left"))
+        while start < len(self._base_hashes) and self._base_hashes[start] == target:
+            term_id = int(self._base_order[start])
+            if self._base_terms.get(term_id) == term:
+                return term_id
+            start += 1
+        return None
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """All postings of a term across segments"""
+        parts: List[Tuple[np.ndarray, np.ndarray]] = []
+        base_id = self._base_term_id(term)
+        if base_id is not None:
+            parts.append(self._base.get(base_id))
+
+        term_id = self._vocab.get(term)
+        if term_id is not None:
+            for segment in self._segments:
+                parts.append(segment.get(term_id))
+            if len(self._buffer_terms):
+                selected = np.frombuffer(self._buffer_terms, dtype=np.int32) == term_id
+                parts.append((
+                    np.frombuffer(self._buffer_rows, dtype=np.int32)[selected],
+                    np.frombuffer(self._buffer_tfs, dtype=np.float32)[selected]
+                ))
+
+        if not parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def _allowed_genres(self, genres: List[str]) -> np.ndarray:
+        """
+        Genre ids matching any requested genre, plus a False slot for songs
+        without a genre (id -1)
+
+        A genre matches when it contains all the words of a requested genre,
+        so "rock" matches "Classic Rock" and "hip hop" matches "Hip-Hop".
+        """
+        wanted = [set(tokenize(genre)) for genre in genres]
+        allowed = np.zeros(len(self._genre_names) + 1, dtype=bool)
+        for genre_id, name in enumerate(self._genre_names):
+            tokens = set(tokenize(name))
+            allowed[genre_id] = any(words and words <= tokens for words in wanted)
+        return allowed
+
+    def _filter_rows(
+        self,
+        rows: Union[np.ndarray, slice],
+        filters: Optional[SearchFilters],
+        allowed_genres: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Which of `rows` are live and pass the filters
+
+        `rows` is an array of row numbers or a slice.
+        """
+        keep = np.array(self._live[rows], dtype=bool)
+        if filters is None:
+            return keep
+        if filters.year_from is not None or filters.year_to is not None:
+            years = self._years[rows]
+            if filters.year_from is not None:
+                keep &= years >= filters.year_from
+            if filters.year_to is not None:
+                keep &= (years <= filters.year_to) & (years > 0)
+        if filters.min_duration is not None:
+            keep &= self._durations[rows] >= filters.min_duration
+        if filters.max_duration is not None:
+            keep &= self._durations[rows] <= filters.max_duration
+        if allowed_genres is not None:
+            keep &= allowed_genres[self._genres[rows]]
+        return keep
+
+    def filter_mask(self, filters: Optional[SearchFilters]) -> Optional[np.ndarray]:
+        """Boolean mask over all rows for the given filters, or None without filters"""
+        if filters is None or not filters.active:
+            return None
+        allowed_genres = self._allowed_genres(filters.genres) if filters.genres else None
+        return self._filter_rows(slice(0, self._size), filters, allowed_genres)
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        filters: Optional[SearchFilters] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top rows for a keyword query by BM25 score, best first"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or self.doc_count == 0 or limit <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if filters is not None and not filters.active:
+            filters = None
+        allowed_genres = self._allowed_genres(filters.genres) if filters and filters.genres else None
+        average_length = self.total_length / self.doc_count
+        matched_rows: List[np.ndarray] = []
+        matched_scores: List[np.ndarray] = []
+
+        for term in terms:
+            rows, tfs = self._postings(term)
+            if not len(rows):
+                continue
+            df = len(rows)
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+            # Filters are applied to the posting list before any scoring
+            keep = self._filter_rows(rows, filters, allowed_genres)
+            if not keep.all():
+                rows, tfs = rows[keep], tfs[keep]
+
+            norm = K1 * (1 - B + B * self._lengths[rows] / average_length)
+            matched_rows.append(rows)
+            matched_scores.append(idf * tfs * (K1 + 1) / (tfs + norm))
+
+        if not matched_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows = np.concatenate(matched_rows)
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        contributions = np.concatenate(matched_scores)
+        if len(rows) * DENSE_ACCUMULATE > self._size:
+            # Long posting lists: summing into a dense array beats sorting them
+            dense = np.bincount(rows, weights=contributions, minlength=self._size)
+            unique_rows = np.argpartition(-dense, min(limit, len(dense)) - 1)[:limit]
+            unique_rows = unique_rows[dense[unique_rows] > 0]
+            scores = dense[unique_rows].astype(np.float32)
+        else:
+            unique_rows, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            unique_rows, scores = unique_rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return unique_rows[order].astype(np.int64), scores[order]
+
+    def _absorb_base(self) -> None:
+        """Move the loaded segment into the in-memory vocabulary"""
+        if self._base is None:
+            return
+        mapping = np.empty(len(self._base_terms), dtype=np.int32)
+        for base_id in range(len(self._base_terms)):
+            term = self._base_terms.get(base_id)
+            term_id = self._vocab.get(term)
+            if term_id is None:
+                term_id = len(self._vocab)
+                self._vocab[term] = term_id
+            mapping[base_id] = term_id
+
+        terms, rows, tfs = self._base.expand()
+        self._segments.insert(0, _Postings.build(mapping[terms], rows, tfs, len(self._vocab)))
+        self._base = self._base_terms = self._base_hashes = self._base_order = None
+
+    def save(self, directory: str) -> None:
+        """Write the index to `directory` as .npy files"""
+        self._absorb_base()
+        if len(self._buffer_terms):
+            self._flush()
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+
+        empty = np.zeros(0, dtype=np.int32)
+        parts = [segment.expand() for segment in self._segments] or [(empty, empty, empty.astype(np.float32))]
+        postings = _Postings.merge(parts, len(self._vocab))
+        self._segments = [postings]
+        save_array(path / "offsets.npy", postings.offsets)
+        save_array(path / "rows.npy", postings.rows)
+        save_array(path / "tfs.npy", postings.tfs)
+
+        StringHeap.build(self._vocab).save(path, "terms")
+        hashes = np.fromiter((id_hash(term) for term in self._vocab), dtype=np.int64, count=len(self._vocab))
+        order = np.argsort(hashes, kind="stable")
+        save_array(path / "term_hashes.npy", hashes[order])
+        save_array(path / "term_order.npy", order.astype(np.int64))
+
+        for name in DOC_ARRAYS:
+            save_array(path / f"{name.lstrip('_')}.npy", getattr(self, name)[:self._size])
+        (path / "bm25.json").write_text(json.dumps({
+            "version": FORMAT_VERSION,
+            "size": self._size,
+            "doc_count": self.doc_count,
+            "total_length": self.total_length,
+            "genres": self._genre_names
+        }))
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        """Whether `directory` holds an index in the current format"""
+        meta_path = Path(directory) / "bm25.json"
+        if not meta_path.exists():
+            return False
+        return json.loads(meta_path.read_text()).get("version") == FORMAT_VERSION
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        """Open an index written by `save`, memory-mapping its postings"""
+        path = Path(directory)
+        meta = json.loads((path / "bm25.json").read_text())
+        index = cls()
+        index._base = _Postings(
+            load_array(path / "offsets.npy"),
+            load_array(path / "rows.npy"),
+            load_array(path / "tfs.npy")
+        )
+        index._base_terms = StringHeap.load(path, "terms")
+        index._base_hashes = load_array(path / "term_hashes.npy")
+        index._base_order = load_array(path / "term_order.npy")
+        for name in DOC_ARRAYS:
+            setattr(index, name, load_array(path / f"{name.lstrip('_')}.npy"))
+        index._size = meta["size"]
+        index.doc_count = meta["doc_count"]
+        index.total_length = meta["total_length"]
+        index._genre_names = meta["genres"]
+        index._genre_ids = {name: genre_id for genre_id, name in enumerate(meta["genres"])}
+        return index
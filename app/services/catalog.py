@@ -0,0 +1,391 @@
+"""
+Song catalog with local semantic search
+"""
+import argparse
+import csv
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from app.models.song import Song
+from app.services.bm25_index import BM25Index, SearchFilters
+from app.services.catalog_store import CatalogStore, CatalogStoreBuilder
+from app.services.embeddings import HashingEmbedder, tokenize
+from app.services.song_resolver import SongResolver
+from app.services.vector_index import VectorIndex
+from app.utils.exceptions import InvalidRequestException
+from app.utils.logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+
+INGEST_BATCH_SIZE = 2048
+
+SEARCH_MODES = ("hybrid", "semantic", "keyword")
+
+# Hybrid search scores this many candidates per result from each index
+HYBRID_CANDIDATES = 4
+
+# Filtered semantic searches matching at most this many songs are exact
+EXACT_FILTER_ROWS = 65536
+
+
+def _song_from_record(record: Dict[str, Any]) -> Song:
+    """Build a Song from a JSON or CSV record, treating empty strings as missing"""
+    return Song(**{key: value for key, value in record.items() if value != "" and value is not None})
+
+
+def read_songs(path: str) -> Iterator[Song]:
+    """Read songs from a JSONL, JSON array or CSV export"""
+    file_path = Path(path)
+    suffix = file_path.suffix.lower()
+
+    with file_path.open(encoding="utf-8", newline="") as handle:
+        if suffix == ".csv":
+            for record in csv.DictReader(handle):
+                yield _song_from_record(record)
+        elif suffix == ".json":
+            for record in json.load(handle):
+                yield _song_from_record(record)
+        else:
+            for line in handle:
+                if line.strip():
+                    yield _song_from_record(json.loads(line))
+
+
+class SongCatalog:
+    """
+    Songs available to search, embedded into a vector index and indexed by
+    keyword
+
+    Songs come from an optional memory-mapped CatalogStore, built offline,
+    plus songs added at runtime, which are kept in memory. Songs are keyed by
+    id; adding a song whose id is already in the catalog replaces it. All
+    indexes share row numbers.
+
+    Ingestion, removal, searches and title matching may run in worker
+    threads; they take a lock so that none of them sees an index half
+    updated. Lookups by id don't.
+    """
+
+    def __init__(
+        self,
+        embedder: HashingEmbedder,
+        index: VectorIndex,
+        store: Optional[CatalogStore] = None,
+        keywords: Optional[BM25Index] = None,
+        resolver: Optional[SongResolver] = None
+    ):
+        self.embedder = embedder
+        self.index = index
+        self.store = store
+        self.keywords = keywords if keywords is not None else BM25Index()
+        self.resolver = resolver if resolver is not None else SongResolver()
+        self._base_count = len(store) if store is not None else 0
+        # Songs added at runtime, stored from row `_base_count` on
+        self._songs: List[Optional[Song]] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def open(cls, directory: str, nprobe: int = 8) -> "SongCatalog":
+        """Open a catalog written by `build_catalog`"""
+        store = CatalogStore.open(directory)
+        index = VectorIndex.load(str(Path(directory) / "index"), nprobe=nprobe)
+        keywords_path = Path(directory) / "keywords"
+        if BM25Index.exists(str(keywords_path)):
+            keywords = BM25Index.load(str(keywords_path))
+        else:
+            logger.warning(f"Catalog store {directory} has no current keyword index, building it in memory")
+            keywords = _index_keywords(store)
+        resolver_path = Path(directory) / "resolver"
+        if SongResolver.exists(str(resolver_path)):
+            resolver = SongResolver.load(str(resolver_path))
+        else:
+            logger.warning(f"Catalog store {directory} has no current title index, building it in memory")
+            resolver = _index_titles(store)
+        catalog = cls(HashingEmbedder(dim=index.dim), index, store, keywords, resolver)
+        logger.info(f"Opened catalog store {directory} with {len(store)} songs")
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def row_of(self, song_id: str) -> Optional[int]:
+        row = self._rows.get(song_id)
+        if row is None and self.store is not None:
+            row = self.store.row_of(song_id)
+        if row is None or not self.keywords.is_live(row):
+            return None
+        return row
+
+    def song_at(self, row: int) -> Optional[Song]:
+        if row < self._base_count:
+            return self.store.song(row)
+        return self._songs[row - self._base_count]
+
+    def genres(self) -> List[str]:
+        """Lowercased names of the genres in the catalog"""
+        return self.keywords.genres()
+
+    def get(self, song_id: str) -> Optional[Song]:
+        row = self.row_of(song_id)
+        return self.song_at(row) if row is not None else None
+
+    def _live_song(self, row: int) -> Optional[Song]:
+        return self.song_at(row) if self.keywords.is_live(row) else None
+
+    def resolve(
+        self,
+        pairs: List[Tuple[str, str]],
+        min_confidence: float = 0.0
+    ) -> List[Optional[Tuple[Song, float]]]:
+        """The song best matching each free-text (title, artist) pair, and how confident the match is"""
+        with self._lock:
+            return self.resolver.match_many(pairs, self._live_song, min_confidence)
+
+    def get_many(self, song_ids: List[str]) -> Tuple[List[Song], List[str]]:
+        """Songs for the given ids, in order, and the ids that weren't found"""
+        songs: List[Song] = []
+        missing: List[str] = []
+        for song_id in song_ids:
+            song = self.get(song_id)
+            if song is None:
+                missing.append(song_id)
+            else:
+                songs.append(song)
+        return songs, missing
+
+    def add_songs(self, songs: Iterable[Song]) -> int:
+        """Embed and index songs, returning how many were added or replaced"""
+        added = 0
+        batch: Dict[str, Song] = {}
+
+        with self._lock:
+            for song in songs:
+                batch[song.id] = song
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    added += self._add_batch(list(batch.values()))
+                    batch = {}
+            if batch:
+                added += self._add_batch(list(batch.values()))
+
+            if self.index.needs_training():
+                self.index.train()
+        return added
+
+    def _add_batch(self, songs: List[Song]) -> int:
+        replaced = [row for row in (self.row_of(song.id) for song in songs) if row is not None]
+        if replaced:
+            self._remove_rows(replaced)
+
+        rows = self.index.add(self.embedder.embed_songs(songs))
+        self.keywords.add(songs)
+        self.resolver.add(rows.tolist(), songs)
+        for row, song in zip(rows.tolist(), songs):
+            self._songs.append(song)
+            self._rows[song.id] = row
+        return len(songs)
+
+    def _remove_rows(self, rows: List[int]) -> None:
+        self.index.remove(np.asarray(rows, dtype=np.int64))
+        self.keywords.remove(rows)
+        for row in rows:
+            if row >= self._base_count:
+                self._songs[row - self._base_count] = None
+
+    def remove_songs(self, song_ids: Iterable[str]) -> int:
+        """Remove songs by id, returning how many were in the catalog"""
+        rows = set()
+        with self._lock:
+            for song_id in song_ids:
+                row = self.row_of(song_id)
+                if row is not None:
+                    rows.add(row)
+                    self._rows.pop(song_id, None)
+            if rows:
+                self._remove_rows(sorted(rows))
+        return len(rows)
+
+    def load_file(self, path: str) -> int:
+        """Ingest a JSONL, JSON or CSV export of songs"""
+        try:
+            count = self.add_songs(read_songs(path))
+        except (OSError, ValueError) as e:
+            raise InvalidRequestException(f"Could not load catalog from {path}: {str(e)}")
+        logger.info(f"Loaded {count} songs from {path}, catalog size {len(self)}")
+        return count
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        mode: str = "hybrid",
+        filters: Optional[SearchFilters] = None,
+        alpha: float = 0.5
+    ) -> List[Tuple[Song, float]]:
+        """
+        Songs matching a free-text query, best first
+
+        `mode` is "semantic" (vector similarity), "keyword" (BM25) or
+        "hybrid", which scores the top candidates of both and ranks them by
+        `alpha` * cosine similarity + (1 - `alpha`) * BM25 score scaled to the
+        best keyword match. A query without search terms lists the songs that
+        pass `filters`, in catalog order.
+        """
+        if mode not in SEARCH_MODES:
+            raise InvalidRequestException(f"Unknown search mode: {mode}")
+
+        with self._lock:
+            return self._search(query, limit, mode, filters, alpha)
+
+    def _search(
+        self,
+        query: str,
+        limit: int,
+        mode: str,
+        filters: Optional[SearchFilters],
+        alpha: float
+    ) -> List[Tuple[Song, float]]:
+        if not tokenize(query):
+            mask = self.keywords.filter_mask(filters)
+            if mask is None:
+                return []
+            rows = np.flatnonzero(mask)[:limit]
+            return [(self.song_at(row), 1.0) for row in rows.tolist()]
+
+        if mode == "keyword":
+            rows, scores = self.keywords.search(query, limit, filters)
+        elif mode == "semantic":
+            rows, scores = self._semantic_search(self.embedder.embed_query(query), limit, filters)
+        else:
+            rows, scores = self._hybrid_search(query, limit, filters, alpha)
+
+        return [
+            (self.song_at(row), float(score))
+            for row, score in zip(rows.tolist(), scores.tolist())
+            if score > 0
+        ]
+
+    def _semantic_search(
+        self,
+        query_vector: np.ndarray,
+        limit: int,
+        filters: Optional[SearchFilters]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        mask = self.keywords.filter_mask(filters)
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            if len(rows) <= EXACT_FILTER_ROWS:
+                # Few songs pass the filters: score them all exactly instead
+                # of probing IVF lists that may hold none of them
+                scores = self.index.vectors(rows) @ query_vector
+                top = np.argsort(-scores, kind="stable")[:limit]
+                return rows[top], scores[top]
+        return self.index.search(query_vector, limit, mask)
+
+    def _hybrid_search(
+        self,
+        query: str,
+        limit: int,
+        filters: Optional[SearchFilters],
+        alpha: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        candidates = limit * HYBRID_CANDIDATES
+        keyword_rows, keyword_scores = self.keywords.search(query, candidates, filters)
+        query_vector = self.embedder.embed_query(query)
+        semantic_rows, _ = self._semantic_search(query_vector, candidates, filters)
+
+        rows = np.union1d(keyword_rows, semantic_rows)
+        if not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+
+        # Exact cosine for every candidate, including keyword-only ones
+        semantic = np.maximum(self.index.vectors(rows) @ query_vector, 0)
+        keyword = np.zeros(len(rows), dtype=np.float32)
+        if len(keyword_rows):
+            keyword[np.searchsorted(rows, keyword_rows)] = keyword_scores / keyword_scores.max()
+        scores = alpha * semantic + (1 - alpha) * keyword
+
+        top = np.argsort(-scores, kind="stable")[:limit]
+        return rows[top], scores[top]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "songs": len(self),
+            "stored_songs": self._base_count,
+            "dimensions": self.index.dim,
+            "ivf_lists": self.index.ivf_lists if self.index.trained else 0,
+            "quantized": self.index.quantize
+        }
+
+
+def _index_keywords(store: CatalogStore) -> BM25Index:
+    """Build a keyword index over every song in a store"""
+    keywords = BM25Index()
+    for start in range(0, len(store), INGEST_BATCH_SIZE):
+        stop = min(start + INGEST_BATCH_SIZE, len(store))
+        keywords.add([store.song(row) for row in range(start, stop)])
+    return keywords
+
+
+def _index_titles(store: CatalogStore) -> SongResolver:
+    """Build a title index over every song in a store"""
+    resolver = SongResolver()
+    for start in range(0, len(store), INGEST_BATCH_SIZE):
+        stop = min(start + INGEST_BATCH_SIZE, len(store))
+        resolver.add(range(start, stop), [store.song(row) for row in range(start, stop)])
+    return resolver
+
+
+def build_catalog(
+    source: str,
+    directory: str,
+    dim: int = 256,
+    ivf_lists: int = 0,
+    quantize: bool = False
+) -> CatalogStore:
+    """
+    Bulk-ingest a JSONL, JSON or CSV export into a catalog store
+
+    Writes the columnar song store, the vector index, the keyword index and
+    the title index under `directory`, ready to be opened with `SongCatalog.open`.
+    """
+    builder = CatalogStoreBuilder()
+    for song in read_songs(source):
+        builder.add(song)
+    store = builder.write(directory, {"source": str(source)})
+
+    embedder = HashingEmbedder(dim=dim)
+    index = VectorIndex(dim, ivf_lists=ivf_lists, quantize=quantize)
+    for start in range(0, len(store), INGEST_BATCH_SIZE):
+        stop = min(start + INGEST_BATCH_SIZE, len(store))
+        index.add(embedder.embed_songs(store.song(row) for row in range(start, stop)))
+    index.train()
+    index.save(str(Path(directory) / "index"))
+    _index_keywords(store).save(str(Path(directory) / "keywords"))
+    _index_titles(store).save(str(Path(directory) / "resolver"))
+    return store
+
+
+def main() -> int:
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Build a memory-mapped song catalog from a JSONL, JSON or CSV export")
+    parser.add_argument("source", help="Songs to ingest")
+    parser.add_argument("directory", help="Where to write the catalog store")
+    parser.add_argument("--dim", type=int, default=settings.SEARCH_EMBEDDING_DIM)
+    parser.add_argument("--ivf-lists", type=int, default=settings.SEARCH_IVF_LISTS)
+    parser.add_argument("--quantize", action="store_true", default=settings.SEARCH_QUANTIZE)
+    args = parser.parse_args()
+
+    store = build_catalog(args.source, args.directory, args.dim, args.ivf_lists, args.quantize)
+    print(f"Wrote {len(store)} songs to {args.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
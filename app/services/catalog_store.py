@@ -0,0 +1,241 @@
+"""
+Columnar, memory-mapped song catalog storage
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from app.models.song import Song
+from app.utils.helpers import save_array
+from app.utils.logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+
+STORE_VERSION = 1
+
+# Columns holding interned strings: column name -> Song field
+INTERNED_FIELDS = {"artist": "artist", "genre": "genre", "album": "album"}
+
+# Columns holding one string per song, stored in a string heap
+HEAP_FIELDS = ("id", "title", "lyrics", "image_url")
+
+
+def id_hash(song_id: str) -> int:
+    """Stable 63-bit hash of a song id"""
+    digest = hashlib.blake2b(song_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") >> 1
+
+
+def load_array(path: Path) -> np.ndarray:
+    """Memory-map an .npy file as a plain read-only ndarray"""
+    return np.load(path, mmap_mode="r").view(np.ndarray)
+
+
+class StringHeap:
+    """
+    Variable-length strings packed into one byte array
+
+    String i is `data[offsets[i]:offsets[i + 1]]`, UTF-8 encoded. Missing
+    values are stored as empty strings.
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, i: int) -> str:
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.data[start:stop].tobytes().decode("utf-8")
+
+    @staticmethod
+    def build(values: Iterable[Optional[str]]) -> "StringHeap":
+        encoded = [(value or "").encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return StringHeap(offsets, data)
+
+    def save(self, directory: Path, name: str) -> None:
+        save_array(directory / f"{name}.offsets.npy", self.offsets)
+        save_array(directory / f"{name}.data.npy", self.data)
+
+    @staticmethod
+    def load(directory: Path, name: str) -> "StringHeap":
+        return StringHeap(
+            load_array(directory / f"{name}.offsets.npy"),
+            load_array(directory / f"{name}.data.npy")
+        )
+
+
+class CatalogStoreBuilder:
+    """
+    Collects songs and writes them out as a columnar store
+
+    Artists, genres and albums are interned into small string tables and
+    referenced by int32 ids (-1 when missing). Years and durations are int32
+    arrays (year 0 when missing). Ids, titles, lyrics and image URLs go into
+    string heaps. A later song with the same id replaces an earlier one.
+    """
+
+    def __init__(self):
+        self._positions: Dict[str, int] = {}
+        self._tables: Dict[str, Dict[str, int]] = {name: {} for name in INTERNED_FIELDS}
+        self._interned: Dict[str, List[int]] = {name: [] for name in INTERNED_FIELDS}
+        self._heaps: Dict[str, List[Optional[str]]] = {name: [] for name in HEAP_FIELDS}
+        self._years: List[int] = []
+        self._durations: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._years)
+
+    def _intern(self, column: str, value: Optional[str]) -> int:
+        if not value:
+            return -1
+        table = self._tables[column]
+        code = table.get(value)
+        if code is None:
+            code = len(table)
+            table[value] = code
+        return code
+
+    def add(self, song: Song) -> int:
+        """Add or replace a song, returning its row"""
+        row = self._positions.get(song.id)
+        values = {
+            "interned": {
+                column: self._intern(column, getattr(song, field))
+                for column, field in INTERNED_FIELDS.items()
+            },
+            "heaps": {name: getattr(song, name) for name in HEAP_FIELDS}
+        }
+
+        if row is None:
+            row = len(self)
+            self._positions[song.id] = row
+            for column, code in values["interned"].items():
+                self._interned[column].append(code)
+            for name, value in values["heaps"].items():
+                self._heaps[name].append(value)
+            self._years.append(song.year or 0)
+            self._durations.append(song.duration)
+        else:
+            for column, code in values["interned"].items():
+                self._interned[column][row] = code
+            for name, value in values["heaps"].items():
+                self._heaps[name][row] = value
+            self._years[row] = song.year or 0
+            self._durations[row] = song.duration
+        return row
+
+    def write(self, directory: str, extra_meta: Optional[Dict[str, Any]] = None) -> "CatalogStore":
+        """Write the columns to `directory` and open the result"""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+
+        for column, codes in self._interned.items():
+            save_array(path / f"{column}.npy", np.asarray(codes, dtype=np.int32))
+            StringHeap.build(self._tables[column]).save(path, f"{column}.values")
+        for name, values in self._heaps.items():
+            StringHeap.build(values).save(path, name)
+        save_array(path / "year.npy", np.asarray(self._years, dtype=np.int32))
+        save_array(path / "duration.npy", np.asarray(self._durations, dtype=np.int32))
+
+        # Id lookup: hashes sorted for binary search, with the row of each
+        hashes = np.fromiter((id_hash(song_id) for song_id in self._heaps["id"]), dtype=np.int64, count=len(self))
+        order = np.argsort(hashes, kind="stable")
+        save_array(path / "id_hashes.npy", hashes[order])
+        save_array(path / "id_rows.npy", order.astype(np.int64))
+
+        meta = {"version": STORE_VERSION, "count": len(self), **(extra_meta or {})}
+        tmp_path = path / "meta.json.tmp"
+        tmp_path.write_text(json.dumps(meta))
+        os.replace(tmp_path, path / "meta.json")
+
+        logger.info(f"Wrote catalog store with {len(self)} songs to {directory}")
+        return CatalogStore.open(directory)
+
+
+class CatalogStore:
+    """
+    Read-only song catalog opened from memory-mapped column files
+
+    Opening only maps the files, so it takes milliseconds regardless of
+    catalog size, and worker processes on the same host share the pages
+    through the OS page cache.
+    """
+
+    def __init__(self, directory: Path, meta: Dict[str, Any]):
+        self.directory = directory
+        self.meta = meta
+        self.count: int = meta["count"]
+        self.ids = StringHeap.load(directory, "id")
+        self.titles = StringHeap.load(directory, "title")
+        self.lyrics = StringHeap.load(directory, "lyrics")
+        self.image_urls = StringHeap.load(directory, "image_url")
+        self.interned = {column: load_array(directory / f"{column}.npy") for column in INTERNED_FIELDS}
+        self.tables = {column: StringHeap.load(directory, f"{column}.values") for column in INTERNED_FIELDS}
+        self.years = load_array(directory / "year.npy")
+        self.durations = load_array(directory / "duration.npy")
+        self._id_hashes = load_array(directory / "id_hashes.npy")
+        self._id_rows = load_array(directory / "id_rows.npy")
+        # Decoded artist, genre and album names, filled on first use
+        self._decoded: Dict[str, Dict[int, str]] = {column: {} for column in INTERNED_FIELDS}
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return (Path(directory) / "meta.json").exists()
+
+    @classmethod
+    def open(cls, directory: str) -> "CatalogStore":
+        path = Path(directory)
+        meta = json.loads((path / "meta.json").read_text())
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported catalog store version {meta.get('version')} in {directory}")
+        return cls(path, meta)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def row_of(self, song_id: str) -> Optional[int]:
+        """Row of a song id, or None if it isn't in the store"""
+        target = id_hash(song_id)
+        start = int(np.searchsorted(self._id_hashes, target, side="left"))
+        while start < len(self._id_hashes) and self._id_hashes[start] == target:
+            row = int(self._id_rows[start])
+            if self.ids.get(row) == song_id:
+                return row
+            start += 1
+        return None
+
+    def _interned_value(self, column: str, row: int) -> Optional[str]:
+        code = int(self.interned[column][row])
+        if code < 0:
+            return None
+        cache = self._decoded[column]
+        value = cache.get(code)
+        if value is None:
+            value = self.tables[column].get(code)
+            cache[code] = value
+        return value
+
+    def song(self, row: int) -> Song:
+        """Materialize the song stored at `row`"""
+        year = int(self.years[row])
+        return Song.model_construct(
+            id=self.ids.get(row),
+            title=self.titles.get(row),
+            artist=self._interned_value("artist", row) or "",
+            album=self._interned_value("album", row),
+            genre=self._interned_value("genre", row),
+            year=year or None,
+            duration=int(self.durations[row]),
+            lyrics=self.lyrics.get(row) or None,
+            image_url=self.image_urls.get(row) or None
+        )
@@ -0,0 +1,168 @@
+"""
+Circuit breaker for upstream calls
+"""
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple
+from app.utils.exceptions import CircuitOpenException
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+
+logger = setup_logger(__name__)
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+breaker_state = metrics.gauge(
+    "circuit_breaker_state",
+    "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)"
+)
+breaker_rejections = metrics.counter(
+    "circuit_breaker_rejected_total",
+    "Calls rejected without reaching upstream because the breaker was open"
+)
+breaker_transitions = metrics.counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes",
+    ("state",)
+)
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker driven by error and slow-call rates
+
+    Outcomes of the last `window_size` calls are kept. Once at least
+    `min_calls` are recorded, the breaker opens when the failure rate or the
+    slow-call rate reaches its threshold. After `open_duration` seconds it lets
+    up to `half_open_calls` probes through; if they all succeed it closes,
+    and any failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 30.0,
+        slow_call_rate_threshold: float = 0.8,
+        window_size: int = 20,
+        min_calls: int = 10,
+        open_duration: float = 30.0,
+        half_open_calls: int = 2
+    ):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        breaker_state.set(STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"Circuit breaker {self._state} -> {state}")
+        self._state = state
+        breaker_state.set(STATE_VALUES[state])
+        breaker_transitions.inc(state=state)
+
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._probes_started = 0
+            self._probes_succeeded = 0
+        elif state == CLOSED:
+            self._outcomes.clear()
+
+    def allow(self) -> None:
+        """Raise CircuitOpenException if a call may not go upstream now"""
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and self._probes_started < self.half_open_calls:
+            self._probes_started += 1
+            return
+        breaker_rejections.inc()
+        raise CircuitOpenException()
+
+    def record_success(self, latency: float) -> None:
+        slow = latency >= self.slow_call_seconds
+        if self._state == HALF_OPEN:
+            if slow:
+                self._transition(OPEN)
+                return
+            self._probes_succeeded += 1
+            if self._probes_succeeded >= self.half_open_calls:
+                self._transition(CLOSED)
+            return
+        self._record(False, slow)
+
+    def record_failure(self) -> None:
+        if self._state == HALF_OPEN:
+            self._transition(OPEN)
+            return
+        self._record(True, False)
+
+    def release(self) -> None:
+        """Give back a half-open probe slot for a call with no verdict"""
+        if self._state == HALF_OPEN and self._probes_started > 0:
+            self._probes_started -= 1
+
+    def _record(self, failed: bool, slow: bool) -> None:
+        self._outcomes.append((failed, slow))
+        if self._state != CLOSED or len(self._outcomes) < self.min_calls:
+            return
+
+        calls = len(self._outcomes)
+        failure_rate = sum(1 for failed, _ in self._outcomes if failed) / calls
+        slow_rate = sum(1 for _, slow in self._outcomes if slow) / calls
+        if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+            self._transition(OPEN)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], is_failure: Callable[[Exception], bool]) -> Any:
+        """Run `fn` through the breaker"""
+        self.allow()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.release()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state for health reporting"""
+        state = self.state
+        calls = len(self._outcomes)
+        snapshot: Dict[str, Any] = {
+            "state": state,
+            "window_calls": calls,
+            "failure_rate": round(sum(1 for failed, _ in self._outcomes if failed) / calls, 4) if calls else 0.0,
+            "slow_call_rate": round(sum(1 for _, slow in self._outcomes if slow) / calls, 4) if calls else 0.0
+        }
+        if state == OPEN:
+            snapshot["retry_in_seconds"] = round(max(0.0, self.open_duration - (time.monotonic() - self._opened_at)), 1)
+        return snapshot
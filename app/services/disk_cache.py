@@ -0,0 +1,509 @@
+"""
+Disk-backed completion cache shared by all worker processes on a host
+
+Usage:
+    python -m app.services.disk_cache stats [--path cache.db]
+    python -m app.services.disk_cache list [--endpoint semantic_search] [--limit 20]
+    python -m app.services.disk_cache show KEY
+    python -m app.services.disk_cache warm operations.jsonl
+    python -m app.services.disk_cache purge [--expired | --endpoint NAME | --all]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.services.response_cache import ResponseCache
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+
+logger = setup_logger(__name__)
+
+disk_cache_lookups = metrics.counter(
+    "disk_cache_lookups_total",
+    "Disk completion cache lookups, by result (hit, miss or error)",
+    ("result",)
+)
+
+# Values at least this long are stored zlib-compressed when that saves space
+COMPRESS_MIN_BYTES = 256
+COMPRESS_LEVEL = 6
+# A hit only rewrites the entry's access time once it is this many seconds
+# old, so popular keys don't turn every read into a write
+ACCESS_RESOLUTION = 60.0
+# Eviction frees this fraction of the budget beyond what is needed, so a
+# full cache doesn't evict on every write
+EVICT_SLACK = 0.05
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    stored INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed_at);
+CREATE INDEX IF NOT EXISTS completions_expires ON completions (expires_at);
+CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals VALUES ('entries', 0), ('bytes', 0);
+CREATE TRIGGER IF NOT EXISTS completions_insert AFTER INSERT ON completions BEGIN
+    UPDATE totals SET value = value + 1 WHERE name = 'entries';
+    UPDATE totals SET value = value + NEW.stored WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS completions_update AFTER UPDATE OF stored ON completions BEGIN
+    UPDATE totals SET value = value + NEW.stored - OLD.stored WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS completions_delete AFTER DELETE ON completions BEGIN
+    UPDATE totals SET value = value - 1 WHERE name = 'entries';
+    UPDATE totals SET value = value - OLD.stored WHERE name = 'bytes';
+END;
+"""
+
+
+def encode_value(value: str) -> Tuple[bytes, bool]:
+    """UTF-8 bytes of a value, compressed when that makes them smaller"""
+    raw = value.encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, COMPRESS_LEVEL)
+        if len(packed) < len(raw):
+            return packed, True
+    return raw, False
+
+
+def decode_value(data: bytes, compressed: bool) -> str:
+    return (zlib.decompress(data) if compressed else data).decode("utf-8")
+
+
+class DiskCache:
+    """
+    Completion cache in a SQLite database with per-endpoint TTLs
+
+    The database runs in WAL mode, so any number of worker processes read
+    concurrently while one writes. Entry count and stored bytes are kept
+    in a totals table by triggers; a write that takes the cache over either
+    limit evicts expired entries first, then the least recently accessed.
+    Like ResponseCache, expired entries stay readable by `get_stale` for
+    another `stale_ttl` seconds, space permitting.
+
+    Errors from the database are logged and treated as misses, so a locked
+    or full disk never fails a request.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 100000,
+        max_bytes: int = 256 * 1024 * 1024,
+        default_ttl: float = 3600.0,
+        ttls: Optional[Dict[str, float]] = None,
+        stale_ttl: float = 0.0
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = 0
+
+    def ttl_for(self, endpoint: Optional[str]) -> float:
+        """TTL in seconds for an endpoint"""
+        if endpoint is None:
+            return self.default_ttl
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """This process's connection, opened on first use (and again after a fork)"""
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path,
+                timeout=5.0,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def lookup(self, key: str, stale: bool = False) -> Tuple[Optional[str], float]:
+        """
+        Cached value and its remaining TTL in seconds
+
+        With `stale`, entries up to `stale_ttl` seconds past expiry are
+        returned too (with a negative remaining TTL). Returns (None, 0) on a
+        miss.
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                row = self.connection.execute(
+                    "SELECT value, compressed, expires_at, accessed_at FROM completions WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                if row is None or row[2] + (self.stale_ttl if stale else 0.0) <= now:
+                    self.misses += 1
+                    disk_cache_lookups.inc(result="miss")
+                    return None, 0.0
+                if now - row[3] >= ACCESS_RESOLUTION:
+                    self.connection.execute(
+                        "UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+            value = decode_value(row[0], bool(row[1]))
+        except (sqlite3.Error, zlib.error, UnicodeDecodeError) as e:
+            self.errors += 1
+            disk_cache_lookups.inc(result="error")
+            logger.warning(f"Disk cache read failed: {e}")
+            return None, 0.0
+
+        self.hits += 1
+        disk_cache_lookups.inc(result="hit")
+        return value, row[2] - now
+
+    def get(self, key: str, endpoint: Optional[str] = None) -> Optional[str]:
+        """Return a fresh cached value, or None on a miss"""
+        return self.lookup(key)[0]
+
+    def get_stale(self, key: str) -> Optional[str]:
+        """Return a value even if it has expired, as long as it is still retained"""
+        return self.lookup(key, stale=True)[0]
+
+    def set(self, key: str, value: str, endpoint: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting entries if the cache goes over its limits"""
+        ttl = self.ttl_for(endpoint) if ttl is None else ttl
+        data, compressed = encode_value(value)
+        if ttl <= 0 or len(data) > self.max_bytes or self.max_entries <= 0:
+            return
+
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self.connection
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    connection.execute(
+                        """
+                        INSERT INTO completions
+                            (key, endpoint, value, compressed, size, stored, created_at, expires_at, accessed_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (key) DO UPDATE SET
+                            endpoint = excluded.endpoint, value = excluded.value,
+                            compressed = excluded.compressed, size = excluded.size,
+                            stored = excluded.stored, created_at = excluded.created_at,
+                            expires_at = excluded.expires_at, accessed_at = excluded.accessed_at
+                        """,
+                        (key, endpoint, data, int(compressed), len(value.encode("utf-8")), len(data),
+                         now, now + ttl, now)
+                    )
+                    self._evict(now)
+                    connection.execute("COMMIT")
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Disk cache write failed: {e}")
+
+    def _totals(self) -> Tuple[int, int]:
+        rows = dict(self.connection.execute("SELECT name, value FROM totals").fetchall())
+        return rows["entries"], rows["bytes"]
+
+    def _evict(self, now: float) -> None:
+        """Bring the cache back under its limits; runs inside the write transaction"""
+        entries, stored = self._totals()
+        if entries <= self.max_entries and stored <= self.max_bytes:
+            return
+
+        self.connection.execute("DELETE FROM completions WHERE expires_at + ? <= ?", (self.stale_ttl, now))
+        entries, stored = self._totals()
+        while entries > self.max_entries or stored > self.max_bytes:
+            average = stored / max(entries, 1)
+            excess = max(
+                entries - self.max_entries * (1 - EVICT_SLACK),
+                (stored - self.max_bytes * (1 - EVICT_SLACK)) / max(average, 1.0),
+                1
+            )
+            deleted = self.connection.execute(
+                "DELETE FROM completions WHERE key IN "
+                "(SELECT key FROM completions ORDER BY accessed_at LIMIT ?)",
+                (int(excess) + 1,)
+            ).rowcount
+            self.evictions += deleted
+            entries, stored = self._totals()
+
+    def invalidate(self, key: str) -> None:
+        """Drop a single entry"""
+        self.purge(key=key)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self.purge()
+
+    def purge(self, endpoint: Optional[str] = None, expired: bool = False, key: Optional[str] = None) -> int:
+        """Delete all entries, or those for one endpoint, key or past expiry; returns the count"""
+        clauses: List[str] = []
+        params: List[Any] = []
+        if endpoint is not None:
+            clauses.append("endpoint = ?")
+            params.append(endpoint)
+        if key is not None:
+            clauses.append("key = ?")
+            params.append(key)
+        if expired:
+            clauses.append("expires_at <= ?")
+            params.append(time.time())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        try:
+            with self._lock:
+                return self.connection.execute(f"DELETE FROM completions{where}", params).rowcount
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Disk cache purge failed: {e}")
+            return 0
+
+    def entries(self, endpoint: Optional[str] = None, limit: int = 20) -> Iterator[Dict[str, Any]]:
+        """Most recently accessed entries, without their values"""
+        where, params = ("WHERE endpoint = ?", [endpoint]) if endpoint is not None else ("", [])
+        now = time.time()
+        rows = self.connection.execute(
+            f"SELECT key, endpoint, size, stored, compressed, expires_at, accessed_at FROM completions "
+            f"{where} ORDER BY accessed_at DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        for key, entry_endpoint, size, stored, compressed, expires_at, accessed_at in rows:
+            yield {
+                "key": key,
+                "endpoint": entry_endpoint,
+                "size": size,
+                "stored": stored,
+                "compressed": bool(compressed),
+                "ttl": round(expires_at - now, 1),
+                "idle": round(now - accessed_at, 1)
+            }
+
+    def stats(self, by_endpoint: bool = False) -> Dict[str, object]:
+        """Size of the shared cache and this process's hit/miss counters"""
+        lookups = self.hits + self.misses
+        stats: Dict[str, object] = {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+            "evictions": self.evictions
+        }
+        try:
+            with self._lock:
+                stats["entries"], stats["bytes"] = self._totals()
+                if by_endpoint:
+                    rows = self.connection.execute(
+                        "SELECT endpoint, COUNT(*), SUM(size), SUM(stored), SUM(expires_at <= ?) "
+                        "FROM completions GROUP BY endpoint ORDER BY endpoint",
+                        (time.time(),)
+                    ).fetchall()
+                    stats["by_endpoint"] = {
+                        endpoint or "default": {
+                            "entries": count,
+                            "size": size,
+                            "stored": stored,
+                            "expired": expired
+                        }
+                        for endpoint, count, size, stored, expired in rows
+                    }
+        except sqlite3.Error as e:
+            stats["error"] = str(e)
+        return stats
+
+
+class TieredCache:
+    """
+    In-process ResponseCache in front of a shared DiskCache
+
+    Reads try memory first, then disk, copying disk hits into memory with
+    their remaining TTL; writes and invalidations go to both. Each lookup
+    counts once in the memory tier's hit/miss statistics, as a hit if
+    either tier had the value.
+
+    DiskCache calls block on SQLite (for up to its busy timeout while
+    another process writes), so the `*_async` methods used on the request
+    path run them in a worker thread.
+    """
+
+    def __init__(self, memory: ResponseCache, disk: DiskCache):
+        self.memory = memory
+        self.disk = disk
+
+    def __len__(self) -> int:
+        return len(self.memory)
+
+    def get(self, key: str, endpoint: Optional[str] = None) -> Optional[str]:
+        value = self.memory.lookup(key)
+        if value is None:
+            value, remaining = self.disk.lookup(key)
+            if value is not None:
+                self.memory.set(key, value, endpoint, ttl=remaining)
+        self.memory.record(endpoint, value is not None)
+        return value
+
+    async def get_async(self, key: str, endpoint: Optional[str] = None) -> Optional[str]:
+        value = self.memory.lookup(key)
+        if value is None:
+            value, remaining = await asyncio.to_thread(self.disk.lookup, key)
+            if value is not None:
+                self.memory.set(key, value, endpoint, ttl=remaining)
+        self.memory.record(endpoint, value is not None)
+        return value
+
+    def get_stale(self, key: str) -> Optional[str]:
+        value = self.memory.get_stale(key)
+        return value if value is not None else self.disk.get_stale(key)
+
+    async def get_stale_async(self, key: str) -> Optional[str]:
+        value = self.memory.get_stale(key)
+        return value if value is not None else await asyncio.to_thread(self.disk.get_stale, key)
+
+    def set(self, key: str, value: str, endpoint: Optional[str] = None) -> None:
+        self.memory.set(key, value, endpoint)
+        self.disk.set(key, value, endpoint)
+
+    async def set_async(self, key: str, value: str, endpoint: Optional[str] = None) -> None:
+        self.memory.set(key, value, endpoint)
+        await asyncio.to_thread(self.disk.set, key, value, endpoint)
+
+    def invalidate(self, key: str) -> None:
+        self.memory.invalidate(key)
+        self.disk.invalidate(key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.disk.clear()
+
+    def stats(self) -> Dict[str, object]:
+        return {**self.memory.stats(), "disk": self.disk.stats()}
+
+    async def stats_async(self) -> Dict[str, object]:
+        return {**self.memory.stats(), "disk": await asyncio.to_thread(self.disk.stats)}
+
+
+def open_disk_cache(path: Optional[str] = None) -> DiskCache:
+    """DiskCache configured from settings"""
+    from app.config import settings
+
+    return DiskCache(
+        path or settings.CACHE_DISK_PATH,
+        max_entries=settings.CACHE_DISK_MAX_ENTRIES,
+        max_bytes=settings.CACHE_DISK_MAX_BYTES,
+        default_ttl=settings.CACHE_DEFAULT_TTL,
+        ttls=settings.cache_ttls_map,
+        stale_ttl=settings.CACHE_STALE_TTL
+    )
+
+
+async def warm(path: str, source: str, chunk: int) -> Tuple[int, int]:
+    """
+    Run batch operations from a JSONL file so their completions get cached
+
+    Each line is a /batch operation, such as {"op": "describe", "songs": [...]};
+    the completions land in the disk cache under the same keys the API uses.
+    Lines that aren't valid operations count as failed. Returns (succeeded, failed).
+    """
+    from app.config import settings
+    from app.services.ai_service import AIService
+
+    settings.CACHE_ENABLED = True
+    settings.CACHE_DISK_PATH = path
+    with open(source, encoding="utf-8") as handle:
+        operations = [json.loads(line) for line in handle if line.strip()]
+
+    service = AIService()
+    await service.startup()
+    succeeded = failed = 0
+    try:
+        for start in range(0, len(operations), chunk):
+            response = await service.run_batch(operations[start:start + chunk])
+            succeeded += response.succeeded
+            failed += response.failed
+    finally:
+        await service.shutdown()
+    return succeeded, failed
+
+
+def main() -> int:
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(
+        description="Inspect, pre-warm and purge the shared disk completion cache"
+    )
+    parser.add_argument("--path", default=settings.CACHE_DISK_PATH, help="Cache database (default: CACHE_DISK_PATH)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Entries, bytes and expired entries per endpoint")
+    listing = commands.add_parser("list", help="Most recently used entries")
+    listing.add_argument("--endpoint")
+    listing.add_argument("--limit", type=int, default=20)
+    show = commands.add_parser("show", help="Print a cached completion")
+    show.add_argument("key")
+    warming = commands.add_parser("warm", help="Run /batch operations from a JSONL file into the cache")
+    warming.add_argument("source")
+    warming.add_argument("--chunk", type=int, default=settings.BATCH_MAX_ITEMS, help="Operations per batch")
+    purge = commands.add_parser("purge", help="Delete entries")
+    scope = purge.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--expired", action="store_true", help="Only entries past their TTL")
+    scope.add_argument("--endpoint", help="Only entries for one endpoint")
+    scope.add_argument("--all", action="store_true", help="Every entry")
+    args = parser.parse_args()
+
+    if not args.path:
+        parser.error("no cache path: pass --path or set CACHE_DISK_PATH")
+
+    if args.command == "warm":
+        succeeded, failed = asyncio.run(warm(args.path, args.source, args.chunk))
+        print(f"Warmed {args.path}: {succeeded} operations succeeded, {failed} failed")
+        return 1 if failed else 0
+
+    cache = open_disk_cache(args.path)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(by_endpoint=True), indent=2))
+    elif args.command == "list":
+        for entry in cache.entries(args.endpoint, args.limit):
+            print(json.dumps(entry))
+    elif args.command == "show":
+        value = cache.get_stale(args.key)
+        if value is None:
+            print(f"No entry for {args.key}", file=sys.stderr)
+            return 1
+        print(value)
+    else:
+        removed = cache.purge(endpoint=args.endpoint, expired=args.expired)
+        print(f"Purged {removed} entries from {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Local text embeddings for songs and search queries
+"""
+import math
+import re
+import unicodedata
+import zlib
+from typing import Dict, Iterable, List
+import numpy as np
+from app.models.song import Song
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "some", "that", "the", "this",
+    "to", "want", "with", "music", "song", "songs", "track", "tracks", "like"
+})
+
+# Relative weight of each song field in its embedding
+FIELD_WEIGHTS: Dict[str, float] = {
+    "title": 1.0,
+    "artist": 1.2,
+    "album": 0.5,
+    "genre": 1.5,
+    "era": 1.0,
+    "lyrics": 0.4
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip accents and split into word tokens without stop words"""
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token for token in TOKEN_PATTERN.findall(text) if token not in STOP_WORDS]
+
+
+def era_tokens(year: int) -> List[str]:
+    """Year, decade and short decade tokens, e.g. 1984 -> 1984, 1980s, 80s"""
+    decade = year // 10 * 10
+    return [str(year), f"{decade}s", f"{decade % 100:02d}s"]
+
+
+class HashingEmbedder:
+    """
+    Hashed-feature vectorizer producing dense, L2-normalized vectors
+
+    Word unigrams and bigrams are hashed into `dim` signed buckets, so no
+    vocabulary has to be fitted or stored and songs can be embedded one batch
+    at a time. Field weights let genre and artist count for more than a
+    passing word in the lyrics. Term frequencies are dampened with a square
+    root so long lyrics don't drown out the other fields.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self._features: Dict[str, tuple] = {}
+
+    def _feature(self, term: str) -> tuple:
+        """Bucket and sign of a term, memoized"""
+        feature = self._features.get(term)
+        if feature is None:
+            digest = zlib.crc32(term.encode("utf-8"))
+            feature = (digest % self.dim, 1.0 if digest & 0x80000000 else -1.0)
+            if len(self._features) < 500_000:
+                self._features[term] = feature
+        return feature
+
+    def _add_terms(self, weights: Dict[str, float], tokens: List[str], weight: float) -> None:
+        terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for term in terms:
+            weights[term] = weights.get(term, 0.0) + weight
+
+    def _embed(self, term_weights: List[Dict[str, float]]) -> np.ndarray:
+        """Hash weighted terms into an (n, dim) matrix and normalize the rows"""
+        indices: List[int] = []
+        values: List[float] = []
+        for i, weights in enumerate(term_weights):
+            offset = i * self.dim
+            for term, weight in weights.items():
+                bucket, sign = self._feature(term)
+                indices.append(offset + bucket)
+                values.append(sign * math.sqrt(weight))
+
+        size = len(term_weights) * self.dim
+        flat = np.bincount(np.asarray(indices, dtype=np.int64), weights=values, minlength=size)
+        return self._normalize(flat.astype(np.float32).reshape(len(term_weights), self.dim))
+
+    def song_terms(self, song: Song) -> Dict[str, float]:
+        """Weighted terms describing a song"""
+        weights: Dict[str, float] = {}
+        self._add_terms(weights, tokenize(song.title), FIELD_WEIGHTS["title"])
+        self._add_terms(weights, tokenize(song.artist), FIELD_WEIGHTS["artist"])
+        if song.album:
+            self._add_terms(weights, tokenize(song.album), FIELD_WEIGHTS["album"])
+        if song.genre:
+            self._add_terms(weights, tokenize(song.genre), FIELD_WEIGHTS["genre"])
+        if song.year:
+            for token in era_tokens(song.year):
+                weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS["era"]
+        if song.lyrics:
+            self._add_terms(weights, tokenize(song.lyrics), FIELD_WEIGHTS["lyrics"])
+        return weights
+
+    def embed_songs(self, songs: Iterable[Song]) -> np.ndarray:
+        """Embed songs into an (n, dim) float32 matrix"""
+        return self._embed([self.song_terms(song) for song in songs])
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a free-text query into a (dim,) float32 vector"""
+        weights: Dict[str, float] = {}
+        self._add_terms(weights, tokenize(query), 1.0)
+        return self._embed([weights])[0]
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix
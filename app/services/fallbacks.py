@@ -0,0 +1,154 @@
+"""
+Deterministic local answers that don't need the AI provider
+"""
+from typing import Dict, List
+from app.models.song import Song
+from app.utils.helpers import (
+    extract_decades,
+    extract_genres,
+    get_dominant_genre,
+    calculate_total_duration,
+    format_duration
+)
+
+
+GENRE_MOODS: Dict[str, List[str]] = {
+    "rock": ["energetic", "rebellious", "powerful"],
+    "metal": ["intense", "aggressive", "cathartic"],
+    "punk": ["rebellious", "raw", "energetic"],
+    "pop": ["upbeat", "catchy", "feel-good"],
+    "dance": ["euphoric", "energetic", "uplifting"],
+    "electronic": ["hypnotic", "energetic", "futuristic"],
+    "hip-hop": ["confident", "rhythmic", "gritty"],
+    "rap": ["confident", "rhythmic", "gritty"],
+    "r&b": ["smooth", "romantic", "soulful"],
+    "soul": ["soulful", "warm", "heartfelt"],
+    "jazz": ["sophisticated", "relaxed", "smooth"],
+    "blues": ["melancholic", "soulful", "raw"],
+    "classical": ["elegant", "contemplative", "dramatic"],
+    "country": ["nostalgic", "heartfelt", "easygoing"],
+    "folk": ["intimate", "reflective", "warm"],
+    "indie": ["dreamy", "introspective", "quirky"],
+    "reggae": ["laid-back", "sunny", "groovy"],
+    "latin": ["passionate", "festive", "rhythmic"],
+    "ambient": ["calm", "atmospheric", "meditative"]
+}
+
+DEFAULT_MOODS = ["eclectic", "varied", "engaging"]
+
+
+def _moods_for(songs: List[Song]) -> List[str]:
+    """Mood tags for the playlist's genres, most common genre first"""
+    moods: List[str] = []
+    genres = [get_dominant_genre(songs)] + extract_genres(songs)
+    for genre in genres:
+        key = genre.lower()
+        for name, genre_moods in GENRE_MOODS.items():
+            if name in key:
+                moods.extend(mood for mood in genre_moods if mood not in moods)
+                break
+        if len(moods) >= 4:
+            break
+    return moods[:5] if moods else list(DEFAULT_MOODS)
+
+
+def _era_phrase(songs: List[Song]) -> str:
+    decades = extract_decades(songs)
+    if not decades:
+        return "across the years"
+    if len(decades) == 1:
+        return f"from the {decades[0]}"
+    return f"spanning the {decades[0]} to the {decades[-1]}"
+
+
+def describe_playlist(songs: List[Song]) -> str:
+    """A plain description built from playlist statistics"""
+    genre = get_dominant_genre(songs)
+    artists = list(dict.fromkeys(song.artist for song in songs))[:3]
+    duration = format_duration(calculate_total_duration(songs))
+    genre_text = "mix" if genre == "Mixed" else f"{genre} collection"
+    count = f"{len(songs)} song" if len(songs) == 1 else f"{len(songs)} songs"
+
+    return (
+        f"{count}: a {genre_text} {_era_phrase(songs)}, "
+        f"featuring {', '.join(artists)}. "
+        f"{duration} of {', '.join(_moods_for(songs)[:2])} listening."
+    )
+
+
+def analyze_mood(songs: List[Song]) -> Dict[str, object]:
+    """Mood tags inferred from genres"""
+    moods = _moods_for(songs)
+    genre = get_dominant_genre(songs)
+    genre_text = "A mix of styles" if genre == "Mixed" else f"Mostly {genre}"
+
+    return {
+        "moods": moods,
+        "description": (
+            f"{genre_text} {_era_phrase(songs)}, with an overall "
+            f"{', '.join(moods[:3])} feel."
+        )
+    }
+
+
+def describe_mood(songs: List[Song], moods: List[str], energy: float, valence: float) -> str:
+    """A mood description built from aggregated song features"""
+    genre = get_dominant_genre(songs)
+    genre_text = "A mix of styles" if genre == "Mixed" else f"Mostly {genre}"
+    if energy < 0.35:
+        energy_text = "low-key"
+    elif energy > 0.65:
+        energy_text = "high-energy"
+    else:
+        energy_text = "moderately paced"
+    if valence < 0.35:
+        tone = "a darker, melancholic tone"
+    elif valence > 0.65:
+        tone = "a bright, positive tone"
+    else:
+        tone = "a balanced emotional tone"
+
+    return (
+        f"{genre_text} {_era_phrase(songs)}, with an overall "
+        f"{', '.join(moods[:3])} feel: {energy_text}, with {tone}."
+    )
+
+
+def generate_playlist_names(songs: List[Song], style: str) -> List[str]:
+    """Three names built from the playlist's genre, era and lead artist"""
+    genre = get_dominant_genre(songs)
+    genre_text = "Eclectic" if genre == "Mixed" else genre
+    decades = extract_decades(songs)
+    era = decades[len(decades) // 2] if decades else "Timeless"
+    mood = _moods_for(songs)[0].title()
+    artist = songs[0].artist
+
+    return [
+        f"{mood} {genre_text}",
+        f"{era} {genre_text} Essentials",
+        f"The {artist} Mix"
+    ]
+
+
+def recommendation_reason(song: Song, anchor: Song) -> str:
+    """Why a song picked from listening data fits, from the playlist song it is played with most"""
+    reason = f"Listeners who play '{anchor.title}' by {anchor.artist} often play this too"
+    if song.genre and song.genre == anchor.genre:
+        reason += f", another {song.genre} pick"
+    return reason + "."
+
+
+def explain_search(query: str, songs: List[Song]) -> str:
+    """A short explanation of catalog search results"""
+    genres = extract_genres(songs)[:3]
+    decades = extract_decades(songs)
+    details = []
+    if genres:
+        details.append(", ".join(genres))
+    if decades:
+        details.append(_era_phrase(songs))
+
+    explanation = f'Catalog songs closest to "{query}" by title, artist, genre, era and lyrics'
+    if details:
+        explanation += f", mostly {' '.join(details)}"
+    return explanation + "."
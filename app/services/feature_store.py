@@ -0,0 +1,381 @@
+"""
+Per-song mood tags, energy and valence, kept by song id
+
+Usage:
+    python -m app.services.feature_store stats [--path features.db]
+    python -m app.services.feature_store enrich songs.jsonl [--path features.db]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.models.song import Song
+from app.services.fallbacks import GENRE_MOODS
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+
+logger = setup_logger(__name__)
+
+feature_lookups = metrics.counter(
+    "song_feature_lookups_total",
+    "Songs looked up in the feature store, by result (stored or missing)",
+    ("result",)
+)
+
+# Tags a song can carry. Fixed so they can be columns of a matrix; includes
+# every tag the local fallbacks use.
+MOOD_TAGS: Tuple[str, ...] = tuple(sorted(
+    {mood for moods in GENRE_MOODS.values() for mood in moods}
+    | {
+        "happy", "sad", "angry", "anxious", "peaceful", "romantic", "dark",
+        "nostalgic", "uplifting", "playful", "hopeful", "bittersweet", "epic",
+        "sensual", "triumphant", "lonely", "euphoric", "calm", "focused",
+        "soothing", "relaxed"
+    }
+))
+MOOD_INDEX: Dict[str, int] = {mood: i for i, mood in enumerate(MOOD_TAGS)}
+
+# A song's tags are listed strongest first; later ones count for less
+TAG_WEIGHTS = np.array([1.0, 0.8, 0.6, 0.5, 0.4], dtype=np.float32)
+MAX_TAGS = len(TAG_WEIGHTS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS song_features (
+    id TEXT PRIMARY KEY,
+    moods TEXT NOT NULL,
+    energy REAL NOT NULL,
+    valence REAL NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class SongFeatures:
+    """Mood features of one song"""
+    moods: List[str]
+    energy: float
+    valence: float
+
+
+@dataclass
+class PlaylistFeatures:
+    """Song features aggregated over a playlist"""
+    moods: List[str]
+    energy: float
+    valence: float
+    coverage: float
+
+
+def parse_features(data: Any) -> Optional[SongFeatures]:
+    """Validate one song's features from an LLM answer; None if unusable"""
+    if not isinstance(data, dict):
+        return None
+    moods = data.get("moods")
+    energy = data.get("energy")
+    valence = data.get("valence")
+    if not isinstance(moods, list) or not all(
+        isinstance(value, (int, float)) and not isinstance(value, bool) for value in (energy, valence)
+    ):
+        return None
+    known = [
+        mood.strip().lower() for mood in moods
+        if isinstance(mood, str) and mood.strip().lower() in MOOD_INDEX
+    ]
+    known = list(dict.fromkeys(known))[:MAX_TAGS]
+    if not known:
+        return None
+    return SongFeatures(
+        moods=known,
+        energy=min(max(float(energy), 0.0), 1.0),
+        valence=min(max(float(valence), 0.0), 1.0)
+    )
+
+
+class FeatureStore:
+    """
+    Song features in memory as arrays, persisted to SQLite by song id
+
+    Mood tags are a weighted row per song over MOOD_TAGS, so a playlist's
+    mood is a mean over its rows. With a `path`, features are written to a
+    SQLite database (WAL mode) that every worker shares: all rows are loaded
+    by `open` (or on first use), and ids missing from memory are looked up
+    there again in case another worker has enriched them since.
+    `lookup_async` and `add_async` read and write the database from a worker
+    thread, so a write waiting on another process's lock never stalls the
+    event loop.
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._rows: Dict[str, int] = {}
+        self._size = 0
+        self._moods = np.zeros((0, len(MOOD_TAGS)), dtype=np.float32)
+        self._energy = np.zeros(0, dtype=np.float32)
+        self._valence = np.zeros(0, dtype=np.float32)
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def connection(self) -> Optional[sqlite3.Connection]:
+        """This process's database connection, opened and loaded on first use"""
+        if not self.path:
+            return None
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+            self._load(connection.execute("SELECT id, moods, energy, valence FROM song_features"))
+        return self._connection
+
+    def open(self) -> int:
+        """Open the database and load its rows ahead of the first lookup; returns the songs held"""
+        self.connection
+        return self._size
+
+    def close(self) -> None:
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def _load(self, rows: Iterable[Tuple[str, str, float, float]]) -> int:
+        features = {
+            song_id: SongFeatures(json.loads(moods), energy, valence)
+            for song_id, moods, energy, valence in rows
+        }
+        self._put(features)
+        return len(features)
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = len(self._energy)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        moods = np.zeros((capacity, len(MOOD_TAGS)), dtype=np.float32)
+        moods[:self._size] = self._moods[:self._size]
+        self._moods = moods
+        for name in ("_energy", "_valence"):
+            current = getattr(self, name)
+            grown = np.zeros(capacity, dtype=current.dtype)
+            grown[:self._size] = current[:self._size]
+            setattr(self, name, grown)
+
+    def _put(self, features: Dict[str, SongFeatures]) -> None:
+        self._reserve(len(features))
+        for song_id, song in features.items():
+            row = self._rows.get(song_id)
+            if row is None:
+                row = self._size
+                self._rows[song_id] = row
+                self._size += 1
+            self._moods[row] = 0.0
+            for rank, mood in enumerate(song.moods[:MAX_TAGS]):
+                index = MOOD_INDEX.get(mood)
+                if index is not None:
+                    self._moods[row, index] = TAG_WEIGHTS[rank]
+            self._energy[row] = song.energy
+            self._valence[row] = song.valence
+
+    def add(self, features: Dict[str, SongFeatures]) -> None:
+        """Store features by song id, replacing earlier ones"""
+        if not features:
+            return
+        # Opening the database loads it, so open it before storing new rows
+        self.open()
+        self._put(features)
+        self._insert(features)
+
+    async def add_async(self, features: Dict[str, SongFeatures]) -> None:
+        """Like `add`, but opening and writing the database in a worker thread"""
+        if not features:
+            return
+        if self.path:
+            await asyncio.to_thread(self.open)
+        self._put(features)
+        if self.path:
+            await asyncio.to_thread(self._insert, features)
+
+    def _insert(self, features: Dict[str, SongFeatures]) -> None:
+        connection = self.connection
+        if connection is None:
+            return
+        now = time.time()
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO song_features (id, moods, energy, valence, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (song_id, json.dumps(song.moods), song.energy, song.valence, now)
+                    for song_id, song in features.items()
+                ]
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Feature store write failed: {e}")
+
+    def get(self, song_id: str) -> Optional[SongFeatures]:
+        row = self._rows.get(song_id)
+        if row is None:
+            return None
+        weights = self._moods[row]
+        order = np.argsort(-weights, kind="stable")
+        return SongFeatures(
+            moods=[MOOD_TAGS[i] for i in order if weights[i] > 0],
+            energy=round(float(self._energy[row]), 3),
+            valence=round(float(self._valence[row]), 3)
+        )
+
+    def lookup(self, songs: List[Song]) -> Tuple[np.ndarray, List[Song]]:
+        """Rows of the songs that have features, and the songs that don't"""
+        self.open()
+        rows, missing = self._split(songs)
+        if missing and self.path:
+            # Another worker may have enriched them since this one loaded
+            self._put(self._select([song.id for song in missing]))
+            rows, missing = self._split(songs)
+        return self._counted(rows, missing)
+
+    async def lookup_async(self, songs: List[Song]) -> Tuple[np.ndarray, List[Song]]:
+        """
+        Like `lookup`, but reading the database in a worker thread
+
+        Songs found in memory cost no thread hop; the database is only read
+        for the ones missing.
+        """
+        rows, missing = self._split(songs)
+        if missing and self.path:
+            self._put(await asyncio.to_thread(self._select, [song.id for song in missing]))
+            rows, missing = self._split(songs)
+        return self._counted(rows, missing)
+
+    def _split(self, songs: List[Song]) -> Tuple[List[int], List[Song]]:
+        rows: List[int] = []
+        missing: List[Song] = []
+        for song in songs:
+            row = self._rows.get(song.id)
+            if row is None:
+                missing.append(song)
+            else:
+                rows.append(row)
+        return rows, missing
+
+    def _select(self, ids: List[str]) -> Dict[str, SongFeatures]:
+        """Stored features of the given song ids, read from the database"""
+        connection = self.connection
+        found: Dict[str, SongFeatures] = {}
+        if connection is None:
+            return found
+        ids = list(dict.fromkeys(ids))
+        try:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                for song_id, moods, energy, valence in connection.execute(
+                    "SELECT id, moods, energy, valence FROM song_features "
+                    f"WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ):
+                    found[song_id] = SongFeatures(json.loads(moods), energy, valence)
+        except sqlite3.Error as e:
+            logger.warning(f"Feature store read failed: {e}")
+        return found
+
+    @staticmethod
+    def _counted(rows: List[int], missing: List[Song]) -> Tuple[np.ndarray, List[Song]]:
+        feature_lookups.inc(len(rows), result="stored")
+        feature_lookups.inc(len(missing), result="missing")
+        return np.asarray(rows, dtype=np.int64), missing
+
+    def aggregate(self, rows: np.ndarray, total: int, top: int = 5) -> PlaylistFeatures:
+        """
+        Playlist mood over the given song rows
+
+        Tags are ranked by mean weight; at least three are kept, and up to
+        `top` as long as they reach a third of the strongest tag's weight.
+        """
+        if not len(rows):
+            return PlaylistFeatures(moods=[], energy=0.5, valence=0.5, coverage=0.0)
+        scores = self._moods[rows].mean(axis=0)
+        order = np.argsort(-scores, kind="stable")[:top]
+        cutoff = scores[order[0]] / 3
+        moods = [
+            MOOD_TAGS[i] for rank, i in enumerate(order)
+            if scores[i] > 0 and (rank < 3 or scores[i] >= cutoff)
+        ]
+        return PlaylistFeatures(
+            moods=moods,
+            energy=float(self._energy[rows].mean()),
+            valence=float(self._valence[rows].mean()),
+            coverage=len(rows) / max(total, 1)
+        )
+
+    def stats(self) -> Dict[str, object]:
+        stats: Dict[str, object] = {"path": self.path or None, "songs": self._size}
+        connection = self.connection
+        if connection is not None:
+            stats["stored"] = connection.execute("SELECT COUNT(*) FROM song_features").fetchone()[0]
+        if self._size:
+            counts = np.count_nonzero(self._moods[:self._size], axis=0)
+            stats["top_moods"] = {
+                MOOD_TAGS[i]: int(counts[i]) for i in np.argsort(-counts)[:10] if counts[i]
+            }
+        return stats
+
+
+async def enrich(path: str, source: str) -> Tuple[int, int]:
+    """Enrich every song in a JSONL, JSON or CSV export; returns (enriched, songs)"""
+    from app.config import settings
+    from app.services.ai_service import AIService
+    from app.services.catalog import read_songs
+
+    settings.FEATURE_STORE_PATH = path
+    songs = list(read_songs(source))
+    service = AIService()
+    await service.startup()
+    chunk = settings.FEATURE_ENRICH_BATCH_SIZE * settings.BATCH_MAX_CONCURRENCY
+    try:
+        for start in range(0, len(songs), chunk):
+            await service.enrich_songs(songs[start:start + chunk])
+    finally:
+        await service.shutdown()
+    _, missing = service.features.lookup(songs)
+    return len(songs) - len(missing), len(songs)
+
+
+def main() -> int:
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Inspect and fill the per-song mood feature store")
+    parser.add_argument("--path", default=settings.FEATURE_STORE_PATH, help="Feature database (default: FEATURE_STORE_PATH)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Songs stored and the most common moods")
+    enriching = commands.add_parser("enrich", help="Enrich the songs in a JSONL, JSON or CSV export")
+    enriching.add_argument("source")
+    args = parser.parse_args()
+
+    if not args.path:
+        parser.error("no feature store path: pass --path or set FEATURE_STORE_PATH")
+
+    if args.command == "enrich":
+        enriched, total = asyncio.run(enrich(args.path, args.source))
+        print(f"{enriched} of {total} songs have features in {args.path}")
+        return 0 if enriched == total else 1
+
+    print(json.dumps(FeatureStore(args.path).stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,107 +1,504 @@
-from groq import Groq
-import json
+from groq import AsyncGroq
+import httpx
 import asyncio
-from typing import Dict, Any, Optional
+import hashlib
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Tuple
 from app.config import settings
-from app.utils.exceptions import ClaudeAPIException, RateLimitException
+from app.services.rate_limiter import RateLimiter
+from app.services.retry import RetryPolicy, classify_error
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.hedging import Hedger
+from app.services.model_router import ModelRouter
+from app.utils.exceptions import AIServiceException, ClaudeAPIException, RateLimitException
+from app.utils.helpers import estimate_tokens
 from app.utils.logger import setup_logger
+from app.utils.metrics import UPSTREAM_BUCKETS, metrics
 
 
 logger = setup_logger(__name__)
 
 
+upstream_latency = metrics.histogram(
+    "upstream_request_duration_seconds",
+    "Time for a single Groq completion call, retries and hedges counted separately",
+    ("model", "outcome"),
+    buckets=UPSTREAM_BUCKETS
+)
+upstream_first_chunk = metrics.histogram(
+    "upstream_stream_first_chunk_seconds",
+    "Time from opening a streamed Groq completion to its first text",
+    ("model",),
+    buckets=UPSTREAM_BUCKETS
+)
+upstream_in_flight = metrics.gauge(
+    "upstream_requests_in_flight",
+    "Groq completion calls currently waiting for an answer",
+    ("model",)
+)
+prompt_tokens_used = metrics.counter(
+    "llm_prompt_tokens_total",
+    "Prompt tokens reported by Groq",
+    ("endpoint", "model")
+)
+completion_tokens_used = metrics.counter(
+    "llm_completion_tokens_total",
+    "Completion tokens reported by Groq",
+    ("endpoint", "model")
+)
+
+
 class GroqService:
     """Service for interacting with Groq API"""
     
     def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
         self.model = settings.GROQ_MODEL
         self.max_tokens = settings.GROQ_MAX_TOKENS
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._client: Optional[AsyncGroq] = None
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=settings.GROQ_RPM_LIMIT,
+            tokens_per_minute=settings.GROQ_TPM_LIMIT,
+            max_wait=settings.RATE_LIMIT_MAX_WAIT
+        )
+        self.retry_policy = RetryPolicy(
+            max_attempts=settings.RETRY_MAX_ATTEMPTS,
+            base_delay=settings.RETRY_BASE_DELAY,
+            max_delay=settings.RETRY_MAX_DELAY,
+            max_total_time=settings.RETRY_MAX_TOTAL_TIME,
+            budget_ratio=settings.RETRY_BUDGET_RATIO,
+            budget_min_per_second=settings.RETRY_BUDGET_MIN_PER_SECOND
+        )
+        self.breaker: Optional[CircuitBreaker] = None
+        if settings.BREAKER_ENABLED:
+            self.breaker = CircuitBreaker(
+                failure_rate_threshold=settings.BREAKER_FAILURE_RATE,
+                slow_call_seconds=settings.BREAKER_SLOW_CALL_SECONDS,
+                slow_call_rate_threshold=settings.BREAKER_SLOW_CALL_RATE,
+                window_size=settings.BREAKER_WINDOW_SIZE,
+                min_calls=settings.BREAKER_MIN_CALLS,
+                open_duration=settings.BREAKER_OPEN_SECONDS,
+                half_open_calls=settings.BREAKER_HALF_OPEN_CALLS
+            )
+        self.hedger: Optional[Hedger] = None
+        if settings.HEDGING_ENABLED:
+            self.hedger = Hedger(
+                percentile=settings.HEDGING_PERCENTILE,
+                budget_ratio=settings.HEDGING_BUDGET_RATIO,
+                min_samples=settings.HEDGING_MIN_SAMPLES,
+                min_delay=settings.HEDGING_MIN_DELAY_MS / 1000,
+                endpoints=set(settings.hedging_endpoints_list)
+            )
+        self.router = ModelRouter(
+            default_model=settings.GROQ_MODEL,
+            tiers=settings.routing_tiers_map,
+            table=settings.routing_table_map,
+            policy=settings.ROUTING_POLICY,
+            explore=settings.ROUTING_EXPLORE_RATIO,
+            min_samples=settings.ROUTING_MIN_SAMPLES
+        )
+        # Running average of completion sizes, used to estimate token usage up front
+        self._avg_completion_tokens = 256.0
+    
+    async def open(self) -> None:
+        """Open the shared HTTP connection pool and async Groq client"""
+        if self._client is not None:
+            return
+        
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.GROQ_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GROQ_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.GROQ_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.GROQ_CONNECT_TIMEOUT,
+                read=settings.GROQ_READ_TIMEOUT,
+                write=settings.GROQ_WRITE_TIMEOUT,
+                pool=settings.GROQ_POOL_TIMEOUT
+            )
+        )
+        self._client = AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            base_url=settings.GROQ_BASE_URL,
+            # Retries are handled by RetryPolicy so they respect our budgets
+            max_retries=0,
+            http_client=self._http_client
+        )
+        logger.info(
+            f"Groq connection pool opened "
+            f"(max_connections={settings.GROQ_MAX_CONNECTIONS}, "
+            f"keepalive={settings.GROQ_MAX_KEEPALIVE_CONNECTIONS})"
+        )
+    
+    async def close(self) -> None:
+        """Close the async Groq client and release pooled connections"""
+        if self._client is None:
+            return
+        
+        await self._client.close()
+        self._client = None
+        self._http_client = None
+        logger.info("Groq connection pool closed")
+    
+    @property
+    def client(self) -> AsyncGroq:
+        """The async Groq client (the pool must be opened first)"""
+        if self._client is None:
+            raise ClaudeAPIException("Groq client is not open")
+        return self._client
     
     async def generate_completion(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: float = 1.0,
-        json_mode: bool = False
+        json_mode: bool = False,
+        endpoint: Optional[str] = None,
+        validate: Optional[Callable[[Any], bool]] = None
     ) -> str:
         """
         Generate a completion using Groq API
         
+        The model comes from the router. In JSON mode, an answer that doesn't
+        parse, or that `validate` rejects, is sent again to the next larger
+        model tier; the largest tier's answer is returned as it is.
+        
         Args:
             prompt: The user prompt
             system_prompt: Optional system prompt
             temperature: Sampling temperature (0-1)
             json_mode: If True, instructs Groq to return only JSON
+            endpoint: Name of the calling feature, used for logging and metrics
+            validate: Optional check of the parsed JSON answer
             
         Returns:
             The generated text response
         """
         try:
-            logger.info(f"Generating completion with model {self.model}")
-            
-            messages = []
-            
-            # Prepare system and user prompts
-            system_content = system_prompt or ""
-            user_content = prompt
+            models = self.router.route(endpoint)
+            for i, model in enumerate(models):
+                content = await self._generate(prompt, system_prompt, temperature, json_mode, endpoint, model)
+                if not json_mode or i == len(models) - 1 or self._is_valid_json(content, validate):
+                    return content
+                logger.warning(f"Invalid JSON answer from {model} for {endpoint}, escalating to {models[i + 1]}")
+                self.router.escalated(endpoint, models[i + 1])
+        except Exception as e:
+            raise self._map_error(e)
+    
+    async def _generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: float,
+        json_mode: bool,
+        endpoint: Optional[str],
+        model: str
+    ) -> str:
+        """One completion from `model`, with rate limiting, retries, hedging and the circuit breaker"""
+        logger.info(f"Generating completion with model {model} for {endpoint or 'default'}")
+        
+        kwargs = self._build_request(prompt, system_prompt, temperature, json_mode, model)
+        
+        if self._client is None:
+            await self.open()
+        
+        async def attempt() -> Any:
+            # Every attempt, including retries, is charged to the rate limiter
+            prompt_tokens, reserved = await self._reserve_tokens(kwargs)
+            upstream_in_flight.inc(model=model)
+            started = time.monotonic()
+            try:
+                response = await self.client.chat.completions.create(**kwargs)
+            except BaseException as e:
+                # Hedges that lose the race are cancelled rather than failed
+                outcome = "cancelled" if isinstance(e, asyncio.CancelledError) else "error"
+                upstream_latency.observe(time.monotonic() - started, model=model, outcome=outcome)
+                # Nothing was generated, so give the token reservation back
+                self.rate_limiter.reconcile(reserved, 0)
+                raise
+            finally:
+                upstream_in_flight.dec(model=model)
+            elapsed = time.monotonic() - started
+            upstream_latency.observe(elapsed, model=model, outcome="ok")
+            self.router.observe(endpoint, model, elapsed)
+            self._record_usage(reserved, prompt_tokens, response.usage, response.choices[0].message.content)
+            self._count_tokens(endpoint, model, response.usage)
+            return response
+        
+        async def with_retries() -> Any:
+            if self.hedger is not None:
+                return await self.retry_policy.run(
+                    lambda: self.hedger.run(attempt, endpoint=endpoint),
+                    endpoint=endpoint
+                )
+            return await self.retry_policy.run(attempt, endpoint=endpoint)
+        
+        response = await self._through_breaker(with_retries)
+        
+        # Extract text from response (OpenAI format)
+        content = response.choices[0].message.content
+        
+        logger.info("Completion generated successfully")
+        return content
+    
+    def _is_valid_json(self, content: str, validate: Optional[Callable[[Any], bool]]) -> bool:
+        """Whether an answer parses as JSON and passes `validate`; a validator that raises rejects it"""
+        try:
+            data = self._load_json(content)
+        except json.JSONDecodeError:
+            return False
+        if validate is None:
+            return True
+        try:
+            return bool(validate(data))
+        except Exception as e:
+            logger.warning(f"Answer validation failed with {type(e).__name__}: {e}")
+            return False
+    
+    async def stream_completion(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 1.0,
+        json_mode: bool = False,
+        endpoint: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a completion from Groq API token by token
+        
+        The upstream stream is only read as fast as the caller consumes it,
+        and it is closed when the caller stops iterating. Like single calls,
+        streams count as in flight until they end, and their time to first
+        text and total duration are recorded; a stream that completes is
+        reported to the model router as one latency sample.
+        
+        Args:
+            prompt: The user prompt
+            system_prompt: Optional system prompt
+            temperature: Sampling temperature (0-1)
+            json_mode: If True, instructs the model to return only JSON
+            endpoint: Name of the calling feature, used for logging and metrics
             
-            # Add JSON mode instruction if requested
-            if json_mode:
-                json_instruction = "\n\nIMPORTANT: You must respond with valid JSON only, no markdown, no code blocks, just raw JSON."
-                if system_content:
-                    system_content = system_content + json_instruction
-                else:
-                    user_content = user_content + json_instruction
+        Yields:
+            Text deltas as they are generated
+        """
+        stream = None
+        try:
+            # A streamed answer can't be taken back, so it is never escalated
+            model = self.router.route(endpoint)[0]
+            logger.info(f"Streaming completion with model {model} for {endpoint or 'default'}")
             
-            if system_content:
-                messages.append({"role": "system", "content": system_content})
+            kwargs = self._build_request(prompt, system_prompt, temperature, json_mode, model)
+            # Groq doesn't support response_format together with streaming, so
+            # JSON output relies on the prompt instruction alone
+            kwargs.pop("response_format", None)
             
-            messages.append({"role": "user", "content": user_content})
+            if self._client is None:
+                await self.open()
             
-            kwargs: Dict[str, Any] = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": self.max_tokens,
-            }
+            prompt_tokens, reserved = await self._reserve_tokens(kwargs)
             
-            # Add JSON mode if requested (Groq supports response_format)
-            if json_mode:
-                kwargs["response_format"] = {"type": "json_object"}
+            generated: List[str] = []
+            started = 0.0
+            outcome = "error"
             
-            # Run synchronous API call in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(**kwargs)
-            )
+            async def open_stream() -> Any:
+                nonlocal started
+                started = time.monotonic()
+                try:
+                    return await self.client.chat.completions.create(stream=True, **kwargs)
+                except BaseException as e:
+                    failed = "cancelled" if isinstance(e, asyncio.CancelledError) else "error"
+                    upstream_latency.observe(time.monotonic() - started, model=model, outcome=failed)
+                    raise
             
-            # Extract text from response (OpenAI format)
-            content = response.choices[0].message.content
+            upstream_in_flight.inc(model=model)
+            try:
+                # Only opening the stream is retried; once tokens have been
+                # sent to the caller a failure is reported as-is
+                stream = await self._through_breaker(
+                    lambda: self.retry_policy.run(open_stream, endpoint=endpoint)
+                )
+                
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not generated:
+                            upstream_first_chunk.observe(time.monotonic() - started, model=model)
+                        generated.append(delta)
+                        yield delta
+                outcome = "ok"
+            except (GeneratorExit, asyncio.CancelledError):
+                outcome = "cancelled"
+                raise
+            finally:
+                upstream_in_flight.dec(model=model)
+                if stream is not None:
+                    elapsed = time.monotonic() - started
+                    upstream_latency.observe(elapsed, model=model, outcome=outcome)
+                    if outcome == "ok":
+                        self.router.observe(endpoint, model, elapsed)
+                # Streams don't report usage, so settle the estimate with what was generated
+                self._record_usage(reserved, prompt_tokens, None, "".join(generated))
             
-            logger.info("Completion generated successfully")
-            return content
+            logger.info("Completion stream finished")
             
+        except (GeneratorExit, asyncio.CancelledError):
+            raise
         except Exception as e:
-            error_str = str(e)
-            # Check for rate limit errors
-            if "rate limit" in error_str.lower() or "429" in error_str:
-                logger.error(f"Rate limit error: {error_str}")
-                raise RateLimitException()
-            # Check for API errors
-            elif "api" in error_str.lower() or "401" in error_str or "403" in error_str:
-                logger.error(f"Groq API error: {error_str}")
-                raise ClaudeAPIException(f"Groq API Error: {error_str}")
+            raise self._map_error(e)
+        finally:
+            if stream is not None:
+                await stream.close()
+    
+    async def _through_breaker(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run an upstream call through the circuit breaker, if enabled"""
+        if self.breaker is None:
+            return await fn()
+        return await self.breaker.call(fn, is_failure=self._is_outage_error)
+    
+    @staticmethod
+    def _is_outage_error(error: Exception) -> bool:
+        """Whether an error suggests the upstream is unhealthy"""
+        retryable, reason, _ = classify_error(error)
+        # Upstream throttling is handled by the rate limiter, not the breaker
+        return retryable and reason != "429"
+    
+    def _estimate_prompt_tokens(self, kwargs: Dict[str, Any]) -> int:
+        """Estimate prompt tokens before calling upstream"""
+        return sum(estimate_tokens(message["content"]) for message in kwargs["messages"])
+    
+    async def _reserve_tokens(self, kwargs: Dict[str, Any]) -> Tuple[int, int]:
+        """
+        Wait for rate limit budget for a request
+        
+        Returns the estimated prompt tokens and the total reserved, which
+        includes the running average completion size.
+        """
+        prompt_tokens = self._estimate_prompt_tokens(kwargs)
+        reserved = prompt_tokens + int(self._avg_completion_tokens)
+        await self.rate_limiter.acquire(reserved)
+        return prompt_tokens, reserved
+    
+    def _record_usage(self, reserved: int, prompt_tokens: int, usage: Any, content: Optional[str]) -> None:
+        """Reconcile the rate limiter with actual usage and update the estimate"""
+        if usage is not None and getattr(usage, "total_tokens", None) is not None:
+            completion_tokens = usage.completion_tokens or 0
+            actual = usage.total_tokens
+        else:
+            completion_tokens = estimate_tokens(content or "")
+            actual = prompt_tokens + completion_tokens
+        
+        self._avg_completion_tokens = 0.9 * self._avg_completion_tokens + 0.1 * completion_tokens
+        self.rate_limiter.reconcile(reserved, actual)
+    
+    @staticmethod
+    def _count_tokens(endpoint: Optional[str], model: str, usage: Any) -> None:
+        """Add the tokens Groq reports for a completion to the token counters"""
+        if usage is None:
+            return
+        endpoint = endpoint or "default"
+        prompt_tokens_used.inc(getattr(usage, "prompt_tokens", None) or 0, endpoint=endpoint, model=model)
+        completion_tokens_used.inc(getattr(usage, "completion_tokens", None) or 0, endpoint=endpoint, model=model)
+    
+    def _build_request(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: float,
+        json_mode: bool,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build chat completion arguments"""
+        messages = []
+        
+        # Prepare system and user prompts
+        system_content = system_prompt or ""
+        user_content = prompt
+        
+        # Add JSON mode instruction if requested
+        if json_mode:
+            json_instruction = "\n\nIMPORTANT: You must respond with valid JSON only, no markdown, no code blocks, just raw JSON."
+            if system_content:
+                system_content = system_content + json_instruction
             else:
-                logger.error(f"Unexpected error: {error_str}")
-                raise ClaudeAPIException(f"Unexpected error: {error_str}")
+                user_content = user_content + json_instruction
+        
+        if system_content:
+            messages.append({"role": "system", "content": system_content})
+        
+        messages.append({"role": "user", "content": user_content})
+        
+        kwargs: Dict[str, Any] = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": self.max_tokens,
+        }
+        
+        # Add JSON mode if requested (Groq supports response_format)
+        if json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        
+        return kwargs
+    
+    def _map_error(self, e: Exception) -> AIServiceException:
+        """Translate an upstream error into a service exception"""
+        if isinstance(e, AIServiceException):
+            return e
+        
+        error_str = str(e)
+        # Check for rate limit errors
+        if "rate limit" in error_str.lower() or "429" in error_str:
+            logger.error(f"Rate limit error: {error_str}")
+            return RateLimitException()
+        # Check for API errors
+        elif "api" in error_str.lower() or "401" in error_str or "403" in error_str:
+            logger.error(f"Groq API error: {error_str}")
+            return ClaudeAPIException(f"Groq API Error: {error_str}")
+        else:
+            logger.error(f"Unexpected error: {error_str}")
+            return ClaudeAPIException(f"Unexpected error: {error_str}")
+    
+    def fingerprint(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 1.0,
+        json_mode: bool = False,
+        endpoint: Optional[str] = None
+    ) -> str:
+        """
+        Stable key identifying a completion request
+        
+        Covers everything that changes the upstream answer: the routing
+        policy and the models the endpoint may be routed or escalated to,
+        system prompt, user prompt, temperature and JSON mode.
+        """
+        payload = json.dumps(
+            [
+                self.router.policy,
+                self.router.ladder(endpoint),
+                system_prompt or "",
+                prompt,
+                round(temperature, 4),
+                json_mode
+            ],
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
     
     async def generate_json_completion(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
-        temperature: float = 1.0
+        temperature: float = 1.0,
+        endpoint: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate a completion and parse it as JSON
@@ -110,6 +507,7 @@ class GroqService:
             prompt: The user prompt
             system_prompt: Optional system prompt
             temperature: Sampling temperature
+            endpoint: Name of the calling feature
             
         Returns:
             Parsed JSON response as dictionary
@@ -118,24 +516,39 @@ class GroqService:
             prompt=prompt,
             system_prompt=system_prompt,
             temperature=temperature,
-            json_mode=True
+            json_mode=True,
+            endpoint=endpoint
         )
         
+        return self.parse_json_response(response)
+    
+    @staticmethod
+    def parse_json_response(response: str) -> Any:
+        """
+        Parse a completion as JSON, tolerating markdown code fences
+        
+        Raises:
+            ClaudeAPIException: If the response is not valid JSON
+        """
         try:
-            # Try to extract JSON from code blocks if present
-            if "```json" in response:
-                json_start = response.find("```json") + 7
-                json_end = response.find("```", json_start)
-                json_str = response[json_start:json_end].strip()
-            elif "```" in response:
-                json_start = response.find("```") + 3
-                json_end = response.find("```", json_start)
-                json_str = response[json_start:json_end].strip()
-            else:
-                json_str = response.strip()
-            
-            return json.loads(json_str)
+            return GroqService._load_json(response)
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON response: {response}")
             raise ClaudeAPIException(f"Failed to parse JSON response: {str(e)}")
-
+    
+    @staticmethod
+    def _load_json(response: str) -> Any:
+        """Load a completion as JSON, tolerating markdown code fences"""
+        # Try to extract JSON from code blocks if present
+        if "```json" in response:
+            json_start = response.find("```json") + 7
+            json_end = response.find("```", json_start)
+            json_str = response[json_start:json_end].strip()
+        elif "```" in response:
+            json_start = response.find("```") + 3
+            json_end = response.find("```", json_start)
+            json_str = response[json_start:json_end].strip()
+        else:
+            json_str = response.strip()
+        
+        return json.loads(json_str)
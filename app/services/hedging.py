@@ -0,0 +1,184 @@
+"""
+Hedged upstream requests to cut tail latency
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+
+logger = setup_logger(__name__)
+
+
+hedges_fired = metrics.counter(
+    "hedge_requests_total",
+    "Second attempts fired because the first was slower than the hedge threshold",
+    ("endpoint",)
+)
+hedges_won = metrics.counter(
+    "hedge_wins_total",
+    "Hedged calls where the second attempt answered first",
+    ("endpoint",)
+)
+hedge_budget_exhausted = metrics.counter(
+    "hedge_budget_exhausted_total",
+    "Hedges skipped because the hedge budget was used up",
+    ("endpoint",)
+)
+
+
+# Log-spaced latency buckets from 5 ms to roughly 4 minutes
+LATENCY_BUCKETS: List[float] = [0.005 * (1.2 ** i) for i in range(60)]
+
+
+class LatencyTracker:
+    """
+    Streaming latency histogram biased towards recent observations
+
+    Counts are halved every `decay_every` observations, so old traffic fades
+    out and percentiles follow the current upstream behaviour.
+    """
+
+    def __init__(self, decay_every: int = 1000):
+        self.decay_every = decay_every
+        self.counts = [0.0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.observations = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += 1
+        self.observations += 1
+        if self.observations % self.decay_every == 0:
+            self.counts = [count / 2 for count in self.counts]
+            self.total /= 2
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th percentile (0-100)"""
+        if self.total <= 0:
+            return None
+        target = self.total * q / 100
+        cumulative = 0.0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+        return LATENCY_BUCKETS[-1]
+
+
+class HedgeBudget:
+    """Caps hedges to a fraction of primary calls"""
+
+    def __init__(self, ratio: float = 0.05, capacity: float = 10.0):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.balance = 1.0
+
+    def deposit(self) -> None:
+        self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        if self.balance >= 1:
+            self.balance -= 1
+            return True
+        return False
+
+
+class Hedger:
+    """
+    Fire a second identical attempt when the first one is unusually slow
+
+    The hedge is sent once the first attempt has been running longer than
+    the configured percentile of recent latency for its endpoint. Whichever
+    attempt succeeds first wins; the other is cancelled and awaited.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget_ratio: float = 0.05,
+        min_samples: int = 20,
+        min_delay: float = 0.05,
+        endpoints: Optional[Set[str]] = None
+    ):
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.endpoints = endpoints
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self._budgets: Dict[str, HedgeBudget] = {}
+
+    def tracker(self, endpoint: str) -> LatencyTracker:
+        tracker = self._trackers.get(endpoint)
+        if tracker is None:
+            tracker = LatencyTracker()
+            self._trackers[endpoint] = tracker
+        return tracker
+
+    def _budget(self, endpoint: str) -> HedgeBudget:
+        budget = self._budgets.get(endpoint)
+        if budget is None:
+            budget = HedgeBudget(self.budget_ratio)
+            self._budgets[endpoint] = budget
+        return budget
+
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None if hedging doesn't apply"""
+        if self.endpoints is not None and endpoint not in self.endpoints:
+            return None
+        tracker = self.tracker(endpoint)
+        if tracker.observations < self.min_samples:
+            return None
+        delay = tracker.percentile(self.percentile)
+        return max(delay, self.min_delay) if delay is not None else None
+
+    async def run(self, fn: Callable[[], Awaitable[Any]], endpoint: Optional[str] = None) -> Any:
+        """Call `fn`, hedging with a second call if the first is slow"""
+        label = endpoint or "default"
+        tracker = self.tracker(label)
+        budget = self._budget(label)
+        budget.deposit()
+        delay = self.hedge_delay(label)
+        started = time.monotonic()
+
+        primary = asyncio.ensure_future(fn())
+        tasks = [primary]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    if budget.try_withdraw():
+                        hedges_fired.inc(endpoint=label)
+                        logger.info(f"Hedging {label} after {delay * 1000:.0f} ms")
+                        tasks.append(asyncio.ensure_future(fn()))
+                    else:
+                        hedge_budget_exhausted.inc(endpoint=label)
+
+            winner = await self._first_success(tasks)
+            if winner.exception() is None:
+                tracker.observe(time.monotonic() - started)
+                if winner is not primary:
+                    hedges_won.inc(endpoint=label)
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # Let cancelled attempts unwind, so their connections go back to
+            # the pool before the next call, and collect every attempt's error
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _first_success(tasks: List[asyncio.Task]) -> asyncio.Task:
+        """Wait for the first task that succeeds, or the last one to fail"""
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task
+            if not pending:
+                return done.pop()
@@ -0,0 +1,428 @@
+"""
+Item-to-item song recommendations learned from playlist co-occurrence
+
+Usage:
+    python -m app.services.item_recommender build playlists.jsonl directory [--neighbors 100] [--factors 64]
+    python -m app.services.item_recommender recommend directory SONG_ID [SONG_ID ...] [--limit 10]
+"""
+import argparse
+import json
+import os
+import sys
+from array import array
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import numpy as np
+from app.services.catalog_store import StringHeap, id_hash, load_array
+from app.utils.helpers import save_array
+from app.utils.logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+
+FORMAT_VERSION = 1
+
+# Who picks recommend-songs' songs: the LLM, or this model with reasons
+# written by the LLM ("local") or built locally ("fast")
+RECOMMEND_MODES = ("llm", "local", "fast")
+
+# Songs kept per playlist when counting co-occurrence, which costs the
+# square of a playlist's length
+MAX_PLAYLIST_SONGS = 1000
+
+# Pairs seen together in few playlists have their cosine similarity shrunk
+# by shared / (shared + SHRINKAGE), so one chance co-occurrence of two rare
+# songs doesn't outrank a well-supported pair
+SHRINKAGE = 5.0
+
+# Randomized SVD: extra sampled dimensions and power iterations
+OVERSAMPLING = 10
+POWER_ITERATIONS = 2
+
+# Rows of a sparse product summed per step, to bound temporary memory
+SEGMENT_CHUNK = 1 << 20
+
+# Neighbor lists are summed over the whole catalog once they hold at least
+# 1 / DENSE_SCORING as many entries as it has songs
+DENSE_SCORING = 16
+
+# Candidates ranked up front per requested song; more are ranked only if
+# too many of them are rejected
+CANDIDATE_FACTOR = 4
+
+
+@dataclass
+class ItemScore:
+    """A recommended song, its score and the playlist song it is most similar to"""
+    song_id: str
+    score: float
+    because: str
+
+
+def read_playlists(path: str) -> Iterator[List[str]]:
+    """
+    Song ids of each playlist in a JSONL export
+
+    Each line is either an object with a `song_ids` list (other keys, such
+    as a playlist id, are ignored) or a bare list of song ids.
+    """
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            song_ids = record.get("song_ids") if isinstance(record, dict) else record
+            if not isinstance(song_ids, list):
+                raise ValueError(f"Playlist without a song_ids list in {path}: {line[:80]}")
+            yield [str(song_id) for song_id in song_ids]
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenated positions starts[i] .. starts[i] + lengths[i] - 1"""
+    ends = np.cumsum(lengths)
+    return np.arange(int(ends[-1]) if len(ends) else 0) + np.repeat(starts - ends + lengths, lengths)
+
+
+def _segment_sums(offsets: np.ndarray, columns: np.ndarray, dense: np.ndarray) -> np.ndarray:
+    """Row r is the sum of dense[columns[offsets[r]:offsets[r + 1]]]; no row may be empty"""
+    rows = len(offsets) - 1
+    result = np.empty((rows, dense.shape[1]), dtype=dense.dtype)
+    start = 0
+    while start < rows:
+        stop = int(np.searchsorted(offsets, offsets[start] + SEGMENT_CHUNK, side="right")) - 1
+        stop = min(max(stop, start + 1), rows)
+        first, last = offsets[start], offsets[stop]
+        result[start:stop] = np.add.reduceat(dense[columns[first:last]], offsets[start:stop] - first, axis=0)
+        start = stop
+    return result
+
+
+class ItemRecommender:
+    """
+    Songs recommended for a playlist by how often they share playlists with
+    its songs
+
+    Each song keeps its most similar songs, by cosine similarity of the sets
+    of playlists they appear in, as a sparse neighbor list. A playlist is
+    scored by summing the neighbor lists of every song in it, so only songs
+    that co-occur with the playlist get a score. Optionally, songs also get
+    low-rank embeddings from a truncated SVD of the playlist-song matrix;
+    these score every song against the playlist's mean embedding, reaching
+    songs two or more playlists away, and are blended in with a weight.
+
+    Built offline from a playlist export, saved to a directory and opened
+    memory-mapped.
+    """
+
+    def __init__(
+        self,
+        ids: StringHeap,
+        id_hashes: np.ndarray,
+        id_items: np.ndarray,
+        counts: np.ndarray,
+        offsets: np.ndarray,
+        neighbors: np.ndarray,
+        weights: np.ndarray,
+        factors: Optional[np.ndarray] = None
+    ):
+        self.ids = ids
+        self._id_hashes = id_hashes
+        self._id_items = id_items
+        # Playlists each song appears in
+        self.counts = counts
+        # Song i's neighbors, most similar first, are
+        # neighbors[offsets[i]:offsets[i + 1]] with their similarities in weights
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.weights = weights
+        # Unit-length song embeddings, or None
+        self.factors = factors
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    @classmethod
+    def build(
+        cls,
+        playlists: Iterable[List[str]],
+        neighbors: int = 100,
+        factors: int = 0,
+        seed: int = 0
+    ) -> "ItemRecommender":
+        """
+        Learn song neighbors, and `factors`-dimensional embeddings if
+        non-zero, from the song ids of each playlist
+
+        Playlists with fewer than two distinct songs say nothing about
+        co-occurrence and are skipped.
+        """
+        items: Dict[str, int] = {}
+        playlist_offsets = array("q", [0])
+        playlist_items = array("i")
+        for playlist in playlists:
+            song_ids = list(dict.fromkeys(playlist))[:MAX_PLAYLIST_SONGS]
+            if len(song_ids) < 2:
+                continue
+            playlist_items.extend(items.setdefault(song_id, len(items)) for song_id in song_ids)
+            playlist_offsets.append(len(playlist_items))
+
+        count = len(items)
+        indptr = np.frombuffer(playlist_offsets, dtype=np.int64)
+        indices = np.frombuffer(playlist_items, dtype=np.int32)
+        counts = np.bincount(indices, minlength=count).astype(np.int32)
+
+        # The transpose: playlists of each song
+        order = np.argsort(indices, kind="stable")
+        song_playlists = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))[order]
+        song_offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(counts, out=song_offsets[1:])
+
+        neighbor_offsets = np.zeros(count + 1, dtype=np.int64)
+        neighbor_items = array("i")
+        neighbor_weights = array("f")
+        for item in range(count):
+            listed = song_playlists[song_offsets[item]:song_offsets[item + 1]]
+            starts = indptr[listed]
+            others, shared = np.unique(indices[_ranges(starts, indptr[listed + 1] - starts)], return_counts=True)
+            keep = others != item
+            others, shared = others[keep], shared[keep].astype(np.float32)
+            similarity = shared / np.sqrt(float(counts[item]) * counts[others]) * (shared / (shared + SHRINKAGE))
+            if len(others) > neighbors:
+                top = np.argpartition(-similarity, neighbors - 1)[:neighbors]
+                others, similarity = others[top], similarity[top]
+            ranked = np.argsort(-similarity, kind="stable")
+            neighbor_items.extend(others[ranked].tolist())
+            neighbor_weights.extend(similarity[ranked].tolist())
+            neighbor_offsets[item + 1] = len(neighbor_items)
+
+        embeddings = None
+        if factors > 0 and count > factors:
+            embeddings = _factorize(indptr, indices, song_offsets, song_playlists, counts, factors, seed)
+
+        ids = StringHeap.build(items)
+        hashes = np.fromiter((id_hash(song_id) for song_id in items), dtype=np.int64, count=count)
+        order = np.argsort(hashes, kind="stable")
+        logger.info(f"Learned neighbors of {count} songs from {len(indptr) - 1} playlists")
+        return cls(
+            ids,
+            hashes[order],
+            order.astype(np.int64),
+            counts,
+            neighbor_offsets,
+            np.frombuffer(neighbor_items, dtype=np.int32),
+            np.frombuffer(neighbor_weights, dtype=np.float32),
+            embeddings
+        )
+
+    def lookup(self, song_ids: List[str]) -> np.ndarray:
+        """Items of the given songs, skipping songs that appear in no playlist"""
+        if not len(self) or not song_ids:
+            return np.zeros(0, dtype=np.int64)
+        hashes = np.fromiter((id_hash(song_id) for song_id in song_ids), dtype=np.int64, count=len(song_ids))
+        positions = np.minimum(np.searchsorted(self._id_hashes, hashes), len(self._id_hashes) - 1)
+        found = []
+        for song_id, target, position, item in zip(
+            song_ids,
+            hashes.tolist(),
+            positions.tolist(),
+            self._id_items[positions].tolist()
+        ):
+            # Songs sharing a hash are adjacent; the first is almost always it
+            while self.ids.get(item) != song_id:
+                position += 1
+                if position == len(self._id_hashes) or self._id_hashes[position] != target:
+                    break
+                item = int(self._id_items[position])
+            else:
+                found.append(item)
+        return np.unique(np.asarray(found, dtype=np.int64))
+
+    def recommend(
+        self,
+        items: np.ndarray,
+        limit: int,
+        factor_weight: float = 0.0,
+        accept: Optional[Callable[[str], bool]] = None
+    ) -> List[ItemScore]:
+        """
+        Up to `limit` songs for a playlist of `items`, best first
+
+        A song's score is its mean similarity to the playlist's songs, blended
+        with the cosine between its embedding and the playlist's as
+        (1 - `factor_weight`) * similarity + `factor_weight` * cosine when
+        the recommender has embeddings. Songs in the playlist are never
+        recommended, nor songs for which `accept` returns False.
+        """
+        if not len(items):
+            return []
+        starts = self.offsets[items]
+        lengths = self.offsets[items + 1] - starts
+        positions = _ranges(starts, lengths)
+        owners = np.repeat(items, lengths)
+        neighbors = self.neighbors[positions]
+        weights = self.weights[positions]
+
+        # Embeddings score every song, and so do long neighbor lists next to
+        # the catalog's size; otherwise only the songs the lists reach
+        use_factors = self.factors is not None and factor_weight > 0
+        if use_factors or len(neighbors) * DENSE_SCORING >= len(self):
+            candidates = np.arange(len(self))
+            scores = np.bincount(neighbors, weights, minlength=len(self)).astype(np.float32) / len(items)
+            scores[items] = 0
+        else:
+            candidates, inverse = np.unique(neighbors, return_inverse=True)
+            scores = np.bincount(inverse, weights).astype(np.float32) / len(items)
+            scores[np.isin(candidates, items, assume_unique=True)] = 0
+        if use_factors:
+            profile = self.factors[items].mean(axis=0)
+            profile /= max(float(np.linalg.norm(profile)), 1e-12)
+            scores *= 1 - factor_weight
+            scores += np.maximum(self.factors @ profile, 0) * factor_weight
+            scores[items] = 0
+
+        # Rank the best candidates, and more of them only if `accept` turns
+        # down too many
+        picked: List[int] = []
+        checked = set()
+        count = min(len(candidates), limit * CANDIDATE_FACTOR)
+        while len(picked) < limit and len(checked) < count:
+            top = np.argpartition(-scores, count - 1)[:count] if count < len(candidates) else np.arange(count)
+            for index in top[np.argsort(-scores[top], kind="stable")].tolist():
+                if scores[index] <= 0 or len(picked) == limit:
+                    break
+                if index in checked:
+                    continue
+                checked.add(index)
+                if accept is None or accept(self.ids.get(int(candidates[index]))):
+                    picked.append(index)
+            else:
+                count = min(len(candidates), count * CANDIDATE_FACTOR)
+                continue
+            break
+
+        results = []
+        for index in picked:
+            item = int(candidates[index])
+            contributions = weights[neighbors == item]
+            if len(contributions):
+                anchor = int(owners[neighbors == item][np.argmax(contributions)])
+            else:
+                anchor = int(items[np.argmax(self.factors[items] @ self.factors[item])])
+            results.append(ItemScore(self.ids.get(item), round(float(scores[index]), 4), self.ids.get(anchor)))
+        return results
+
+    def save(self, directory: str) -> None:
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        self.ids.save(path, "id")
+        save_array(path / "id_hashes.npy", self._id_hashes)
+        save_array(path / "id_items.npy", self._id_items)
+        save_array(path / "counts.npy", self.counts)
+        save_array(path / "offsets.npy", self.offsets)
+        save_array(path / "neighbors.npy", self.neighbors)
+        save_array(path / "weights.npy", self.weights)
+        if self.factors is not None:
+            save_array(path / "factors.npy", self.factors)
+        meta = {
+            "version": FORMAT_VERSION,
+            "songs": len(self),
+            "factors": self.factors.shape[1] if self.factors is not None else 0
+        }
+        tmp_path = path / "recommender.json.tmp"
+        tmp_path.write_text(json.dumps(meta))
+        os.replace(tmp_path, path / "recommender.json")
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        meta_path = Path(directory) / "recommender.json"
+        return meta_path.exists() and json.loads(meta_path.read_text()).get("version") == FORMAT_VERSION
+
+    @classmethod
+    def load(cls, directory: str) -> "ItemRecommender":
+        path = Path(directory)
+        meta = json.loads((path / "recommender.json").read_text())
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported recommender version {meta.get('version')} in {directory}")
+        recommender = cls(
+            StringHeap.load(path, "id"),
+            load_array(path / "id_hashes.npy"),
+            load_array(path / "id_items.npy"),
+            load_array(path / "counts.npy"),
+            load_array(path / "offsets.npy"),
+            load_array(path / "neighbors.npy"),
+            load_array(path / "weights.npy"),
+            load_array(path / "factors.npy") if meta["factors"] else None
+        )
+        logger.info(f"Opened recommender {directory} with {len(recommender)} songs")
+        return recommender
+
+
+def _factorize(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    song_offsets: np.ndarray,
+    song_playlists: np.ndarray,
+    counts: np.ndarray,
+    rank: int,
+    seed: int
+) -> np.ndarray:
+    """
+    Unit-length song embeddings from a randomized truncated SVD of the
+    playlist-song matrix
+
+    Each song's column is scaled by 1 / sqrt(playlists it appears in), so
+    popular songs don't dominate the leading factors.
+    """
+    scale = (1 / np.sqrt(counts)).astype(np.float32)[:, None]
+
+    def times(dense: np.ndarray) -> np.ndarray:
+        return _segment_sums(indptr, indices, dense * scale)
+
+    def transpose_times(dense: np.ndarray) -> np.ndarray:
+        return _segment_sums(song_offsets, song_playlists, dense) * scale
+
+    rng = np.random.default_rng(seed)
+    sample = times(rng.standard_normal((len(counts), rank + OVERSAMPLING)).astype(np.float32))
+    for _ in range(POWER_ITERATIONS):
+        basis, _ = np.linalg.qr(sample)
+        song_basis, _ = np.linalg.qr(transpose_times(basis))
+        sample = times(song_basis)
+    basis, _ = np.linalg.qr(sample)
+    _, singular, song_vectors = np.linalg.svd(transpose_times(basis).T, full_matrices=False)
+    embeddings = (song_vectors[:rank].T * singular[:rank]).astype(np.float32)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    return embeddings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build and query the playlist co-occurrence recommender")
+    commands = parser.add_subparsers(dest="command", required=True)
+    building = commands.add_parser("build", help="Learn song neighbors from a playlist JSONL export")
+    building.add_argument("source", help="One playlist per line: {\"song_ids\": [...]} or a list of ids")
+    building.add_argument("directory", help="Where to write the recommender")
+    building.add_argument("--neighbors", type=int, default=100, help="Most similar songs kept per song")
+    building.add_argument("--factors", type=int, default=0, help="Embedding dimensions (0 disables embeddings)")
+    recommending = commands.add_parser("recommend", help="Recommend songs for a playlist of song ids")
+    recommending.add_argument("directory")
+    recommending.add_argument("song_ids", nargs="+")
+    recommending.add_argument("--limit", type=int, default=10)
+    recommending.add_argument("--factor-weight", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        recommender = ItemRecommender.build(read_playlists(args.source), args.neighbors, args.factors)
+        recommender.save(args.directory)
+        print(f"Wrote neighbors of {len(recommender)} songs to {args.directory}")
+        return 0
+
+    recommender = ItemRecommender.load(args.directory)
+    items = recommender.lookup(args.song_ids)
+    recommendations = recommender.recommend(items, args.limit, args.factor_weight)
+    print(json.dumps([asdict(recommendation) for recommendation in recommendations], indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Micro-batching of compatible requests into a single upstream call
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+
+logger = setup_logger(__name__)
+
+
+batches_flushed = metrics.counter(
+    "microbatch_batches_total",
+    "Micro-batches flushed to the batch runner",
+    ("group",)
+)
+batched_items = metrics.counter(
+    "microbatch_items_total",
+    "Requests submitted to the micro-batcher",
+    ("group",)
+)
+
+
+BatchRunner = Callable[[str, List[Any]], Awaitable[List[Any]]]
+
+
+class _PendingBatch:
+    """Items collected for one group during the current window"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """
+    Collect compatible requests for a short window and run them together
+
+    Requests are grouped by a caller-provided key. A group is flushed when its
+    window elapses or it reaches `max_size`. The runner receives the group key
+    and the collected items and must return one result per item, in order; a
+    result that is an exception is raised to that item's caller only.
+    """
+
+    def __init__(self, runner: BatchRunner, window: float = 0.01, max_size: int = 8):
+        self.runner = runner
+        self.window = window
+        self.max_size = max_size
+        self._pending: Dict[str, _PendingBatch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, group: str, item: Any) -> Any:
+        """Add an item to its group's batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(group)
+
+        if batch is None:
+            batch = _PendingBatch()
+            self._pending[group] = batch
+            batch.timer = loop.call_later(self.window, self._flush, group)
+
+        future = loop.create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        batched_items.inc(group=group)
+
+        if len(batch.items) >= self.max_size:
+            self._flush(group)
+
+        return await future
+
+    def flush(self, group: str) -> None:
+        """Run a group's pending batch now instead of waiting for its window"""
+        self._flush(group)
+
+    def _flush(self, group: str) -> None:
+        batch = self._pending.pop(group, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+
+        batches_flushed.inc(group=group)
+        task = asyncio.ensure_future(self._run(group, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group: str, batch: _PendingBatch) -> None:
+        try:
+            results = await self.runner(group, batch.items)
+            if len(results) != len(batch.items):
+                raise RuntimeError(
+                    f"Batch runner returned {len(results)} results for {len(batch.items)} items"
+                )
+        except asyncio.CancelledError:
+            for future in batch.futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Micro-batch for {group} failed: {str(e)}")
+            results = [e] * len(batch.items)
+
+        for future, result in zip(batch.futures, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
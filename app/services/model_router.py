@@ -0,0 +1,151 @@
+"""
+Routing completions to model tiers per endpoint
+"""
+import random
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+
+logger = setup_logger(__name__)
+
+
+routed_requests = metrics.counter(
+    "model_requests_total",
+    "Completions sent to each model",
+    ("endpoint", "model")
+)
+model_escalations = metrics.counter(
+    "model_escalations_total",
+    "Completions sent again to a larger model because the JSON answer failed validation",
+    ("endpoint", "model")
+)
+
+
+# "single" sends everything to the default model, "tiered" starts each
+# endpoint on its tier, "latency" also moves to a larger tier when it has
+# been answering that endpoint faster
+ROUTING_POLICIES = ("single", "tiered", "latency")
+
+# Weight of the newest call in a model's moving average latency; about the
+# last ten calls count
+LATENCY_SMOOTHING = 0.2
+
+
+class LatencyAverage:
+    """Exponentially weighted moving average of call latency"""
+
+    __slots__ = ("seconds", "samples")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.samples = 0
+
+    def observe(self, seconds: float) -> None:
+        if self.samples == 0:
+            self.seconds = seconds
+        else:
+            self.seconds += LATENCY_SMOOTHING * (seconds - self.seconds)
+        self.samples += 1
+
+
+class ModelRouter:
+    """
+    Pick the model for each completion
+
+    `tiers` maps tier names to models, smallest first; the default model is
+    the largest tier. Endpoints listed in `table` start on their tier,
+    others on the default model. A JSON answer that fails validation is
+    sent again to each larger tier in turn.
+
+    With the "latency" policy, a moving average of each model's latency is
+    kept per endpoint, and the endpoint goes to whichever of its tier and
+    the larger ones has been fastest lately. A share of calls (`explore`)
+    goes to a random one of those models, so every candidate keeps fresh
+    samples.
+    """
+
+    def __init__(
+        self,
+        default_model: str,
+        tiers: Optional[Dict[str, str]] = None,
+        table: Optional[Dict[str, str]] = None,
+        policy: str = "single",
+        explore: float = 0.05,
+        min_samples: int = 5,
+        rng: Callable[[], float] = random.random
+    ):
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"Unknown routing policy {policy!r}, expected one of {ROUTING_POLICIES}")
+        self.default_model = default_model
+        self.policy = policy
+        self.explore = explore
+        self.min_samples = min_samples
+        self._rng = rng
+        self._latencies: Dict[Tuple[str, str], LatencyAverage] = {}
+
+        models = [model for model in (tiers or {}).values() if model != default_model]
+        models.append(default_model)
+        self._ladders: Dict[str, List[str]] = {}
+        for endpoint, tier in (table or {}).items():
+            if tier not in (tiers or {}):
+                logger.warning(f"Unknown model tier {tier!r} for {endpoint}, using {default_model}")
+                continue
+            model = tiers[tier]
+            self._ladders[endpoint] = models[models.index(model):] if model in models else [default_model]
+
+    def ladder(self, endpoint: Optional[str]) -> List[str]:
+        """The endpoint's models from its own tier up to the default model"""
+        if self.policy == "single" or endpoint is None:
+            return [self.default_model]
+        return self._ladders.get(endpoint, [self.default_model])
+
+    def route(self, endpoint: Optional[str]) -> List[str]:
+        """
+        Models to try for a completion, in order
+
+        The first is the one to call; the rest are the escalations for an
+        answer that fails validation.
+        """
+        ladder = self.ladder(endpoint)
+        first = 0
+        if self.policy == "latency" and len(ladder) > 1:
+            first = self._fastest(endpoint, ladder)
+        models = ladder[first:]
+        routed_requests.inc(endpoint=endpoint or "default", model=models[0])
+        return models
+
+    def _fastest(self, endpoint: str, ladder: List[str]) -> int:
+        if self._rng() < self.explore:
+            return int(self._rng() * len(ladder)) % len(ladder)
+        # Stay on the endpoint's own tier until it has been measured
+        own = self._latencies.get((endpoint, ladder[0]))
+        if own is None or own.samples < self.min_samples:
+            return 0
+        best, best_seconds = 0, own.seconds
+        for i, model in enumerate(ladder[1:], 1):
+            latency = self._latencies.get((endpoint, model))
+            if latency is None or latency.samples < self.min_samples:
+                continue
+            if latency.seconds < best_seconds:
+                best, best_seconds = i, latency.seconds
+        return best
+
+    def observe(self, endpoint: Optional[str], model: str, seconds: float) -> None:
+        """Record the latency of a successful call"""
+        key = (endpoint or "default", model)
+        latency = self._latencies.get(key)
+        if latency is None:
+            latency = self._latencies[key] = LatencyAverage()
+        latency.observe(seconds)
+
+    def escalated(self, endpoint: Optional[str], model: str) -> None:
+        """Count a completion sent again to `model` after an invalid answer"""
+        model_escalations.inc(endpoint=endpoint or "default", model=model)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Routing policy and moving average latency in seconds per endpoint and model"""
+        latency: Dict[str, Dict[str, float]] = {}
+        for (endpoint, model), average in self._latencies.items():
+            latency.setdefault(endpoint, {})[model] = round(average.seconds, 4)
+        return {"policy": self.policy, "latency_seconds": latency}
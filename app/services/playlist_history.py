@@ -0,0 +1,158 @@
+"""
+Prior playlist analyses, found again by playlist fingerprint
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+import numpy as np
+from app.models.song import Song
+
+
+def song_key(song: Song) -> int:
+    """Stable 64-bit identity of a song, matching `sort_songs_canonically`"""
+    digest = hashlib.blake2b(
+        f"{song.id}\x1f{song.title}\x1f{song.artist}".encode("utf-8"),
+        digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "little")
+
+
+@dataclass
+class PlaylistSnapshot:
+    """An analysis result and the songs it was generated for"""
+    namespace: str
+    keys: FrozenSet[int]
+    songs: Dict[int, Song]
+    result: Any
+    bands: Tuple[str, ...]
+    created_at: float
+
+
+@dataclass
+class PlaylistChange:
+    """How a playlist differs from the closest snapshot"""
+    snapshot: PlaylistSnapshot
+    added: List[Song]
+    removed: List[Song]
+
+    @property
+    def ratio(self) -> float:
+        """Jaccard distance: the share of the combined songs that changed"""
+        changed = len(self.added) + len(self.removed)
+        union = len(self.snapshot.keys) + len(self.added)
+        return changed / union if union else 0.0
+
+
+class PlaylistHistory:
+    """
+    LRU store of analysis results, looked up by MinHash fingerprint
+
+    A playlist's fingerprint is the MinHash signature of its song keys,
+    split into bands; playlists sharing any band are candidates, and the
+    candidate with the most songs in common wins. With 8 bands of 4 rows,
+    a playlist that changed by one song in ten is found with probability
+    above 0.99, and one that changed by half with about 0.4.
+
+    Snapshots older than the `max_age` given to `find` are dropped, and a
+    playlist remembered again with the same result keeps its original age,
+    so a result is never served past its freshness however often it is
+    asked for.
+    """
+
+    def __init__(self, max_entries: int = 10000, bands: int = 8, rows: int = 4, seed: int = 0):
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.default_rng(seed)
+        # Odd multipliers for multiply-add hashing modulo 2**64
+        self._multipliers = rng.integers(1, 2 ** 63, bands * rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._offsets = rng.integers(0, 2 ** 63, bands * rows, dtype=np.uint64)
+        self._entries: "OrderedDict[int, PlaylistSnapshot]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, str], Set[int]] = {}
+        self._by_songs: Dict[Tuple[str, FrozenSet[int]], int] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _fingerprint(self, keys: FrozenSet[int]) -> Tuple[bytes, ...]:
+        values = np.fromiter(keys, dtype=np.uint64, count=len(keys))
+        signature = (values[:, None] * self._multipliers + self._offsets).min(axis=0)
+        return tuple(band.tobytes() for band in signature.reshape(self.bands, self.rows))
+
+    def find(self, namespace: str, songs: List[Song], max_age: Optional[float] = None) -> Optional[PlaylistChange]:
+        """
+        The stored snapshot closest to `songs`, with the songs added and
+        removed since; snapshots older than `max_age` seconds are dropped
+        """
+        by_key = {song_key(song): song for song in songs}
+        keys = frozenset(by_key)
+        if not keys:
+            return None
+
+        candidates: Set[int] = set()
+        for band, value in enumerate(self._fingerprint(keys)):
+            candidates |= self._buckets.get((band, namespace + value.hex()), set())
+        if max_age is not None:
+            cutoff = time.monotonic() - max_age
+            for entry in [entry for entry in candidates if self._entries[entry].created_at <= cutoff]:
+                self._drop(entry)
+                candidates.discard(entry)
+        if not candidates:
+            return None
+
+        best = max(candidates, key=lambda entry: len(self._entries[entry].keys & keys))
+        snapshot = self._entries[best]
+        self._entries.move_to_end(best)
+        return PlaylistChange(
+            snapshot=snapshot,
+            added=[by_key[key] for key in keys - snapshot.keys],
+            removed=[snapshot.songs[key] for key in snapshot.keys - keys]
+        )
+
+    def remember(self, namespace: str, songs: List[Song], result: Any) -> None:
+        """
+        Store the result generated for `songs`
+
+        The same songs remembered with the same result keep their snapshot
+        and its age; a different result replaces it.
+        """
+        by_key = {song_key(song): song for song in songs}
+        if not by_key or self.max_entries <= 0:
+            return
+        keys = frozenset(by_key)
+        existing = self._by_songs.get((namespace, keys))
+        if existing is not None:
+            if self._entries[existing].result == result:
+                self._entries.move_to_end(existing)
+                return
+            self._drop(existing)
+
+        bands = tuple(namespace + value.hex() for value in self._fingerprint(keys))
+        entry = self._next_id
+        self._next_id += 1
+        self._entries[entry] = PlaylistSnapshot(
+            namespace=namespace,
+            keys=keys,
+            songs=by_key,
+            result=result,
+            bands=bands,
+            created_at=time.monotonic()
+        )
+        self._by_songs[(namespace, keys)] = entry
+        for band, value in enumerate(bands):
+            self._buckets.setdefault((band, value), set()).add(entry)
+
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, entry: int) -> None:
+        snapshot = self._entries.pop(entry)
+        del self._by_songs[(snapshot.namespace, snapshot.keys)]
+        for band, value in enumerate(snapshot.bands):
+            bucket = self._buckets[(band, value)]
+            bucket.discard(entry)
+            if not bucket:
+                del self._buckets[(band, value)]
@@ -0,0 +1,348 @@
+"""
+Compilation of natural-language search queries into structured plans
+"""
+import re
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.services.bm25_index import SearchFilters
+from app.services.embeddings import tokenize
+from app.services.fallbacks import GENRE_MOODS
+from app.utils.metrics import metrics
+
+
+plan_requests = metrics.counter(
+    "search_plans_total",
+    "Search queries planned, by where the plan came from (cache, rules or llm)",
+    ("source",)
+)
+
+
+YEAR = r"((?:19|20)\d\d)"
+
+YEAR_RANGE_PATTERN = re.compile(rf"\b(?:between|from)?\s*{YEAR}\s*(?:-|–|to|and)\s*{YEAR}\b")
+YEAR_BEFORE_PATTERN = re.compile(rf"\b(before|pre|until|up to)\s*-?\s*{YEAR}\b")
+YEAR_AFTER_PATTERN = re.compile(rf"\b(after|since|post)\s*-?\s*{YEAR}\b")
+DECADE_PATTERN = re.compile(r"\b(?:(early|mid|late)[\s-]+)?(?:the\s+)?'?((?:19|20)?\d0)'?s\b")
+SINGLE_YEAR_PATTERN = re.compile(rf"\b{YEAR}\b")
+DECADE_WORDS = {
+    "fifties": 1950, "sixties": 1960, "seventies": 1970, "eighties": 1980,
+    "nineties": 1990, "noughties": 2000, "aughts": 2000
+}
+DECADE_WORD_PATTERN = re.compile(
+    r"\b(?:(early|mid|late)[\s-]+)?(?:the\s+)?(" + "|".join(DECADE_WORDS) + r")\b"
+)
+
+MINUTES = r"(\d+(?:\.\d+)?)\s*(?:minutes?|mins?|m)\b"
+MAX_DURATION_PATTERN = re.compile(rf"\b(?:under|less than|shorter than|below|at most|max(?:imum)?)\s+{MINUTES}")
+MIN_DURATION_PATTERN = re.compile(rf"\b(?:over|more than|longer than|at least|min(?:imum)?)\s+{MINUTES}")
+# "short"/"long" followed, within two words, by "songs", "tracks" or "ones"
+SONGS_AHEAD = r"(?=(?:\s+[\w&'-]+){0,2}?\s+(?:songs?|tracks?|ones)\b)"
+SHORT_PATTERN = re.compile(rf"\bshort(?:er)?\b{SONGS_AHEAD}")
+LONG_PATTERN = re.compile(rf"\b(?:long(?:er)?\b{SONGS_AHEAD}|epics?\b)")
+
+SHORT_SONG_SECONDS = 180
+LONG_SONG_SECONDS = 360
+
+# Activities and moods mentioned in queries -> mood tags
+ACTIVITY_MOODS: Dict[str, List[str]] = {
+    "running": ["energetic", "upbeat"],
+    "jogging": ["energetic", "upbeat"],
+    "workout": ["energetic", "intense"],
+    "gym": ["energetic", "intense"],
+    "exercise": ["energetic", "intense"],
+    "party": ["upbeat", "euphoric"],
+    "study": ["calm", "focused"],
+    "studying": ["calm", "focused"],
+    "focus": ["calm", "focused"],
+    "concentration": ["calm", "focused"],
+    "sleep": ["calm", "soothing"],
+    "sleeping": ["calm", "soothing"],
+    "bedtime": ["calm", "soothing"],
+    "relax": ["relaxed", "calm"],
+    "relaxing": ["relaxed", "calm"],
+    "chill": ["relaxed", "laid-back"],
+    "unwind": ["relaxed", "calm"],
+    "driving": ["upbeat", "nostalgic"],
+    "road trip": ["upbeat", "nostalgic"],
+    "rainy day": ["melancholic", "reflective"],
+    "date night": ["romantic", "smooth"],
+    "romantic": ["romantic", "smooth"],
+    "sad": ["melancholic", "heartfelt"],
+    "heartbreak": ["melancholic", "heartfelt"],
+    "breakup": ["melancholic", "heartfelt"],
+    "happy": ["upbeat", "feel-good"],
+    "feel good": ["upbeat", "feel-good"],
+    "morning": ["uplifting", "warm"]
+}
+
+# Every mood tag the fallbacks know, so "energetic rock" plans a mood too
+MOOD_WORDS = frozenset(
+    mood for moods in list(GENRE_MOODS.values()) + list(ACTIVITY_MOODS.values()) for mood in moods
+)
+
+# Words that say nothing about which songs to return
+FILLER_WORDS = frozenset({
+    "playlist", "tunes", "good", "best", "great", "give", "find", "play",
+    "listen", "listening", "something", "anything", "stuff", "please", "while",
+    "during", "when", "era", "decade", "year", "years", "minute", "minutes"
+})
+
+# Queries with more keywords than this and nothing the rules recognize are
+# planned by the LLM
+RULES_MAX_KEYWORDS = 3
+
+
+@dataclass
+class QueryPlan:
+    """Structured form of a search query"""
+    keywords: List[str] = field(default_factory=list)
+    genres: List[str] = field(default_factory=list)
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    min_duration: Optional[int] = None
+    max_duration: Optional[int] = None
+    moods: List[str] = field(default_factory=list)
+    source: str = "rules"
+
+    @property
+    def structured(self) -> bool:
+        """Whether the plan has anything besides keywords"""
+        return bool(self.genres or self.moods) or self.filters().active
+
+    def filters(self) -> SearchFilters:
+        return SearchFilters(
+            year_from=self.year_from,
+            year_to=self.year_to,
+            genres=self.genres or None,
+            min_duration=self.min_duration,
+            max_duration=self.max_duration
+        )
+
+    def search_text(self) -> str:
+        """
+        Text to search the catalog with
+
+        Keywords and moods, plus genres associated with the moods when the
+        plan has no genre of its own, so "for running" favours energetic
+        genres without excluding anything.
+        """
+        terms = self.keywords + self.genres + self.moods
+        if not self.genres:
+            for mood in self.moods:
+                terms.extend(genre for genre, moods in GENRE_MOODS.items() if mood in moods)
+        return " ".join(dict.fromkeys(terms))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key for a query
+
+    Queries that differ only in case, accents, punctuation, stop words or
+    word order share a key, e.g. "Songs for running from the 80s" and
+    "80s running songs".
+    """
+    return " ".join(sorted(set(tokenize(query))))
+
+
+def _decade_range(qualifier: Optional[str], decade: int) -> Tuple[int, int]:
+    if qualifier == "early":
+        return decade, decade + 3
+    if qualifier == "mid":
+        return decade + 3, decade + 6
+    if qualifier == "late":
+        return decade + 6, decade + 9
+    return decade, decade + 9
+
+
+def _decade_from_digits(digits: str) -> int:
+    value = int(digits)
+    if value >= 1900:
+        return value
+    # Two-digit decades: 60s-90s are 1900s, 00s-20s are 2000s
+    return 1900 + value if value >= 30 else 2000 + value
+
+
+class QueryPlanner:
+    """
+    Rule-based query planning with an LRU cache of plans
+
+    The rules recognize years, decades and year ranges, duration phrases,
+    genres, moods and activities such as "for running"; the remaining words
+    become keywords. A query the rules don't understand can be planned by
+    the LLM instead; callers do that and store the result with `remember`.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[str, QueryPlan]" = OrderedDict()
+        # Genre phrases, rebuilt when the catalog's genre list grows
+        self._genre_count = -1
+        self._genre_table: Dict[Tuple[str, ...], str] = {}
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def cached(self, query: str) -> Optional[QueryPlan]:
+        """A previously computed plan for this query or a near-repeat of it"""
+        key = normalize_query(query)
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+            plan_requests.inc(source="cache")
+        return plan
+
+    def remember(self, query: str, plan: QueryPlan) -> None:
+        key = normalize_query(query)
+        self._plans[key] = plan
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.max_entries:
+            self._plans.popitem(last=False)
+        plan_requests.inc(source=plan.source)
+
+    def plan_with_rules(self, query: str, genres: List[str] = ()) -> Tuple[QueryPlan, bool]:
+        """
+        Plan a query with the rules alone
+
+        `genres` are extra genre names to recognize, such as the catalog's.
+        Returns the plan and whether the rules understood the query well
+        enough that the LLM isn't needed.
+        """
+        plan = QueryPlan()
+        text = query.lower()
+        text = self._extract_years(text, plan)
+        text = self._extract_durations(text, plan)
+
+        tokens = tokenize(text)
+        if len(genres) != self._genre_count:
+            self._genre_table = self._genre_phrases(genres)
+            self._genre_count = len(genres)
+        tokens = self._extract_phrases(tokens, self._genre_table, plan.genres)
+        moods: List[str] = []
+        tokens = self._extract_phrases(tokens, {tuple(phrase.split()): phrase for phrase in ACTIVITY_MOODS}, moods)
+        for activity in moods:
+            plan.moods.extend(mood for mood in ACTIVITY_MOODS[activity] if mood not in plan.moods)
+
+        for token in tokens:
+            if token in MOOD_WORDS:
+                if token not in plan.moods:
+                    plan.moods.append(token)
+            elif token not in FILLER_WORDS and token not in plan.keywords:
+                plan.keywords.append(token)
+
+        understood = plan.structured or len(plan.keywords) <= RULES_MAX_KEYWORDS
+        return plan, understood
+
+    @staticmethod
+    def _extract_years(text: str, plan: QueryPlan) -> str:
+        bounds: List[Tuple[int, int]] = []
+
+        def take(pattern: re.Pattern, to_range) -> None:
+            nonlocal text
+            for match in pattern.finditer(text):
+                bounds.append(to_range(match))
+            text = pattern.sub(" ", text)
+
+        take(YEAR_RANGE_PATTERN, lambda m: tuple(sorted((int(m.group(1)), int(m.group(2))))))
+        take(YEAR_BEFORE_PATTERN, lambda m: (0, int(m.group(2)) - (0 if m.group(1) in ("until", "up to") else 1)))
+        take(YEAR_AFTER_PATTERN, lambda m: (int(m.group(2)) + (0 if m.group(1) == "since" else 1), 9999))
+        take(DECADE_PATTERN, lambda m: _decade_range(m.group(1), _decade_from_digits(m.group(2))))
+        take(DECADE_WORD_PATTERN, lambda m: _decade_range(m.group(1), DECADE_WORDS[m.group(2)]))
+        take(SINGLE_YEAR_PATTERN, lambda m: (int(m.group(1)), int(m.group(1))))
+
+        if bounds:
+            year_from = min(low for low, _ in bounds)
+            year_to = max(high for _, high in bounds)
+            plan.year_from = year_from or None
+            plan.year_to = year_to if year_to != 9999 else None
+        return text
+
+    @staticmethod
+    def _extract_durations(text: str, plan: QueryPlan) -> str:
+        match = MAX_DURATION_PATTERN.search(text)
+        if match:
+            plan.max_duration = int(float(match.group(1)) * 60)
+            text = MAX_DURATION_PATTERN.sub(" ", text)
+        match = MIN_DURATION_PATTERN.search(text)
+        if match:
+            plan.min_duration = int(float(match.group(1)) * 60)
+            text = MIN_DURATION_PATTERN.sub(" ", text)
+        if plan.max_duration is None and SHORT_PATTERN.search(text):
+            plan.max_duration = SHORT_SONG_SECONDS
+            text = SHORT_PATTERN.sub(" ", text)
+        if plan.min_duration is None and LONG_PATTERN.search(text):
+            plan.min_duration = LONG_SONG_SECONDS
+            text = LONG_PATTERN.sub(" ", text)
+        return text
+
+    @staticmethod
+    def _genre_phrases(genres: Iterable[str]) -> Dict[Tuple[str, ...], str]:
+        phrases: Dict[Tuple[str, ...], str] = {}
+        for genre in list(GENRE_MOODS) + list(genres):
+            tokens = tuple(tokenize(genre))
+            if tokens:
+                phrases.setdefault(tokens, genre)
+        return phrases
+
+    @staticmethod
+    def _extract_phrases(
+        tokens: List[str],
+        phrases: Dict[Tuple[str, ...], str],
+        found: List[str]
+    ) -> List[str]:
+        """Move the longest matching phrases out of `tokens` into `found`"""
+        longest = max((len(phrase) for phrase in phrases), default=0)
+        remaining: List[str] = []
+        i = 0
+        while i < len(tokens):
+            for length in range(min(longest, len(tokens) - i), 0, -1):
+                value = phrases.get(tuple(tokens[i:i + length]))
+                if value is not None:
+                    if value not in found:
+                        found.append(value)
+                    i += length
+                    break
+            else:
+                remaining.append(tokens[i])
+                i += 1
+        return remaining
+
+
+def _bounded_int(value: Any, low: int, high: int) -> Optional[int]:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if low <= number <= high else None
+
+
+def _strings(value: Any, limit: int) -> List[str]:
+    if not isinstance(value, list):
+        return []
+    strings = [str(item).strip().lower() for item in value if str(item).strip()]
+    return list(dict.fromkeys(strings))[:limit]
+
+
+def plan_from_llm(data: Any) -> QueryPlan:
+    """Validate a plan returned by the LLM, dropping fields that don't make sense"""
+    if not isinstance(data, dict):
+        raise ValueError("Query plan must be a JSON object")
+    plan = QueryPlan(
+        keywords=[token for keyword in _strings(data.get("keywords"), 10) for token in tokenize(keyword)],
+        genres=_strings(data.get("genres"), 5),
+        year_from=_bounded_int(data.get("year_from"), 1900, 2100),
+        year_to=_bounded_int(data.get("year_to"), 1900, 2100),
+        min_duration=_bounded_int(data.get("min_duration"), 1, 3600),
+        max_duration=_bounded_int(data.get("max_duration"), 1, 3600),
+        moods=_strings(data.get("moods"), 6),
+        source="llm"
+    )
+    if plan.year_from and plan.year_to and plan.year_from > plan.year_to:
+        plan.year_from, plan.year_to = plan.year_to, plan.year_from
+    if plan.min_duration and plan.max_duration and plan.min_duration > plan.max_duration:
+        plan.min_duration, plan.max_duration = plan.max_duration, plan.min_duration
+    plan.keywords = list(dict.fromkeys(plan.keywords))
+    return plan
@@ -0,0 +1,139 @@
+"""
+Client-side rate limiting for upstream requests and tokens
+"""
+import asyncio
+import time
+from typing import Optional
+from app.utils.exceptions import RateLimitException
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+
+logger = setup_logger(__name__)
+
+
+queue_depth = metrics.gauge(
+    "ratelimit_queue_depth",
+    "Calls waiting for rate limit budget"
+)
+waited_calls = metrics.counter(
+    "ratelimit_waited_total",
+    "Calls that had to wait for rate limit budget"
+)
+wait_seconds = metrics.counter(
+    "ratelimit_wait_seconds_total",
+    "Total time spent waiting for rate limit budget"
+)
+rejected_calls = metrics.counter(
+    "ratelimit_rejected_total",
+    "Calls rejected because budget did not free up within the maximum wait"
+)
+
+
+class TokenBucket:
+    """Continuously refilling budget; may go negative to record overspend"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self.level = min(self.capacity, self.level + elapsed * self.refill_per_second)
+            self._updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it already is)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_per_second
+
+    def consume(self, amount: float, now: Optional[float] = None) -> None:
+        """Take budget; negative amounts give it back"""
+        self._refill(now if now is not None else time.monotonic())
+        self.level = min(self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter
+
+    Callers reserve one request and an estimated token count before calling
+    upstream, and reconcile the estimate with the reported usage afterwards.
+    Callers that would exceed the budget queue in arrival order for up to
+    `max_wait` seconds, then fail with RateLimitException.
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, max_wait: float = 10.0):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60) if tokens_per_minute > 0 else None
+        self.max_wait = max_wait
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _time_until(self, tokens: int, now: float) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.time_until(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.time_until(tokens, now))
+        return wait
+
+    async def acquire(self, tokens: int) -> None:
+        """Reserve one request and `tokens` tokens, waiting if needed"""
+        if not self.enabled:
+            return
+
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        queued = self._lock.locked()
+        self._waiting += 1
+        queue_depth.set(self._waiting)
+
+        try:
+            try:
+                await asyncio.wait_for(self._lock.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                rejected_calls.inc()
+                raise RateLimitException("Upstream rate limit budget exhausted, try again later")
+
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._time_until(tokens, now)
+                    if wait <= 0:
+                        if self.requests is not None:
+                            self.requests.consume(1, now)
+                        if self.tokens is not None:
+                            self.tokens.consume(tokens, now)
+                        break
+                    if now + wait > deadline:
+                        rejected_calls.inc()
+                        raise RateLimitException("Upstream rate limit budget exhausted, try again later")
+                    queued = True
+                    await asyncio.sleep(wait)
+            finally:
+                self._lock.release()
+        finally:
+            self._waiting -= 1
+            queue_depth.set(self._waiting)
+
+        if queued:
+            waited = time.monotonic() - started
+            waited_calls.inc()
+            wait_seconds.inc(waited)
+            logger.info(f"Waited {waited:.2f}s for rate limit budget")
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the token reservation once the real usage is known"""
+        if self.tokens is not None:
+            self.tokens.consume(actual_tokens - estimated_tokens)
@@ -0,0 +1,179 @@
+"""
+Bounded in-process cache for LLM completions
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+from app.utils.metrics import metrics
+
+
+cache_lookups = metrics.counter(
+    "response_cache_lookups_total",
+    "Response cache lookups, by endpoint and result",
+    ("endpoint", "result")
+)
+cache_evictions = metrics.counter(
+    "response_cache_evictions_total",
+    "Response cache entries evicted to stay within the entry and byte limits"
+)
+
+
+@dataclass
+class CacheEntry:
+    """A cached completion"""
+    value: str
+    expires_at: float
+    size: int
+    endpoint: Optional[str] = None
+    stale: bool = False
+
+
+class ResponseCache:
+    """
+    LRU cache with per-endpoint TTLs and entry/byte limits
+
+    Expired entries are kept for a further `stale_ttl` seconds (space
+    permitting) so they can be served by `get_stale` while the upstream is
+    unavailable.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 16 * 1024 * 1024,
+        default_ttl: float = 3600.0,
+        ttls: Optional[Dict[str, float]] = None,
+        stale_ttl: float = 0.0
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def ttl_for(self, endpoint: Optional[str]) -> float:
+        """TTL in seconds for an endpoint"""
+        if endpoint is None:
+            return self.default_ttl
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    def get(self, key: str, endpoint: Optional[str] = None) -> Optional[str]:
+        """Return a fresh cached value, or None on a miss"""
+        value = self.lookup(key)
+        self.record(endpoint, value is not None)
+        return value
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Like `get`, but without counting a hit or miss"""
+        entry = self._entries.get(key)
+
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._expire(key, entry)
+            entry = None
+
+        if entry is None:
+            return None
+
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def record(self, endpoint: Optional[str], hit: bool) -> None:
+        """Count the outcome of one lookup"""
+        label = endpoint or "default"
+        counts = self.hits if hit else self.misses
+        counts[label] = counts.get(label, 0) + 1
+        cache_lookups.inc(endpoint=label, result="hit" if hit else "miss")
+
+    def get_stale(self, key: str) -> Optional[str]:
+        """Return a value even if it has expired, as long as it is still retained"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at + self.stale_ttl <= time.monotonic():
+            self._expire(key, entry)
+            return None
+
+        self.stale_hits += 1
+        return entry.value
+
+    def set(self, key: str, value: str, endpoint: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting least recently used entries as needed"""
+        ttl = self.ttl_for(endpoint) if ttl is None else ttl
+        size = len(key) + len(value.encode("utf-8"))
+
+        if ttl <= 0 or size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = CacheEntry(
+            value=value,
+            expires_at=time.monotonic() + ttl,
+            size=size,
+            endpoint=endpoint
+        )
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+            cache_evictions.inc()
+
+    def invalidate(self, key: str) -> None:
+        """Drop a single entry"""
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, object]:
+        """Hit/miss counters and current size"""
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        lookups = hits + misses
+
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_hits": self.stale_hits,
+            "by_endpoint": {
+                endpoint: {
+                    "hits": self.hits.get(endpoint, 0),
+                    "misses": self.misses.get(endpoint, 0)
+                }
+                for endpoint in sorted(set(self.hits) | set(self.misses))
+            }
+        }
+
+    def _expire(self, key: str, entry: CacheEntry) -> None:
+        """Count an entry's expiry once, keeping it around if it may still be served stale"""
+        if not entry.stale:
+            entry.stale = True
+            self.expirations += 1
+        if entry.expires_at + self.stale_ttl <= time.monotonic():
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
@@ -0,0 +1,179 @@
+"""
+Retry policy for upstream calls
+"""
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import groq
+import httpx
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+
+logger = setup_logger(__name__)
+
+
+retries_total = metrics.counter(
+    "upstream_retries_total",
+    "Upstream calls retried after a transient error",
+    ("endpoint", "reason")
+)
+retry_budget_exhausted = metrics.counter(
+    "upstream_retry_budget_exhausted_total",
+    "Retries skipped because the endpoint's retry budget was used up",
+    ("endpoint",)
+)
+retry_giveups = metrics.counter(
+    "upstream_retry_giveups_total",
+    "Calls that failed after exhausting their attempts or retry time",
+    ("endpoint",)
+)
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def classify_error(error: BaseException) -> Tuple[bool, Optional[str], Optional[float]]:
+    """
+    Decide whether an upstream error is worth retrying
+
+    Returns (retryable, reason, retry_after_seconds). Timeouts, connection
+    failures, 5xx and 429 are retryable; authentication, permission and
+    validation errors are fatal.
+    """
+    if isinstance(error, (groq.APITimeoutError, httpx.TimeoutException)):
+        return True, "timeout", None
+    if isinstance(error, (groq.APIConnectionError, httpx.TransportError)):
+        return True, "connection", None
+    if isinstance(error, groq.APIStatusError):
+        status_code = error.status_code
+        if status_code in RETRYABLE_STATUS_CODES:
+            return True, str(status_code), parse_retry_after(error.response.headers)
+        return False, str(status_code), None
+    return False, None, None
+
+
+def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Read a Retry-After delay in seconds from response headers"""
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            return None
+    return None
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of recent traffic
+
+    Every call deposits `ratio` of a retry and the budget also refills by
+    `min_per_second`, so a quiet endpoint can still retry occasionally while a
+    failing one can't multiply its load during an outage.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, capacity: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self.balance = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.balance = min(self.capacity, self.balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self.balance >= 1:
+            self.balance -= 1
+            return True
+        return False
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, a time cap and per-endpoint budgets"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        max_total_time: float = 20.0,
+        budget_ratio: float = 0.1,
+        budget_min_per_second: float = 1.0
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_total_time = max_total_time
+        self.budget_ratio = budget_ratio
+        self.budget_min_per_second = budget_min_per_second
+        self._budgets: Dict[str, RetryBudget] = {}
+
+    def budget(self, endpoint: str) -> RetryBudget:
+        budget = self._budgets.get(endpoint)
+        if budget is None:
+            budget = RetryBudget(self.budget_ratio, self.budget_min_per_second)
+            self._budgets[endpoint] = budget
+        return budget
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number `attempt` (starting at 1)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    async def run(self, fn: Callable[[], Awaitable[Any]], endpoint: Optional[str] = None) -> Any:
+        """Call `fn`, retrying transient failures"""
+        label = endpoint or "default"
+        budget = self.budget(label)
+        budget.deposit()
+        deadline = time.monotonic() + self.max_total_time
+        attempt = 1
+
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                retryable, reason, retry_after = classify_error(e)
+                if not retryable:
+                    raise
+
+                if attempt >= self.max_attempts:
+                    retry_giveups.inc(endpoint=label)
+                    raise
+
+                delay = self.backoff(attempt)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+
+                if time.monotonic() + delay > deadline:
+                    logger.warning(f"Not retrying {label}: retry time cap reached")
+                    retry_giveups.inc(endpoint=label)
+                    raise
+
+                if not budget.try_withdraw():
+                    logger.warning(f"Not retrying {label}: retry budget exhausted")
+                    retry_budget_exhausted.inc(endpoint=label)
+                    raise
+
+                retries_total.inc(endpoint=label, reason=reason)
+                logger.warning(
+                    f"Retrying {label} after {reason} error in {delay:.2f}s "
+                    f"(attempt {attempt + 1}/{self.max_attempts})"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
@@ -0,0 +1,126 @@
+"""
+Cache of search responses keyed by query similarity
+"""
+import time
+from typing import Any, List, Optional, Tuple
+import numpy as np
+from app.services.embeddings import HashingEmbedder
+from app.services.query_planner import QueryPlan
+from app.utils.metrics import metrics
+
+
+semantic_cache_lookups = metrics.counter(
+    "semantic_cache_lookups_total",
+    "Semantic cache lookups, by result (hit or miss)",
+    ("result",)
+)
+
+
+def query_signature(plan: QueryPlan) -> Tuple[str, Tuple[Any, ...]]:
+    """
+    Text to embed and exact-match scope for a planned query
+
+    Keywords and moods are compared by similarity, so "songs for running"
+    and "upbeat jogging songs" (both energetic and upbeat) are neighbours.
+    Genres, years and durations change which songs qualify, so they must
+    match exactly.
+    """
+    text = " ".join(plan.keywords + plan.moods)
+    scope = (
+        tuple(sorted(plan.genres)),
+        plan.year_from,
+        plan.year_to,
+        plan.min_duration,
+        plan.max_duration
+    )
+    return text, scope
+
+
+class SemanticCache:
+    """
+    Values keyed by the embedding of a text, matched by cosine similarity
+
+    Entries live in a fixed-size matrix, so a lookup is one matrix-vector
+    product over the live entries with the same scope; the best entry is a
+    hit when its similarity reaches `threshold`. Entries expire after `ttl`
+    seconds, and when the cache is full the least recently used entry is
+    replaced.
+    """
+
+    def __init__(
+        self,
+        embedder: HashingEmbedder,
+        threshold: float = 0.9,
+        max_entries: int = 1000,
+        ttl: float = 3600.0
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._vectors = np.zeros((max_entries, embedder.dim), dtype=np.float32)
+        self._scopes = np.zeros(max_entries, dtype=np.int64)
+        # Expiry and last use in monotonic seconds; expiry 0 marks a free slot
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._used = np.zeros(max_entries, dtype=np.float64)
+        self._texts: List[Optional[str]] = [None] * max_entries
+        self._values: List[Any] = [None] * max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._expires > time.monotonic()))
+
+    def _embed(self, text: str) -> np.ndarray:
+        # Empty texts (queries that are only filters) all share one vector
+        return self.embedder.embed_query(text or "<empty>")
+
+    def _match(self, vector: np.ndarray, scope: Any, now: float) -> Tuple[int, float]:
+        """Most similar live slot in `scope` and its similarity, or (-1, 0)"""
+        candidates = np.flatnonzero((self._expires > now) & (self._scopes == hash(scope)))
+        if not len(candidates):
+            return -1, 0.0
+        scores = self._vectors[candidates] @ vector
+        best = int(np.argmax(scores))
+        return int(candidates[best]), float(scores[best])
+
+    def lookup(self, text: str, scope: Any = None) -> Tuple[Optional[Any], float, Optional[str]]:
+        """
+        Cached value for the most similar text in `scope`
+
+        Returns (value, similarity, cached text); value is None on a miss.
+        """
+        now = time.monotonic()
+        slot, similarity = self._match(self._embed(text), scope, now)
+        if slot < 0 or similarity < self.threshold:
+            self.misses += 1
+            semantic_cache_lookups.inc(result="miss")
+            return None, similarity, None
+        self._used[slot] = now
+        self.hits += 1
+        semantic_cache_lookups.inc(result="hit")
+        return self._values[slot], similarity, self._texts[slot]
+
+    def get(self, text: str, scope: Any = None) -> Optional[Any]:
+        return self.lookup(text, scope)[0]
+
+    def put(self, text: str, scope: Any, value: Any) -> None:
+        """Cache a value, replacing an identical text or the least recently used entry"""
+        now = time.monotonic()
+        vector = self._embed(text)
+        slot, similarity = self._match(vector, scope, now)
+        if slot < 0 or similarity < 0.9999:
+            free = np.flatnonzero(self._expires <= now)
+            slot = int(free[0]) if len(free) else int(np.argmin(self._used))
+
+        self._vectors[slot] = vector
+        self._scopes[slot] = hash(scope)
+        self._expires[slot] = now + self.ttl
+        self._used[slot] = now
+        self._texts[slot] = text
+        self._values[slot] = value
+
+    def clear(self) -> None:
+        self._expires[:] = 0
+        self._texts = [None] * self.max_entries
+        self._values = [None] * self.max_entries
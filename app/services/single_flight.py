@@ -0,0 +1,82 @@
+"""
+Coalescing of identical concurrent upstream calls
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.utils.metrics import metrics
+
+
+leader_calls = metrics.counter(
+    "singleflight_leader_calls_total",
+    "Upstream calls started by the single-flight layer",
+    ("endpoint",)
+)
+coalesced_calls = metrics.counter(
+    "singleflight_coalesced_total",
+    "Calls that waited on an identical in-flight call instead of starting their own",
+    ("endpoint",)
+)
+in_flight_calls = metrics.gauge(
+    "singleflight_in_flight",
+    "Distinct upstream calls currently in flight"
+)
+
+
+class _Flight:
+    """A shared in-flight call and the number of callers waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time
+
+    Later callers with the same key wait on the running call and receive the
+    same result or exception. A waiter that is cancelled only stops waiting;
+    the shared call is cancelled once no waiters are left.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        endpoint: Optional[str] = None
+    ) -> Any:
+        label = endpoint or "default"
+        flight = self._flights.get(key)
+
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            in_flight_calls.inc()
+            leader_calls.inc(endpoint=label)
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+        else:
+            coalesced_calls.inc(endpoint=label)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Last interested caller left; stop the upstream call and make
+                # sure nobody new joins a flight that is being torn down
+                self._finish(key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finish(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+            in_flight_calls.dec()
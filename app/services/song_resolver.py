@@ -0,0 +1,599 @@
+"""
+Matching free-text song titles and artists to catalog songs
+"""
+import json
+import re
+import unicodedata
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.models.song import Song
+from app.services.catalog_store import id_hash, load_array
+from app.utils.helpers import save_array
+
+
+# Words marking a release variant rather than a different song
+VERSION_WORDS = (
+    r"remaster(?:ed)?|live|version|edit|mix|remix|mono|stereo|deluxe|anniversary|bonus|demo|"
+    r"acoustic|single|radio|extended|instrumental|explicit|clean"
+)
+FEATURING = r"feat\.?|ft\.?|featuring"
+
+_BRACKETED = re.compile(r"\s*[(\[][^)\]]*\b(?:" + FEATURING + r"|with|" + VERSION_WORDS + r")\b[^)\]]*[)\]]")
+_DASH_SUFFIX = re.compile(r"\s+-\s+[^-]*\b(?:" + VERSION_WORDS + r")\b.*$")
+_FEATURED = re.compile(r"\s+(?:" + FEATURING + r")\s.*$")
+_APOSTROPHES = re.compile(r"['’`]")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# Title and artist trigrams are each hashed into this many posting lists;
+# artist trigrams are numbered after the title ones
+TRIGRAM_BITS = 19
+TRIGRAM_BUCKETS = 1 << TRIGRAM_BITS
+# Multiplier of the Fibonacci hash from a trigram's three bytes to its list
+TRIGRAM_HASH = 0x9E3779B1
+TITLE = 0
+ARTIST = 1
+
+# Songs by the same artist, or with the same title, considered per lookup at most
+KEY_CANDIDATES = 1024
+
+# Candidates are shortlisted by trigram signature to this many per lookup
+# before their trigrams are compared exactly
+SCORED_CANDIDATES = 16
+
+# Bits of each field's trigram signature, a bitmap of its hashed trigrams
+SIGNATURE_BITS = 128
+SIGNATURE_WORDS = 2 * SIGNATURE_BITS // 64
+
+# When neither the artist nor the title is known, posting lists are read
+# rarest first up to about this many postings, and the songs sharing the
+# most trigrams with the query are scored
+CANDIDATE_POSTINGS = 1024
+TRIGRAM_CANDIDATES = 32
+
+# Share of the confidence that comes from the title; the rest is the artist
+TITLE_WEIGHT = 0.6
+
+FORMAT_VERSION = 2
+
+
+
+def fold(text: str) -> str:
+    """Lowercase `text` and strip accents"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def _clean(text: str) -> str:
+    text = _APOSTROPHES.sub("", text).replace("&", " and ")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_title(title: str) -> str:
+    """
+    Comparable form of a song title
+
+    Drops accents, case, punctuation, featured artists and release variants
+    such as "- Remastered 2011" or "(Live at Wembley)".
+    """
+    text = _BRACKETED.sub("", fold(title))
+    text = _DASH_SUFFIX.sub("", text)
+    return _clean(_FEATURED.sub("", text))
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_artist(artist: str) -> str:
+    """Comparable form of an artist name, without featured artists or a leading "the" """
+    text = _clean(_FEATURED.sub("", _BRACKETED.sub("", fold(artist))))
+    return text[4:] if text.startswith("the ") else text
+
+
+def match_key(title: str, artist: str) -> int:
+    """Hash of the normalized title and artist, equal for variants of one song"""
+    return id_hash(f"{normalize_artist(artist)}\x1f{normalize_title(title)}")
+
+
+def _distinct(values: np.ndarray) -> np.ndarray:
+    """Sorted distinct values; np.unique without counts can hash instead, which is slower here"""
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))]
+
+
+def _best_first(owners: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    """
+    Positions ordered by owner, then by rank (lowest first), then position
+
+    Sorts packed integer keys, which is several times faster than a stable
+    argsort. Ranks are below 2**27 and there are fewer than 2**20 positions.
+    """
+    keys = np.sort(owners.astype(np.int64) << 47 | ranks.astype(np.int64) << 20 | np.arange(len(ranks), dtype=np.int64))
+    return keys & ((1 << 20) - 1)
+
+
+def _score_ranks(scores: np.ndarray) -> np.ndarray:
+    """Ranks for `_best_first` putting the highest of scores from 0 to 1 first"""
+    return ((1.0 - scores.astype(np.float64)) * ((1 << 26) - 1)).astype(np.int64)
+
+
+def _ranks(order: np.ndarray, owners: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Rank of each position of `order` among those of its owner; owners are sorted"""
+    starts = np.cumsum(counts) - counts
+    return np.arange(len(order)) - starts[owners[order]]
+
+
+def _buckets(titles: List[str], artists: List[str]) -> Tuple[List[List[int]], List[List[int]]]:
+    """Posting list numbers of the distinct trigrams of each title and each artist, padded with spaces"""
+    texts = titles + artists
+    padded = [f" {text} ".encode("utf-8") if text else b"" for text in texts]
+    sizes = np.array([len(text) for text in padded], dtype=np.int64)
+    counts = np.maximum(sizes - 2, 0)
+    total = int(counts.sum())
+    if not total:
+        return [[] for _ in titles], [[] for _ in artists]
+    data = np.frombuffer(b"".join(padded), dtype=np.uint8).astype(np.uint64)
+    ends = np.cumsum(counts)
+    starts = np.cumsum(sizes) - sizes
+    positions = np.arange(total) + np.repeat(starts - ends + counts, counts)
+    trigrams = data[positions] << 16 | data[positions + 1] << 8 | data[positions + 2]
+    buckets = (trigrams * TRIGRAM_HASH & 0xFFFFFFFF) >> (32 - TRIGRAM_BITS)
+    owners = np.repeat(np.arange(len(texts), dtype=np.uint64), counts)
+    # Artist trigrams are numbered after the title ones
+    buckets += (owners >= len(titles)) * np.uint64(ARTIST * TRIGRAM_BUCKETS)
+    # Distinct per text, sorted by text
+    keys = _distinct(owners << 32 | buckets)
+    values = (keys & 0xFFFFFFFF).astype(np.int64).tolist()
+    bounds = np.cumsum(np.bincount((keys >> 32).astype(np.int64), minlength=len(texts))).tolist()
+    found = [values[start:stop] for start, stop in zip([0] + bounds, bounds)]
+    return found[:len(titles)], found[len(titles):]
+
+
+def _signatures(titles: List[List[int]], artists: List[List[int]]) -> np.ndarray:
+    """Title then artist trigram bitmaps of each song or query, as 64-bit words"""
+    counts = [len(title) + len(artist) for title, artist in zip(titles, artists)]
+    buckets = np.array([bucket for title, artist in zip(titles, artists) for bucket in title + artist], dtype=np.int64)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    bits = (buckets >= TRIGRAM_BUCKETS) * SIGNATURE_BITS + buckets % SIGNATURE_BITS
+    signatures = np.zeros((len(counts), SIGNATURE_WORDS), dtype=np.uint64)
+    np.bitwise_or.at(signatures, (owners, bits >> 6), np.left_shift(np.uint64(1), (bits & 63).astype(np.uint64)))
+    return signatures
+
+
+def _popcount(signatures: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Set bits of each row's title signature and of its artist signature"""
+    if hasattr(np, "bitwise_count"):
+        bits = np.bitwise_count(signatures)
+    else:
+        # numpy < 2.0: count bits within each byte, then add the bytes up
+        bits = signatures - ((signatures >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        bits = (bits & np.uint64(0x3333333333333333)) + ((bits >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        bits = (bits + (bits >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        bits = (bits * np.uint64(0x0101010101010101)) >> np.uint64(56)
+    # Two title words, then two artist words
+    bits = bits.astype(np.int64)
+    return bits[:, 0] + bits[:, 1], bits[:, 2] + bits[:, 3]
+
+
+class _KeyTable:
+    """Rows by 63-bit key: a sorted read-only part plus keys added in memory"""
+
+    def __init__(self, keys: Optional[np.ndarray] = None, rows: Optional[np.ndarray] = None):
+        self._base_keys = keys if keys is not None else np.zeros(0, dtype=np.int64)
+        self._base_rows = rows if rows is not None else np.zeros(0, dtype=np.int64)
+        self._keys: Dict[int, List[int]] = {}
+
+    def add(self, key: int, row: int) -> None:
+        self._keys.setdefault(key, []).append(row)
+
+    def get_many(self, keys: List[int]) -> List[np.ndarray]:
+        """Rows of each key, searching the sorted part once for all of them"""
+        if not keys:
+            return []
+        wanted = np.array(keys, dtype=np.int64)
+        starts = np.searchsorted(self._base_keys, wanted, side="left").tolist()
+        stops = np.searchsorted(self._base_keys, wanted, side="right").tolist()
+        found = []
+        for key, start, stop in zip(keys, starts, stops):
+            rows = self._base_rows[start:stop]
+            memory = self._keys.get(key)
+            found.append(rows if memory is None else np.concatenate([rows, np.array(memory, dtype=rows.dtype)]))
+        return found
+
+    def save(self, path: Path, name: str) -> None:
+        pairs = [(key, row) for key, rows in self._keys.items() for row in rows]
+        keys = np.concatenate([self._base_keys, np.array([key for key, _ in pairs], dtype=np.int64)])
+        rows = np.concatenate([self._base_rows, np.array([row for _, row in pairs], dtype=np.int64)])
+        order = np.argsort(keys, kind="stable")
+        save_array(path / f"{name}.keys.npy", keys[order])
+        save_array(path / f"{name}.rows.npy", rows[order])
+
+    @staticmethod
+    def load(path: Path, name: str) -> "_KeyTable":
+        return _KeyTable(load_array(path / f"{name}.keys.npy"), load_array(path / f"{name}.rows.npy"))
+
+
+class SongResolver:
+    """
+    Index from normalized titles and artists to catalog rows
+
+    A lookup first tries the exact normalized (title, artist) key. Failing
+    that, it scores the songs by the same artist and the songs with the same
+    title, which covers a misspelled title or artist, and as a last resort
+    the songs sharing the rarest trigrams with the query, read from hashed
+    posting lists. Candidates are scored together by trigram Dice similarity,
+    weighted between title and artist, against the trigrams stored for each
+    song. A common title or a prolific artist brings hundreds of candidates,
+    so each lookup's are first shortlisted by the same similarity over
+    128-bit trigram bitmaps, which costs a few word operations per song.
+
+    Rows come from a read-only part loaded from disk plus rows added in
+    memory, numbered on from it. Removed rows stay indexed; callers pass
+    a `song_at` that returns None for them.
+    """
+
+    def __init__(self):
+        self._base_size = 0
+        self._songs = _KeyTable()
+        self._titles = _KeyTable()
+        self._artists = _KeyTable()
+        # Trigram -> rows, for the loaded part and in memory
+        self._base_offsets: Optional[np.ndarray] = None
+        self._base_rows = np.zeros(0, dtype=np.int32)
+        self._postings: Dict[int, array] = {}
+        # Row -> its title and artist trigrams, and how many of each
+        self._base_gram_offsets = np.zeros(1, dtype=np.int64)
+        self._base_grams = np.zeros(0, dtype=np.int32)
+        self._base_counts = np.zeros((0, 2), dtype=np.int16)
+        self._gram_offsets = array("q", [0])
+        self._grams = array("i")
+        self._counts = array("h")
+        # Row -> its title and artist trigram bitmaps
+        self._base_signatures = np.zeros((0, SIGNATURE_WORDS), dtype=np.uint64)
+        self._signatures = array("Q")
+        # During a lookup, bit i of a trigram's entry is set if query i has it
+        self._query = np.zeros(2 * TRIGRAM_BUCKETS, dtype=np.uint32)
+
+    def __len__(self) -> int:
+        return self._base_size + len(self._counts) // 2
+
+    def add(self, rows: Iterable[int], songs: Iterable[Song]) -> None:
+        """Index songs at the given rows, which must follow on from the indexed ones"""
+        pairs = list(zip(rows, songs))
+        for index, (row, _) in enumerate(pairs):
+            if row != len(self) + index:
+                raise ValueError(f"Row {row} added out of order, expected {len(self) + index}")
+        titles = [normalize_title(song.title) for _, song in pairs]
+        artists = [normalize_artist(song.artist) for _, song in pairs]
+        title_buckets, artist_buckets = _buckets(titles, artists)
+        for (row, _), title, artist, title_grams, artist_grams in zip(
+            pairs, titles, artists, title_buckets, artist_buckets
+        ):
+            self._songs.add(id_hash(f"{artist}\x1f{title}"), row)
+            self._titles.add(id_hash(title), row)
+            self._artists.add(id_hash(artist), row)
+            for bucket in title_grams + artist_grams:
+                postings = self._postings.get(bucket)
+                if postings is None:
+                    postings = self._postings[bucket] = array("i")
+                postings.append(row)
+            self._grams.extend(title_grams)
+            self._grams.extend(artist_grams)
+            self._gram_offsets.append(len(self._grams))
+            self._counts.extend((len(title_grams), len(artist_grams)))
+        if pairs:
+            self._signatures.frombytes(_signatures(title_buckets, artist_buckets).tobytes())
+
+    def _posting_list(self, bucket: int) -> np.ndarray:
+        base = self._base_rows
+        if self._base_offsets is not None:
+            base = base[self._base_offsets[bucket]:self._base_offsets[bucket + 1]]
+        memory = self._postings.get(bucket)
+        if memory is None:
+            return base
+        if not len(base):
+            return np.frombuffer(memory, dtype=np.int32)
+        return np.concatenate([base, np.frombuffer(memory, dtype=np.int32)])
+
+    @staticmethod
+    def _count_shared(
+        query: np.ndarray,
+        offsets: np.ndarray,
+        grams: np.ndarray,
+        rows: np.ndarray,
+        bits: np.ndarray
+    ) -> np.ndarray:
+        """Title and artist trigrams each row shares with the query at its bit"""
+        starts = offsets[rows]
+        lengths = offsets[rows + 1] - starts
+        ends = np.cumsum(lengths)
+        values = grams[np.arange(int(ends[-1])) + np.repeat(starts - ends + lengths, lengths)]
+        hits = (query[values] >> np.repeat(bits, lengths)) & 1
+        # Even slots count title trigrams, odd ones artist trigrams
+        slots = np.repeat(np.arange(0, 2 * len(rows), 2), lengths) + (values >= TRIGRAM_BUCKETS)
+        return np.bincount(slots, weights=hits, minlength=2 * len(rows)).reshape(-1, 2)
+
+    def _shared(self, rows: np.ndarray, bits: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Trigrams `rows` share with the marked queries, and their own trigram counts, by field"""
+        in_base = rows < self._base_size
+        if in_base.all():
+            return (
+                self._count_shared(self._query, self._base_gram_offsets, self._base_grams, rows, bits),
+                np.take(self._base_counts, rows, axis=0)
+            )
+        shared = np.zeros((len(rows), 2), dtype=np.int64)
+        counts = np.zeros((len(rows), 2), dtype=np.int64)
+        if in_base.any():
+            base = rows[in_base]
+            shared[in_base] = self._count_shared(
+                self._query, self._base_gram_offsets, self._base_grams, base, bits[in_base]
+            )
+            counts[in_base] = np.take(self._base_counts, base, axis=0)
+        memory = rows[~in_base] - self._base_size
+        shared[~in_base] = self._count_shared(
+            self._query,
+            np.frombuffer(self._gram_offsets, dtype=np.int64),
+            np.frombuffer(self._grams, dtype=np.int32),
+            memory,
+            bits[~in_base]
+        )
+        counts[~in_base] = np.frombuffer(self._counts, dtype=np.int16).reshape(-1, 2)[memory]
+        return shared, counts
+
+    def _signatures_of(self, rows: np.ndarray) -> np.ndarray:
+        # np.take gathers rows of a 2-D array much faster than indexing does
+        in_base = rows < self._base_size
+        if in_base.all():
+            return np.take(self._base_signatures, rows, axis=0)
+        signatures = np.empty((len(rows), SIGNATURE_WORDS), dtype=np.uint64)
+        signatures[in_base] = np.take(self._base_signatures, rows[in_base], axis=0)
+        memory = np.frombuffer(self._signatures, dtype=np.uint64).reshape(-1, SIGNATURE_WORDS)
+        signatures[~in_base] = np.take(memory, rows[~in_base] - self._base_size, axis=0)
+        return signatures
+
+    def _shortlist(
+        self,
+        owners: np.ndarray,
+        rows: np.ndarray,
+        signatures: np.ndarray,
+        weights: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Distinct (query, row) candidate pairs, ordered by query
+
+        Queries with more than SCORED_CANDIDATES candidates keep those most
+        similar to them by trigram signature.
+        """
+        keys = _distinct(owners.astype(np.int64) << 32 | rows.astype(np.int64))
+        owners = keys >> 32
+        rows = keys & 0xFFFFFFFF
+        counts = np.bincount(owners, minlength=len(signatures))
+        if counts.max() <= SCORED_CANDIDATES:
+            return owners, rows
+
+        row_signatures = self._signatures_of(rows)
+        shared_title, shared_artist = _popcount(row_signatures & np.take(signatures, owners, axis=0))
+        row_title, row_artist = _popcount(row_signatures)
+        query_title, query_artist = _popcount(signatures)
+        scores = (
+            weights[:, TITLE][owners] * 2 * shared_title / np.maximum(row_title + query_title[owners], 1)
+            + weights[:, ARTIST][owners] * 2 * shared_artist / np.maximum(row_artist + query_artist[owners], 1)
+        )
+        # Keep the first SCORED_CANDIDATES of each query, best first
+        order = _best_first(owners, _score_ranks(scores))
+        kept = np.sort(order[_ranks(order, owners, counts) < SCORED_CANDIDATES])
+        return owners[kept], rows[kept]
+
+    def _score(
+        self,
+        queries: List[Tuple[List[int], List[int]]],
+        weights: np.ndarray,
+        owners: np.ndarray,
+        rows: np.ndarray
+    ) -> np.ndarray:
+        """Score of each (query, row) pair; at most 32 queries"""
+        marked = np.array([bucket for title, artist in queries for bucket in title + artist], dtype=np.int64)
+        bits = np.repeat(
+            np.left_shift(np.uint32(1), np.arange(len(queries), dtype=np.uint32)),
+            [len(title) + len(artist) for title, artist in queries]
+        )
+        np.bitwise_or.at(self._query, marked, bits)
+        try:
+            shared, counts = self._shared(rows, owners.astype(np.uint32))
+        finally:
+            self._query[marked] = 0
+
+        sizes = np.array([(len(title), len(artist)) for title, artist in queries], dtype=np.float32)
+        return (
+            weights[:, TITLE][owners] * 2 * shared[:, TITLE] / np.maximum(counts[:, TITLE] + sizes[:, TITLE][owners], 1)
+            + weights[:, ARTIST][owners] * 2 * shared[:, ARTIST]
+            / np.maximum(counts[:, ARTIST] + sizes[:, ARTIST][owners], 1)
+        )
+
+    def _posting_lengths(self, buckets: np.ndarray) -> np.ndarray:
+        lengths = np.zeros(len(buckets), dtype=np.int64)
+        if self._base_offsets is not None:
+            lengths += self._base_offsets[buckets + 1] - self._base_offsets[buckets]
+        if self._postings:
+            lengths += [len(self._postings.get(bucket, ())) for bucket in buckets.tolist()]
+        return lengths
+
+    def _trigram_candidates(self, queries: List[Tuple[List[int], List[int]]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (query, row) pairs of the TRIGRAM_CANDIDATES songs sharing the most
+        of each query's rarest trigrams, reading posting lists rarest first up
+        to about CANDIDATE_POSTINGS postings
+        """
+        counts = [len(title) + len(artist) for title, artist in queries]
+        buckets = np.array([bucket for title, artist in queries for bucket in title + artist], dtype=np.int64)
+        owners = np.repeat(np.arange(len(queries), dtype=np.int64), counts)
+        lengths = self._posting_lengths(buckets)
+        # Rarest lists first within each query, as many as fit in CANDIDATE_POSTINGS
+        order = _best_first(owners, np.minimum(lengths, (1 << 27) - 1))
+        read = np.cumsum(lengths[order])
+        starts = np.cumsum(counts) - counts
+        before = (read - lengths[order])[starts][owners[order]]
+        used = order[(lengths[order] > 0) & (read - before <= CANDIDATE_POSTINGS)]
+        # Where nothing is used, even the rarest trigram is too common to single out a song
+        if not len(used):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        found = [self._posting_list(bucket).astype(np.int64) for bucket in buckets[used].tolist()]
+        rows = np.concatenate(found)
+        row_owners = np.repeat(owners[used], [len(part) for part in found])
+        keys = np.sort(row_owners << 32 | rows)
+        first = np.concatenate(([True], keys[1:] != keys[:-1]))
+        shared = np.diff(np.append(np.flatnonzero(first), len(keys)))
+        keys = keys[first]
+        owners = keys >> 32
+        matched = np.bincount(owners, minlength=len(queries))
+        order = _best_first(owners, (1 << 16) - shared)
+        kept = np.sort(order[_ranks(order, owners, matched) < TRIGRAM_CANDIDATES])
+        return owners[kept], keys[kept] & 0xFFFFFFFF
+
+    def match_many(
+        self,
+        pairs: List[Tuple[str, str]],
+        song_at: Callable[[int], Optional[Song]],
+        min_confidence: float = 0.0
+    ) -> List[Optional[Tuple[Song, float]]]:
+        """
+        The catalog song best matching each (title, artist) pair, with a
+        confidence from 0 to 1, or None where no song reaches `min_confidence`
+
+        `song_at` returns the song at a row, or None if it was removed. Pairs
+        without an exact match are scored together, so a batch costs little
+        more than a single lookup.
+        """
+        results: List[Optional[Tuple[Song, float]]] = [None] * len(pairs)
+        normalized = [(normalize_title(title), normalize_artist(artist)) for title, artist in pairs]
+        wanted = [i for i, (title, _) in enumerate(normalized) if title]
+        exact = self._songs.get_many([id_hash(f"{normalized[i][1]}\x1f{normalized[i][0]}") for i in wanted])
+        for i, rows in zip(wanted, exact):
+            for row in rows:
+                song = song_at(row)
+                if song is not None:
+                    results[i] = (song, 1.0)
+                    break
+
+        unmatched = [i for i in wanted if results[i] is None]
+        if not unmatched:
+            return results
+        by_title = self._titles.get_many([id_hash(normalized[i][0]) for i in unmatched])
+        by_artist = self._artists.get_many([id_hash(normalized[i][1]) for i in unmatched])
+        title_buckets, artist_buckets = _buckets(
+            [normalized[i][0] for i in unmatched],
+            [normalized[i][1] for i in unmatched]
+        )
+        queries = list(zip(title_buckets, artist_buckets))
+        signatures = _signatures(title_buckets, artist_buckets)
+        weights = np.array(
+            [(TITLE_WEIGHT, 1 - TITLE_WEIGHT) if artist else (1.0, 0.0) for _, artist in queries],
+            dtype=np.float32
+        )
+        key_candidates = [
+            np.concatenate([same_title[:KEY_CANDIDATES], same_artist[:KEY_CANDIDATES]])
+            if normalized[i][1] else same_title[:KEY_CANDIDATES]
+            for i, same_title, same_artist in zip(unmatched, by_title, by_artist)
+        ]
+
+        def same_key(chunk: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+            parts = [key_candidates[q] for q in chunk]
+            owners = np.repeat(np.arange(len(chunk), dtype=np.int64), [len(part) for part in parts])
+            return owners, np.concatenate(parts)
+
+        # Songs with the same title or by the same artist first, then songs
+        # sharing rare trigrams for the pairs still unmatched
+        for find in (same_key, lambda chunk: self._trigram_candidates([queries[q] for q in chunk])):
+            pending = [q for q, i in enumerate(unmatched) if results[i] is None]
+            for start in range(0, len(pending), 32):
+                chunk = pending[start:start + 32]
+                owners, rows = find(chunk)
+                if not len(rows):
+                    continue
+                chunk_weights = weights[chunk]
+                owners, rows = self._shortlist(owners, rows, signatures[chunk], chunk_weights)
+                scores = self._score([queries[q] for q in chunk], chunk_weights, owners, rows)
+                # Best first per query, ties to the earlier row
+                order = _best_first(owners, _score_ranks(scores))
+                order = order[scores[order] >= min_confidence]
+                for owner, row, score in zip(owners[order].tolist(), rows[order].tolist(), scores[order].tolist()):
+                    i = unmatched[chunk[owner]]
+                    if results[i] is None:
+                        song = song_at(row)
+                        if song is not None:
+                            results[i] = (song, round(score, 3))
+        return results
+
+    def match(
+        self,
+        title: str,
+        artist: str,
+        song_at: Callable[[int], Optional[Song]],
+        min_confidence: float = 0.0
+    ) -> Optional[Tuple[Song, float]]:
+        """The catalog song best matching a title and artist; see `match_many`"""
+        return self.match_many([(title, artist)], song_at, min_confidence)[0]
+
+    def save(self, directory: str) -> None:
+        """Write the index to `directory` as .npy files"""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        self._songs.save(path, "songs")
+        self._titles.save(path, "titles")
+        self._artists.save(path, "artists")
+
+        base_buckets = np.zeros(0, dtype=np.int64)
+        if self._base_offsets is not None:
+            base_buckets = np.repeat(np.arange(2 * TRIGRAM_BUCKETS, dtype=np.int64), np.diff(self._base_offsets))
+        memory_buckets = [np.full(len(rows), bucket, dtype=np.int64) for bucket, rows in self._postings.items()]
+        memory_rows = [np.frombuffer(rows, dtype=np.int32) for rows in self._postings.values()]
+        buckets = np.concatenate([base_buckets, *memory_buckets])
+        rows = np.concatenate([self._base_rows, *memory_rows])
+        order = np.lexsort((rows, buckets))
+        offsets = np.zeros(2 * TRIGRAM_BUCKETS + 1, dtype=np.int64)
+        np.cumsum(np.bincount(buckets, minlength=2 * TRIGRAM_BUCKETS), out=offsets[1:])
+        save_array(path / "offsets.npy", offsets)
+        save_array(path / "rows.npy", rows[order])
+
+        memory_offsets = np.frombuffer(self._gram_offsets, dtype=np.int64)
+        save_array(path / "gram_offsets.npy", np.concatenate([
+            self._base_gram_offsets, memory_offsets[1:] + self._base_gram_offsets[-1]
+        ]))
+        save_array(path / "grams.npy", np.concatenate([self._base_grams, np.frombuffer(self._grams, dtype=np.int32)]))
+        save_array(path / "counts.npy", np.concatenate([
+            self._base_counts, np.frombuffer(self._counts, dtype=np.int16).reshape(-1, 2)
+        ]))
+        save_array(path / "signatures.npy", np.concatenate([
+            self._base_signatures, np.frombuffer(self._signatures, dtype=np.uint64).reshape(-1, SIGNATURE_WORDS)
+        ]))
+        (path / "resolver.json").write_text(json.dumps({"version": FORMAT_VERSION, "size": len(self)}))
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        """Whether `directory` holds an index in the current format"""
+        meta_path = Path(directory) / "resolver.json"
+        if not meta_path.exists():
+            return False
+        return json.loads(meta_path.read_text()).get("version") == FORMAT_VERSION
+
+    @classmethod
+    def load(cls, directory: str) -> "SongResolver":
+        """Open an index written by `save`, memory-mapping its arrays"""
+        path = Path(directory)
+        meta = json.loads((path / "resolver.json").read_text())
+        resolver = cls()
+        resolver._base_size = meta["size"]
+        resolver._songs = _KeyTable.load(path, "songs")
+        resolver._titles = _KeyTable.load(path, "titles")
+        resolver._artists = _KeyTable.load(path, "artists")
+        resolver._base_offsets = load_array(path / "offsets.npy")
+        resolver._base_rows = load_array(path / "rows.npy")
+        resolver._base_gram_offsets = load_array(path / "gram_offsets.npy")
+        resolver._base_grams = load_array(path / "grams.npy")
+        resolver._base_counts = load_array(path / "counts.npy")
+        resolver._base_signatures = load_array(path / "signatures.npy")
+        return resolver
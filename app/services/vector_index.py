@@ -0,0 +1,290 @@
+"""
+In-memory vector index with top-k cosine search
+"""
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+from app.utils.helpers import save_array
+from app.utils.logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+
+# Vectors scored per matrix product when a full pass over the index is needed
+CHUNK_ROWS = 65536
+
+# Per-slot and per-row arrays written by `save`
+STORED_ARRAYS = ("_vectors", "_scales", "_live", "_assignments", "_slot_rows", "_row_slots")
+
+
+class VectorIndex:
+    """
+    Top-k cosine search over L2-normalized vectors
+
+    Vectors are scored with matrix-vector products and the best k are picked
+    with argpartition, so a flat search is a single pass over the matrix.
+
+    With `ivf_lists` set, `train` clusters the vectors with spherical k-means
+    and a search only scores the `nprobe` lists whose centroids are closest to
+    the query. Vectors are kept grouped by list so each probed list is one
+    contiguous slice. With `quantize` set, vectors are stored as int8 with a
+    per-vector scale, using a quarter of the float32 memory.
+
+    Callers refer to vectors by the row number `add` returns; the storage
+    order behind it is internal. An index written with `save` can be opened
+    with `load` as read-only memory maps; it is copied into memory the first
+    time it is modified.
+    """
+
+    def __init__(self, dim: int, ivf_lists: int = 0, nprobe: int = 8, quantize: bool = False):
+        self.dim = dim
+        self.ivf_lists = ivf_lists
+        self.nprobe = nprobe
+        self.quantize = quantize
+        self._size = 0
+        self._live_count = 0
+        # Storage, indexed by slot
+        self._vectors = np.zeros((0, dim), dtype=np.int8 if quantize else np.float32)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._slot_rows = np.zeros(0, dtype=np.int64)
+        # Slot of each row
+        self._row_slots = np.zeros(0, dtype=np.int64)
+        self._centroids: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    @property
+    def size(self) -> int:
+        """Number of rows, including removed ones"""
+        return self._size
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = len(self._vectors)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+
+        vectors = np.zeros((capacity, self.dim), dtype=self._vectors.dtype)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        for name in ("_scales", "_live", "_assignments", "_slot_rows", "_row_slots"):
+            current = getattr(self, name)
+            grown = np.zeros(capacity, dtype=current.dtype)
+            grown[:self._size] = current[:self._size]
+            setattr(self, name, grown)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Append vectors and return their row numbers"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        count = len(vectors)
+        self._reserve(count)
+        slots = np.arange(self._size, self._size + count)
+
+        if self.quantize:
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            self._vectors[slots] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[slots] = scales
+        else:
+            self._vectors[slots] = vectors
+
+        self._live[slots] = True
+        self._slot_rows[slots] = slots
+        self._row_slots[slots] = slots
+        self._size += count
+        self._live_count += count
+
+        if self._centroids is not None:
+            self._assignments[slots] = self._argmax_chunks(vectors, self._centroids)
+            self._list_offsets = None
+        return slots
+
+    def remove(self, rows: np.ndarray) -> None:
+        """Exclude rows from future searches"""
+        slots = self._row_slots[np.asarray(rows, dtype=np.int64)]
+        if not self._live.flags.writeable:
+            self._live = np.array(self._live)
+        slots = slots[self._live[slots]]
+        self._live[slots] = False
+        self._live_count -= len(slots)
+
+    def _vectors_at(self, slots: np.ndarray) -> np.ndarray:
+        stored = self._vectors[slots]
+        if self.quantize:
+            return stored.astype(np.float32) * self._scales[slots][:, None]
+        return stored
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Float32 vectors for the given rows"""
+        return self._vectors_at(self._row_slots[np.asarray(rows, dtype=np.int64)])
+
+    def needs_training(self) -> bool:
+        """Whether IVF lists are missing or stale after substantial growth"""
+        if not self.ivf_lists or self._size < self.ivf_lists * 4:
+            return False
+        return self._centroids is None or self._size >= self._trained_size * 2
+
+    def train(self, sample_per_list: int = 64, iterations: int = 10, seed: int = 0) -> None:
+        """Cluster the vectors into IVF lists with spherical k-means"""
+        if not self.ivf_lists:
+            return
+        rng = np.random.default_rng(seed)
+        live_slots = np.flatnonzero(self._live[:self._size])
+        nlist = min(self.ivf_lists, len(live_slots))
+        if nlist == 0:
+            return
+
+        sample_slots = live_slots
+        if len(live_slots) > nlist * sample_per_list:
+            sample_slots = np.sort(rng.choice(live_slots, nlist * sample_per_list, replace=False))
+        sample = self._vectors_at(sample_slots)
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = self._argmax_chunks(sample, centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=nlist)
+            filled = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+            centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+
+            # Re-seed empty lists with random sample vectors
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids /= norms
+
+        self._centroids = centroids
+        for start in range(0, self._size, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, self._size)
+            self._assignments[start:stop] = self._argmax_chunks(
+                self._vectors_at(np.arange(start, stop)), centroids
+            )
+        self._list_offsets = None
+        self._lists()
+        self._trained_size = self._size
+        logger.info(f"Trained IVF index: {nlist} lists over {self._size} vectors")
+
+    @staticmethod
+    def _argmax_chunks(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        result = np.empty(len(vectors), dtype=np.int32)
+        step = max(1, CHUNK_ROWS * 64 // max(len(centroids), 1))
+        for start in range(0, len(vectors), step):
+            result[start:start + step] = np.argmax(vectors[start:start + step] @ centroids.T, axis=1)
+        return result
+
+    def _lists(self) -> np.ndarray:
+        """
+        Offsets of each IVF list in storage
+
+        Storage is re-sorted by list after training or adds, so every list is
+        a contiguous run of slots.
+        """
+        if self._list_offsets is None:
+            size = self._size
+            order = np.argsort(self._assignments[:size], kind="stable")
+            self._vectors[:size] = self._vectors[order]
+            for name in ("_scales", "_live", "_assignments", "_slot_rows"):
+                values = getattr(self, name)
+                values[:size] = values[order]
+            self._row_slots[self._slot_rows[:size]] = np.arange(size)
+
+            counts = np.bincount(self._assignments[:size], minlength=len(self._centroids))
+            self._list_offsets = np.concatenate(([0], np.cumsum(counts)))
+        return self._list_offsets
+
+    def _score_range(self, start: int, stop: int, query: np.ndarray) -> np.ndarray:
+        if self.quantize:
+            return (self._vectors[start:stop].astype(np.float32) @ query) * self._scales[start:stop]
+        return self._vectors[start:stop] @ query
+
+    def _ranges(self, query: np.ndarray) -> List[Tuple[int, int]]:
+        """Slot ranges to score: the nearest IVF lists, or everything"""
+        if self._centroids is not None and self.nprobe < len(self._centroids):
+            offsets = self._lists()
+            probes = np.argpartition(-(self._centroids @ query), self.nprobe - 1)[:self.nprobe]
+            return [(int(offsets[p]), int(offsets[p + 1])) for p in np.sort(probes)]
+        return [(start, min(start + CHUNK_ROWS, self._size)) for start in range(0, self._size, CHUNK_ROWS)]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k rows most similar to `query`
+
+        `mask`, if given, is a boolean array over rows; rows where it is False
+        are skipped. Returns (rows, scores), best first.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if self._live_count == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        ranges = self._ranges(query)
+        scores = np.concatenate([self._score_range(start, stop, query) for start, stop in ranges])
+        slots = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+
+        keep = self._live[slots]
+        if mask is not None:
+            keep &= mask[self._slot_rows[slots]]
+        if not keep.all():
+            slots, scores = slots[keep], scores[keep]
+
+        if len(slots) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            slots, scores = slots[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return self._slot_rows[slots[order]], scores[order]
+
+    def save(self, directory: str) -> None:
+        """Write the index to `directory` as .npy files"""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        if self._centroids is not None:
+            self._lists()
+            save_array(path / "centroids.npy", self._centroids)
+            save_array(path / "list_offsets.npy", self._list_offsets)
+
+        for name in STORED_ARRAYS:
+            save_array(path / f"{name.lstrip('_')}.npy", getattr(self, name)[:self._size])
+        (path / "index.json").write_text(json.dumps({
+            "dim": self.dim,
+            "size": self._size,
+            "live_count": self._live_count,
+            "ivf_lists": self.ivf_lists,
+            "quantize": self.quantize,
+            "trained_size": self._trained_size
+        }))
+
+    @classmethod
+    def load(cls, directory: str, nprobe: int = 8) -> "VectorIndex":
+        """Open an index written by `save`, memory-mapping its arrays"""
+        path = Path(directory)
+        meta = json.loads((path / "index.json").read_text())
+        index = cls(meta["dim"], ivf_lists=meta["ivf_lists"], nprobe=nprobe, quantize=meta["quantize"])
+        for name in STORED_ARRAYS:
+            setattr(index, name, np.load(path / f"{name.lstrip('_')}.npy", mmap_mode="r").view(np.ndarray))
+        index._size = meta["size"]
+        index._live_count = meta["live_count"]
+        index._trained_size = meta["trained_size"]
+        if (path / "centroids.npy").exists():
+            index._centroids = np.load(path / "centroids.npy")
+            index._list_offsets = np.load(path / "list_offsets.npy")
+        return index
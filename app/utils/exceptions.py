@@ -33,3 +33,12 @@ class RateLimitException(AIServiceException):
             status_code=status.HTTP_429_TOO_MANY_REQUESTS
         )
 
+
+
+class CircuitOpenException(AIServiceException):
+    """Exception raised when the upstream circuit breaker is open"""
+    def __init__(self, detail: str = "AI provider temporarily unavailable"):
+        super().__init__(
+            detail=detail,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
@@ -1,24 +1,47 @@
-from typing import List, Dict
+import json
+import os
+from pathlib import Path
+from typing import Any, List, Dict
+import numpy as np
 from app.models.song import Song
+from app.utils.prompt_compiler import SongFragments
 
 
-def format_songs_for_prompt(songs: List[Song]) -> str:
-    """Format songs list into a readable string for prompts"""
+def _song_line(song: Song) -> str:
+    parts = [f"'{song.title}' by {song.artist}"]
     
-    formatted = []
-    for i, song in enumerate(songs, 1):
-        parts = [f"{i}. '{song.title}' by {song.artist}"]
-        
-        if song.album:
-            parts.append(f"from the album '{song.album}'")
-        if song.genre:
-            parts.append(f"({song.genre})")
-        if song.year:
-            parts.append(f"[{song.year}]")
-        
-        formatted.append(" ".join(parts))
+    if song.album:
+        parts.append(f"from the album '{song.album}'")
+    if song.genre:
+        parts.append(f"({song.genre})")
+    if song.year:
+        parts.append(f"[{song.year}]")
     
-    return "\n".join(formatted)
+    return " ".join(parts)
+
+
+def _short_song_line(song: Song) -> str:
+    line = f"'{song.title}' by {song.artist}"
+    if song.genre:
+        line += f" ({song.genre})"
+    if song.year:
+        line += f" [{song.year}]"
+    return line
+
+
+# Memoized prompt lines: title, artist, album, genre and year, or without the album
+song_lines = SongFragments(_song_line)
+short_song_lines = SongFragments(_short_song_line)
+
+
+def format_songs_for_prompt(songs: List[Song]) -> str:
+    """Format songs list into a readable string for prompts"""
+    return song_lines.numbered(songs)
+
+
+def sort_songs_canonically(songs: List[Song]) -> List[Song]:
+    """Return songs in a stable order that doesn't depend on how they were sent"""
+    return sorted(songs, key=lambda song: (song.id, song.title, song.artist))
 
 
 def format_duration(seconds: int) -> str:
@@ -65,3 +88,49 @@ def calculate_total_duration(songs: List[Song]) -> int:
     """Calculate total duration of songs in seconds"""
     return sum(song.duration for song in songs)
 
+
+# Characters that mostly end one token and start the next: spaces, line
+# breaks and punctuation, counted at 1.15 tokens each.
+_TOKEN_BOUNDARIES = " \n'\".,:;!?()[]{}-/&"
+
+# Floors for what the boundaries miss: a token per 4 characters of ASCII
+# text, for unspaced runs such as ids and URLs, and a token per 2.5 UTF-8
+# bytes of characters outside ASCII. Like the boundary weight, these are
+# rules of thumb that haven't been fitted to a tokenizer.
+_ASCII_CHARS_PER_TOKEN = 4
+_OTHER_BYTES_PER_TOKEN = 2.5
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast local token estimate from the word and punctuation boundaries in
+    a text, with a floor for unspaced text and a count per UTF-8 byte for
+    characters outside ASCII
+
+    Not a tokenizer count: `benchmarks.bench_prompt_budget` prints its
+    error against tiktoken where tiktoken is installed.
+    """
+    boundaries = int(sum(map(text.count, _TOKEN_BOUNDARIES)) * 1.15)
+    if text.isascii():
+        return max(boundaries, len(text) // _ASCII_CHARS_PER_TOKEN) + 1
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    other_bytes = len(text.encode("utf-8", "surrogatepass")) - ascii_chars
+    return max(boundaries, ascii_chars // _ASCII_CHARS_PER_TOKEN) + int(other_bytes / _OTHER_BYTES_PER_TOKEN) + 1
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def format_ndjson(data: Any) -> str:
+    """Format a single newline-delimited JSON record"""
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+def save_array(path: Path, array: np.ndarray) -> None:
+    """Write an .npy file atomically, so open memory maps of the old file stay valid"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as handle:
+        np.save(handle, array)
+    os.replace(tmp_path, path)
@@ -0,0 +1,108 @@
+"""
+Incremental JSON parsing over a token stream
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+
+class _Container:
+    """An open JSON object or array"""
+    __slots__ = ("kind", "key", "start", "current_key")
+
+    def __init__(self, kind: str, key: Optional[str], start: int):
+        self.kind = kind
+        self.key = key
+        self.start = start
+        self.current_key: Optional[str] = None
+
+
+class IncrementalJSONParser:
+    """
+    Emit the items of a JSON array as soon as each one is complete
+
+    Watches for an array stored under `array_key` in the root object (or a
+    root array when `accept_root_array` is set) and returns every object in
+    it the moment its closing brace arrives. Text before the root value, such
+    as a stray markdown fence, is skipped. The full document stays buffered
+    so the remaining fields can be read once the stream ends.
+    """
+
+    def __init__(self, array_key: str, accept_root_array: bool = False):
+        self.array_key = array_key
+        self.accept_root_array = accept_root_array
+        self.buffer = ""
+        self._pos = 0
+        self._stack: List[_Container] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._started = False
+        self._finished = False
+
+    @property
+    def finished(self) -> bool:
+        """True once the root value has closed"""
+        return self._finished
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume more text and return items completed by it"""
+        self.buffer += text
+        items: List[Dict[str, Any]] = []
+        buffer = self.buffer
+
+        for pos in range(self._pos, len(buffer)):
+            if self._finished:
+                break
+
+            char = buffer[pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = json.loads(buffer[self._string_start:pos + 1])
+                continue
+
+            if not self._started:
+                if char in "{[":
+                    self._started = True
+                else:
+                    continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == ":":
+                if self._stack and self._stack[-1].kind == "{":
+                    self._stack[-1].current_key = self._last_string
+            elif char in "{[":
+                parent = self._stack[-1] if self._stack else None
+                key = parent.current_key if parent is not None and parent.kind == "{" else None
+                self._stack.append(_Container(char, key, pos))
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                container = self._stack.pop()
+                if char == "}" and self._is_item(container):
+                    items.append(json.loads(buffer[container.start:pos + 1]))
+                if not self._stack:
+                    self._finished = True
+
+        self._pos = len(buffer)
+        return items
+
+    def _is_item(self, container: _Container) -> bool:
+        """Whether a just-closed object is an element of the watched array"""
+        if container.kind != "{" or not self._stack or self._stack[-1].kind != "[":
+            return False
+
+        array = self._stack[-1]
+        if len(self._stack) == 2:
+            return self._stack[0].kind == "{" and array.key == self.array_key
+        if len(self._stack) == 1:
+            return self.accept_root_array
+        return False
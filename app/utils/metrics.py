@@ -0,0 +1,198 @@
+"""
+Lightweight in-process metrics
+
+Updates happen on the event loop without locks: each one is a dict lookup
+and an addition, and nothing awaits in between.
+"""
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+LabelValues = Tuple[str, ...]
+
+# Bucket upper bounds in seconds for latencies of our own requests and of
+# upstream completions, which can take tens of seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._values: Dict[LabelValues, float] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if not self.labelnames:
+            return ()
+        return tuple([str(labels.get(name, "")) for name in self.labelnames])
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Dict[LabelValues, float]:
+        return dict(self._values)
+
+    def lines(self) -> Iterator[str]:
+        if not self.labelnames and () not in self._values:
+            yield f"{self.name} 0"
+        for key, value in list(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) - amount
+
+
+class Histogram:
+    """
+    Distribution of observed values in fixed buckets, optionally split by labels
+
+    Each observation increments a single bucket; the cumulative counts the
+    Prometheus format expects are only summed up when rendering.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = REQUEST_BUCKETS
+    ):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: a count per bucket plus one for values above the last, then the sum
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if not self.labelnames:
+            return ()
+        return tuple([str(labels.get(name, "")) for name in self.labelnames])
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        counts = self._values.get(key)
+        if counts is None:
+            counts = self._values[key] = [0.0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def count(self, **labels: Any) -> float:
+        counts = self._values.get(self._key(labels))
+        return sum(counts[:-1]) if counts else 0.0
+
+    def samples(self) -> Dict[LabelValues, Dict[str, float]]:
+        return {
+            key: {"count": sum(counts[:-1]), "sum": round(counts[-1], 6)}
+            for key, counts in self._values.items()
+        }
+
+    def lines(self) -> Iterator[str]:
+        for key, counts in list(self._values.items()):
+            labels = _labels(self.labelnames, key)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le=_number(bound))} {_number(cumulative)}"
+            yield f"{self.name}_sum{labels} {_number(counts[-1])}"
+            yield f"{self.name}_count{labels} {_number(cumulative)}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: LabelValues, le: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsRegistry:
+    """Named collection of metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, description: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Get or create a counter"""
+        return self._register(Counter, name, description, labelnames)
+
+    def gauge(self, name: str, description: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """Get or create a gauge"""
+        return self._register(Gauge, name, description, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = REQUEST_BUCKETS
+    ) -> Histogram:
+        """Get or create a histogram"""
+        return self._register(Histogram, name, description, labelnames, buckets=buckets)
+
+    def _register(self, cls, name: str, description: str, labelnames: Tuple[str, ...], **options: Any):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(name, description, labelnames, **options)
+            self._metrics[name] = metric
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as {type(metric).__name__}")
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values as a JSON-friendly dict"""
+        result: Dict[str, Any] = {}
+        for name, metric in self._metrics.items():
+            samples = metric.samples()
+            if not metric.labelnames:
+                result[name] = samples.get((), 0.0)
+            else:
+                result[name] = {
+                    ",".join(f"{label}={value}" for label, value in zip(metric.labelnames, key)): amount
+                    for key, amount in samples.items()
+                }
+        return result
+
+    def render(self) -> str:
+        """Current values in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            description = metric.description.replace("\\", "\\\\").replace("\n", "\\n")
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,162 @@
+"""
+Fitting playlists of any length into a prompt's token budget
+"""
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+from app.models.song import Song
+from app.utils.helpers import estimate_tokens, format_songs_for_prompt
+
+
+# Lines formatted to measure a playlist's tokens per song
+PROBE_SONGS = 32
+
+SAMPLE_NOTE = (
+    "(A sample of {count} of the playlist's {total} songs, chosen to cover its "
+    "genres, decades and artists. Whole playlist:)"
+)
+
+# Genres, decades and artists named in the statistics of a sampled playlist
+TOP_VALUES = 8
+
+
+def _taste_groups(songs: List[Song]) -> List[List[List[int]]]:
+    """Song indexes grouped by genre and decade, then by artist; biggest groups first"""
+    groups: Dict[Tuple[str, int], Dict[str, List[int]]] = {}
+    for index, song in enumerate(songs):
+        key = (song.genre or "", (song.year or 0) // 10)
+        groups.setdefault(key, {}).setdefault(song.artist, []).append(index)
+    return sorted(
+        (sorted(artists.values(), key=lambda indexes: (-len(indexes), indexes[0])) for artists in groups.values()),
+        key=lambda queues: -sum(len(indexes) for indexes in queues)
+    )
+
+
+def _sample(songs: List[Song], groups: List[List[List[int]]], count: int) -> List[Song]:
+    if count >= len(songs):
+        return list(songs)
+    if count <= 0:
+        return []
+
+    sizes = [sum(len(indexes) for indexes in queues) for queues in groups]
+    shares = [1 if i < count else 0 for i in range(len(groups))]
+    spare = count - sum(shares)
+    if spare > 0:
+        # Largest remainder apportionment of what is left after one each
+        rest = [size - share for size, share in zip(sizes, shares)]
+        total = sum(rest)
+        quotas = [spare * size / total for size in rest]
+        extra = [int(quota) for quota in quotas]
+        by_remainder = sorted(range(len(groups)), key=lambda i: extra[i] - quotas[i])
+        for i in by_remainder[:spare - sum(extra)]:
+            extra[i] += 1
+        shares = [share + more for share, more in zip(shares, extra)]
+
+    picked: List[int] = []
+    for queues, share in zip(groups, shares):
+        turn = 0
+        while share > 0:
+            for indexes in queues:
+                if share == 0:
+                    break
+                if turn < len(indexes):
+                    picked.append(indexes[turn])
+                    share -= 1
+            turn += 1
+    return [songs[index] for index in sorted(picked)]
+
+
+def representative_songs(songs: List[Song], count: int) -> List[Song]:
+    """
+    `count` songs that cover a playlist's genres, decades and artists, in
+    playlist order
+
+    Songs are grouped by genre and decade. Every group gets one song while
+    there are enough to go round, biggest groups first, and the rest are
+    shared out in proportion to group size. Within a group, songs are taken
+    one per artist in turn, so no artist crowds out the others.
+    """
+    if count >= len(songs) or count <= 0:
+        return _sample(songs, [], count)
+    return _sample(songs, _taste_groups(songs), count)
+
+
+def _distribution(values: List[str], total: int) -> str:
+    counts = Counter(values).most_common()
+    parts = [f"{value} {count / total:.0%}" for value, count in counts[:TOP_VALUES]]
+    others = sum(count for _, count in counts[TOP_VALUES:])
+    if others:
+        parts.append(f"{len(counts) - TOP_VALUES} others {others / total:.0%}")
+    return ", ".join(parts)
+
+
+def playlist_stats(songs: List[Song]) -> str:
+    """Genre, decade and artist make-up of a whole playlist, for prompts that list only part of it"""
+    total = len(songs)
+    genres = [song.genre for song in songs if song.genre]
+    years = [song.year for song in songs if song.year]
+    artists = Counter(song.artist for song in songs).most_common()
+
+    lines = []
+    if genres:
+        lines.append(f"- Genres: {_distribution(genres, total)}")
+    if years:
+        lines.append(f"- Decades: {_distribution([f'{year // 10 * 10}s' for year in years], total)}")
+        lines.append(f"- Years: {min(years)}-{max(years)}")
+    top_artists = ", ".join(f"{artist} ({count})" for artist, count in artists[:TOP_VALUES])
+    lines.append(f"- Artists: {len(artists)}, most played {top_artists}")
+    return "\n".join(lines)
+
+
+def songs_within_budget(
+    songs: List[Song],
+    budget: int,
+    format_songs: Callable[[List[Song]], str] = format_songs_for_prompt
+) -> str:
+    """
+    A listing of a playlist's songs that takes at most about `budget` tokens
+
+    Lists every song if they fit, or if `budget` is 0. Otherwise lists a
+    representative sample, sized from the tokens per song of a few formatted
+    lines, followed by statistics of the whole playlist. Only the sampled
+    songs are formatted, so the cost stays flat as playlists grow.
+    """
+    if budget <= 0 or not songs:
+        return format_songs(songs)
+
+    groups = _taste_groups(songs)
+    probe = _sample(songs, groups, PROBE_SONGS)
+    per_song = estimate_tokens(format_songs(probe)) / len(probe)
+    if per_song * len(songs) <= budget:
+        listing = format_songs(songs)
+        if len(songs) <= PROBE_SONGS or estimate_tokens(listing) <= budget:
+            return listing
+
+    stats = playlist_stats(songs)
+    available = budget - estimate_tokens(f"{SAMPLE_NOTE.format(count=len(songs), total=len(songs))}\n{stats}")
+    count = max(1, int(available / per_song))
+    while True:
+        sample = _sample(songs, groups, count)
+        listing = format_songs(sample)
+        used = estimate_tokens(listing)
+        if used <= available or count == 1:
+            break
+        # Song lengths vary; shrink by the overshoot and try again
+        count = max(1, min(count - 1, int(count * available / used)))
+    note = SAMPLE_NOTE.format(count=count, total=len(songs))
+    return f"{listing}\n\n{note}\n{stats}"
+
+
+def fit_prompt(
+    render: Callable[[str], str],
+    songs: List[Song],
+    budget: int,
+    format_songs: Callable[[List[Song]], str] = format_songs_for_prompt
+) -> str:
+    """
+    Render a prompt around a listing of `songs`, sampled so the whole
+    prompt stays within about `budget` tokens (0 lists every song)
+    """
+    if budget <= 0:
+        return render(format_songs(songs))
+    fixed = estimate_tokens(render(""))
+    return render(songs_within_budget(songs, max(budget - fixed, 1), format_songs))
@@ -0,0 +1,113 @@
+"""
+Prompt templates compiled once at import, and memoized per-song prompt lines
+"""
+import re
+from itertools import count
+from string import Formatter
+from typing import Callable, Dict, FrozenSet, List, Tuple
+from app.models.song import Song
+
+
+# Numbered lists ("1. ", "- ") and the lines of JSON examples, whose braces
+# are doubled in templates
+_LIST_OR_JSON = re.compile(r"\s*(\d+\. |- |\{\{|\}\}|[\[\]\"])")
+
+# Formatted fragments kept per kind of song line
+FRAGMENT_CACHE_SIZE = 100000
+
+
+def minimize_whitespace(text: str) -> str:
+    """
+    Drop the blank lines a prompt doesn't need
+
+    Trailing spaces are stripped and runs of blank lines become one. A
+    single blank line between two list items or two lines of a JSON
+    example is dropped, so lists and examples are written one line per
+    entry.
+    """
+    lines = [line.rstrip() for line in text.strip().split("\n")]
+    kept: List[str] = []
+    i = 0
+    while i < len(lines):
+        if lines[i]:
+            kept.append(lines[i])
+            i += 1
+            continue
+        start = i
+        while i < len(lines) and not lines[i]:
+            i += 1
+        single = i - start == 1
+        if single and _LIST_OR_JSON.match(kept[-1]) and _LIST_OR_JSON.match(lines[i]):
+            continue
+        kept.append("")
+    return "\n".join(kept)
+
+
+class PromptTemplate:
+    """
+    A prompt with named `{fields}`, whitespace-minimized and parsed once
+
+    Literal braces are written `{{` and `}}`, as with str.format.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.text = minimize_whitespace(source)
+        fields = set()
+        prefix: List[str] = []
+        for literal, name, _, _ in Formatter().parse(self.text):
+            if not fields:
+                prefix.append(literal)
+            if name is not None:
+                if not name.isidentifier():
+                    raise ValueError(f"Prompt template fields must be named: {{{name}}}")
+                fields.add(name)
+        self.fields: FrozenSet[str] = frozenset(fields)
+        # Static text before the first field, the same in every prompt built
+        # from the template
+        self.static_prefix = "".join(prefix)
+        self._render = self.text.format_map
+
+    def render(self, **values) -> str:
+        """Fill in the template's fields"""
+        return self._render(values)
+
+
+def static_prompt(source: str) -> str:
+    """A prompt without fields, such as a system prompt, whitespace-minimized"""
+    return minimize_whitespace(source)
+
+
+class SongFragments:
+    """
+    Prompt lines for songs, formatted once per song
+
+    Fragments are memoized by song id plus a hash of the fields that are
+    written out, so an edited song gets a fresh line.
+    """
+
+    def __init__(self, fragment: Callable[[Song], str], max_entries: int = FRAGMENT_CACHE_SIZE):
+        self._fragment = fragment
+        self._max_entries = max_entries
+        self._cache: Dict[Tuple[str, int], str] = {}
+
+    def get(self, song: Song) -> str:
+        """The formatted fragment for a song"""
+        key = (song.id, hash((song.title, song.artist, song.album, song.genre, song.year)))
+        fragment = self._cache.get(key)
+        if fragment is None:
+            if len(self._cache) >= self._max_entries:
+                # Evict the oldest entry; dicts keep insertion order
+                del self._cache[next(iter(self._cache))]
+            fragment = self._cache[key] = self._fragment(song)
+        return fragment
+
+    def numbered(self, songs: List[Song], prefix: str = "", start: int = 1) -> str:
+        """One line per song, numbered from `start` with an optional id prefix ("s" for s0, s1...)"""
+        return "\n".join(map(f"{prefix}{{}}. {{}}".format, count(start), map(self.get, songs)))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
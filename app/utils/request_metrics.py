@@ -0,0 +1,69 @@
+"""
+Latency, in-flight and error metrics for API requests
+"""
+import time
+from typing import Any, Callable, Dict
+from app.utils.metrics import metrics
+
+
+request_latency = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ("route", "method", "status")
+)
+requests_in_flight = metrics.gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled"
+)
+request_errors = metrics.counter(
+    "request_errors_total",
+    "Errors reported to clients, by exception class",
+    ("exception",)
+)
+
+
+def count_error(error: BaseException) -> None:
+    """Count an error reported to a client, in a response or in-band in a stream"""
+    request_errors.inc(exception=type(error).__name__)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request
+
+    Requests are labelled with the path template of the route that handled
+    them, such as /catalog/songs/{song_id}, so label values stay bounded;
+    paths no route matched share "unmatched". Streaming responses are timed
+    until their last chunk is sent.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_flight.dec()
+            # The router stores the matched route in the scope it was given
+            route = scope.get("route")
+            request_latency.observe(
+                time.perf_counter() - started,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=status
+            )
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: building and opening the memory-mapped catalog store
+
+Writes a synthetic JSONL export, bulk-ingests it into a catalog store, then
+measures how long a fresh process takes to open the store and how fast songs
+can be looked up by id, compared with parsing the JSONL export directly.
+
+Usage:
+    python -m benchmarks.bench_catalog_store [--songs 1000000] [--keep DIR]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.synthetic_catalog import make_songs
+
+
+OPEN_SCRIPT = """
+import resource, sys, time
+started = time.perf_counter()
+from app.services.catalog import SongCatalog
+imported = time.perf_counter()
+catalog = SongCatalog.open(sys.argv[1])
+opened = time.perf_counter()
+catalog.search("electric midnight rock from the 80s", 10)
+searched = time.perf_counter()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(f"{(opened - imported) * 1000:.1f} {(searched - opened) * 1000:.1f} {rss:.0f}")
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--keep", help="Build the store in this directory and keep it")
+    args = parser.parse_args()
+    
+    from app.services.catalog import SongCatalog, build_catalog, read_songs
+    
+    workdir = Path(args.keep or tempfile.mkdtemp(prefix="catalog-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    source = workdir / "songs.jsonl"
+    store_dir = workdir / "store"
+    
+    with source.open("w") as handle:
+        for song in make_songs(args.songs):
+            handle.write(json.dumps(song.model_dump(exclude_none=True)) + "\n")
+    print(f"{args.songs} songs, export {source.stat().st_size / 1e6:.0f} MB")
+    
+    start = time.perf_counter()
+    for _ in read_songs(str(source)):
+        pass
+    print(f"parse JSONL export:       {time.perf_counter() - start:8.1f} s")
+    
+    start = time.perf_counter()
+    build_catalog(str(source), str(store_dir))
+    size = sum(path.stat().st_size for path in store_dir.rglob("*") if path.is_file())
+    print(f"build store (with index): {time.perf_counter() - start:8.1f} s, {size / 1e6:.0f} MB on disk")
+    
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    output = subprocess.run(
+        [sys.executable, "-c", OPEN_SCRIPT, str(store_dir)],
+        capture_output=True, text=True, env=env, check=True
+    ).stdout.split()
+    print(f"open store (new process): {float(output[0]):8.1f} ms")
+    print(f"first search (cold):      {float(output[1]):8.1f} ms, process RSS {output[2]} MB")
+    
+    catalog = SongCatalog.open(str(store_dir))
+    ids = [f"song-{random.randrange(args.songs)}" for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for song_id in ids:
+        catalog.get(song_id)
+    elapsed = time.perf_counter() - start
+    print(f"lookup by id:             {elapsed / args.lookups * 1e6:8.1f} us per song")
+    
+    if not args.keep:
+        for path in sorted(workdir.rglob("*"), reverse=True):
+            path.unlink() if path.is_file() else path.rmdir()
+        workdir.rmdir()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent completions per process against a local mock Groq server
+
+Compares the async pooled GroqService with the previous approach of running the
+synchronous Groq client in the default thread pool executor.
+
+Usage:
+    python -m benchmarks.bench_groq_concurrency [--latency 0.2] [--requests 500]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.mock_groq import MockGroqServer
+
+
+async def run_async_service(total: int, concurrency: int) -> float:
+    """Run completions through the pooled async GroqService"""
+    from app.services.groq_service import GroqService
+    
+    service = GroqService()
+    await service.open()
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one():
+        async with semaphore:
+            await service.generate_completion(prompt="benchmark", temperature=0.5)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    await service.close()
+    return elapsed
+
+
+async def run_executor_client(total: int, concurrency: int, base_url: str) -> float:
+    """Run completions through the sync client in the default executor"""
+    from groq import Groq
+    
+    client = Groq(api_key="benchmark-key", base_url=base_url)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one():
+        async with semaphore:
+            await loop.run_in_executor(
+                None,
+                lambda: client.chat.completions.create(
+                    model="mock",
+                    messages=[{"role": "user", "content": "benchmark"}]
+                )
+            )
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock upstream latency in seconds")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    
+    server = MockGroqServer(port=args.port, latency=args.latency)
+    server.start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    
+    from app.config import settings
+    settings.GROQ_BASE_URL = server.base_url
+    settings.GROQ_MAX_CONNECTIONS = max(args.concurrency)
+    settings.GROQ_MAX_KEEPALIVE_CONNECTIONS = max(args.concurrency)
+    
+    print(f"Mock upstream latency: {args.latency * 1000:.0f} ms, {args.requests} requests per run")
+    print(f"{'backend':<10} {'concurrency':>11} {'req/s':>10} {'peak in-flight':>15}")
+    
+    try:
+        for concurrency in args.concurrency:
+            for name in ("executor", "async"):
+                server.reset()
+                if name == "async":
+                    elapsed = asyncio.run(run_async_service(args.requests, concurrency))
+                else:
+                    elapsed = asyncio.run(run_executor_client(args.requests, concurrency, server.base_url))
+                print(f"{name:<10} {concurrency:>11} {args.requests / elapsed:>10.1f} {server.peak_in_flight:>15}")
+    finally:
+        server.stop()
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
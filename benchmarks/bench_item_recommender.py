@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark: recommend-songs from the local playlist co-occurrence model
+
+Generates playlists with some taste: each draws most of its songs from one
+or two (genre, decade) groups of a synthetic catalog, with Zipf-like
+popularity inside a group, plus a few random songs. The recommender learns
+from 90% of them; from each of the rest, a few songs are held out and
+recommended back from the others.
+
+- build: time to learn the neighbor lists, and the embeddings
+- recall: share of held-out songs among the top N, for neighbors only,
+  neighbors blended with embeddings, and the most popular songs
+- scoring: latency of scoring playlists of 10 to 500 songs
+- endpoint: recommend-songs through AIService against a local mock Groq
+  server, with the LLM picking the songs (llm), the model picking them and
+  the LLM writing the reasons in one call (local), or no LLM call (fast)
+
+Usage:
+    python -m benchmarks.bench_item_recommender [--songs 20000] [--playlists 20000] [--factors 64] [--latency 0.3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.synthetic_catalog import make_songs
+
+
+def respond(body: dict) -> str:
+    prompt = body["messages"][-1]["content"]
+    if "keyed by recommendation id" in prompt:
+        ids = re.findall(r"^(r\d+)\. ", prompt, re.M)
+        return json.dumps({rec_id: "It shares the playlist's sound and era." for rec_id in ids})
+    count = int(re.search(r"Recommend exactly (\d+)", prompt).group(1))
+    return json.dumps({"recommendations": [
+        {"title": f"Mock Song {i}", "artist": "Mock Artist", "reason": "It fits."} for i in range(count)
+    ]})
+
+
+def make_playlists(songs, count: int, seed: int):
+    """Song ids of `count` playlists drawn mostly from one or two taste groups"""
+    rng = np.random.default_rng(seed)
+    groups = {}
+    for song in songs:
+        groups.setdefault((song.genre, song.year // 10), []).append(song.id)
+    groups = [np.array(ids) for ids in groups.values() if len(ids) >= 20]
+    playlists = []
+    for _ in range(count):
+        size = int(rng.integers(10, 61))
+        tastes = rng.choice(len(groups), size=int(rng.integers(1, 3)), replace=False)
+        ids = set()
+        for taste in tastes:
+            group = groups[taste]
+            weights = 1.0 / np.arange(1, len(group) + 1)
+            draw = min(len(group), int(size * 0.9 / len(tastes)))
+            ids.update(group[rng.choice(len(group), size=draw, replace=False, p=weights / weights.sum())].tolist())
+        ids.update(songs[i].id for i in rng.integers(0, len(songs), size=size - len(ids) if size > len(ids) else 0))
+        playlists.append(sorted(ids, key=lambda _: rng.random()))
+    return playlists
+
+
+def recall(recommend, tests, limit: int) -> float:
+    hits = total = 0
+    for kept, held_out in tests:
+        found = set(recommend(kept, limit))
+        hits += len(found & held_out)
+        total += len(held_out)
+    return hits / total
+
+
+async def run_endpoint(service, songs_by_id, tests, mode: str, limit: int):
+    latencies = []
+    for kept, _ in tests:
+        started = time.perf_counter()
+        await service.recommend_songs([songs_by_id[song_id] for song_id in kept], limit, mode)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=20000)
+    parser.add_argument("--playlists", type=int, default=20000)
+    parser.add_argument("--neighbors", type=int, default=100)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--held-out", type=int, default=5, help="Songs held out of each test playlist")
+    parser.add_argument("--limit", type=int, default=10, help="Songs recommended per playlist")
+    parser.add_argument("--tests", type=int, default=200, help="Test playlists scored for recall and latency")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mock upstream latency in seconds")
+    parser.add_argument("--port", type=int, default=8774)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.services.item_recommender import ItemRecommender
+
+    songs = list(make_songs(args.songs, args.seed))
+    playlists = make_playlists(songs, args.playlists, args.seed)
+    split = int(len(playlists) * 0.9)
+    train = playlists[:split]
+    tests = [
+        (playlist[args.held_out:], set(playlist[:args.held_out]))
+        for playlist in playlists[split:][:args.tests]
+    ]
+    print(f"{args.songs} songs, {len(train)} training playlists of 10-60 songs, {len(tests)} test playlists")
+
+    started = time.perf_counter()
+    neighbors_only = ItemRecommender.build(train, args.neighbors)
+    neighbor_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    recommender = ItemRecommender.build(train, args.neighbors, args.factors, args.seed)
+    factor_seconds = time.perf_counter() - started - neighbor_seconds
+    print(f"build: neighbors {neighbor_seconds:.1f}s, {args.factors} factors {max(factor_seconds, 0):.1f}s")
+
+    popular = [recommender.ids.get(int(item)) for item in np.argsort(-recommender.counts, kind="stable")]
+
+    def most_popular(kept, limit):
+        kept = set(kept)
+        return [song_id for song_id in popular[:limit + len(kept)] if song_id not in kept][:limit]
+
+    def model(weight):
+        def recommend(kept, limit):
+            items = recommender.lookup(kept)
+            return [item.song_id for item in recommender.recommend(items, limit, weight)]
+        return recommend
+
+    print(f"recall@{args.limit}: popular {recall(most_popular, tests, args.limit):.1%}, "
+          f"neighbors {recall(model(0.0), tests, args.limit):.1%}, "
+          f"neighbors+factors {recall(model(settings.RECOMMEND_FACTOR_WEIGHT), tests, args.limit):.1%} "
+          f"(weight {settings.RECOMMEND_FACTOR_WEIGHT})")
+
+    rng = np.random.default_rng(args.seed + 1)
+    print(f"{'playlist':>9} {'neighbors p50 ms':>17} {'+factors p50 ms':>16}")
+    for size in (10, 50, 100, 500):
+        timings = {0.0: [], settings.RECOMMEND_FACTOR_WEIGHT: []}
+        for _ in range(50):
+            kept = [recommender.ids.get(int(i)) for i in rng.choice(len(recommender), size, replace=False)]
+            for weight, samples in timings.items():
+                started = time.perf_counter()
+                recommender.recommend(recommender.lookup(kept), args.limit, weight)
+                samples.append(time.perf_counter() - started)
+        print(f"{size:>9} {np.percentile(timings[0.0], 50) * 1000:>17.2f} "
+              f"{np.percentile(timings[settings.RECOMMEND_FACTOR_WEIGHT], 50) * 1000:>16.2f}")
+    del neighbors_only
+
+    server = MockGroqServer(port=args.port, latency=args.latency, responder=respond)
+    server.start()
+    settings.GROQ_BASE_URL = server.base_url
+    settings.CACHE_ENABLED = False
+
+    from app.services.ai_service import AIService
+
+    async def run():
+        service = AIService()
+        await service.startup()
+        service.catalog.add_songs(songs)
+        service.recommender = recommender
+        results = []
+        for mode in ("llm", "local", "fast"):
+            server.reset()
+            latencies = await run_endpoint(service, songs_by_id, tests[:50], mode, args.limit)
+            results.append((mode, server.total_requests, server.prompt_tokens, latencies))
+        await service.shutdown()
+        return results
+
+    songs_by_id = {song.id: song for song in songs}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            recommender.save(directory)
+            recommender = ItemRecommender.load(directory)
+            print(f"endpoint, mock latency {args.latency * 1000:.0f} ms:")
+            print(f"{'mode':<6} {'calls':>6} {'prompt tok':>11} {'p50 ms':>8} {'p95 ms':>8}")
+            for mode, calls, tokens, latencies in asyncio.run(run()):
+                print(f"{mode:<6} {calls:>6} {tokens:>11} "
+                      f"{np.percentile(latencies, 50) * 1000:>8.1f} {np.percentile(latencies, 95) * 1000:>8.1f}")
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
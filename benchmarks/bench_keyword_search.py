@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: BM25 keyword and hybrid search over a synthetic song catalog
+
+Builds a catalog with both the vector index and the BM25 keyword index, then
+measures query latency per search mode, with and without year/genre filters,
+the cost of incremental adds and deletes, and how long a saved keyword index
+takes to open.
+
+Usage:
+    python -m benchmarks.bench_keyword_search [--songs 1000000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+from benchmarks.synthetic_catalog import GENRES, WORDS, make_songs
+
+
+def make_queries(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(range(1960, 2024))}"
+        for _ in range(count)
+    ]
+
+
+def make_filters(count: int, seed: int = 2):
+    from app.services.bm25_index import SearchFilters
+
+    rng = random.Random(seed)
+    filters = []
+    for _ in range(count):
+        year_from = rng.choice(range(1960, 2020, 10))
+        filters.append(SearchFilters(year_from=year_from, year_to=year_from + 9, genres=[rng.choice(GENRES)]))
+    return filters
+
+
+def percentile(values, q: float) -> float:
+    return float(np.percentile(values, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--probes", type=int, default=32)
+    parser.add_argument("--updates", type=int, default=10000, help="Songs added and deleted incrementally")
+    args = parser.parse_args()
+
+    from app.services.bm25_index import BM25Index
+    from app.services.catalog import SongCatalog
+    from app.services.embeddings import HashingEmbedder
+    from app.services.vector_index import VectorIndex
+
+    songs = list(make_songs(args.songs + args.updates))
+    base, updates = songs[:args.songs], songs[args.songs:]
+
+    keywords = BM25Index()
+    start = time.perf_counter()
+    for offset in range(0, len(base), 2048):
+        keywords.add(base[offset:offset + 2048])
+    keyword_seconds = time.perf_counter() - start
+    segments = keywords._segments
+    postings = sum(len(segment) for segment in segments)
+    memory = sum(
+        array.nbytes for segment in segments for array in (segment.offsets, segment.rows, segment.tfs)
+    ) / 1e6
+    print(f"{args.songs} songs: keyword index built in {keyword_seconds:.1f}s "
+          f"({args.songs / keyword_seconds:.0f} songs/s), {postings} postings in {len(segments)} segments, "
+          f"{memory:.0f} MB")
+
+    lists = int(np.sqrt(args.songs))
+    index = VectorIndex(args.dim, ivf_lists=lists, nprobe=args.probes)
+    catalog = SongCatalog(HashingEmbedder(dim=args.dim), index, keywords=keywords)
+    start = time.perf_counter()
+    for offset in range(0, len(base), 2048):
+        index.add(catalog.embedder.embed_songs(base[offset:offset + 2048]))
+    index.train()
+    catalog._songs = list(base)
+    catalog._rows = {song.id: row for row, song in enumerate(base)}
+    print(f"vector index ({lists} lists, {args.probes} probes) built in {time.perf_counter() - start:.1f}s")
+
+    queries = make_queries(args.queries)
+    filters = make_filters(args.queries)
+    print(f"{'mode':<18} {'p50 ms':>8} {'p95 ms':>8} {'results':>8}")
+    for mode in ("keyword", "semantic", "hybrid"):
+        for filtered in (False, True):
+            latencies = []
+            found = 0
+            for query, query_filters in zip(queries, filters):
+                started = time.perf_counter()
+                results = catalog.search(query, 10, mode, query_filters if filtered else None)
+                latencies.append(time.perf_counter() - started)
+                found += len(results)
+            name = mode + (" +filter" if filtered else "")
+            print(f"{name:<18} {percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f} "
+                  f"{found / len(queries):>8.1f}")
+
+    start = time.perf_counter()
+    for offset in range(0, len(updates), 256):
+        catalog.add_songs(updates[offset:offset + 256])
+    add_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    catalog.remove_songs(song.id for song in updates)
+    remove_seconds = time.perf_counter() - start
+    print(f"incremental add:    {add_seconds / max(len(updates), 1) * 1e6:8.1f} us per song (both indexes)")
+    print(f"incremental delete: {remove_seconds / max(len(updates), 1) * 1e6:8.1f} us per song")
+
+    with tempfile.TemporaryDirectory(prefix="keyword-bench-") as directory:
+        start = time.perf_counter()
+        keywords.save(directory)
+        save_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = BM25Index.load(directory)
+        open_ms = (time.perf_counter() - start) * 1000
+        started = time.perf_counter()
+        loaded.search(queries[0], 10)
+        print(f"save keyword index: {save_seconds:8.1f} s, open {open_ms:.1f} ms, "
+              f"first query {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of the metrics instruments and of timing each request
+
+- instruments: time per call of a labelled counter increment, a gauge
+  increment and decrement, and a labelled histogram observation
+- requests: time per request of a bare ASGI app and of a small FastAPI
+  app, called directly, without and with RequestMetricsMiddleware; the
+  difference is what timing, labelling and counting in-flight requests
+  add to each request. The bare app isolates it from FastAPI's own
+  run-to-run noise
+- render: time to render /metrics with the instruments this benchmark
+  filled in
+
+Usage:
+    python -m benchmarks.bench_metrics_overhead [--calls 200000] [--requests 5000] [--rounds 10]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def per_call(fn, calls: int, rounds: int = 5) -> float:
+    """Median over rounds of the seconds per call of `fn`"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        timings.append((time.perf_counter() - started) / calls)
+    return statistics.median(timings)
+
+
+def make_app(with_metrics: bool):
+    from fastapi import FastAPI
+    from app.utils.request_metrics import RequestMetricsMiddleware
+
+    app = FastAPI()
+
+    @app.get("/songs/{song_id}")
+    async def song(song_id: str):
+        return {"id": song_id}
+
+    if with_metrics:
+        app.add_middleware(RequestMetricsMiddleware)
+    return app
+
+
+class Route:
+    path = "/songs/{song_id}"
+
+
+async def bare_app(scope, receive, send):
+    """The least an ASGI app does: match a route and send an empty response"""
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def per_request(apps, requests: int, rounds: int) -> list:
+    """
+    Fastest round's seconds per request for each app, called directly over ASGI
+
+    Rounds alternate between the apps so that they see the same machine load.
+    """
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def scope(i: int):
+        return {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": f"/songs/{i}", "raw_path": f"/songs/{i}".encode(),
+            "query_string": b"", "root_path": "", "headers": [], "server": ("test", 80), "client": ("test", 1)
+        }
+
+    best = [float("inf")] * len(apps)
+    for _ in range(rounds):
+        for index, app in enumerate(apps):
+            started = time.perf_counter()
+            for i in range(requests):
+                await app(scope(i), receive, send)
+            best[index] = min(best[index], (time.perf_counter() - started) / requests)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200000, help="Calls timed per instrument and round")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests timed per app and round")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    from app.utils.metrics import UPSTREAM_BUCKETS, metrics
+
+    counter = metrics.counter("bench_calls_total", "Benchmark counter", ("endpoint", "model"))
+    gauge = metrics.gauge("bench_in_flight", "Benchmark gauge")
+    histogram = metrics.histogram("bench_seconds", "Benchmark histogram", ("model",), buckets=UPSTREAM_BUCKETS)
+
+    def gauge_round_trip():
+        gauge.inc()
+        gauge.dec()
+
+    instruments = {
+        "counter.inc (2 labels)": lambda: counter.inc(endpoint="describe_playlist", model="llama"),
+        "gauge.inc + gauge.dec": gauge_round_trip,
+        "histogram.observe (1 label)": lambda: histogram.observe(0.42, model="llama"),
+    }
+    print(f"{'instrument':<30} {'ns/call':>8}")
+    for name, fn in instruments.items():
+        print(f"{name:<30} {per_call(fn, args.calls) * 1e9:>8.0f}")
+
+    from app.utils.request_metrics import RequestMetricsMiddleware
+
+    bare, bare_timed = asyncio.run(per_request(
+        [bare_app, RequestMetricsMiddleware(bare_app)], args.requests * 5, args.rounds
+    ))
+    plain, timed = asyncio.run(per_request([make_app(False), make_app(True)], args.requests, args.rounds))
+    print(f"\n{'app':<30} {'us/request':>10} {'overhead':>9}")
+    print(f"{'bare ASGI app':<30} {bare * 1e6:>10.2f}")
+    print(f"{'  with metrics':<30} {bare_timed * 1e6:>10.2f} {(bare_timed - bare) * 1e6:>9.2f}")
+    print(f"{'FastAPI app':<30} {plain * 1e6:>10.2f}")
+    print(f"{'  with metrics':<30} {timed * 1e6:>10.2f} {(timed - plain) * 1e6:>9.2f}")
+
+    render_seconds = per_call(metrics.render, 200)
+    print(f"\nrender /metrics: {len(metrics.render()):,} bytes in {render_seconds * 1e6:.0f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: analyze-mood and generate-name with and without micro-batching
+
+Sends many distinct playlists at once through AIService against a local mock
+Groq server and reports upstream calls, tokens per playlist and throughput.
+The response cache is disabled so every playlist reaches the upstream.
+
+Usage:
+    python -m benchmarks.bench_micro_batching [--playlists 200] [--latency 0.3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.mock_groq import MockGroqServer
+
+
+def respond(body: dict) -> str:
+    """Answer single and keyed multi-playlist prompts"""
+    prompt = body["messages"][-1]["content"]
+    keys = sorted(set(re.findall(r"Playlist (p\d+)", prompt)), key=lambda k: int(k[1:]))
+    is_names = "playlist names" in prompt
+    
+    def answer():
+        if is_names:
+            return ["Midnight Drive", "Neon Echoes", "Static Hearts"]
+        return {"moods": ["energetic", "nostalgic", "uplifting"], "description": "A bright, driving set."}
+    
+    if keys:
+        return json.dumps({key: answer() for key in keys})
+    return json.dumps(answer())
+
+
+def make_playlists(count: int, size: int):
+    from app.models import Song
+    
+    genres = ["Rock", "Pop", "Jazz", "Hip-Hop", "Electronic", "Folk"]
+    return [
+        [
+            Song(
+                id=f"{p}-{i}",
+                title=f"Song {p}-{i}",
+                artist=f"Artist {(p * 7 + i) % 50}",
+                album=f"Album {(p + i) % 30}",
+                genre=genres[(p + i) % len(genres)],
+                year=1970 + (p * 3 + i) % 50,
+                duration=180 + i
+            )
+            for i in range(size)
+        ]
+        for p in range(count)
+    ]
+
+
+async def run(operation: str, playlists) -> float:
+    from app.services.ai_service import AIService
+    
+    service = AIService()
+    await service.startup()
+    
+    async def one(songs):
+        if operation == "mood":
+            await service.analyze_mood(songs)
+        else:
+            await service.generate_playlist_name(songs, "creative")
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one(songs) for songs in playlists))
+    elapsed = time.perf_counter() - start
+    await service.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--playlists", type=int, default=200)
+    parser.add_argument("--songs", type=int, default=8, help="Songs per playlist")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mock upstream latency in seconds")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--window-ms", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    
+    server = MockGroqServer(port=args.port, latency=args.latency, responder=respond)
+    server.start()
+    
+    from app.config import settings
+    settings.GROQ_BASE_URL = server.base_url
+    settings.CACHE_ENABLED = False
+    settings.MICRO_BATCH_MAX_SIZE = args.batch_size
+    settings.MICRO_BATCH_WINDOW_MS = args.window_ms
+    
+    playlists = make_playlists(args.playlists, args.songs)
+    
+    print(f"{args.playlists} playlists x {args.songs} songs, mock latency {args.latency * 1000:.0f} ms")
+    print(f"{'operation':<10} {'batching':<9} {'calls':>6} {'prompt tok/pl':>14} {'compl tok/pl':>13} {'playlists/s':>12}")
+    
+    try:
+        for operation in ("mood", "name"):
+            for enabled in (False, True):
+                settings.MICRO_BATCH_ENABLED = enabled
+                server.reset()
+                elapsed = asyncio.run(run(operation, playlists))
+                print(
+                    f"{operation:<10} {'on' if enabled else 'off':<9} {server.total_requests:>6} "
+                    f"{server.prompt_tokens / args.playlists:>14.1f} "
+                    f"{server.completion_tokens / args.playlists:>13.1f} "
+                    f"{args.playlists / elapsed:>12.1f}"
+                )
+    finally:
+        server.stop()
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency per endpoint under each model routing policy
+
+Runs generate-name, analyze-mood, describe-playlist and recommend-songs
+through AIService against a local mock Groq server that answers like two
+models: a small one that is fast but sometimes returns broken JSON, and the
+large GROQ_MODEL. Each policy runs two phases: normal, then one where the
+small model is congested and slower than the large one.
+
+- single: every call goes to GROQ_MODEL
+- tiered: endpoints in ROUTING_TABLE go to the small model and escalate to
+  the large one when the JSON answer fails validation
+- latency: as tiered, but an endpoint moves to the large model while it
+  has been answering faster
+
+Reports p50 and p95 latency, the share of calls answered by the small
+model, and escalations, per policy, phase and endpoint.
+
+Usage:
+    python -m benchmarks.bench_model_routing [--calls 200] [--concurrency 8] [--invalid 0.1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+import numpy as np
+
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.synthetic_catalog import make_songs
+
+
+ENDPOINTS = ("generate_name", "analyze_mood", "describe_playlist", "recommend_songs")
+
+
+class TwoModels:
+    """Mock answers and latencies for a small and a large model"""
+
+    def __init__(self, small_model: str, small: float, large: float, invalid: float, seed: int):
+        self.small_model = small_model
+        self.latencies = {"small": small, "large": large}
+        self.invalid = invalid
+        self.rng = random.Random(seed)
+        self.small_calls = 0
+        self.calls = 0
+
+    def latency(self, body: dict) -> float:
+        tier = "small" if body.get("model") == self.small_model else "large"
+        return self.latencies[tier] * self.rng.uniform(0.8, 1.3)
+
+    def respond(self, body: dict) -> str:
+        prompt = body["messages"][-1]["content"]
+        small = body.get("model") == self.small_model
+        self.calls += 1
+        self.small_calls += small
+        if "response_format" in body and small and self.rng.random() < self.invalid:
+            return '{"moods": ["calm", "dreamy"'
+        if "playlist names" in prompt:
+            return json.dumps(["Night Drive", "Golden Hour", "Slow Burn"])
+        if "Analyze the mood" in prompt:
+            return json.dumps({"moods": ["calm", "dreamy", "nostalgic"], "description": "A hazy, late-night mix."})
+        match = re.search(r"Recommend exactly (\d+)", prompt)
+        if match:
+            return json.dumps({"recommendations": [
+                {"title": f"Mock Song {i}", "artist": "Mock Artist", "reason": "It fits."}
+                for i in range(int(match.group(1)))
+            ]})
+        return "A warm, unhurried playlist for long evenings."
+
+
+async def run_phase(service, playlists, calls: int, concurrency: int):
+    """Latencies per endpoint for `calls` requests to each endpoint"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {endpoint: [] for endpoint in ENDPOINTS}
+    handlers = {
+        "generate_name": lambda songs: service.generate_playlist_name(songs, "creative"),
+        "analyze_mood": service.analyze_mood,
+        "describe_playlist": service.describe_playlist,
+        "recommend_songs": lambda songs: service.recommend_songs(songs, 5, "llm"),
+    }
+
+    async def one(endpoint: str, songs) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await handlers[endpoint](songs)
+            latencies[endpoint].append(time.perf_counter() - started)
+
+    jobs = [(endpoint, playlists.pop()) for _ in range(calls) for endpoint in ENDPOINTS]
+    await asyncio.gather(*(one(endpoint, songs) for endpoint, songs in jobs))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="Requests per endpoint and phase")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--small-latency", type=float, default=0.08, help="Small model latency in seconds")
+    parser.add_argument("--large-latency", type=float, default=0.3, help="Large model latency in seconds")
+    parser.add_argument("--congested-latency", type=float, default=0.9,
+                        help="Small model latency in seconds while congested")
+    parser.add_argument("--invalid", type=float, default=0.1, help="Share of broken JSON answers from the small model")
+    parser.add_argument("--port", type=int, default=8776)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.utils.metrics import metrics
+
+    small_model = next(iter(settings.routing_tiers_map.values()))
+    models = TwoModels(small_model, args.small_latency, args.large_latency, args.invalid, args.seed)
+    server = MockGroqServer(
+        port=args.port,
+        responder=models.respond,
+        latency_sampler=models.latency
+    )
+    server.start()
+    settings.GROQ_BASE_URL = server.base_url
+    settings.CACHE_ENABLED = False
+    settings.FEATURE_STORE_ENABLED = False
+    settings.RETRY_MAX_ATTEMPTS = 1
+
+    from app.services.ai_service import AIService
+
+    songs = list(make_songs(5000, args.seed))
+    rng = random.Random(args.seed)
+
+    async def run(policy: str):
+        settings.ROUTING_POLICY = policy
+        service = AIService()
+        await service.startup()
+        results = []
+        for phase, small_latency in (("normal", args.small_latency), ("congested", args.congested_latency)):
+            models.latencies["small"] = small_latency
+            escalations_before = metrics.snapshot().get("model_escalations_total", {})
+            small_before, calls_before = models.small_calls, models.calls
+            playlists = [rng.sample(songs, 20) for _ in range(args.calls * len(ENDPOINTS))]
+            latencies = await run_phase(service, playlists, args.calls, args.concurrency)
+            escalations = sum(metrics.snapshot().get("model_escalations_total", {}).values()) - sum(
+                escalations_before.values()
+            )
+            small_share = (models.small_calls - small_before) / max(models.calls - calls_before, 1)
+            results.append((phase, latencies, small_share, escalations))
+        await service.shutdown()
+        return results
+
+    try:
+        print(f"small model {small_model}: {args.small_latency * 1000:.0f} ms "
+              f"({args.congested_latency * 1000:.0f} ms congested), {args.invalid:.0%} broken JSON; "
+              f"large model {settings.GROQ_MODEL}: {args.large_latency * 1000:.0f} ms")
+        print(f"routed to the small tier: {', '.join(settings.routing_table_map)}")
+        print(f"{'policy':<8} {'phase':<10} {'endpoint':<18} {'p50 ms':>8} {'p95 ms':>8}")
+        for policy in ("single", "tiered", "latency"):
+            for phase, latencies, small_share, escalations in asyncio.run(run(policy)):
+                for endpoint in ENDPOINTS:
+                    samples = latencies[endpoint]
+                    print(f"{policy:<8} {phase:<10} {endpoint:<18} "
+                          f"{np.percentile(samples, 50) * 1000:>8.1f} {np.percentile(samples, 95) * 1000:>8.1f}")
+                print(f"{policy:<8} {phase:<10} small model answered {small_share:.0%} of upstream calls, "
+                      f"{escalations:.0f} escalations")
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
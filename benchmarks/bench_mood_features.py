@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: analyze-mood with and without the per-song feature store
+
+Draws playlists from a song pool with Zipf-like popularity, so popular songs
+appear in many playlists, and analyzes them through AIService against a local
+mock Groq server in two phases: cold, starting from an empty feature store,
+then warm, with new playlists drawn from the same pool.
+
+- llm: the whole playlist goes to the LLM on every request
+- features: songs are rated once in batches and stored; playlist moods are
+  aggregated from the stored features and the LLM only writes the description
+- features-local: as features, with the description built locally
+
+Reports upstream calls, prompt tokens and latency per phase, and the cost of
+the aggregation itself.
+
+Usage:
+    python -m benchmarks.bench_mood_features [--playlists 300] [--pool 5000] [--size 30] [--latency 0.3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.synthetic_catalog import make_songs
+
+
+MOODS = ["energetic", "nostalgic", "melancholic", "calm", "happy", "dreamy", "dark", "romantic"]
+
+
+def respond(body: dict) -> str:
+    prompt = body["messages"][-1]["content"]
+    if "Rate each of these" in prompt:
+        ids = re.findall(r"^(s\d+)\. ", prompt, re.M)
+        return json.dumps({
+            song_id: {"moods": [MOODS[i % 8], MOODS[(i + 3) % 8]], "energy": (i % 10) / 10, "valence": (i % 7) / 7}
+            for i, song_id in enumerate(ids)
+        })
+    if "JSON" in prompt:
+        return json.dumps({"moods": ["nostalgic", "warm", "reflective"], "description": "A warm, reflective mix."})
+    return "A warm, reflective mix with a nostalgic glow."
+
+
+def make_playlists(count: int, pool: int, size: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    songs = list(make_songs(pool, seed=seed))
+    weights = 1.0 / np.arange(1, pool + 1)
+    weights /= weights.sum()
+    return [
+        [songs[i] for i in rng.choice(pool, size=size, replace=False, p=weights)]
+        for _ in range(count)
+    ]
+
+
+async def run(phases, server) -> list:
+    from app.services.ai_service import AIService
+
+    service = AIService()
+    await service.startup()
+    results = []
+    for playlists in phases:
+        server.reset()
+        latencies = []
+        for songs in playlists:
+            started = time.perf_counter()
+            await service.analyze_mood(songs)
+            latencies.append(time.perf_counter() - started)
+        await asyncio.gather(*service._enriching.values(), return_exceptions=True)
+        results.append((server.total_requests, server.prompt_tokens, latencies))
+    await service.shutdown()
+    return results
+
+
+def time_aggregation(size: int) -> float:
+    from app.services.feature_store import MOOD_TAGS, FeatureStore, SongFeatures
+
+    store = FeatureStore()
+    store.add({
+        str(i): SongFeatures([MOOD_TAGS[i % len(MOOD_TAGS)], MOOD_TAGS[(i * 7) % len(MOOD_TAGS)]], 0.5, 0.5)
+        for i in range(10000)
+    })
+    rows = np.random.default_rng(0).choice(10000, size, replace=False)
+    started = time.perf_counter()
+    for _ in range(2000):
+        store.aggregate(rows, size)
+    return (time.perf_counter() - started) / 2000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--playlists", type=int, default=300)
+    parser.add_argument("--pool", type=int, default=5000, help="Distinct songs to draw playlists from")
+    parser.add_argument("--size", type=int, default=30, help="Songs per playlist")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mock upstream latency in seconds")
+    parser.add_argument("--port", type=int, default=8773)
+    args = parser.parse_args()
+
+    server = MockGroqServer(port=args.port, latency=args.latency, responder=respond)
+    server.start()
+
+    from app.config import settings
+    settings.GROQ_BASE_URL = server.base_url
+    settings.PLAYLIST_HISTORY_SIZE = 0
+
+    cold = make_playlists(args.playlists, args.pool, args.size, seed=0)
+    warm = make_playlists(args.playlists, args.pool, args.size, seed=1)
+    distinct = len({song.id for songs in cold + warm for song in songs})
+    print(f"2 x {args.playlists} playlists of {args.size} songs ({distinct} distinct songs), "
+          f"mock latency {args.latency * 1000:.0f} ms")
+    print(f"{'run':<15} {'phase':<5} {'calls':>6} {'prompt tok':>11} {'p50 ms':>8} {'p95 ms':>8}")
+
+    try:
+        for name, enabled, llm_description in (
+            ("llm", False, True),
+            ("features", True, True),
+            ("features-local", True, False)
+        ):
+            settings.FEATURE_STORE_ENABLED = enabled
+            settings.FEATURE_LLM_DESCRIPTION = llm_description
+            results = asyncio.run(run((cold, warm), server))
+            for phase, (calls, tokens, latencies) in zip(("cold", "warm"), results):
+                print(f"{name:<15} {phase:<5} {calls:>6} {tokens:>11} "
+                      f"{np.percentile(latencies, 50) * 1000:>8.1f} {np.percentile(latencies, 95) * 1000:>8.1f}")
+    finally:
+        server.stop()
+
+    print(f"aggregating {args.size} songs: {time_aggregation(args.size) * 1e6:.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: describing and analyzing playlists that are edited a song at a time
+
+Simulates an edit-heavy client: each playlist is described and its mood
+analyzed, then a song is added or removed and both are requested again, many
+times over. Runs the workload against a local mock Groq server with the
+playlist history disabled (every edit is a full re-analysis) and enabled
+(small edits reuse the prior result, larger ones send an update prompt), and
+reports upstream calls, prompt tokens and latency.
+
+Usage:
+    python -m benchmarks.bench_playlist_edits [--playlists 50] [--edits 20] [--size 40] [--latency 0.3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.synthetic_catalog import make_songs
+
+
+def respond(body: dict) -> str:
+    prompt = body["messages"][-1]["content"]
+    if "JSON" in prompt:
+        return json.dumps({
+            "moods": ["nostalgic", "warm", "reflective"],
+            "description": "A warm, reflective mix with a nostalgic glow."
+        })
+    return "A warm, nostalgic journey through decades of timeless songs."
+
+
+def make_sessions(playlists: int, edits: int, size: int, seed: int = 0):
+    """Successive versions of each playlist, one song added or removed per edit"""
+    rng = random.Random(seed)
+    pool = list(make_songs(max(playlists * size * 2, 1000), seed=seed))
+    sessions = []
+    for _ in range(playlists):
+        songs = rng.sample(pool, size)
+        versions = [list(songs)]
+        for _ in range(edits):
+            if rng.random() < 0.6 or len(songs) <= 2:
+                songs.append(rng.choice(pool))
+            else:
+                songs.pop(rng.randrange(len(songs)))
+            versions.append(list(songs))
+        sessions.append(versions)
+    return sessions
+
+
+async def run(sessions) -> list:
+    from app.services.ai_service import AIService
+
+    service = AIService()
+    await service.startup()
+    latencies = []
+    for versions in sessions:
+        for songs in versions:
+            started = time.perf_counter()
+            await service.describe_playlist(songs)
+            await service.analyze_mood(songs)
+            latencies.append(time.perf_counter() - started)
+    await service.shutdown()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--playlists", type=int, default=50)
+    parser.add_argument("--edits", type=int, default=20, help="Single-song edits per playlist")
+    parser.add_argument("--size", type=int, default=40, help="Songs per playlist before editing")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mock upstream latency in seconds")
+    parser.add_argument("--port", type=int, default=8772)
+    args = parser.parse_args()
+
+    server = MockGroqServer(port=args.port, latency=args.latency, responder=respond)
+    server.start()
+
+    from app.config import settings
+    settings.GROQ_BASE_URL = server.base_url
+
+    sessions = make_sessions(args.playlists, args.edits, args.size)
+    requests = sum(len(versions) for versions in sessions)
+    print(f"{args.playlists} playlists of {args.size} songs, {args.edits} edits each: "
+          f"{requests} describe + mood requests, mock latency {args.latency * 1000:.0f} ms")
+    print(f"{'history':<8} {'calls':>6} {'prompt tok':>11} {'p50 ms':>8} {'p95 ms':>8}")
+
+    try:
+        for name, size in (("off", 0), ("on", 10000)):
+            settings.PLAYLIST_HISTORY_SIZE = size
+            server.reset()
+            latencies = asyncio.run(run(sessions))
+            print(f"{name:<8} {server.total_requests:>6} {server.prompt_tokens:>11} "
+                  f"{np.percentile(latencies, 50) * 1000:>8.1f} {np.percentile(latencies, 95) * 1000:>8.1f}")
+    finally:
+        server.stop()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: prompt size and build time for playlists of growing length
+
+Builds the describe-playlist, analyze-mood and recommend-songs prompts for
+synthetic playlists of 10 to 5000 songs, with every song listed and within
+the endpoints' PROMPT_TOKEN_BUDGETS.
+
+- tokens: estimated prompt tokens, which stay flat once a playlist no
+  longer fits its budget
+- build: time to build a prompt, including the token estimates
+- coverage: share of the playlist's (genre, decade) groups and of its
+  songs' groups represented in the sample
+- estimate: estimate_tokens against tiktoken's cl100k_base count for
+  prompts, unspaced ids and non-English titles, when tiktoken is
+  installed and its encoding can be loaded
+
+Usage:
+    python -m benchmarks.bench_prompt_budget [--sizes 10,100,1000,5000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.synthetic_catalog import make_songs
+
+
+def timed(build, repeat: int):
+    """Median seconds of `repeat` builds, and the last prompt"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        prompt = build()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), prompt
+
+
+def estimate_error(texts):
+    """estimate_tokens against tiktoken for each sample text, if tiktoken is available"""
+    from app.utils.helpers import estimate_tokens
+
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"estimate vs tiktoken: skipped ({type(e).__name__}: {e})")
+        return
+    print(f"{'sample':<22} {'estimate':>9} {'tiktoken':>9} {'error':>7}")
+    for name, text in texts.items():
+        estimate = estimate_tokens(text)
+        actual = len(encoding.encode(text))
+        print(f"{name:<22} {estimate:>9} {actual:>9} {estimate / actual - 1:>+7.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="Comma-separated playlist sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="Builds timed per prompt")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.prompts.analyze_mood import create_analyze_mood_prompt
+    from app.prompts.describe_playlist import create_describe_playlist_prompt
+    from app.prompts.recommend_songs import create_recommend_songs_prompt
+    from app.utils.helpers import estimate_tokens
+    from app.utils.prompt_budget import representative_songs
+
+    budgets = settings.prompt_budgets_map
+    builders = {
+        "describe_playlist": create_describe_playlist_prompt,
+        "analyze_mood": create_analyze_mood_prompt,
+        "recommend_songs": lambda songs, budget: create_recommend_songs_prompt(songs, 10, budget),
+    }
+    sizes = [int(size) for size in args.sizes.split(",")]
+    songs = list(make_songs(max(sizes), args.seed))
+
+    print(f"budgets: {', '.join(f'{endpoint}={budgets.get(endpoint, 0)}' for endpoint in builders)}")
+    print(f"{'endpoint':<18} {'songs':>6} {'all tok':>8} {'all ms':>8} {'budget tok':>11} {'budget ms':>10}")
+    for endpoint, build in builders.items():
+        budget = budgets.get(endpoint, 0)
+        for size in sizes:
+            playlist = songs[:size]
+            full_seconds, full = timed(lambda: build(playlist, 0), args.repeat)
+            budget_seconds, fitted = timed(lambda: build(playlist, budget), args.repeat)
+            print(f"{endpoint:<18} {size:>6} {estimate_tokens(full):>8} {full_seconds * 1000:>8.2f} "
+                  f"{estimate_tokens(fitted):>11} {budget_seconds * 1000:>10.2f}")
+
+    print(f"{'songs':>6} {'sample':>7} {'groups':>7} {'covered':>8} {'songs in covered':>17}")
+    for size in sizes:
+        playlist = songs[:size]
+        for count in (20, 50):
+            if count >= size:
+                continue
+            groups = {}
+            for song in playlist:
+                key = (song.genre, song.year // 10)
+                groups[key] = groups.get(key, 0) + 1
+            covered = {(song.genre, song.year // 10) for song in representative_songs(playlist, count)}
+            print(f"{size:>6} {count:>7} {len(groups):>7} {len(covered) / len(groups):>8.0%} "
+                  f"{sum(groups[key] for key in covered) / size:>17.0%}")
+
+    text = create_describe_playlist_prompt(songs, 0)
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        estimate_tokens(text)
+    seconds = (time.perf_counter() - started) / args.repeat
+    print(f"estimate_tokens: {len(text) / 1024:.0f} KB in {seconds * 1e6:.0f} us "
+          f"({seconds * 1e6 / (len(text) / 1024):.2f} us/KB)")
+
+    estimate_error({
+        "describe prompt": create_describe_playlist_prompt(songs[:200], 0),
+        "recommend prompt": create_recommend_songs_prompt(songs[:200], 10, 0),
+        "unspaced ids": ",".join(f"{hash((args.seed, i)) & (1 << 64) - 1:016x}" for i in range(500)),
+        "japanese titles": "\n".join(["夜に駆ける - YOASOBI", "紅蓮華 - LiSA", "レモン - 米津玄師"] * 50),
+        "russian titles": "\n".join(["Группа крови - Кино", "Звезда по имени Солнце - Кино"] * 50),
+        "accented titles": "\n".join(["Déjà Vu - Beyoncé", "Señorita - Shawn Mendes", "Für Elise - Beethoven"] * 50),
+        "emoji": "🎵🎶🎸🔥❤️ " * 100,
+    })
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark: prompt build time and prompt tokens per endpoint, before and
+after compiling the prompt templates
+
+For each endpoint, prompts are built for synthetic playlists:
+
+- tokens: estimated tokens of the system and user prompts from the
+  templates as written, and whitespace-minimized
+- prefix: tokens at the start of the request (system prompt first) that
+  are the same for two different playlists, which the provider can serve
+  from its prompt cache
+- build: time to build the prompts from the templates as written with
+  every song line formatted afresh, from the compiled templates with
+  fresh song lines, and with the song lines memoized from earlier calls
+
+Usage:
+    python -m benchmarks.bench_prompt_compiler [--songs 50] [--repeat 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.synthetic_catalog import make_songs
+
+
+def median_seconds(build, repeat: int, before=None) -> float:
+    timings = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        build()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=50, help="Songs per playlist")
+    parser.add_argument("--repeat", type=int, default=200, help="Builds timed per endpoint and mode")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.prompts import analyze_mood, describe_playlist, generate_name, recommend_songs, semantic_search
+    from app.services.feature_store import MOOD_TAGS
+    from app.utils.helpers import estimate_tokens, short_song_lines, song_lines
+    from app.utils.prompt_compiler import PromptTemplate
+
+    modules = (analyze_mood, describe_playlist, generate_name, recommend_songs, semantic_search)
+    templates = [value for module in modules for value in vars(module).values() if isinstance(value, PromptTemplate)]
+
+    def as_written(enabled: bool):
+        """Render from the template sources instead of the compiled text"""
+        for template in templates:
+            template._render = (template.source if enabled else template.text).format_map
+
+    def clear_fragments():
+        song_lines.clear()
+        short_song_lines.clear()
+
+    songs = list(make_songs(args.songs * 2, args.seed))
+    first, second = songs[:args.songs], songs[args.songs:]
+    endpoints = {
+        "describe_playlist": (
+            describe_playlist.create_system_prompt,
+            lambda playlist: describe_playlist.create_describe_playlist_prompt(playlist)
+        ),
+        "analyze_mood": (
+            analyze_mood.create_system_prompt,
+            lambda playlist: analyze_mood.create_analyze_mood_prompt(playlist)
+        ),
+        "song_features": (
+            analyze_mood.create_song_features_system_prompt,
+            lambda playlist: analyze_mood.create_song_features_prompt(playlist[:25], list(MOOD_TAGS))
+        ),
+        "recommend_songs": (
+            recommend_songs.create_system_prompt,
+            lambda playlist: recommend_songs.create_recommend_songs_prompt(playlist, 5)
+        ),
+        "generate_name": (
+            generate_name.create_system_prompt,
+            lambda playlist: generate_name.create_generate_name_prompt(playlist, "creative")
+        ),
+        "semantic_search": (
+            semantic_search.create_system_prompt,
+            lambda playlist: semantic_search.create_semantic_search_prompt(f"songs like {playlist[0].title}")
+        ),
+        "search_explanation": (
+            semantic_search.create_system_prompt,
+            lambda playlist: semantic_search.create_search_explanation_prompt(playlist[0].title, playlist[:10])
+        ),
+    }
+
+    print(f"{args.songs} songs per playlist, median of {args.repeat} builds")
+    print(f"{'endpoint':<19} {'tok before':>10} {'tok after':>10} {'saved':>6} {'prefix tok':>11} "
+          f"{'us before':>10} {'us cold':>8} {'us warm':>8}")
+    for endpoint, (system_prompt, build) in endpoints.items():
+        as_written(True)
+        before = estimate_tokens(system_prompt()) + estimate_tokens(build(first))
+        before_seconds = median_seconds(lambda: build(first), args.repeat, clear_fragments)
+        as_written(False)
+        after = estimate_tokens(system_prompt()) + estimate_tokens(build(first))
+        cold_seconds = median_seconds(lambda: build(first), args.repeat, clear_fragments)
+        build(first)
+        warm_seconds = median_seconds(lambda: build(first), args.repeat)
+
+        shared = os.path.commonprefix([
+            f"{system_prompt()}\n{build(first)}",
+            f"{system_prompt()}\n{build(second)}"
+        ])
+        print(f"{endpoint:<19} {before:>10} {after:>10} {1 - after / before:>6.0%} {estimate_tokens(shared):>11} "
+              f"{before_seconds * 1e6:>10.0f} {cold_seconds * 1e6:>8.0f} {warm_seconds * 1e6:>8.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: semantic search with and without the query planner
+
+Runs the same stream of search queries, a third of them repeats and a third
+near-repeats (reordered words, different case and punctuation), through
+AIService against a local mock Groq server:
+
+- llm: no catalog, so every query is answered by a full LLM completion
+  (exact repeats hit the response cache)
+- planner: a synthetic catalog searched through cached query plans, with the
+  LLM only planning queries the rules don't understand
+
+Reports upstream calls, prompt tokens and latency by query kind.
+
+Usage:
+    python -m benchmarks.bench_query_planner [--queries 300] [--songs 100000] [--latency 0.3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.synthetic_catalog import GENRES, WORDS, make_songs
+
+
+ACTIVITIES = ["running", "studying", "a road trip", "a party", "sleeping", "the gym"]
+
+
+def respond(body: dict) -> str:
+    prompt = body["messages"][-1]["content"]
+    if "into filters" in prompt:
+        return json.dumps({"genres": [], "moods": ["calm", "reflective"], "keywords": ["evening"]})
+    song = {"id": "x", "title": "Song", "artist": "Artist", "genre": "Rock", "year": 1984, "duration": 200}
+    return json.dumps({"songs": [song] * 10, "explanation": "Mock results."})
+
+
+def make_queries(count: int, seed: int = 0):
+    """Distinct base queries, each asked as-is, as a near-repeat and as a repeat"""
+    rng = random.Random(seed)
+    templates = [
+        lambda: f"{rng.choice(GENRES)} from the {rng.choice(range(60, 100, 10))}s",
+        lambda: f"{rng.choice(GENRES).lower()} songs for {rng.choice(ACTIVITIES)}",
+        lambda: f"short {rng.choice(GENRES).lower()} songs after {rng.choice(range(1970, 2020))}",
+        lambda: f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(range(1960, 2024))}",
+        lambda: f"music that feels like a {rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(WORDS)} evening"
+    ]
+    base = list(dict.fromkeys(rng.choice(templates)() for _ in range(count * 2)))[:count]
+
+    def near_repeat(query: str) -> str:
+        words = query.split()
+        rng.shuffle(words)
+        return " ".join(words).upper() + "!"
+
+    stream = [("first", query) for query in base]
+    stream += [("near-repeat", near_repeat(query)) for query in base]
+    stream += [("repeat", query) for query in base]
+    return stream
+
+
+async def run(queries, songs) -> dict:
+    from app.services.ai_service import AIService
+
+    service = AIService()
+    await service.startup()
+    if songs:
+        service.catalog.add_songs(songs)
+
+    latencies = {}
+    for kind, query in queries:
+        started = time.perf_counter()
+        await service.semantic_search(query, 10)
+        latencies.setdefault(kind, []).append(time.perf_counter() - started)
+    await service.shutdown()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=300, help="Distinct base queries")
+    parser.add_argument("--songs", type=int, default=100000, help="Catalog size for the planner run")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mock upstream latency in seconds")
+    parser.add_argument("--port", type=int, default=8771)
+    args = parser.parse_args()
+
+    server = MockGroqServer(port=args.port, latency=args.latency, responder=respond)
+    server.start()
+
+    from app.config import settings
+    settings.GROQ_BASE_URL = server.base_url
+    settings.SEARCH_LLM_EXPLANATION = False
+
+    queries = make_queries(args.queries)
+    songs = list(make_songs(args.songs))
+    print(f"{len(queries)} queries ({args.queries} distinct), {args.songs} catalog songs, "
+          f"mock latency {args.latency * 1000:.0f} ms")
+    print(f"{'run':<8} {'calls':>6} {'prompt tok':>11}  " + "  ".join(
+        f"{kind + ' p50/p95 ms':>26}" for kind in ("first", "near-repeat", "repeat")
+    ))
+
+    try:
+        for name, catalog in (("llm", []), ("planner", songs)):
+            server.reset()
+            latencies = asyncio.run(run(queries, catalog))
+            columns = "  ".join(
+                f"{np.percentile(latencies[kind], 50) * 1000:>12.2f} / {np.percentile(latencies[kind], 95) * 1000:>11.2f}"
+                for kind in ("first", "near-repeat", "repeat")
+            )
+            print(f"{name:<8} {server.total_requests:>6} {server.prompt_tokens:>11}  {columns}")
+    finally:
+        server.stop()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
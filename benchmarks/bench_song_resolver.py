@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark: matching recommended titles and artists to catalog songs
+
+Builds the title index over a synthetic catalog, saves it and opens it
+memory-mapped as a catalog store would, then resolves batches of
+recommendations the way recommend-songs does: each is checked against the
+playlist's songs and matched against the catalog. Batches are drawn from:
+
+- exact: catalog songs written differently (case, accents, "feat.",
+  "- Remastered 2011", "(Live)", a leading "The")
+- typo: a letter dropped or swapped in the title or the artist
+- absent: songs that aren't in the catalog
+- mixed: 70% exact, 20% typo, 10% absent
+
+Reports per-batch latency and how many recommendations were matched to the
+right song, to a wrong one, or left unmatched.
+
+Usage:
+    python -m benchmarks.bench_song_resolver [--songs 200000] [--batches 200] [--batch-size 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+from benchmarks.synthetic_catalog import WORDS, make_songs
+
+
+VARIANTS = (
+    lambda title, artist: (title.upper(), artist.lower()),
+    lambda title, artist: (f"{title} - Remastered 2011", artist),
+    lambda title, artist: (f"{title} (Live)", f"The {artist}"),
+    lambda title, artist: (f"{title} (feat. {artist.split()[0]})", artist),
+    lambda title, artist: (title.replace("e", "é"), artist)
+)
+
+
+def typo(text: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(text) - 1)
+    if rng.random() < 0.5:
+        return text[:i] + text[i + 1:]
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def make_recommendation(kind: str, songs, rng: random.Random):
+    """(title, artist, expected song) for one recommendation"""
+    song = rng.choice(songs)
+    if kind == "exact":
+        title, artist = rng.choice(VARIANTS)(song.title, song.artist)
+        return title, artist, song
+    if kind == "typo":
+        if rng.random() < 0.7:
+            return typo(song.title, rng), song.artist, song
+        return song.title, typo(song.artist, rng), song
+    words = [rng.choice(WORDS).title() for _ in range(2)]
+    return f"Unheard {words[0]}", f"Nobody {words[1]}", None
+
+
+def make_batches(kind: str, songs, count: int, size: int, seed: int):
+    rng = random.Random(seed)
+    batches = []
+    for _ in range(count):
+        batch = []
+        for _ in range(size):
+            if kind == "mixed":
+                roll = rng.random()
+                pick = "exact" if roll < 0.7 else "typo" if roll < 0.9 else "absent"
+            else:
+                pick = kind
+            batch.append(make_recommendation(pick, songs, rng))
+        batches.append(batch)
+    return batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=200000)
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--playlist", type=int, default=50, help="Songs in the playlist recommendations are checked against")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.services.song_resolver import SongResolver, match_key, normalize_artist, normalize_title
+
+    songs = list(make_songs(args.songs, args.seed))
+    start = time.perf_counter()
+    resolver = SongResolver()
+    resolver.add(range(len(songs)), songs)
+    build_seconds = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as directory:
+        resolver.save(directory)
+        resolver = SongResolver.load(directory)
+        print(f"{args.songs} songs: title index built in {build_seconds:.1f}s "
+              f"({args.songs / build_seconds:.0f} songs/s), minimum confidence {settings.RECOMMEND_MIN_CONFIDENCE}")
+
+        rng = random.Random(args.seed + 1)
+        playlist = rng.sample(songs, args.playlist)
+        playlist_keys = {match_key(song.title, song.artist) for song in playlist}
+        song_at = songs.__getitem__
+
+        print(f"{'batches':>8} {'p50 ms':>8} {'p95 ms':>8} {'us/rec':>7} {'right':>7} {'wrong':>7} {'unmatched':>10}")
+        for kind in ("exact", "typo", "absent", "mixed"):
+            batches = make_batches(kind, songs, args.batches, args.batch_size, args.seed + 2)
+            timings = []
+            right = wrong = unmatched = 0
+            for batch in batches:
+                start = time.perf_counter()
+                matches = resolver.match_many(
+                    [(title, artist) for title, artist, _ in batch],
+                    song_at,
+                    settings.RECOMMEND_MIN_CONFIDENCE
+                )
+                matches = [
+                    None if match_key(title, artist) in playlist_keys else match
+                    for (title, artist, _), match in zip(batch, matches)
+                ]
+                timings.append(time.perf_counter() - start)
+                for (_, _, expected), match in zip(batch, matches):
+                    if match is None:
+                        unmatched += 1
+                    elif expected is not None and (
+                        normalize_title(match[0].title), normalize_artist(match[0].artist)
+                    ) == (normalize_title(expected.title), normalize_artist(expected.artist)):
+                        right += 1
+                    else:
+                        wrong += 1
+            total = args.batches * args.batch_size
+            print(f"{kind:>8} {np.percentile(timings, 50) * 1000:>8.3f} {np.percentile(timings, 95) * 1000:>8.3f} "
+                  f"{np.mean(timings) / args.batch_size * 1e6:>7.1f} {right / total:>7.1%} {wrong / total:>7.1%} "
+                  f"{unmatched / total:>10.1%}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
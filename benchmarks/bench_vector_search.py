@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: local semantic search over a synthetic song catalog
+
+Embeds a synthetic catalog with the hashing embedder, then measures query
+latency for flat, IVF and quantized IVF indexes, plus the recall of the
+approximate indexes against the exact flat top-k.
+
+Usage:
+    python -m benchmarks.bench_vector_search [--songs 1000000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+from benchmarks.synthetic_catalog import GENRES, WORDS, make_songs
+
+
+def make_queries(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(GENRES).lower()} from the {rng.choice(range(60, 100, 10))}s"
+        for _ in range(count)
+    ]
+
+
+def embed_catalog(embedder, count: int, batch_size: int = 4096) -> np.ndarray:
+    matrix = np.empty((count, embedder.dim), dtype=np.float32)
+    batch = []
+    start = 0
+    for song in make_songs(count):
+        batch.append(song)
+        if len(batch) == batch_size:
+            matrix[start:start + len(batch)] = embedder.embed_songs(batch)
+            start += len(batch)
+            batch = []
+    if batch:
+        matrix[start:start + len(batch)] = embedder.embed_songs(batch)
+    return matrix
+
+
+def percentile(values, q: float) -> float:
+    return float(np.percentile(values, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=0, help="IVF lists (default: about sqrt(songs))")
+    parser.add_argument("--probes", type=int, default=16)
+    args = parser.parse_args()
+    
+    from app.services.embeddings import HashingEmbedder
+    from app.services.vector_index import VectorIndex
+    
+    embedder = HashingEmbedder(dim=args.dim)
+    lists = args.lists or int(np.sqrt(args.songs))
+    
+    start = time.perf_counter()
+    matrix = embed_catalog(embedder, args.songs)
+    embed_seconds = time.perf_counter() - start
+    print(f"{args.songs} songs, {args.dim} dimensions: embedded in {embed_seconds:.1f}s "
+          f"({args.songs / embed_seconds:.0f} songs/s)")
+    
+    queries = [embedder.embed_query(query) for query in make_queries(args.queries)]
+    
+    indexes = {
+        "flat": VectorIndex(args.dim),
+        "ivf": VectorIndex(args.dim, ivf_lists=lists, nprobe=args.probes),
+        "ivf+int8": VectorIndex(args.dim, ivf_lists=lists, nprobe=args.probes, quantize=True)
+    }
+    
+    print(f"{'index':<10} {'build s':>8} {'MB':>7} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(args.k):>10}")
+    exact = None
+    for name, index in indexes.items():
+        start = time.perf_counter()
+        index.add(matrix)
+        index.train()
+        build_seconds = time.perf_counter() - start
+        
+        latencies = []
+        results = []
+        for query in queries:
+            started = time.perf_counter()
+            _, scores = index.search(query, args.k)
+            latencies.append(time.perf_counter() - started)
+            results.append(scores)
+        
+        # Many synthetic songs tie on score, so a result counts as a hit when
+        # it scores at least as well as the exact k-th best
+        if exact is None:
+            exact = results
+        recall = np.mean([
+            np.sum(found >= truth[-1] - 1e-4) / max(len(truth), 1) if len(truth) else 1.0
+            for found, truth in zip(results, exact)
+        ])
+        memory = (index._vectors.nbytes + index._scales.nbytes) / 1e6
+        print(f"{name:<10} {build_seconds:>8.1f} {memory:>7.0f} {percentile(latencies, 50):>8.2f} "
+              f"{percentile(latencies, 95):>8.2f} {recall:>10.3f}")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Evaluation: semantic cache hit rate and false hits on a labelled query set
+
+Each query is labelled with the intent it expresses; paraphrases of one intent
+share a label. Queries are replayed in shuffled order through a SemanticCache
+keyed the way AIService keys searches, storing each query's label on a miss.
+A hit is correct when the cached entry has the query's label and false
+otherwise. Reports, for each threshold:
+
+- hit rate: hits / queries
+- reachable: hits / queries whose intent was already cached (the best any
+  threshold can do)
+- false-hit rate: false hits / hits
+
+Queries can also be read from a JSONL file of {"query": ..., "intent": ...}.
+
+Usage:
+    python -m benchmarks.eval_semantic_cache [--queries queries.jsonl] [--thresholds 0.6,0.7,0.8,0.9]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+LABELLED_QUERIES = {
+    "running": [
+        "songs for running", "running music", "upbeat jogging songs", "music to run to",
+        "energetic songs for a jog", "running playlist"
+    ],
+    "workout": ["music for the gym", "workout songs", "gym playlist", "songs for lifting", "intense workout music"],
+    "study": [
+        "songs to study to", "music for studying", "focus music", "calm music for concentration",
+        "studying playlist"
+    ],
+    "sleep": ["songs for sleeping", "music to fall asleep to", "sleep music", "bedtime songs"],
+    "party": ["party songs", "music for a party", "songs to dance to at a party", "party playlist"],
+    "sad": ["sad songs", "melancholic music", "songs that make me cry", "sad music"],
+    "happy": ["happy songs", "feel good music", "cheerful songs", "songs that make me smile"],
+    "rainy sunday": [
+        "songs for a rainy sunday afternoon", "rainy sunday afternoon music", "music for a rainy sunday"
+    ],
+    "road trip": ["road trip songs", "music for a road trip", "driving songs", "songs for a long drive"],
+    "80s rock": ["80s rock", "rock from the 80s", "rock songs from the eighties", "1980s rock music"],
+    "90s rock": ["90s rock", "rock from the 90s", "rock songs from the nineties"],
+    "70s disco": ["70s disco", "disco from the 70s", "seventies disco songs"],
+    "short jazz": ["short jazz songs", "jazz songs under 3 minutes", "quick jazz tracks"],
+    "love": ["love songs", "songs about love", "romantic songs", "songs about falling in love"],
+    "heartbreak": ["songs about heartbreak", "breakup songs", "songs about a broken heart"],
+    "queen": ["songs by queen", "queen songs", "best of queen"],
+    "summer": ["summer songs", "songs for the beach", "summer beach music"],
+    "christmas": ["christmas songs", "holiday music", "christmas music"]
+}
+
+
+def load_queries(path: str):
+    if not path:
+        return [(query, intent) for intent, queries in LABELLED_QUERIES.items() for query in queries]
+    with open(path, encoding="utf-8") as handle:
+        rows = [json.loads(line) for line in handle if line.strip()]
+    return [(row["query"], row["intent"]) for row in rows]
+
+
+def evaluate(queries, threshold: float, rounds: int, seed: int) -> dict:
+    from app.services.embeddings import HashingEmbedder
+    from app.services.query_planner import QueryPlanner
+    from app.services.semantic_cache import SemanticCache, query_signature
+
+    planner = QueryPlanner(max_entries=len(queries))
+    keys = [query_signature(planner.plan_with_rules(query)[0]) for query, _ in queries]
+    totals = {"queries": 0, "hits": 0, "false": 0, "reachable": 0}
+    false_examples = []
+    rng = random.Random(seed)
+
+    for _ in range(rounds):
+        cache = SemanticCache(HashingEmbedder(), threshold=threshold, max_entries=len(queries))
+        seen = set()
+        order = list(range(len(queries)))
+        rng.shuffle(order)
+        for i in order:
+            query, intent = queries[i]
+            text, scope = keys[i]
+            cached, _, cached_text = cache.lookup(text, scope)
+            totals["queries"] += 1
+            totals["reachable"] += intent in seen
+            seen.add(intent)
+            if cached is None:
+                cache.put(text, scope, (query, intent))
+                continue
+            totals["hits"] += 1
+            if cached[1] != intent:
+                totals["false"] += 1
+                false_examples.append(f"{query!r} served {cached[0]!r}")
+
+    return {**totals, "examples": sorted(set(false_examples))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default="", help="JSONL file of labelled queries (default: built-in set)")
+    parser.add_argument("--thresholds", default="0.5,0.6,0.7,0.8,0.9,0.95")
+    parser.add_argument("--rounds", type=int, default=20, help="Shuffled replays per threshold")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--show-false", action="store_true", help="Print the false hits for each threshold")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    intents = len({intent for _, intent in queries})
+    print(f"{len(queries)} queries, {intents} intents, {args.rounds} shuffled rounds")
+    print(f"{'threshold':>9} {'hit rate':>9} {'reachable':>10} {'false-hit rate':>15}")
+    for threshold in (float(value) for value in args.thresholds.split(",")):
+        result = evaluate(queries, threshold, args.rounds, args.seed)
+        hits = max(result["hits"], 1)
+        print(f"{threshold:>9.2f} {result['hits'] / result['queries']:>9.1%} "
+              f"{result['hits'] / max(result['reachable'], 1):>10.1%} {result['false'] / hits:>15.1%}")
+        if args.show_false:
+            for example in result["examples"]:
+                print(f"    {example}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Local mock of the Groq chat completions API used by the benchmarks
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class MockGroqServer:
+    """
+    OpenAI-compatible mock server with a fixed response latency
+    
+    Responses use `content`, or `responder(body)` when one is given, and
+    wait `latency` seconds, or `latency_sampler(body)` when one is given. Token
+    usage is estimated from message lengths and totalled per run. Queued
+    faults (see `inject_fault`) are returned before normal responses.
+    """
+    
+    def __init__(
+        self,
+        port: int = 8765,
+        latency: float = 0.2,
+        content: str = "A mock description.",
+        token_delay: float = 0.01,
+        responder: Optional[Callable[[dict], str]] = None,
+        latency_sampler: Optional[Callable[[dict], float]] = None
+    ):
+        self.port = port
+        self.latency = latency
+        self.content = content
+        self.token_delay = token_delay
+        self.responder = responder
+        self.latency_sampler = latency_sampler
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.faults: deque = deque()
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self.app = self._create_app()
+    
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+    
+    def _create_app(self) -> FastAPI:
+        app = FastAPI()
+        
+        @app.post("/openai/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            if self.faults:
+                status_code, headers, delay = self.faults.popleft()
+                self.total_requests += 1
+                await asyncio.sleep(delay)
+                return JSONResponse(
+                    {"error": {"message": f"Injected fault {status_code}", "type": "mock_error"}},
+                    status_code=status_code,
+                    headers=headers
+                )
+            
+            if body.get("stream"):
+                return StreamingResponse(self._stream(body), media_type="text/event-stream")
+            
+            self.total_requests += 1
+            content = self.responder(body) if self.responder else self.content
+            prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in body.get("messages", []))
+            completion_tokens = estimate_tokens(content)
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self._latency(body))
+            finally:
+                self.in_flight -= 1
+            
+            return {
+                "id": f"chatcmpl-{self.total_requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop"
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            }
+        
+        return app
+    
+    async def _stream(self, body: dict):
+        """Emit the content word by word as chat completion chunks"""
+        self.total_requests += 1
+        await asyncio.sleep(self._latency(body))
+        
+        content = self.responder(body) if self.responder else self.content
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": f"chatcmpl-{self.total_requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": word if i == 0 else " " + word},
+                        "finish_reason": None
+                    }
+                ]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(self.token_delay)
+        
+        yield "data: [DONE]\n\n"
+    
+    def _latency(self, body: dict) -> float:
+        return self.latency_sampler(body) if self.latency_sampler else self.latency
+    
+    def inject_fault(self, status_code: int, headers: Optional[Dict[str, str]] = None, delay: float = 0.0, count: int = 1) -> None:
+        """Queue error responses for the next `count` requests"""
+        for _ in range(count):
+            self.faults.append((status_code, headers or {}, delay))
+    
+    def reset(self) -> None:
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.faults.clear()
+    
+    def start(self) -> None:
+        config = uvicorn.Config(
+            self.app,
+            host="127.0.0.1",
+            port=self.port,
+            log_level="warning",
+            backlog=4096
+        )
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.05)
+    
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
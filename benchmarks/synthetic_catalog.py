@@ -0,0 +1,44 @@
+"""
+Synthetic song catalog for search benchmarks
+"""
+import random
+from typing import Iterator
+from app.models.song import Song
+
+
+GENRES = [
+    "Rock", "Pop", "Jazz", "Hip-Hop", "Electronic", "Folk", "Country", "R&B",
+    "Soul", "Metal", "Punk", "Reggae", "Blues", "Classical", "Indie", "Latin"
+]
+
+WORDS = (
+    "love night fire heart dance summer rain road dream city light blue run "
+    "shadow gold river star ocean wild home midnight sun moon storm electric "
+    "lonely broken sweet cold young forever highway neon velvet morning sky "
+    "thunder ghost desert garden silver echo paradise rebel heaven honey "
+    "memory freedom diamond wave window whisker lantern harbor valley crown"
+).split()
+
+
+def make_songs(count: int, seed: int = 0) -> Iterator[Song]:
+    """Deterministic fake songs with titles, artists, genres, years and short lyrics"""
+    rng = random.Random(seed)
+    artists = [
+        f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}"
+        for _ in range(max(10, count // 20))
+    ]
+
+    for i in range(count):
+        artist_index = rng.randrange(len(artists))
+        genre = GENRES[(artist_index + rng.randrange(2)) % len(GENRES)]
+        year = 1960 + (artist_index * 7 + rng.randrange(6)) % 64
+        yield Song(
+            id=f"song-{i}",
+            title=" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title(),
+            artist=artists[artist_index],
+            album=f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+            genre=genre,
+            year=year,
+            duration=rng.randint(120, 420),
+            lyrics=" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24)))
+        )
@@ -0,0 +1,96 @@
+"""
+Shared test setup: in-memory settings and a stub Groq client
+
+Tests drive async code with asyncio.run, so they need no event loop plugin.
+"""
+import os
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+import pytest
+
+from app.config import settings
+
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+def completion(content: str, prompt_tokens: int = 10, completion_tokens: int = 5) -> SimpleNamespace:
+    """A chat completion response as the Groq SDK returns it"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+    )
+
+
+class StubStream:
+    """A streamed completion yielding `deltas`, then raising `error` if given"""
+
+    def __init__(self, deltas: List[str], error: Optional[BaseException] = None):
+        self.deltas = deltas
+        self.error = error
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for delta in self.deltas:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+        if self.error is not None:
+            raise self.error
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class StubCompletions:
+    """Records each request and answers it with `handler`"""
+
+    def __init__(self, handler: Handler):
+        self.handler = handler
+        self.calls: List[Dict[str, Any]] = []
+
+    async def create(self, **kwargs: Any) -> Any:
+        self.calls.append(kwargs)
+        return await self.handler(kwargs)
+
+
+class StubClient:
+    """Stands in for AsyncGroq"""
+
+    def __init__(self, handler: Handler):
+        self.chat = SimpleNamespace(completions=StubCompletions(handler))
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def in_memory_settings(monkeypatch):
+    """Keep caches and stores in memory and upstream calls fast"""
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", "")
+    monkeypatch.setattr(settings, "FEATURE_STORE_PATH", "")
+    monkeypatch.setattr(settings, "CATALOG_STORE_PATH", None)
+    monkeypatch.setattr(settings, "CATALOG_PATH", None)
+    monkeypatch.setattr(settings, "RECOMMEND_MODEL_PATH", "")
+    monkeypatch.setattr(settings, "RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(settings, "RETRY_MAX_DELAY", 0.002)
+
+
+@pytest.fixture
+def stub_groq():
+    """Install a StubClient answering with `handler` on a GroqService"""
+
+    def install(groq, handler: Handler) -> StubCompletions:
+        groq._client = StubClient(handler)
+        return groq._client.chat.completions
+
+    return install
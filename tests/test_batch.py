@@ -0,0 +1,55 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers import ai_routes
+from app.services.ai_service import AIService
+from conftest import completion
+
+
+SONG = {"id": "1", "title": "Bohemian Rhapsody", "artist": "Queen", "genre": "Rock", "year": 1975, "duration": 354}
+
+
+def test_invalid_items_fail_alone(monkeypatch, stub_groq):
+    service = AIService()
+    monkeypatch.setattr(ai_routes, "ai_service", service)
+
+    async def answer(kwargs):
+        return completion("An operatic rock epic.")
+
+    calls = stub_groq(service.groq, answer)
+    response = TestClient(app).post("/batch", json={"operations": [
+        {"op": "describe", "id": "ok", "songs": [SONG]},
+        {"op": "describe", "id": "empty", "songs": []},
+        {"op": "search", "id": "short", "query": "ab"},
+        {"op": "shuffle", "id": 7},
+    ]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (1, 3)
+    results = body["results"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert results[0]["status"] == "ok"
+    assert results[0]["result"]["description"] == "An operatic rock epic."
+    for result in results[1:]:
+        assert result["status"] == "error"
+        assert result["error"]["error_type"] == "validation_error"
+        assert result["error"]["status_code"] == 422
+    assert results[1]["id"] == "empty"
+    assert "songs" in results[1]["error"]["detail"]
+    assert results[2]["op"] == "search"
+    assert "query" in results[2]["error"]["detail"]
+    assert results[3]["id"] == "7"
+    assert len(calls.calls) == 1
+
+
+def test_empty_batch_is_rejected():
+    assert TestClient(app).post("/batch", json={"operations": []}).status_code == 422
+
+
+def test_openapi_documents_each_operation_schema():
+    operations = app.openapi()["components"]["schemas"]["BatchRequest"]["properties"]["operations"]
+
+    documented = operations["items"]["anyOf"][0]
+    assert documented["discriminator"]["propertyName"] == "op"
+    assert set(documented["discriminator"]["mapping"]) == {"describe", "recommend", "name", "mood", "search"}
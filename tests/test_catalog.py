@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.config import settings
+from app.models.responses import SongRecommendation
+from app.models.song import Song
+from app.routers import ai_routes, catalog_routes
+from app.services.ai_service import AIService
+from app.services.song_resolver import SongResolver
+
+
+def make_songs(count: int):
+    genres = ["Rock", "Jazz", "Pop", "Soul", "Folk"]
+    return [
+        Song(
+            id=f"song-{i}",
+            title=f"Midnight Song {i}",
+            artist=f"Artist {i % 97}",
+            genre=genres[i % len(genres)],
+            year=1960 + i % 60,
+            duration=180 + i % 120
+        )
+        for i in range(count)
+    ]
+
+
+def test_ingest_and_remove_through_the_api(monkeypatch):
+    service = AIService()
+    monkeypatch.setattr(ai_routes, "ai_service", service)
+    monkeypatch.setattr(catalog_routes, "ai_service", service)
+    client = TestClient(app)
+    songs = [song.model_dump() for song in make_songs(3)]
+
+    response = client.post("/catalog/songs", json={"songs": songs})
+    assert response.status_code == 200
+    assert response.json() == {"ingested": 3, "total": 3}
+
+    assert client.delete("/catalog/songs/song-1").json() == {"removed": 1, "total": 2}
+    assert client.delete("/catalog/songs/song-1").status_code == 404
+    assert service.catalog.get("song-0") is not None
+    assert service.catalog.get("song-1") is None
+
+
+def test_ingest_leaves_the_event_loop_free():
+    service = AIService()
+    songs = make_songs(5000)
+
+    async def run():
+        ticks = 0
+        longest = 0.0
+        ingest = asyncio.create_task(service.ingest_songs(songs))
+        while not ingest.done():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            longest = max(longest, time.perf_counter() - started)
+            ticks += 1
+        return ticks, longest, await ingest
+
+    ticks, longest, response = asyncio.run(run())
+
+    assert response.ingested == 5000
+    assert len(service.catalog) == 5000
+    assert ticks > 5
+    assert longest < 0.5
+
+
+def test_catalog_search_runs_in_a_worker_thread(monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_QUERY_PLANNER", False)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    service = AIService()
+    service.catalog.add_songs(make_songs(200))
+    threads = []
+    search = service.catalog.search
+
+    def recording_search(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(service.catalog, "search", recording_search)
+
+    response = asyncio.run(service.semantic_search("midnight jazz", 5, "keyword"))
+
+    assert response.songs
+    assert threads and all(thread is not threading.main_thread() for thread in threads)
+
+
+def test_resolver_matches_typos_after_a_save_and_load(tmp_path):
+    songs = make_songs(300) + [
+        Song(id="queen", title="Bohemian Rhapsody", artist="Queen", genre="Rock", year=1975, duration=354)
+    ]
+    resolver = SongResolver()
+    resolver.add(range(len(songs)), songs)
+    resolver.save(str(tmp_path))
+    loaded = SongResolver.load(str(tmp_path))
+    pairs = [
+        ("Bohemian Rhapsody", "Queen"),
+        ("Bohemain Rapsody", "Queen"),
+        ("Midnight Song 42", "Artist 42"),
+        ("Completely Unknown Tune", "Nobody At All"),
+    ]
+
+    for index in (resolver, loaded):
+        matches = index.match_many(pairs, songs.__getitem__, min_confidence=0.5)
+        assert matches[0] == (songs[-1], 1.0)
+        assert matches[1][0] is songs[-1] and 0.5 <= matches[1][1] < 1.0
+        assert matches[2] == (songs[42], 1.0)
+        assert matches[3] is None
+
+
+def test_recommendations_are_resolved_in_a_worker_thread(monkeypatch):
+    service = AIService()
+    service.catalog.add_songs(make_songs(50))
+    threads = []
+    resolve = service.catalog.resolve
+
+    def recording_resolve(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return resolve(*args, **kwargs)
+
+    monkeypatch.setattr(service.catalog, "resolve", recording_resolve)
+    recommendations = [SongRecommendation(title="Midnight Song 7", artist="Artist 7", reason="Late-night")]
+
+    kept = asyncio.run(service._resolve_recommendations(recommendations, (set(), set())))
+
+    assert [recommendation.song_id for recommendation in kept] == ["song-7"]
+    assert threads and all(thread is not threading.main_thread() for thread in threads)
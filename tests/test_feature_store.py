@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+from app.config import Settings, settings
+from app.models.song import Song
+from app.services.ai_service import AIService
+from app.services.feature_store import FeatureStore, SongFeatures
+
+
+def test_feature_store_is_off_by_default():
+    assert Settings.model_fields["FEATURE_STORE_ENABLED"].default is False
+
+
+def test_startup_loads_stored_features_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "features.db")
+    store = FeatureStore(path)
+    store.add({str(i): SongFeatures(moods=["calm"], energy=0.2, valence=0.6) for i in range(100)})
+    store.close()
+
+    monkeypatch.setattr(settings, "FEATURE_STORE_ENABLED", True)
+    monkeypatch.setattr(settings, "FEATURE_STORE_PATH", path)
+    service = AIService()
+    threads = []
+    open_store = service.features.open
+
+    def record():
+        threads.append(threading.current_thread())
+        return open_store()
+
+    monkeypatch.setattr(service.features, "open", record)
+
+    async def run():
+        await service.startup()
+        try:
+            return threading.current_thread()
+        finally:
+            await service.shutdown()
+
+    loop_thread = asyncio.run(run())
+
+    assert len(threads) == 1 and threads[0] is not loop_thread
+    assert len(service.features) == 100
+    assert service.features.get("7").moods == ["calm"]
+
+
+def test_database_reads_and_writes_run_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "features.db")
+    writer = FeatureStore(path)
+    reader = FeatureStore(path)
+    reader.open()
+    threads = []
+
+    for store, name in ((writer, "_insert"), (reader, "_select")):
+        original = getattr(store, name)
+
+        def record(*args, original=original):
+            threads.append(threading.current_thread())
+            return original(*args)
+
+        monkeypatch.setattr(store, name, record)
+
+    songs = [Song(id=str(i), title=f"Song {i}", artist="Artist", genre="Jazz", year=1960, duration=200) for i in range(3)]
+
+    async def run():
+        await writer.add_async({"0": SongFeatures(moods=["calm"], energy=0.2, valence=0.6)})
+        # The reader loaded before the write, so it finds song 0 in the database
+        rows, missing = await reader.lookup_async(songs)
+        return threading.current_thread(), rows, missing
+
+    loop_thread, rows, missing = asyncio.run(run())
+
+    assert len(threads) == 2 and all(thread is not loop_thread for thread in threads)
+    assert len(rows) == 1 and [song.id for song in missing] == ["1", "2"]
+    assert reader.get("0").moods == ["calm"]
+    # Songs now held in memory don't touch the database
+    asyncio.run(reader.lookup_async(songs[:1]))
+    assert len(threads) == 2
+    writer.close()
+    reader.close()
+
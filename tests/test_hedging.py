@@ -0,0 +1,39 @@
+import asyncio
+
+from app.services.hedging import Hedger, hedges_fired, hedges_won
+
+
+def hedger() -> Hedger:
+    hedger = Hedger(percentile=50, budget_ratio=1.0, min_samples=1, min_delay=0.01)
+    for _ in range(5):
+        hedger.tracker("hedge-test").observe(0.01)
+    return hedger
+
+
+def test_losing_attempt_is_cancelled_and_awaited():
+    attempts = []
+    unwound = []
+
+    async def call():
+        index = len(attempts)
+        attempts.append(index)
+        try:
+            await asyncio.sleep(1.0 if index == 0 else 0.02)
+            return index
+        finally:
+            unwound.append(index)
+
+    fired = hedges_fired.get(endpoint="hedge-test")
+    won = hedges_won.get(endpoint="hedge-test")
+
+    async def run():
+        result = await hedger().run(call, endpoint="hedge-test")
+        # Checked before yielding to the loop: the loser has already unwound
+        return result, list(unwound)
+
+    result, unwound_on_return = asyncio.run(run())
+
+    assert result == 1
+    assert sorted(unwound_on_return) == [0, 1]
+    assert hedges_fired.get(endpoint="hedge-test") - fired == 1
+    assert hedges_won.get(endpoint="hedge-test") - won == 1
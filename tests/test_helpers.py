@@ -0,0 +1,18 @@
+from app.utils.helpers import estimate_tokens
+
+
+def test_estimate_counts_word_and_punctuation_boundaries():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("1. Bohemian Rhapsody - Queen (Rock, 1975)") == 13
+
+
+def test_estimate_has_a_floor_for_unspaced_text():
+    ids = "9f86d081884c7d659a2feb1bcd0f2800" * 8
+    assert estimate_tokens(ids) == len(ids) // 4 + 1
+
+
+def test_estimate_counts_characters_outside_ascii():
+    japanese = "夜に駆ける紅蓮華米津玄師" * 10
+    assert estimate_tokens(japanese) == int(len(japanese.encode()) / 2.5) + 1
+    # Accents add to the estimate of otherwise ASCII words
+    assert estimate_tokens("Déjà Vu by Beyoncé") > estimate_tokens("Deja Vu by Beyonce")
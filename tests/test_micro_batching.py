@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from app.config import settings
+from app.models.song import Song
+from app.services.ai_service import AIService
+from conftest import completion
+
+
+def playlist(name: str, count: int = 3):
+    return [
+        Song(id=f"{name}-{i}", title=f"{name} song {i}", artist=f"{name} artist", genre="Jazz", year=1960, duration=200)
+        for i in range(count)
+    ]
+
+
+def is_batch(kwargs) -> bool:
+    return "each of the playlists" in kwargs["messages"][-1]["content"]
+
+
+def batching_service(monkeypatch) -> AIService:
+    monkeypatch.setattr(settings, "MICRO_BATCH_ENABLED", True)
+    monkeypatch.setattr(settings, "MICRO_BATCH_WINDOW_MS", 50.0)
+    monkeypatch.setattr(settings, "CACHE_ENABLED", False)
+    return AIService()
+
+
+def test_batch_answer_missing_a_playlist_falls_back_to_a_single_call(monkeypatch, stub_groq):
+    service = batching_service(monkeypatch)
+
+    async def answer(kwargs):
+        if is_batch(kwargs):
+            # Only the first playlist is answered
+            return completion(json.dumps({"p0": {"moods": ["calm"], "description": "Quiet jazz."}}))
+        return completion(json.dumps({"moods": ["smoky"], "description": "Late-night jazz."}))
+
+    calls = stub_groq(service.groq, answer)
+
+    async def run():
+        return await asyncio.gather(
+            service.analyze_mood(playlist("a")),
+            service.analyze_mood(playlist("b"))
+        )
+
+    first, second = asyncio.run(run())
+
+    assert len(calls.calls) == 2
+    assert is_batch(calls.calls[0]) and not is_batch(calls.calls[1])
+    assert "b song 0" in calls.calls[1]["messages"][-1]["content"]
+    assert (first.moods, first.description) == (["calm"], "Quiet jazz.")
+    assert (second.moods, second.description) == (["smoky"], "Late-night jazz.")
+
+
+def test_unparsable_batch_answer_falls_back_for_every_playlist(monkeypatch, stub_groq):
+    service = batching_service(monkeypatch)
+
+    async def answer(kwargs):
+        if is_batch(kwargs):
+            return completion("Sorry, I can't help with that.")
+        return completion(json.dumps({"moods": ["smoky"], "description": "Late-night jazz."}))
+
+    calls = stub_groq(service.groq, answer)
+
+    async def run():
+        return await asyncio.gather(*(service.analyze_mood(playlist(name)) for name in "abc"))
+
+    results = asyncio.run(run())
+
+    assert len(calls.calls) == 4
+    assert [result.moods for result in results] == [["smoky"]] * 3
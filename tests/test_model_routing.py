@@ -0,0 +1,60 @@
+import asyncio
+
+from app.config import settings
+from app.services.groq_service import GroqService
+from conftest import completion
+
+
+def routed_service(monkeypatch, policy: str, tiers: str = "small=llama-3.1-8b-instant") -> GroqService:
+    monkeypatch.setattr(settings, "ROUTING_POLICY", policy)
+    monkeypatch.setattr(settings, "ROUTING_TIERS", tiers)
+    monkeypatch.setattr(settings, "ROUTING_TABLE", "analyze_mood=small")
+    return GroqService()
+
+
+def test_fingerprint_covers_the_models_an_endpoint_is_routed_to(monkeypatch):
+    single = routed_service(monkeypatch, "single")
+    tiered = routed_service(monkeypatch, "tiered")
+    latency = routed_service(monkeypatch, "latency")
+    other_tier = routed_service(monkeypatch, "tiered", "small=gemma2-9b-it")
+
+    def key(service, endpoint):
+        return service.fingerprint("prompt", "system", 0.7, True, endpoint)
+
+    # Answers from the small model aren't served once routing sends the endpoint elsewhere
+    assert len({key(single, "analyze_mood"), key(tiered, "analyze_mood"), key(other_tier, "analyze_mood")}) == 3
+    assert key(tiered, "analyze_mood") != key(latency, "analyze_mood")
+    # Endpoints on the default model keep one key whatever the tiers are
+    assert key(tiered, "describe_playlist") == key(other_tier, "describe_playlist")
+    assert key(tiered, "describe_playlist") != key(tiered, "analyze_mood")
+
+
+def test_fingerprint_is_stable_across_services(monkeypatch):
+    first = routed_service(monkeypatch, "tiered")
+    second = routed_service(monkeypatch, "tiered")
+
+    assert first.fingerprint("prompt", None, 1.0, False, "analyze_mood") == \
+        second.fingerprint("prompt", None, 1.0, False, "analyze_mood")
+    assert first.fingerprint("prompt", None, 1.0, False, "analyze_mood") != \
+        first.fingerprint("prompt", None, 1.0, True, "analyze_mood")
+
+
+def test_a_validator_that_raises_escalates_to_the_next_model(monkeypatch, stub_groq):
+    service = routed_service(monkeypatch, "tiered")
+    answers = iter(['{"mood": "calm"}', '{"moods": ["calm"]}'])
+
+    async def answer(kwargs):
+        return completion(next(answers))
+
+    calls = stub_groq(service, answer)
+
+    def validate(data):
+        # Raises KeyError on the small model's answer
+        return bool(data["moods"])
+
+    content = asyncio.run(service.generate_completion(
+        "prompt", json_mode=True, endpoint="analyze_mood", validate=validate
+    ))
+
+    assert content == '{"moods": ["calm"]}'
+    assert [call["model"] for call in calls.calls] == ["llama-3.1-8b-instant", settings.GROQ_MODEL]
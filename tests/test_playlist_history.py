@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.models.song import Song
+from app.services import playlist_history
+from app.services.ai_service import AIService
+from app.services.playlist_history import PlaylistHistory
+from conftest import completion
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(playlist_history.time, "monotonic", clock)
+    return clock
+
+
+def make_songs(count: int, start: int = 0):
+    return [
+        Song(id=str(i), title=f"Song {i}", artist=f"Artist {i}", genre="Jazz", year=1960, duration=200)
+        for i in range(start, start + count)
+    ]
+
+
+def test_snapshots_expire_after_max_age(clock):
+    history = PlaylistHistory()
+    songs = make_songs(20)
+    history.remember("describe_playlist", songs, "Smoky late-night jazz.")
+
+    clock.now += 59
+    assert history.find("describe_playlist", songs, max_age=60).snapshot.result == "Smoky late-night jazz."
+
+    clock.now += 1
+    assert history.find("describe_playlist", songs, max_age=60) is None
+    assert len(history) == 0
+
+
+def test_remembering_the_same_result_keeps_one_snapshot_and_its_age(clock):
+    history = PlaylistHistory()
+    songs = make_songs(20)
+    history.remember("describe_playlist", songs, "Smoky late-night jazz.")
+
+    for _ in range(5):
+        clock.now += 10
+        history.remember("describe_playlist", songs, "Smoky late-night jazz.")
+
+    assert len(history) == 1
+    assert history.find("describe_playlist", songs, max_age=50) is None
+
+    history.remember("describe_playlist", songs, "Cool jazz for a quiet evening.")
+    history.remember("analyze_mood", songs, {"moods": ["calm"], "description": "Calm."})
+    assert len(history) == 2
+    assert history.find("describe_playlist", songs, max_age=50).snapshot.result == "Cool jazz for a quiet evening."
+
+
+def test_describe_stops_reusing_a_snapshot_past_the_cache_ttl(clock, stub_groq, monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "CACHE_TTLS", "describe_playlist=60")
+    monkeypatch.setattr(settings, "CACHE_ENABLED", False)
+    service = AIService()
+    answers = iter(["First description.", "Second description."])
+
+    async def answer(kwargs):
+        return completion(next(answers))
+
+    calls = stub_groq(service.groq, answer)
+    songs = make_songs(20)
+
+    async def describe():
+        return (await service.describe_playlist(songs)).description
+
+    assert asyncio.run(describe()) == "First description."
+    clock.now += 30
+    assert asyncio.run(describe()) == "First description."
+    assert len(calls.calls) == 1
+    assert len(service.history) == 1
+
+    clock.now += 30
+    assert asyncio.run(describe()) == "Second description."
+    assert len(calls.calls) == 2
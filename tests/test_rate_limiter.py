@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app.services import rate_limiter
+from app.services.rate_limiter import RateLimiter, waited_calls
+from app.utils.exceptions import RateLimitException
+
+
+class Clock:
+    """Monotonic time that only moves when a waiter sleeps"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        clock.now += delay
+        await real_sleep(0)
+
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", sleep)
+    return clock
+
+
+def grant_times(limiter: RateLimiter, clock: Clock, reservations):
+    """Time each concurrent reservation was granted, relative to the start"""
+    start = clock.now
+
+    async def reserve(tokens):
+        await limiter.acquire(tokens)
+        return clock.now - start
+
+    async def run():
+        return await asyncio.gather(*(reserve(tokens) for tokens in reservations))
+
+    return sorted(asyncio.run(run()))
+
+
+def test_requests_wait_for_budget_instead_of_exceeding_rpm(clock):
+    limiter = RateLimiter(requests_per_minute=3, max_wait=600)
+    waited_before = waited_calls.get()
+
+    times = grant_times(limiter, clock, [1] * 9)
+
+    # A burst of the full minute's budget, then one request every 20 seconds
+    assert times[:3] == [0, 0, 0]
+    assert times[3:] == pytest.approx([20, 40, 60, 80, 100, 120])
+    for granted, at in enumerate(times, 1):
+        assert granted <= 3 + at * 3 / 60 + 1e-9
+    assert waited_calls.get() - waited_before == 6
+
+
+def test_tokens_wait_for_budget_instead_of_exceeding_tpm(clock):
+    limiter = RateLimiter(tokens_per_minute=1000, max_wait=600)
+
+    times = grant_times(limiter, clock, [400] * 5)
+
+    for granted, at in enumerate(times, 1):
+        assert granted * 400 <= 1000 + at * 1000 / 60 + 1e-6
+    assert times[-1] == pytest.approx((5 * 400 - 1000) * 60 / 1000)
+
+
+def test_usage_above_the_estimate_delays_later_calls(clock):
+    limiter = RateLimiter(tokens_per_minute=600, max_wait=600)
+
+    async def run():
+        await limiter.acquire(100)
+        # The call actually used 600 tokens, emptying the bucket; without the
+        # correction 500 tokens would be left and the next call wouldn't wait
+        limiter.reconcile(100, 600)
+        started = clock.now
+        await limiter.acquire(100)
+        return clock.now - started
+
+    assert asyncio.run(run()) == pytest.approx(10)
+
+
+def test_calls_that_would_wait_past_max_wait_are_rejected(clock):
+    limiter = RateLimiter(requests_per_minute=2, max_wait=5)
+
+    async def run():
+        await limiter.acquire(1)
+        await limiter.acquire(1)
+        with pytest.raises(RateLimitException):
+            await limiter.acquire(1)
+
+    asyncio.run(run())
@@ -0,0 +1,84 @@
+import pytest
+
+from app.services import response_cache
+from app.services.response_cache import ResponseCache, cache_evictions, cache_lookups
+from app.utils.metrics import metrics
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_stale_entry_counts_one_expiration_however_often_it_is_read(clock):
+    cache = ResponseCache(default_ttl=10, stale_ttl=60)
+    cache.set("key", "value", "describe_playlist")
+
+    clock.now += 11
+    for _ in range(5):
+        assert cache.get("key", "describe_playlist") is None
+        assert cache.get_stale("key") == "value"
+
+    assert cache.expirations == 1
+    assert cache.stats()["misses"] == 5
+    assert cache.stale_hits == 5
+
+    clock.now += 60
+    assert cache.get_stale("key") is None
+    assert len(cache) == 0
+    assert cache.expirations == 1
+
+
+def test_entry_dropped_unread_counts_one_expiration(clock):
+    cache = ResponseCache(default_ttl=10, stale_ttl=5)
+    cache.set("key", "value")
+
+    clock.now += 20
+    assert cache.get_stale("key") is None
+
+    assert len(cache) == 0
+    assert cache.expirations == 1
+
+
+def test_refreshed_entry_can_expire_again(clock):
+    cache = ResponseCache(default_ttl=10, stale_ttl=60)
+    cache.set("key", "old")
+    clock.now += 11
+    assert cache.get("key") is None
+
+    cache.set("key", "new")
+    assert cache.get("key") == "new"
+    clock.now += 11
+    assert cache.get("key") is None
+
+    assert cache.expirations == 2
+
+
+def test_lookups_and_evictions_are_counted_as_they_happen(clock):
+    cache = ResponseCache(max_entries=2)
+    hits = cache_lookups.get(endpoint="counter-test", result="hit")
+    misses = cache_lookups.get(endpoint="counter-test", result="miss")
+    evictions = cache_evictions.get()
+
+    cache.set("a", "1", "counter-test")
+    assert cache.get("a", "counter-test") == "1"
+    assert cache.get("b", "counter-test") is None
+    cache.set("b", "2", "counter-test")
+    cache.set("c", "3", "counter-test")
+
+    assert cache_lookups.get(endpoint="counter-test", result="hit") - hits == 1
+    assert cache_lookups.get(endpoint="counter-test", result="miss") - misses == 1
+    assert cache_evictions.get() - evictions == 1
+    rendered = metrics.render()
+    assert "# TYPE response_cache_lookups_total counter" in rendered
+    assert "# TYPE response_cache_evictions_total counter" in rendered
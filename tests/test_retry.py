@@ -0,0 +1,208 @@
+import asyncio
+
+import groq
+import httpx
+import pytest
+
+from app.services import retry
+from app.services.groq_service import GroqService
+from app.services.retry import RetryPolicy, retries_total, retry_budget_exhausted, retry_giveups
+from app.utils.exceptions import ClaudeAPIException, RateLimitException
+from conftest import completion
+
+
+REQUEST = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+
+
+def status_error(status_code: int, headers=None) -> groq.APIStatusError:
+    response = httpx.Response(status_code, headers=headers or {}, request=REQUEST)
+    return groq.APIStatusError(f"Error code: {status_code}", response=response, body=None)
+
+
+class Flaky:
+    """Fails with each of `errors` in turn, then answers"""
+
+    def __init__(self, *errors: BaseException):
+        self.errors = list(errors)
+        self.attempts = 0
+
+    async def __call__(self):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "answer"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff delays instead of waiting them out"""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(retry.asyncio, "sleep", sleep)
+    return delays
+
+
+def policy(**options) -> RetryPolicy:
+    return RetryPolicy(**{"max_attempts": 3, "base_delay": 0.01, "max_delay": 0.05, **options})
+
+
+@pytest.mark.parametrize("error, reason", [
+    (status_error(429), "429"),
+    (status_error(500), "500"),
+    (status_error(503), "503"),
+    (groq.APITimeoutError(request=REQUEST), "timeout"),
+    (httpx.ReadTimeout("read timed out"), "timeout"),
+    (groq.APIConnectionError(request=REQUEST), "connection"),
+])
+def test_transient_errors_are_retried(error, reason, sleeps):
+    call = Flaky(error, error)
+    before = retries_total.get(endpoint="retry-test", reason=reason)
+
+    assert asyncio.run(policy().run(call, endpoint="retry-test")) == "answer"
+
+    assert call.attempts == 3
+    assert len(sleeps) == 2
+    assert retries_total.get(endpoint="retry-test", reason=reason) - before == 2
+
+
+@pytest.mark.parametrize("error", [
+    status_error(400),
+    status_error(401),
+    status_error(403),
+    status_error(404),
+    status_error(422),
+    ValueError("not an upstream error"),
+])
+def test_client_errors_are_not_retried(error, sleeps):
+    call = Flaky(error)
+
+    with pytest.raises(type(error)):
+        asyncio.run(policy().run(call, endpoint="retry-test"))
+
+    assert call.attempts == 1
+    assert sleeps == []
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    call = Flaky(*[status_error(503)] * 5)
+    before = retry_giveups.get(endpoint="retry-test")
+
+    with pytest.raises(groq.APIStatusError):
+        asyncio.run(policy(max_attempts=3).run(call, endpoint="retry-test"))
+
+    assert call.attempts == 3
+    assert retry_giveups.get(endpoint="retry-test") - before == 1
+
+
+def test_backoff_is_full_jitter_within_the_capped_exponential():
+    retries = policy(base_delay=0.1, max_delay=1.0)
+
+    for attempt, cap in [(1, 0.1), (2, 0.2), (3, 0.4), (4, 0.8), (5, 1.0), (10, 1.0)]:
+        delays = [retries.backoff(attempt) for _ in range(2000)]
+        assert all(0 <= delay <= cap for delay in delays)
+        # Full jitter spreads delays over the whole range, not just near the cap
+        assert min(delays) < 0.1 * cap
+        assert max(delays) > 0.9 * cap
+
+
+def test_retry_after_header_sets_the_minimum_delay(sleeps):
+    call = Flaky(status_error(429, {"retry-after": "0.5"}), status_error(503, {"retry-after-ms": "250"}))
+
+    assert asyncio.run(policy(max_total_time=10).run(call)) == "answer"
+
+    assert sleeps[0] >= 0.5
+    assert sleeps[1] >= 0.25
+
+
+def test_no_retry_past_the_total_time_cap(sleeps):
+    call = Flaky(status_error(503, {"retry-after": "5"}))
+    before = retry_giveups.get(endpoint="retry-test")
+
+    with pytest.raises(groq.APIStatusError):
+        asyncio.run(policy(max_total_time=1.0).run(call, endpoint="retry-test"))
+
+    assert call.attempts == 1
+    assert sleeps == []
+    assert retry_giveups.get(endpoint="retry-test") - before == 1
+
+
+def test_total_time_cap_counts_time_already_spent():
+    call = Flaky(*[status_error(503)] * 100)
+
+    async def slow_failure():
+        await asyncio.sleep(0.05)
+        return await call()
+
+    retries = policy(max_attempts=100, base_delay=0.001, max_delay=0.001, max_total_time=0.2)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(groq.APIStatusError):
+            await retries.run(slow_failure, endpoint="deadline-test")
+        return loop.time() - started
+
+    elapsed = asyncio.run(run())
+    assert 2 <= call.attempts <= 5
+    # The deadline stops retrying; only the attempt in progress may overrun it
+    assert elapsed < 0.5
+
+
+def test_exhausted_budget_stops_retries(sleeps):
+    # No refill and no deposits: only the initial balance of 10 retries
+    retries = policy(max_attempts=2, budget_ratio=0, budget_min_per_second=0)
+    before = retry_budget_exhausted.get(endpoint="budget-test")
+
+    calls = [Flaky(status_error(503)) for _ in range(12)]
+    results = []
+    for call in calls:
+        try:
+            results.append(asyncio.run(retries.run(call, endpoint="budget-test")))
+        except groq.APIStatusError:
+            results.append("failed")
+
+    assert results == ["answer"] * 10 + ["failed"] * 2
+    assert [call.attempts for call in calls] == [2] * 10 + [1] * 2
+    assert retry_budget_exhausted.get(endpoint="budget-test") - before == 2
+    # Budgets are per endpoint
+    assert asyncio.run(retries.run(Flaky(status_error(503)), endpoint="other-endpoint")) == "answer"
+
+
+def test_groq_service_retries_a_throttled_completion(stub_groq, sleeps):
+    service = GroqService()
+    errors = [status_error(429)]
+
+    async def answer(kwargs):
+        if errors:
+            raise errors.pop()
+        return completion("ok")
+
+    calls = stub_groq(service, answer)
+
+    assert asyncio.run(service.generate_completion("prompt", endpoint="retry-test")) == "ok"
+    assert len(calls.calls) == 2
+
+
+def test_groq_service_maps_errors_once_retries_are_spent(stub_groq, sleeps):
+    service = GroqService()
+
+    async def throttled(kwargs):
+        raise status_error(429)
+
+    async def unauthorized(kwargs):
+        raise status_error(401)
+
+    calls = stub_groq(service, throttled)
+    with pytest.raises(RateLimitException):
+        asyncio.run(service.generate_completion("prompt", endpoint="retry-test"))
+    assert len(calls.calls) == service.retry_policy.max_attempts
+
+    calls = stub_groq(service, unauthorized)
+    with pytest.raises(ClaudeAPIException):
+        asyncio.run(service.generate_completion("prompt", endpoint="retry-test"))
+    assert len(calls.calls) == 1
@@ -0,0 +1,81 @@
+import pytest
+
+from app.services import semantic_cache
+from app.services.embeddings import HashingEmbedder
+from app.services.query_planner import QueryPlan
+from app.services.semantic_cache import SemanticCache, query_signature, semantic_cache_lookups
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(semantic_cache.time, "monotonic", clock)
+    return clock
+
+
+def make_cache(threshold: float = 0.9, **options) -> SemanticCache:
+    return SemanticCache(HashingEmbedder(dim=256), threshold=threshold, **options)
+
+
+def test_similar_query_above_the_threshold_is_a_hit(clock):
+    cache = make_cache()
+    scope = query_signature(QueryPlan(keywords=["upbeat", "running", "songs"]))[1]
+    hits = semantic_cache_lookups.get(result="hit")
+    cache.put("upbeat running songs", scope, "answer")
+
+    value, similarity, text = cache.lookup("songs upbeat running", scope)
+
+    assert value == "answer"
+    assert similarity >= 0.9
+    assert text == "upbeat running songs"
+    assert semantic_cache_lookups.get(result="hit") - hits == 1
+
+
+def test_threshold_decides_between_hit_and_miss(clock):
+    probe = make_cache()
+    probe.put("upbeat running songs for the morning", None, "answer")
+    _, similarity, _ = probe.lookup("upbeat running songs for the evening", None)
+    assert 0 < similarity < 1
+
+    below = make_cache(threshold=similarity - 0.01)
+    above = make_cache(threshold=similarity + 0.01)
+    for cache in (below, above):
+        cache.put("upbeat running songs for the morning", None, "answer")
+
+    assert below.get("upbeat running songs for the evening") == "answer"
+    assert above.get("upbeat running songs for the evening") is None
+    assert (above.hits, above.misses) == (0, 1)
+
+
+def test_same_text_in_another_scope_is_a_miss(clock):
+    cache = make_cache()
+    rock = QueryPlan(keywords=["driving"], genres=["Rock"])
+    jazz = QueryPlan(keywords=["driving"], genres=["Jazz"])
+    seventies_rock = QueryPlan(keywords=["driving"], genres=["Rock"], year_from=1970, year_to=1979)
+    text, rock_scope = query_signature(rock)
+    cache.put(text, rock_scope, "rock answer")
+
+    assert cache.get(*query_signature(rock)) == "rock answer"
+    assert cache.get(*query_signature(jazz)) is None
+    assert cache.get(*query_signature(seventies_rock)) is None
+    # Genres are a set: their order doesn't change the scope
+    assert query_signature(QueryPlan(genres=["Rock", "Jazz"]))[1] == query_signature(QueryPlan(genres=["Jazz", "Rock"]))[1]
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = make_cache(ttl=60)
+    cache.put("late night jazz", None, "answer")
+
+    clock.now += 59
+    assert cache.get("late night jazz") == "answer"
+    clock.now += 1
+    assert cache.get("late night jazz") is None
+    assert len(cache) == 0
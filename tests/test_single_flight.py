@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from app.services.ai_service import AIService
+from app.services.single_flight import SingleFlight, coalesced_calls, in_flight_calls, leader_calls
+from conftest import completion
+
+
+def test_concurrent_identical_calls_share_one_upstream_call(stub_groq):
+    service = AIService()
+    leaders_before = leader_calls.get(endpoint="describe_playlist")
+    coalesced_before = coalesced_calls.get(endpoint="describe_playlist")
+
+    async def run():
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def answer(kwargs):
+            started.set()
+            await release.wait()
+            return completion("A warm, unhurried playlist.")
+
+        calls = stub_groq(service.groq, answer)
+        tasks = [
+            asyncio.create_task(service._complete("describe_playlist", "Describe these songs", "You curate music"))
+            for _ in range(20)
+        ]
+        await started.wait()
+        assert in_flight_calls.get() == 1
+        release.set()
+        return calls, await asyncio.gather(*tasks)
+
+    calls, results = asyncio.run(run())
+
+    assert len(calls.calls) == 1
+    assert results == ["A warm, unhurried playlist."] * 20
+    assert leader_calls.get(endpoint="describe_playlist") - leaders_before == 1
+    assert coalesced_calls.get(endpoint="describe_playlist") - coalesced_before == 19
+    assert in_flight_calls.get() == 0
+    assert len(service.single_flight) == 0
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call(stub_groq):
+    service = AIService()
+
+    async def run():
+        started = asyncio.Event()
+        release = asyncio.Event()
+        finished = []
+
+        async def answer(kwargs):
+            started.set()
+            await release.wait()
+            finished.append(True)
+            return completion("Late-night jazz.")
+
+        calls = stub_groq(service.groq, answer)
+        first = asyncio.create_task(service._complete("describe_playlist", "prompt", "system"))
+        second = asyncio.create_task(service._complete("describe_playlist", "prompt", "system"))
+        await started.wait()
+        await asyncio.sleep(0)
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        release.set()
+        return calls, finished, await second
+
+    calls, finished, result = asyncio.run(run())
+
+    assert result == "Late-night jazz."
+    assert finished == [True]
+    assert len(calls.calls) == 1
+    assert in_flight_calls.get() == 0
+
+
+def test_shared_call_is_cancelled_when_every_waiter_leaves():
+    flight = SingleFlight()
+
+    async def run():
+        started = asyncio.Event()
+        cancelled = []
+
+        async def call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        waiters = [asyncio.create_task(flight.do("key", call)) for _ in range(3)]
+        await started.wait()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        return cancelled
+
+    assert asyncio.run(run()) == [True]
+    assert len(flight) == 0
+    assert in_flight_calls.get() == 0
+
+
+def test_waiters_share_the_error_and_later_calls_start_afresh():
+    flight = SingleFlight()
+    attempts = []
+
+    async def failing():
+        attempts.append(True)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        results = await asyncio.gather(*(flight.do("key", failing) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        with pytest.raises(RuntimeError):
+            await flight.do("key", failing)
+
+    asyncio.run(run())
+    assert len(attempts) == 2
+    assert len(flight) == 0
@@ -0,0 +1,227 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers import ai_routes
+from app.services.ai_service import AIService
+from app.services.groq_service import GroqService, upstream_first_chunk, upstream_in_flight, upstream_latency
+from app.utils.json_stream import IncrementalJSONParser
+from conftest import StubStream
+
+
+SONGS = [
+    {"id": "1", "title": "Bohemian Rhapsody", "artist": "Queen", "genre": "Rock", "year": 1975, "duration": 354},
+    {"id": "2", "title": "Hotel California", "artist": "Eagles", "genre": "Rock", "year": 1976, "duration": 391},
+]
+
+RECOMMENDATIONS = json.dumps({"recommendations": [
+    {"title": "Stairway to Heaven", "artist": "Led Zeppelin", "reason": "A \"classic\" {epic} build"},
+    {"title": "Dream On", "artist": "Aerosmith", "reason": "Same era, same drama"},
+]})
+
+
+def split(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = AIService()
+    monkeypatch.setattr(ai_routes, "ai_service", service)
+    return service
+
+
+@pytest.fixture
+def client(service):
+    # Without the context manager the app's startup doesn't run, so the stub
+    # client installed by each test stays in place
+    return TestClient(app)
+
+
+def streaming(stream: StubStream):
+    async def answer(kwargs):
+        assert kwargs["stream"] is True
+        return stream
+    return answer
+
+
+def sse_events(body: str):
+    events = []
+    for frame in body.split("\n\n"):
+        if not frame or frame.startswith(":"):
+            continue
+        event, data = frame.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_stream_completion_yields_chunks_in_order_and_closes_stream(stub_groq):
+    groq = GroqService()
+    stream = StubStream(["Late", "-night ", "", "jazz", "."])
+    calls = stub_groq(groq, streaming(stream))
+
+    async def run():
+        return [delta async for delta in groq.stream_completion("prompt", "system", json_mode=True)]
+
+    assert asyncio.run(run()) == ["Late", "-night ", "jazz", "."]
+    assert stream.closed
+    assert "response_format" not in calls.calls[0]
+
+
+def test_stream_completion_closes_stream_when_caller_stops(stub_groq):
+    groq = GroqService()
+    stream = StubStream(["one ", "two ", "three"])
+    stub_groq(groq, streaming(stream))
+
+    async def run():
+        deltas = groq.stream_completion("prompt")
+        first = await deltas.__anext__()
+        await deltas.aclose()
+        return first
+
+    assert asyncio.run(run()) == "one "
+    assert stream.closed
+
+
+def test_describe_stream_sends_sse_frames(client, service, stub_groq):
+    stub_groq(service.groq, streaming(StubStream(["A warm", " rock ", "classic."])))
+
+    response = client.post("/describe-playlist/stream", json={"songs": SONGS})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith(": stream opened\n\n")
+    assert sse_events(response.text) == [
+        ("token", {"text": "A warm"}),
+        ("token", {"text": " rock "}),
+        ("token", {"text": "classic."}),
+        ("done", {"description": "A warm rock classic."}),
+    ]
+
+
+def test_describe_stream_reports_mid_stream_failure_as_error_frame(client, service, stub_groq):
+    stream = StubStream(["A warm", " rock "], error=RuntimeError("connection reset"))
+    stub_groq(service.groq, streaming(stream))
+
+    response = client.post("/describe-playlist/stream", json={"songs": SONGS})
+
+    assert response.status_code == 200
+    events = sse_events(response.text)
+    assert events[:2] == [("token", {"text": "A warm"}), ("token", {"text": " rock "})]
+    assert events[2][0] == "error"
+    assert events[2][1]["error_type"] == "ai_service_error"
+    assert len(events) == 3
+    assert stream.closed
+
+
+def test_recommend_stream_sends_ndjson_records_as_items_complete(client, service, stub_groq):
+    stub_groq(service.groq, streaming(StubStream(split(RECOMMENDATIONS, 7))))
+
+    response = client.post(
+        "/recommend-songs/stream",
+        json={"current_songs": SONGS, "number_of_recommendations": 2, "mode": "llm"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.text.endswith("\n")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["type"] for record in records] == ["recommendation", "recommendation", "done"]
+    assert records[0]["data"]["title"] == "Stairway to Heaven"
+    assert records[0]["data"]["reason"] == "A \"classic\" {epic} build"
+    assert records[1]["data"]["title"] == "Dream On"
+
+
+def test_recommend_stream_reports_mid_stream_failure_as_error_record(client, service, stub_groq):
+    cut = RECOMMENDATIONS.index("Dream On")
+    stream = StubStream(split(RECOMMENDATIONS[:cut], 5), error=RuntimeError("connection reset"))
+    stub_groq(service.groq, streaming(stream))
+
+    response = client.post(
+        "/recommend-songs/stream",
+        json={"current_songs": SONGS, "number_of_recommendations": 2, "mode": "llm"}
+    )
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["type"] for record in records] == ["recommendation", "error"]
+    assert records[1]["error_type"] == "ai_service_error"
+    assert stream.closed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 11, 1000])
+def test_parser_emits_items_whatever_the_token_boundaries(size):
+    parser = IncrementalJSONParser("recommendations")
+    items = []
+    for token in split(RECOMMENDATIONS, size):
+        items.extend(parser.feed(token))
+
+    assert items == json.loads(RECOMMENDATIONS)["recommendations"]
+    assert parser.finished
+
+
+def test_parser_emits_each_item_as_soon_as_it_closes():
+    parser = IncrementalJSONParser("songs")
+
+    assert parser.feed('{"songs": [{"title": "A", "tags": {"mood": "calm"}}') == [
+        {"title": "A", "tags": {"mood": "calm"}}
+    ]
+    assert parser.feed(', {"title": "B\\"}"') == []
+    assert parser.feed('}], "explanation": "x"}') == [{"title": 'B"}'}]
+    assert parser.finished
+    assert json.loads(parser.buffer)["explanation"] == "x"
+
+
+def test_parser_skips_fences_and_accepts_root_arrays():
+    parser = IncrementalJSONParser("recommendations", accept_root_array=True)
+
+    items = parser.feed('```json\n[{"title": "A"}, ')
+    items += parser.feed('{"title": "B"}]\n```')
+
+    assert items == [{"title": "A"}, {"title": "B"}]
+
+
+def test_parser_ignores_other_arrays():
+    parser = IncrementalJSONParser("songs")
+
+    assert parser.feed('{"other": [{"title": "A"}], "songs": [{"title": "B"}]}') == [{"title": "B"}]
+
+
+def test_stream_completion_records_latency_and_feeds_the_router(stub_groq):
+    groq = GroqService()
+    stub_groq(groq, streaming(StubStream(["Late", "-night ", "jazz."])))
+    model = groq.router.default_model
+    streams_before = upstream_latency.count(model=model, outcome="ok")
+    first_chunks_before = upstream_first_chunk.count(model=model)
+
+    async def run():
+        deltas = []
+        async for delta in groq.stream_completion("prompt", endpoint="describe_playlist"):
+            assert upstream_in_flight.get(model=model) == 1
+            deltas.append(delta)
+        return deltas
+
+    assert asyncio.run(run()) == ["Late", "-night ", "jazz."]
+    assert upstream_in_flight.get(model=model) == 0
+    assert upstream_latency.count(model=model, outcome="ok") - streams_before == 1
+    assert upstream_first_chunk.count(model=model) - first_chunks_before == 1
+    assert "describe_playlist" in groq.router.snapshot()["latency_seconds"]
+
+
+def test_stream_left_by_the_caller_counts_as_cancelled(stub_groq):
+    groq = GroqService()
+    stub_groq(groq, streaming(StubStream(["one ", "two ", "three"])))
+    model = groq.router.default_model
+    cancelled_before = upstream_latency.count(model=model, outcome="cancelled")
+
+    async def run():
+        deltas = groq.stream_completion("prompt", endpoint="describe_playlist")
+        await deltas.__anext__()
+        await deltas.aclose()
+
+    asyncio.run(run())
+    assert upstream_latency.count(model=model, outcome="cancelled") - cancelled_before == 1
+    assert upstream_in_flight.get(model=model) == 0
+    assert "describe_playlist" not in groq.router.snapshot()["latency_seconds"]
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+from app.services.ai_service import AIService
+from app.services.disk_cache import DiskCache, TieredCache
+from app.services.response_cache import ResponseCache
+from conftest import completion
+
+
+def tiered(tmp_path) -> TieredCache:
+    return TieredCache(ResponseCache(), DiskCache(str(tmp_path / "cache.db")))
+
+
+def test_each_lookup_counts_one_outcome(tmp_path):
+    cache = tiered(tmp_path)
+    cache.disk.set("key", "value", "describe_playlist")
+
+    # Missing from memory but found on disk: a hit, not a miss and a hit
+    assert cache.get("key", "describe_playlist") == "value"
+    # Now served from memory
+    assert cache.get("key", "describe_playlist") == "value"
+    assert cache.get("other", "describe_playlist") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["by_endpoint"]["describe_playlist"] == {"hits": 2, "misses": 1}
+
+
+def test_async_lookup_counts_one_outcome(tmp_path):
+    cache = tiered(tmp_path)
+    cache.disk.set("key", "value", "describe_playlist")
+
+    async def run():
+        return [
+            await cache.get_async("key", "describe_playlist"),
+            await cache.get_async("other", "describe_playlist")
+        ]
+
+    assert asyncio.run(run()) == ["value", None]
+    assert cache.memory.lookup("key") == "value"
+    assert asyncio.run(cache.stats_async())["by_endpoint"]["describe_playlist"] == {"hits": 1, "misses": 1}
+
+
+def test_disk_tier_runs_off_the_event_loop(tmp_path, stub_groq):
+    service = AIService()
+    service.cache = tiered(tmp_path)
+    disk = service.cache.disk
+    threads = []
+
+    for name in ("lookup", "set"):
+        method = getattr(disk, name)
+
+        def record(*args, method=method, **kwargs):
+            threads.append(threading.current_thread())
+            return method(*args, **kwargs)
+
+        setattr(disk, name, record)
+
+    async def answer(kwargs):
+        return completion("Late-night jazz.")
+
+    calls = stub_groq(service.groq, answer)
+
+    async def run():
+        first = await service._complete("describe_playlist", "prompt", "system")
+        service.cache.memory.clear()
+        second = await service._complete("describe_playlist", "prompt", "system")
+        return first, second, threading.current_thread()
+
+    first, second, loop_thread = asyncio.run(run())
+
+    assert first == second == "Late-night jazz."
+    assert len(calls.calls) == 1
+    # Miss, write, then a hit from disk once memory was cleared
+    assert len(threads) == 3
+    assert all(thread is not loop_thread for thread in threads)